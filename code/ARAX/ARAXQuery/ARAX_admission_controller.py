@@ -0,0 +1,231 @@
+#!/usr/bin/python3
+# Admission control for the queries run by the query server. Each query's memory use is estimated before it runs,
+# and queries only start while the server's memory budget and concurrency limit allow; the others wait in a queue,
+# ordered by priority class and then arrival.
+
+import sys
+import os
+def eprint(*args, **kwargs): print(*args, file=sys.stderr, **kwargs)
+import time
+import json
+import sqlite3
+import itertools
+import threading
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../../")
+from RTXConfiguration import RTXConfiguration
+
+#### Rough memory model of a query (in GB), from how many KG edges it is likely to bring back
+BASE_QUERY_GB = 1.5                 # a query that returns (next to) nothing
+GB_PER_KG_EDGE = 1e-5               # ~10 kB per edge in the message, with its attributes
+GB_PER_OPERATION = 0.25             # each workflow operation or ARAXi command (overlays, ranking, ...)
+MAX_QUERY_GB = 32.0                 # the memory limit of a query's child process
+DEFAULT_NODE_DEGREE = 1000          # for pinned curies not in KG2c (e.g. not canonical)
+UNPINNED_QEDGE_KG_EDGES = 200000    # for a qedge with no pinned end, which expands from the results of other qedges
+
+#### Priority classes, highest first. Queries estimated to need at least LARGE_QUERY_GB are 'large' (so they don't
+#### hold up smaller ones), interactive queries (streamed to the UI) are 'interactive', and the others 'standard'.
+#### Waiting queries move up a class every PRIORITY_AGING_INTERVAL seconds, so that large ones can't wait forever.
+PRIORITY_CLASSES = [ 'interactive', 'standard', 'large' ]
+LARGE_QUERY_GB = 8.0
+PRIORITY_AGING_INTERVAL = 300
+
+MEMORY_BUDGET_FRACTION = 0.75       # of the host's physical memory
+MAX_QUEUED_QUERIES = 200
+MAX_QUEUE_WAIT = 1800               # seconds
+QUEUE_POSITION_REPORT_INTERVAL = 30 # seconds; a waiting query's position is reported at least this often
+
+
+class QueryTicket:
+    """A query's place in the admission controller: its estimated cost, then 'waiting', 'admitted' or 'timed_out'"""
+
+    def __init__(self, cost, sequence_number):
+        self.cost = cost
+        self.sequence_number = sequence_number
+        self.enqueued_at = time.time()
+        self.status = 'waiting'
+
+
+class ARAXAdmissionController:
+
+    def __init__(self, memory_budget_gb=None, max_concurrent_queries=None, max_queued_queries=MAX_QUEUED_QUERIES,
+                 kg2c_sqlite_path=None):
+        if memory_budget_gb is None:
+            memory_budget_gb = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') / 1024 ** 3 * MEMORY_BUDGET_FRACTION
+        self.memory_budget_gb = memory_budget_gb
+        self.max_concurrent_queries = max_concurrent_queries if max_concurrent_queries is not None else max(4, os.cpu_count() or 1)
+        self.max_queued_queries = max_queued_queries
+        self.kg2c_sqlite_path = kg2c_sqlite_path
+        self.condition = threading.Condition()
+        self.waiting_tickets = []
+        self.running_tickets = set()
+        self.reserved_memory_gb = 0.0
+        self.sequence_numbers = itertools.count()
+
+
+    ##################################################################################################
+    #### Estimate what running a query will take
+    def estimate_cost(self, query):
+        """
+        Estimates a query's memory use from its query graph (the number of KG edges each qedge is likely to bring back,
+        from the KG2c neighbor counts of its pinned nodes) and its workflow operations or ARAXi commands, and assigns
+        it a priority class. Never fails: a query that can't be estimated gets the cost of a query with no pinned nodes.
+        """
+        message = query.get('message') or {}
+        query_graph = message.get('query_graph') or {}
+        qnodes = query_graph.get('nodes') or {}
+        qedges = query_graph.get('edges') or {}
+        n_operations = len(query.get('workflow') or []) + len((query.get('operations') or {}).get('actions') or [])
+
+        try:
+            n_kg_edges = self._estimate_kg_edges(qnodes, qedges)
+        except Exception as error:
+            eprint(f"WARNING: Unable to estimate the cost of a query: {error}")
+            n_kg_edges = UNPINNED_QEDGE_KG_EDGES * max(len(qedges), 1)
+
+        memory_gb = min(BASE_QUERY_GB + n_kg_edges * GB_PER_KG_EDGE + n_operations * GB_PER_OPERATION, MAX_QUERY_GB)
+        if memory_gb >= LARGE_QUERY_GB:
+            priority_class = 'large'
+        elif query.get('stream_progress', False):
+            priority_class = 'interactive'
+        else:
+            priority_class = 'standard'
+        return { 'n_qedges': len(qedges), 'n_kg_edges': n_kg_edges, 'n_operations': n_operations,
+                 'memory_gb': round(memory_gb, 3), 'priority_class': priority_class }
+
+
+    def _estimate_kg_edges(self, qnodes, qedges):
+        pinned_curies = { curie for qnode in qnodes.values() for curie in (qnode.get('ids') or []) }
+        neighbor_counts = self._get_neighbor_counts(pinned_curies) if pinned_curies else {}
+
+        n_kg_edges = 0
+        for qedge in qedges.values():
+            #### A pinned end has as many edges as its curies have neighbors of the other end's categories
+            end_kg_edges = []
+            for qnode_key, other_qnode_key in [ (qedge.get('subject'), qedge.get('object')), (qedge.get('object'), qedge.get('subject')) ]:
+                qnode = qnodes.get(qnode_key) or {}
+                if not qnode.get('ids'):
+                    continue
+                other_categories = (qnodes.get(other_qnode_key) or {}).get('categories') or [ 'biolink:NamedThing' ]
+                end_kg_edges.append(sum(sum(neighbor_counts[curie].get(category, 0) for category in other_categories)
+                                        if curie in neighbor_counts else DEFAULT_NODE_DEGREE
+                                        for curie in qnode['ids']))
+            n_kg_edges += min(end_kg_edges) if end_kg_edges else UNPINNED_QEDGE_KG_EDGES
+        return n_kg_edges
+
+
+    def _get_neighbor_counts(self, curies):
+        """Returns the KG2c neighbor counts (by category) of the curies that are in KG2c"""
+        if self.kg2c_sqlite_path is None:
+            rtx_config = RTXConfiguration()
+            self.kg2c_sqlite_path = f"{os.path.dirname(os.path.abspath(__file__))}/../KnowledgeSources/KG2c/" \
+                                    f"{rtx_config.kg2c_sqlite_path.split('/')[-1]}"
+        connection = sqlite3.connect(f"file:{self.kg2c_sqlite_path}?mode=ro", uri=True)
+        try:
+            rows = connection.execute("SELECT N.id, N.neighbor_counts FROM neighbors AS N WHERE N.id IN (SELECT value FROM json_each(?))",
+                                      (json.dumps(list(curies)),)).fetchall()
+        finally:
+            connection.close()
+        return { curie: json.loads(neighbor_counts) for curie, neighbor_counts in rows }
+
+
+    ##################################################################################################
+    #### Queue a query and wait until it may run
+    def submit(self, cost):
+        """Puts a query (with its estimated cost) in the queue, and returns its ticket, or None if the queue is full"""
+        with self.condition:
+            if len(self.waiting_tickets) >= self.max_queued_queries:
+                return None
+            ticket = QueryTicket(cost, next(self.sequence_numbers))
+            self.waiting_tickets.append(ticket)
+            self._admit_waiting_queries()
+            return ticket
+
+
+    def wait_for_admission(self, ticket, timeout=MAX_QUEUE_WAIT):
+        """
+        Generator that waits until the query is admitted (ticket.status is then 'admitted') or the timeout passes
+        ('timed_out'). While it waits, it yields the query's position in the queue (1 for the next one to run)
+        whenever that changes, and at least every QUEUE_POSITION_REPORT_INTERVAL seconds.
+        """
+        deadline = time.time() + timeout
+        last_position = None
+        last_report_time = 0.0
+        while True:
+            with self.condition:
+                self._admit_waiting_queries()
+                if ticket.status != 'waiting':
+                    return
+                if time.time() >= deadline:
+                    self.waiting_tickets.remove(ticket)
+                    ticket.status = 'timed_out'
+                    self.condition.notify_all()
+                    return
+                position = self._get_queue_position(ticket)
+                if position == last_position and time.time() - last_report_time < QUEUE_POSITION_REPORT_INTERVAL:
+                    self.condition.wait(timeout=min(QUEUE_POSITION_REPORT_INTERVAL, deadline - time.time()))
+                    continue
+            last_position = position
+            last_report_time = time.time()
+            yield position
+
+
+    def release(self, ticket):
+        """Frees the memory and slot of a query that has finished (or drops it from the queue, if it never started)"""
+        with self.condition:
+            if ticket in self.running_tickets:
+                self.running_tickets.remove(ticket)
+                self.reserved_memory_gb = max(self.reserved_memory_gb - ticket.cost['memory_gb'], 0.0)
+            elif ticket in self.waiting_tickets:
+                self.waiting_tickets.remove(ticket)
+            ticket.status = 'released'
+            self._admit_waiting_queries()
+            self.condition.notify_all()
+
+
+    def get_status(self):
+        """Returns the number of running and waiting queries and the memory reserved for the running ones"""
+        with self.condition:
+            return { 'running': len(self.running_tickets), 'waiting': len(self.waiting_tickets),
+                     'reserved_memory_gb': round(self.reserved_memory_gb, 3), 'memory_budget_gb': round(self.memory_budget_gb, 3),
+                     'max_concurrent_queries': self.max_concurrent_queries }
+
+
+    def _get_queue_order(self, ticket, now):
+        priority = PRIORITY_CLASSES.index(ticket.cost['priority_class'])
+        return max(priority - int((now - ticket.enqueued_at) / PRIORITY_AGING_INTERVAL), 0), ticket.sequence_number
+
+
+    def _get_queue_position(self, ticket):
+        now = time.time()
+        ticket_order = self._get_queue_order(ticket, now)
+        return 1 + sum(1 for other_ticket in self.waiting_tickets if self._get_queue_order(other_ticket, now) < ticket_order)
+
+
+    def _admit_waiting_queries(self):
+        """Admits waiting queries in queue order for as long as the next one fits (must hold the condition's lock)"""
+        now = time.time()
+        self.waiting_tickets.sort(key=lambda ticket: self._get_queue_order(ticket, now))
+        while self.waiting_tickets:
+            ticket = self.waiting_tickets[0]
+            if len(self.running_tickets) >= self.max_concurrent_queries:
+                break
+            #### A query bigger than the whole budget may still run on its own
+            if self.running_tickets and self.reserved_memory_gb + ticket.cost['memory_gb'] > self.memory_budget_gb:
+                break
+            self.waiting_tickets.pop(0)
+            self.running_tickets.add(ticket)
+            self.reserved_memory_gb += ticket.cost['memory_gb']
+            ticket.status = 'admitted'
+            self.condition.notify_all()
+
+
+_admission_controller = None
+
+
+def get_admission_controller():
+    """Returns this process's admission controller (the query server runs every query from one process)"""
+    global _admission_controller
+    if _admission_controller is None:
+        _admission_controller = ARAXAdmissionController()
+    return _admission_controller
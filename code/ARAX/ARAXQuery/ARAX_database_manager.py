@@ -16,6 +16,8 @@ pathlist = os.path.realpath(__file__).split(os.path.sep)
 RTXindex = pathlist.index("RTX")
 sys.path.append(os.path.sep.join([*pathlist[:(RTXindex + 1)], 'code']))
 from RTXConfiguration import RTXConfiguration
+sys.path.append(os.path.sep.join([*pathlist[:(RTXindex + 1)], 'code', 'ARAX', 'ResponseCache']))
+from query_result_cache import invalidate_query_result_cache
 
 knowledge_sources_filepath = os.path.sep.join([*pathlist[:(RTXindex + 1)], 'code', 'ARAX', 'KnowledgeSources'])
 versions_path = os.path.sep.join([knowledge_sources_filepath, 'db_versions.json'])
@@ -196,6 +198,7 @@ class ARAXDatabaseManager:
         if not self.allow_downloads:
             raise ValueError("in ARAXDatabaseManager, update_databases called with self.allow_downloads=False")
         debug = True
+        previous_versions = self._read_db_versions_file()
         # First ensure we have a db versions file if we're in a docker container (since host has dbs predownloaded)
         if os.path.exists(self.docker_databases_dir_path) and not os.path.exists(versions_path):
             self._write_db_versions_file(debug=True)
@@ -262,6 +265,9 @@ class ARAXDatabaseManager:
                 response.debug(f"No local verson json file present. Downloading all databases...")
             self._force_download_all(debug=debug)
             self._write_db_versions_file()
+        # Answers to queries cached before this update may have come from different databases
+        if self._read_db_versions_file() != previous_versions:
+            invalidate_query_result_cache()
         return response
 
     @staticmethod
@@ -393,6 +399,12 @@ class ARAXDatabaseManager:
                     return True
         return update_flag
 
+    def _read_db_versions_file(self):
+        if not os.path.exists(versions_path):
+            return None
+        with open(versions_path, "r") as fid:
+            return json.load(fid)
+
     def _write_db_versions_file(self, debug=False):
         print(f"saving new version file to {versions_path}") if debug else None
         with open(versions_path, "w") as fid:
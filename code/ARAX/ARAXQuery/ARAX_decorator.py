@@ -3,8 +3,10 @@ import copy
 import os
 import sqlite3
 import sys
-from collections import defaultdict
-from typing import List, Dict, Optional, Tuple, Union
+import threading
+import time
+from collections import defaultdict, OrderedDict
+from typing import List, Dict, Optional, Set, Union
 
 import ujson
 
@@ -20,6 +22,14 @@ from openapi_server.models.edge import Edge
 def eprint(*args, **kwargs): print(*args, file=sys.stderr, **kwargs)
 
 
+# Each process keeps one read-only connection to the KG2c sqlite (reopened after a fork or if the file is replaced)
+# and a bounded LRU cache of decoded node attributes, so that frequently returned nodes are not looked up repeatedly
+_kg2c_connection_lock = threading.RLock()
+_kg2c_connections = dict()
+_node_properties_cache = OrderedDict()
+NODE_PROPERTIES_CACHE_SIZE = 50000
+
+
 class ARAXDecorator:
 
     def __init__(self):
@@ -60,35 +70,20 @@ class ARAXDecorator:
     def decorate_nodes(self, response: ARAXResponse) -> ARAXResponse:
         message = response.envelope.message
         response.debug(f"Decorating nodes with metadata from KG2c")
+        start = time.time()
 
-        # Get connected to the local KG2c sqlite database
-        connection, cursor = self._connect_to_sqlite()
-
-        # Extract the KG2c nodes from sqlite
-        response.debug(f"Looking up corresponding KG2c nodes in sqlite")
-        node_attributes_ordered = list(self.node_attributes)
-        node_keys = set(node_key.replace("'", "''") for node_key in message.knowledge_graph.nodes)  # Escape quotes
-        node_keys_str = "','".join(node_keys)  # SQL wants ('node1', 'node2') format for string lists
-        node_cols_str = ", ".join([f"N.{property_name}" for property_name in node_attributes_ordered])
-        sql_query = f"SELECT N.id, {node_cols_str} " \
-                    f"FROM nodes AS N " \
-                    f"WHERE N.id IN ('{node_keys_str}')"
-        cursor.execute(sql_query)
-        rows = cursor.fetchall()
-        cursor.close()
-        connection.close()
+        # Extract the KG2c nodes from sqlite (those not already in this process's cache)
+        node_properties_map = self._get_node_properties(set(message.knowledge_graph.nodes), response)
 
         # Decorate nodes in the KG with info in these KG2c nodes
         response.debug(f"Adding attributes to nodes in the KG")
-        for row in rows:
+        for node_id, node_properties in node_properties_map.items():
             # First create the attributes for this KG2c node
-            node_id = row[0]
             trapi_node = message.knowledge_graph.nodes[node_id]
             kg2c_node_attributes = []
-            for index, property_name in enumerate(node_attributes_ordered):
-                value = self._load_property(property_name, row[index + 1])  # Add one to account for 'id' column
-                if value:
-                    kg2c_node_attributes.append(self.create_attribute(property_name, value))
+            for property_name, value in node_properties.items():
+                # Copy list values so that later changes to an attribute can't alter the cached node
+                kg2c_node_attributes.append(self.create_attribute(property_name, list(value) if isinstance(value, list) else value))
 
             # Then decorate the TRAPI node with those attributes it doesn't already have
             existing_attribute_triples = {self._get_attribute_triple(attribute)
@@ -100,8 +95,46 @@ class ARAXDecorator:
             else:
                 trapi_node.attributes = novel_attributes
 
+        response.info(f"Decorated {len(node_properties_map)} nodes with KG2c metadata in {round(time.time() - start, 2)} seconds")
         return response
 
+    def _get_node_properties(self, node_ids: Set[str], response: ARAXResponse) -> Dict[str, Dict[str, any]]:
+        """
+        Returns the decoded, non-empty properties of the KG2c nodes with the given IDs (nodes not in KG2c are
+        omitted). Results are served from/added to the per-process LRU cache.
+        """
+        node_properties_map = dict()
+        with _kg2c_connection_lock:
+            for node_id in node_ids:
+                if node_id in _node_properties_cache:
+                    _node_properties_cache.move_to_end(node_id)
+                    node_properties_map[node_id] = _node_properties_cache[node_id]
+        node_ids_to_look_up = node_ids.difference(node_properties_map)
+        response.debug(f"Found {len(node_properties_map)} nodes in the KG2c node cache; looking up "
+                       f"{len(node_ids_to_look_up)} in sqlite")
+        if not node_ids_to_look_up:
+            return node_properties_map
+
+        node_attributes_ordered = list(self.node_attributes)
+        node_cols_str = ", ".join([f"N.{property_name}" for property_name in node_attributes_ordered])
+        sql_query = f"SELECT N.id, {node_cols_str} " \
+                    f"FROM nodes AS N " \
+                    f"WHERE N.id IN (SELECT value FROM json_each(?))"
+        rows = self._execute_sqlite_query(sql_query, list(node_ids_to_look_up))
+
+        with _kg2c_connection_lock:
+            for row in rows:
+                node_properties = dict()
+                for index, property_name in enumerate(node_attributes_ordered):
+                    value = self._load_property(property_name, row[index + 1])  # Add one to account for 'id' column
+                    if value:
+                        node_properties[property_name] = value
+                node_properties_map[row[0]] = node_properties
+                _node_properties_cache[row[0]] = node_properties
+            while len(_node_properties_cache) > NODE_PROPERTIES_CACHE_SIZE:
+                _node_properties_cache.popitem(last=False)
+        return node_properties_map
+
     def decorate_edges(self, response: ARAXResponse, kind: Optional[str] = "RTX-KG2") -> ARAXResponse:
         """
         Decorates edges with publication sentences and any other available EPC info.
@@ -110,6 +143,7 @@ class ARAXDecorator:
         """
         kg = response.envelope.message.knowledge_graph
         response.debug(f"Decorating edges with EPC info from KG2c")
+        start = time.time()
         supported_kinds = {"RTX-KG2", "NGD", "SEMMEDDB"}
         if kind not in supported_kinds:
             response.error(f"Supported values for ARAXDecorator.decorate_edges()'s 'kind' parameter are: "
@@ -152,30 +186,30 @@ class ARAXDecorator:
                                    f"{kg2c_edge_ids_to_kg_keys_map[kg2c_edge_id]}")
                 kg2c_edge_ids_to_kg_keys_map[kg2c_edge_id] = edge_key
 
+            # Only fetch the attribute columns that at least one of these edges doesn't already have
+            attribute_type_id_map = {self.attribute_shells[property_name].attribute_type_id: property_name
+                                     for property_name in set(self.edge_attributes)}
+            edge_attributes_ordered = [property_name for property_name in self.edge_attributes
+                                       if any(not self._has_attribute(kg.edges[edge_key], property_name)
+                                              for edge_key in edge_keys_to_decorate)]
+            if not edge_keys_to_decorate or not edge_attributes_ordered:
+                response.info(f"Decorated 0 {kind} edges with KG2c EPC info in {round(time.time() - start, 2)} seconds")
+                return response
+
             # Extract the proper entries from sqlite
             edge_id_col = "triple"  # NOTE: This column name is outdated; the column contains KG2c edge ids
-            connection, cursor = self._connect_to_sqlite()
             response.debug(f"Looking up EPC edge info in KG2c sqlite")
-            response.debug(f"Looking up corresponding KG2c nodes in sqlite")
-            edge_attributes_ordered = list(self.edge_attributes)
-            kg2c_edge_ids_set = set(search_key.replace("'", "''") for search_key in set(kg2c_edge_ids_to_kg_keys_map))  # Escape quotes
-            kg2c_edge_ids_str = "','".join(kg2c_edge_ids_set)  # SQL wants ('edge1', 'edge2') format for string lists
             edge_cols_str = ", ".join([f"E.{property_name}" for property_name in edge_attributes_ordered])
             sql_query = f"SELECT E.{edge_id_col}, {edge_cols_str} " \
                         f"FROM edges AS E " \
-                        f"WHERE E.{edge_id_col} IN ('{kg2c_edge_ids_str}')"
-            cursor.execute(sql_query)
-            rows = cursor.fetchall()
-            cursor.close()
-            connection.close()
+                        f"WHERE E.{edge_id_col} IN (SELECT value FROM json_each(?))"
+            rows = self._execute_sqlite_query(sql_query, list(kg2c_edge_ids_to_kg_keys_map))
 
             response.debug(f"Got {len(rows)} rows back from KG2c sqlite")
 
             response.debug(f"Adding attributes to edges in the KG")
-            # Create helper maps for easy access to returned rows and attribute shells
+            # Create a helper map for easy access to returned rows
             kg2c_edge_id_to_kg2c_edge_tuple_map = {row[0]: row for row in rows}
-            attribute_type_id_map = {self.create_attribute(property_name, "irrelevant").attribute_type_id: property_name
-                                     for property_name in set(self.edge_attributes)}
             # Loop through and add attributes to KG edges based on rows returned from KG2c sqlite
             for kg2c_edge_id, kg2c_edge_tuple in kg2c_edge_id_to_kg2c_edge_tuple_map.items():
                 kg_edge_key = kg2c_edge_ids_to_kg_keys_map[kg2c_edge_id]
@@ -209,6 +243,8 @@ class ARAXDecorator:
                     else:
                         kg_edge.attributes += new_attributes
 
+        response.info(f"Decorated {len(edge_keys_to_decorate)} {kind} edges with KG2c EPC info in "
+                      f"{round(time.time() - start, 2)} seconds")
         return response
 
     def _decorate_ngd_edges(self, edge_keys_to_decorate, kg, response):
@@ -220,19 +256,15 @@ class ARAXDecorator:
             search_key_to_edge_keys_map[search_key].add(edge_key)
         node_pair_key_col = "node_pair"
 
+        if not search_key_to_edge_keys_map:
+            return
+
         # Extract the proper entries from sqlite
-        connection, cursor = self._connect_to_sqlite()
         response.debug(f"Looking up EPC edge info in KG2c sqlite to decorate NGD edges")
-        edge_attributes_ordered = list(self.edge_attributes)
-        search_keys_set = set(search_key.replace("'", "''") for search_key in set(search_key_to_edge_keys_map))  # Escape quotes
-        search_keys_str = "','".join(search_keys_set)  # SQL wants ('edge1', 'edge2') format for string lists
         sql_query = f"SELECT E.{node_pair_key_col}, E.publications_info " \
                     f"FROM edges AS E " \
-                    f"WHERE E.{node_pair_key_col} IN ('{search_keys_str}')"
-        cursor.execute(sql_query)
-        rows = cursor.fetchall()
-        cursor.close()
-        connection.close()
+                    f"WHERE E.{node_pair_key_col} IN (SELECT value FROM json_each(?))"
+        rows = self._execute_sqlite_query(sql_query, list(search_key_to_edge_keys_map))
 
         response.debug(f"Got {len(rows)} rows back from KG2c sqlite")
 
@@ -243,14 +275,13 @@ class ARAXDecorator:
             search_key = row[0]
             search_key_to_kg2c_edge_tuples_map[search_key].append(row)
 
-        attribute_type_id_map = {self.create_attribute(property_name, "irrelevant").attribute_type_id: property_name
+        attribute_type_id_map = {self.attribute_shells[property_name].attribute_type_id: property_name
                                  for property_name in set(self.edge_attributes)}
         for search_key, kg2c_edge_tuples in search_key_to_kg2c_edge_tuples_map.items():
             # Extract publications info for all edges between the two nodes specified in the search key
             merged_publications_info = []
             for kg2c_edge_tuple in kg2c_edge_tuples:
-                pubs_info_col_index = edge_attributes_ordered.index("publications_info")
-                raw_value = kg2c_edge_tuple[pubs_info_col_index]
+                raw_value = kg2c_edge_tuple[1]
                 if raw_value:  # Skip empty attributes
                     value = self._load_property("publications_info", raw_value)
                     merged_publications_info.append(value)
@@ -304,16 +335,41 @@ class ARAXDecorator:
                               if source.resource_role == "primary_knowledge_source"] if edge.sources else []
         return primary_ks_sources[0] if primary_ks_sources else ""
 
-    def _connect_to_sqlite(self) -> Tuple[sqlite3.Connection, sqlite3.Cursor]:
+    def _has_attribute(self, edge: Edge, property_name: str) -> bool:
+        attribute_type_id = self.attribute_shells[property_name].attribute_type_id
+        return any(attribute.attribute_type_id == attribute_type_id for attribute in edge.attributes) if edge.attributes else False
+
+    @staticmethod
+    def _get_sqlite_file_path() -> str:
         path_list = os.path.realpath(__file__).split(os.path.sep)
         rtx_index = path_list.index("RTX")
         rtxc = RTXConfiguration()
         sqlite_dir_path = os.path.sep.join([*path_list[:(rtx_index + 1)], 'code', 'ARAX', 'KnowledgeSources', 'KG2c'])
         sqlite_name = rtxc.kg2c_sqlite_path.split('/')[-1]
-        sqlite_file_path = f"{sqlite_dir_path}{os.path.sep}{sqlite_name}"
-        connection = sqlite3.connect(sqlite_file_path)
-        cursor = connection.cursor()
-        return connection, cursor
+        return f"{sqlite_dir_path}{os.path.sep}{sqlite_name}"
+
+    def _get_sqlite_connection(self) -> sqlite3.Connection:
+        """
+        Returns this process's read-only connection to the KG2c sqlite. Connections are not shared across a fork,
+        and a new one is opened if the database file has been replaced (e.g., by the database manager).
+        """
+        sqlite_file_path = self._get_sqlite_file_path()
+        file_id = os.stat(sqlite_file_path).st_ino
+        with _kg2c_connection_lock:
+            pid, connection_file_id, connection = _kg2c_connections.get(sqlite_file_path, (None, None, None))
+            if pid != os.getpid() or connection_file_id != file_id:
+                if pid == os.getpid():
+                    _node_properties_cache.clear()
+                    connection.close()
+                connection = sqlite3.connect(f"file:{sqlite_file_path}?mode=ro", uri=True, check_same_thread=False)
+                _kg2c_connections[sqlite_file_path] = (os.getpid(), file_id, connection)
+            return connection
+
+    def _execute_sqlite_query(self, sql_query: str, search_values: List[str]) -> list:
+        """Runs a query whose single parameter is the JSON-encoded list of values to look up (via json_each)"""
+        connection = self._get_sqlite_connection()
+        with _kg2c_connection_lock:
+            return connection.execute(sql_query, (ujson.dumps(search_values),)).fetchall()
 
     def _load_property(self, property_name: str, raw_value: str) -> Union[str, List[str], Dict[str, any], None]:
         attributes_info_lookup = self.node_attributes if property_name in self.node_attributes else self.edge_attributes
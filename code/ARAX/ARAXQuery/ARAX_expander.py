@@ -580,11 +580,13 @@ class ARAXExpander:
         # Decorate all nodes with additional attributes info from KG2c if requested (iri, description, etc.)
         if mode != "RTXKG2" or not parameters.get("return_minimal_metadata"):
             decorator = ARAXDecorator()
-            decorator.decorate_nodes(response)
-            decorator.decorate_edges(response, kind="RTX-KG2")
+            with response.profiler.span("decorate"):
+                decorator.decorate_nodes(response)
+                decorator.decorate_edges(response, kind="RTX-KG2")
         elif mode == "RTXKG2":
             decorator = ARAXDecorator()
-            decorator.decorate_edges(response, kind="SEMMEDDB")
+            with response.profiler.span("decorate"):
+                decorator.decorate_edges(response, kind="SEMMEDDB")
 
         # Second half of patch for #2328; edit KG2 'treats_or_applied_or_studied_to_treat' edges to just 'treats'
         response.info(f"Treats-like predicates are: {self.treats_like_predicates}")
@@ -947,7 +949,8 @@ class ARAXExpander:
         for qnode_key, nodes in answer_kg.nodes_by_qg_id.items():
             # Load preferred curie info from NodeSynonymizer
             log.debug(f"{kp_name}: Getting preferred curies for {qnode_key} nodes returned in this step")
-            canonicalized_nodes = eu.get_canonical_curies_dict(list(nodes), log) if nodes else dict()
+            with log.profiler.span("synonymize", kp=kp_name, qnode_key=qnode_key, n_curies=len(nodes)):
+                canonicalized_nodes = eu.get_canonical_curies_dict(list(nodes), log) if nodes else dict()
             if log.status != 'OK':
                 return deduplicated_kg
 
@@ -37,8 +37,7 @@ from node_synonymizer import NodeSynonymizer
 sys.path.append(os.path.sep.join([*pathlist[:(RTXindex + 1)], 'code', 'ARAX', 'ARAXQuery', 'Infer', 'scripts']))
 from infer_utilities import InferUtilities
 # from creativeDTD import creativeDTD
-from creativeCRG import creativeCRG
-from ExplianableDTD_db import ExplainableDTD
+#### creativeCRG and ExplianableDTD_db (with pandas and the models they load) are imported by the actions that use them
 
 # from ExplianableCRG import ExplianableCRG
 
@@ -47,7 +46,6 @@ from ExplianableDTD_db import ExplainableDTD
 # RTXConfig = RTXConfiguration()
 
 import pickle
-import pandas as pd
 
 
 class ARAXInfer:
@@ -385,6 +383,7 @@ chemical_gene_regulation_graph_expansion predicts the regulation relationship be
         """
         message = self.message
         parameters = self.parameters
+        from ExplianableDTD_db import ExplainableDTD
         XDTD = ExplainableDTD()
         iu = InferUtilities()
         # make a list of the allowable parameters (keys), and their possible values (values). Note that the action and corresponding name will always be in the allowable parameters
@@ -616,6 +615,7 @@ chemical_gene_regulation_graph_expansion predicts the regulation relationship be
         """
         message = self.message
         parameters = self.parameters
+        from creativeCRG import creativeCRG
         XCRG = creativeCRG(self.response, os.path.sep.join([*pathlist[:(RTXindex + 1)], 'code', 'ARAX', 'ARAXQuery', 'Infer', 'data', 'xCRG_data']))
         # make a list of the allowable parameters (keys), and their possible values (values). Note that the action and corresponding name will always be in the allowable parameters
         if message and parameters and hasattr(message, 'query_graph') and hasattr(message.query_graph, 'nodes'):
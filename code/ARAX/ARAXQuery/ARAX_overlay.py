@@ -14,6 +14,8 @@ from ARAX_response import ARAXResponse
 from collections import Counter
 import traceback
 import itertools
+import copy
+from concurrent.futures import ThreadPoolExecutor
 
 from ARAX_decorator import ARAXDecorator
 
@@ -543,6 +545,136 @@ This information is included in edge attributes with the name 'icees_p-value'.
             response = self.report_response_stats(response)
         return response
 
+    #### Actions that, given a virtual_relation_label and explicit qnode keys, only add a virtual qedge and virtual edges
+    concurrent_actions = {'compute_ngd', 'overlay_clinical_info', 'fisher_exact_test', 'compute_jaccard'}
+
+    def get_independent_overlays(self, response, actions):
+        """
+        Finds the leading run of overlay actions that can be applied concurrently (see apply_concurrently()) with the
+        same outcome as applying them in order. That is the case when each adds its own virtual qedge and edges
+        between explicitly given qnodes (so it ignores the others' edges), there are no results to update yet, and
+        only the first of them may be one that would see the others' edges (compute_jaccard counts all KG edges, and
+        compute_ngd decorates all literature co-occurrence edges).
+        :param response: the response to be overlaid
+        :param actions: the remaining actions of the processing plan, starting with an overlay
+        :return: the actions to apply together (only the first one if it can't be grouped)
+        """
+        message = response.envelope.message
+        if message.results or message.knowledge_graph is None or message.knowledge_graph.edges is None or \
+                message.query_graph is None or message.query_graph.edges is None:
+            return actions[:1]
+        group = []
+        qedge_keys = set(message.query_graph.edges)
+        for action in actions:
+            if action['command'] != 'overlay' or not isinstance(action['parameters'], dict):
+                break
+            parameters = action['parameters']
+            if parameters.get('action') not in self.concurrent_actions:
+                break
+            if parameters['action'] == 'compute_jaccard':
+                qnode_key_parameters = ['start_node_key', 'intermediate_node_key', 'end_node_key']
+            else:
+                qnode_key_parameters = ['subject_qnode_key', 'object_qnode_key']
+            label = parameters.get('virtual_relation_label')
+            if not isinstance(label, str) or label in qedge_keys or not all(parameters.get(key) for key in qnode_key_parameters):
+                break
+            if group and parameters['action'] in {'compute_jaccard', 'compute_ngd'}:
+                break
+            qedge_keys.add(label)
+            group.append(action)
+        return group if group else actions[:1]
+
+    def apply_concurrently(self, response, parameters_list):
+        """
+        Applies a group of independent overlays (see get_independent_overlays()) concurrently, each in a thread on its
+        own copy of the message (see _get_overlay_copy()), then merges their logs, qedges and the KG nodes and edges
+        they added or changed into the response in the order of the group. The overlays mostly wait on sqlite and web
+        services, so threads overlap well. If the copies turn out to conflict (e.g. removed keys, or two of them
+        adding or changing the same key), the overlays are applied in order instead, to the untouched message.
+        :param response: the response to be overlaid
+        :param parameters_list: the parameters of each overlay, in order
+        :return: the response
+        """
+        message = response.envelope.message
+        response.debug(f"Applying {len(parameters_list)} independent overlays concurrently")
+        sub_responses = [self._get_overlay_copy(response) for _ in parameters_list]
+        with ThreadPoolExecutor(max_workers=len(parameters_list)) as executor:
+            futures = [executor.submit(ARAXOverlay().apply, sub_response, parameters)
+                       for sub_response, parameters in zip(sub_responses, parameters_list)]
+            for future in futures:
+                future.result()
+
+        # Only merge if each overlay just added or changed its own keys
+        changed_keys = [self._get_changed_keys(message, sub_response.envelope.message) for sub_response in sub_responses]
+        if None in changed_keys or len(set(itertools.chain(*changed_keys))) != sum(len(keys) for keys in changed_keys):
+            response.debug(f"The concurrently applied overlays conflict, so applying them in order instead")
+            for parameters in parameters_list:
+                self.apply(response, parameters)
+                if response.status != 'OK':
+                    break
+            return response
+
+        for sub_response, sub_response_changed_keys in zip(sub_responses, changed_keys):
+            response.merge(sub_response)
+            if 'parameters' in sub_response.data:
+                response.data['parameters'] = sub_response.data['parameters']
+            sub_message = sub_response.envelope.message
+            for graph_name, dict_name, key in sub_response_changed_keys:
+                graph = getattr(message, graph_name)
+                if getattr(graph, dict_name) is None:
+                    setattr(graph, dict_name, {})
+                getattr(graph, dict_name)[key] = getattr(getattr(sub_message, graph_name), dict_name)[key]
+            if response.status != 'OK':
+                break
+        return response
+
+    @staticmethod
+    def _get_changed_keys(message, sub_message):
+        # The (graph, dict, key) of each qnode, qedge, node and edge added to or changed in the copy of the message, in
+        # order, or None if anything was removed or the results changed
+        if sub_message.results or sub_message.query_graph is None or sub_message.knowledge_graph is None:
+            return None
+        changed_keys = []
+        for graph_name in ['query_graph', 'knowledge_graph']:
+            for dict_name in ['nodes', 'edges']:
+                old_dict = getattr(getattr(message, graph_name), dict_name) or {}
+                new_dict = getattr(getattr(sub_message, graph_name), dict_name) or {}
+                if any(key not in new_dict for key in old_dict):
+                    return None
+                changed_keys.extend((graph_name, dict_name, key) for key, value in new_dict.items()
+                                    if key not in old_dict or type(value) is not type(old_dict[key]) or value != old_dict[key])
+        return changed_keys
+
+    @staticmethod
+    def _copy_graph_element(element):
+        # A copy of a qnode, qedge, node or edge whose lists and dicts (e.g. attributes, qnode_keys) are copies too. The
+        # overlays only append to or replace these, never change an attribute in place, so the original stays as it was
+        element_copy = copy.copy(element)
+        element_copy.__dict__.update({name: copy.copy(value) for name, value in vars(element).items()
+                                      if isinstance(value, (list, dict))})
+        return element_copy
+
+    @staticmethod
+    def _get_overlay_copy(response):
+        # A response for one of the concurrent overlays, logging like the given response, whose message has copies of
+        # the query and knowledge graphs and of their nodes and edges, so that anything the overlay changes can be
+        # found (see _get_changed_keys()) and only reaches the given response once merged
+        message = copy.copy(response.envelope.message)
+        message.results = list(message.results) if message.results is not None else None
+        for graph_name in ['query_graph', 'knowledge_graph']:
+            graph = copy.copy(getattr(message, graph_name))
+            for dict_name in ['nodes', 'edges']:
+                elements = getattr(graph, dict_name)
+                if elements is not None:
+                    setattr(graph, dict_name, {key: ARAXOverlay._copy_graph_element(element) for key, element in elements.items()})
+            setattr(message, graph_name, graph)
+        sub_response = ARAXResponse(logging_level=response.logging_level)
+        sub_response.set_log_level(response.log_level)
+        sub_response.output = response.output
+        sub_response.envelope = copy.copy(response.envelope)
+        sub_response.envelope.message = message
+        return sub_response
+
     def __compute_ngd(self, describe=False):
         """
         Computes normalized google distance between two nodes connected by an edge in the knowledge graph
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+import sys
+def eprint(*args, **kwargs): print(*args, file=sys.stderr, **kwargs)
+
+import contextlib
+import json
+import os
+import resource
+import threading
+import time
+
+
+class ARAXProfiler:
+    """Records how long each stage of processing a query takes, as a tree of spans (e.g. the query, each ARAXi
+    command, and sub-phases like KP queries, synonymization, decoration and ranking). Each span has its wall time and,
+    for spans run synchronously in one thread, the CPU time, RSS change and change in allocated Python memory blocks.
+    Every ARAXResponse has a profiler, so code with a response object can add spans:
+
+        with response.profiler.span('decorate_nodes'):
+            ...
+
+    When the query is done, the spans can be exported to OpenTelemetry (if the server has configured a tracer
+    provider) and/or written to a JSON file that Chrome's about:tracing or Perfetto can display.
+    """
+
+    def __init__(self):
+        self.spans = []
+        #### Indexes of the spans open in each thread, innermost last
+        self.open_span_indexes = {}
+        self.lock = threading.Lock()
+
+    #### The lock can't be copied or pickled (e.g. with a response), so a copy gets its own
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+
+    #### Start a span
+    def start_span(self, name, **attributes):
+        """Public method that starts a span inside the innermost span open in this thread, and returns its index
+        (to pass to end_span()). Prefer the span() context manager where possible.
+
+        :param name: Name of the stage (e.g. 'expand').
+        :type name: str
+        :param attributes: Any details about the stage (e.g. kp='infores:rtx-kg2').
+        :return: The index of the new span
+        :rtype: int
+        """
+        open_span_indexes = self.open_span_indexes.setdefault(threading.get_ident(), [])
+        span = { 'name': name, 'parent': open_span_indexes[-1] if open_span_indexes else None, 'attributes': attributes,
+                 'start': time.time(), 'wall_s': None, 'cpu_s': None, 'rss_delta_mb': None, 'allocated_blocks': None,
+                 '_start_counters': (time.perf_counter(), time.process_time(), get_rss_mb(), sys.getallocatedblocks()) }
+        with self.lock:
+            self.spans.append(span)
+            span_index = len(self.spans) - 1
+        open_span_indexes.append(span_index)
+        return span_index
+
+
+    #### End a span
+    def end_span(self, span_index):
+        """Public method that ends the span (and any spans still open inside it).
+
+        :param span_index: The index returned by start_span().
+        :type span_index: int
+        """
+        open_span_indexes = self.open_span_indexes.get(threading.get_ident(), [])
+        while span_index in open_span_indexes:
+            index = open_span_indexes.pop()
+            span = self.spans[index]
+            start_wall, start_cpu, start_rss, start_blocks = span.pop('_start_counters')
+            span['wall_s'] = round(time.perf_counter() - start_wall, 6)
+            span['cpu_s'] = round(time.process_time() - start_cpu, 6)
+            span['rss_delta_mb'] = round(get_rss_mb() - start_rss, 3)
+            span['allocated_blocks'] = sys.getallocatedblocks() - start_blocks
+
+
+    #### Profile a block of code
+    @contextlib.contextmanager
+    def span(self, name, **attributes):
+        """Public context manager that records the enclosed block as a span (see start_span())"""
+        span_index = self.start_span(name, **attributes)
+        try:
+            yield self.spans[span_index]
+        finally:
+            self.end_span(span_index)
+
+
+    #### Record an already finished span
+    def add_span(self, name, start, wall_s, **attributes):
+        """Public method that records a finished span inside the innermost span open in this thread, with only its
+        wall time. For stages that overlap others in the same thread (e.g. concurrent KP queries with asyncio), whose
+        CPU time and memory use can't be told apart.
+
+        :param name: Name of the stage (e.g. 'kp_query').
+        :type name: str
+        :param start: When the stage started (as from time.time()).
+        :type start: float
+        :param wall_s: How long the stage took, in seconds.
+        :type wall_s: float
+        """
+        open_span_indexes = self.open_span_indexes.get(threading.get_ident(), [])
+        with self.lock:
+            self.spans.append({ 'name': name, 'parent': open_span_indexes[-1] if open_span_indexes else None,
+                                'attributes': attributes, 'start': start, 'wall_s': round(wall_s, 6), 'cpu_s': None,
+                                'rss_delta_mb': None, 'allocated_blocks': None })
+
+
+    #### Merge in the spans of another profiler
+    def merge(self, profiler):
+        """Public method that adds the finished spans of another profiler (e.g. of a response being merged) inside the
+        innermost span open in this thread"""
+        open_span_indexes = self.open_span_indexes.get(threading.get_ident(), [])
+        parent = open_span_indexes[-1] if open_span_indexes else None
+        with self.lock:
+            offset = len(self.spans)
+            for span in profiler.get_spans():
+                self.spans.append({ **span, 'parent': parent if span['parent'] is None else span['parent'] + offset })
+
+
+    #### Return the finished spans
+    def get_spans(self):
+        """Public method that returns the finished spans, as a list of dicts with name, parent (the index of the
+        enclosing span in this list, or None), attributes, start, wall_s, cpu_s, rss_delta_mb and allocated_blocks"""
+        finished_spans = []
+        new_span_indexes = {}
+        for span_index, span in enumerate(self.spans):
+            if span['wall_s'] is None or (span['parent'] is not None and span['parent'] not in new_span_indexes):
+                continue
+            finished_spans.append({ **span, 'parent': None if span['parent'] is None else new_span_indexes[span['parent']] })
+            new_span_indexes[span_index] = len(finished_spans) - 1
+        return finished_spans
+
+
+    #### Export the spans to OpenTelemetry
+    def export_to_opentelemetry(self):
+        """Public method that sends the finished spans to the OpenTelemetry tracer provider (as set up by the server
+        when telemetry is enabled). The top spans become children of the current span (e.g. the HTTP request)."""
+        try:
+            from opentelemetry import trace
+        except ImportError:
+            return
+        if isinstance(trace.get_tracer_provider(), trace.ProxyTracerProvider):
+            return  # No tracer provider has been set up, so nothing would be recorded
+        tracer = trace.get_tracer(__name__)
+        spans = self.get_spans()
+        otel_spans = []
+        for span in spans:
+            context = trace.set_span_in_context(otel_spans[span['parent']]) if span['parent'] is not None else None
+            otel_spans.append(tracer.start_span(f"ARAX.{span['name']}", context=context,
+                                                start_time=int(span['start'] * 1e9),
+                                                attributes=self._get_otel_attributes(span)))
+        for span, otel_span in reversed(list(zip(spans, otel_spans))):
+            otel_span.end(end_time=int((span['start'] + span['wall_s']) * 1e9))
+
+
+    @staticmethod
+    def _get_otel_attributes(span):
+        attributes = { f"arax.{key}": value if isinstance(value, (str, bool, int, float)) else str(value)
+                       for key, value in span['attributes'].items() }
+        for metric_name in [ 'cpu_s', 'rss_delta_mb', 'allocated_blocks' ]:
+            if span[metric_name] is not None:
+                attributes[f"arax.{metric_name}"] = span[metric_name]
+        return attributes
+
+
+    #### Write the spans to a file
+    def write_json(self, file_path):
+        """Public method that writes the finished spans to a JSON file, both as they are ('spans') and as Trace Event
+        Format events ('traceEvents') that Chrome's about:tracing or Perfetto can display.
+
+        :param file_path: Path of the file to write.
+        :type file_path: str
+        """
+        spans = self.get_spans()
+        trace_events = [ { 'name': span['name'], 'ph': 'X', 'ts': int(span['start'] * 1e6), 'dur': int(span['wall_s'] * 1e6),
+                           'pid': os.getpid(), 'tid': 0,
+                           'args': { **{ key: str(value) for key, value in span['attributes'].items() },
+                                     'cpu_s': span['cpu_s'], 'rss_delta_mb': span['rss_delta_mb'],
+                                     'allocated_blocks': span['allocated_blocks'] } }
+                         for span in spans ]
+        with open(file_path, 'w') as outfile:
+            json.dump({ 'spans': spans, 'traceEvents': trace_events }, outfile, default=str)
+
+
+    #### Export the spans of a finished query
+    def export(self, output_dir=None):
+        """Public method that exports the spans of a finished query to OpenTelemetry and, if output_dir is given, to a
+        JSON file there (see write_json()). Export problems are reported but never fail the query.
+
+        :param output_dir: Directory to write the profile file to, if any.
+        :type output_dir: str
+        """
+        try:
+            self.export_to_opentelemetry()
+            if output_dir is not None:
+                os.makedirs(output_dir, exist_ok=True)
+                self.write_json(f"{output_dir}/arax_profile_{time.strftime('%Y%m%d-%H%M%S')}_{os.getpid()}_{id(self)}.json")
+        except Exception as error:
+            eprint(f"WARNING: Unable to export the query profile: {error}")
+
+
+#### Return the current resident set size of this process
+def get_rss_mb():
+    try:
+        with open('/proc/self/statm') as statm_file:
+            return int(statm_file.read().split()[1]) * PAGE_SIZE / 1e6
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # Peak RSS is the best we can do here
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+
+
+##########################################################################################
+import unittest
+class ProfilerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.profiler = ARAXProfiler()
+        with self.profiler.span('query', mode='ARAX'):
+            with self.profiler.span('expand'):
+                self.profiler.add_span('kp_query', time.time(), 0.5, kp='infores:rtx-kg2')
+            self.results = [ { 'id': i } for i in range(10000) ]
+            self.profiler.start_span('resultify')
+        self.spans = self.profiler.get_spans()
+
+    def test_nesting(self):
+        self.assertEqual([ (span['name'], span['parent']) for span in self.spans ],
+                         [ ('query', None), ('expand', 0), ('kp_query', 1), ('resultify', 0) ])
+
+    def test_metrics(self):
+        self.assertEqual(self.spans[2]['wall_s'], 0.5)
+        self.assertIsNone(self.spans[2]['cpu_s'])
+        self.assertGreater(self.spans[0]['wall_s'], 0)
+        self.assertGreater(self.spans[0]['allocated_blocks'], 0)
+
+    def test_merge(self):
+        profiler = ARAXProfiler()
+        with profiler.span('overlay'):
+            profiler.merge(self.profiler)
+        self.assertEqual([ (span['name'], span['parent']) for span in profiler.get_spans() ],
+                         [ ('overlay', None), ('query', 0), ('expand', 1), ('kp_query', 2), ('resultify', 1) ])
+
+    def test_write_json(self):
+        import tempfile
+        with tempfile.TemporaryDirectory() as output_dir:
+            self.profiler.export(output_dir)
+            with open(f"{output_dir}/{os.listdir(output_dir)[0]}") as infile:
+                profile = json.load(infile)
+        self.assertEqual(len(profile['spans']), 4)
+        self.assertEqual(profile['traceEvents'][2]['dur'], 500000)
+
+    def test_copy(self):
+        import copy
+        import pickle
+        self.assertEqual(copy.deepcopy(self.profiler).get_spans(), self.spans)
+        self.assertEqual(pickle.loads(pickle.dumps(self.profiler)).get_spans(), self.spans)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -19,7 +19,6 @@ import uuid
 import requests
 import gc
 import contextlib
-import connexion
 
 from ARAX_response import ARAXResponse
 from query_graph_info import QueryGraphInfo
@@ -31,7 +30,7 @@ from ARAX_query_graph_interpreter import ARAXQueryGraphInterpreter
 from ARAX_messenger import ARAXMessenger
 from ARAX_ranker import ARAXRanker
 from operation_to_ARAXi import WorkflowToARAXi
-from ARAX_query_tracker import ARAXQueryTracker
+from ARAX_query_tracker import ARAXQueryTracker, flush_tracker_updates
 from result_transformer import ResultTransformer
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../../UI/OpenAPI/python-flask-server/")
@@ -53,7 +52,8 @@ from openapi_server.models.q_edge import QEdge
 sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../../reasoningtool/QuestionAnswering")
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../ResponseCache")
-from response_cache import ResponseCache
+from response_storage import wait_for_pending_writes
+from query_result_cache import get_query_result_cache
 
 
 ARAXResponse.output = 'STDERR'
@@ -78,6 +78,8 @@ class ARAXQuery:
         self.message = None
         self.rtxConfig = RTXConfiguration()
         self.lock = None
+        self.concurrent_overlays = True
+        self.use_result_cache = True
 
     def handle_memory_error(self, e):
         with self.lock if self.lock is not None else null_context_manager:
@@ -112,8 +114,6 @@ class ARAXQuery:
 
             try:
                 i_message = 0
-                with self.lock:
-                    n_messages = len(self.response.messages)
                 query_plan_counter = 0
                 idle_ticks = 0.0
                 pid = None
@@ -127,12 +127,9 @@ class ARAXQuery:
                     if response_status_says_done:
                         break
                     with self.lock:
-                        n_messages = len(self.response.messages)
-                    while i_message < n_messages:
-                        with self.lock:
-                            i_message_obj = self.response.messages[i_message].copy()
-                        yield(json.dumps(i_message_obj, allow_nan=False) + "\n")
-                        i_message += 1
+                        new_messages, i_message = self.response.get_messages_since(i_message)
+                    for message in new_messages:
+                        yield(json.dumps(message, allow_nan=False) + "\n")
                         idle_ticks = 0.0
 
                     if pid is None:
@@ -159,10 +156,9 @@ class ARAXQuery:
                 self.handle_memory_error(e)
 
                 # #### If there are any more logging messages in the queue, send them first
-            n_messages = len(self.response.messages)
-            while i_message < n_messages:
-                yield(json.dumps(self.response.messages[i_message], allow_nan=False) + "\n")
-                i_message += 1
+            new_messages, i_message = self.response.get_messages_since(i_message)
+            for message in new_messages:
+                yield(json.dumps(message, allow_nan=False) + "\n")
 
             #### Also emit any updates to the query_plan
             self_response_query_plan_counter = self.response.query_plan['counter']
@@ -243,6 +239,7 @@ class ARAXQuery:
             if hasattr(response,'http_status'):
                 response.envelope.http_status = response.http_status
             self.track_query_finish()
+            response.envelope.logs = response.messages.to_dict()
             return response.envelope
 
         if mode == 'asynchronous':
@@ -260,7 +257,8 @@ class ARAXQuery:
             #### Switch OK to Success for TRAPI compliance
             response.envelope.status = 'Success'
 
-
+        #### The logs are kept compactly while the query runs; return them as TRAPI LogEntry dicts
+        response.envelope.logs = response.messages.to_dict()
         return response.envelope
 
 
@@ -277,7 +275,8 @@ class ARAXQuery:
             'status': 'Completed',
             'message_id': response_id,
             'message_code': self.response.error_code,
-            'code_description': self.response.message
+            'code_description': self.response.message,
+            'result_cache_status': getattr(self.response, 'result_cache_status', None)
         }
 
         if hasattr(self.response, 'job_id'):
@@ -298,6 +297,24 @@ class ARAXQuery:
             response = ARAXResponse()
             self.response = response
 
+        #### Profile the whole query, with each ARAXi command and its sub-phases inside it
+        query_span = response.profiler.start_span('query', mode=mode, origin=origin)
+        try:
+            return self.run_query(query, mode=mode, origin=origin)
+        finally:
+            response.profiler.end_span(query_span)
+            response.profiler.export(self.rtxConfig.profile_output_dir)
+
+
+    ########################################################################################
+    def run_query(self, query, mode='ARAX', origin='local'):
+
+        response = self.response
+
+        #### Only keep log messages at or above the log_level requested in the Query, if any
+        if 'log_level' in query and query['log_level'] is not None:
+            response.set_log_level(query['log_level'])
+
         #### Announce the launch of query()
         #### Note that setting ARAXResponse.output = 'STDERR' means that we get noisy output to the logs
         response.info(f"{mode} Query launching on incoming Query")
@@ -366,6 +383,11 @@ class ARAXQuery:
                 response.debug(f"Deserializing message")
                 query['message'] = ARAXMessenger().from_dict(query['message'])
 
+            #### Answers to TRAPI queries from the API are cached for equivalent later queries (see execute_processing_plan())
+            if origin == 'API' and self.use_result_cache and mode in [ 'ARAX', 'RTXKG2' ] and "have_query_graph" in query_attributes \
+                    and "have_operations" not in query_attributes:
+                self.set_result_cache_key(query, mode=mode)
+
             # If there is a workflow, translate it to ARAXi and append it to the operations actions list
             if "have_workflow" in query_attributes:
                 if query['message'].query_graph is None:
@@ -422,6 +444,51 @@ class ARAXQuery:
         return response
 
 
+    #######################################################################################
+    def set_result_cache_key(self, query, mode='ARAX'):
+
+        response = self.response
+        message = query['message']
+        if message.query_graph is None or ( message.knowledge_graph is not None and message.knowledge_graph.nodes ) or message.results:
+            return
+
+        #### Options that can change the answer are part of the key, along with the query graph and workflow
+        query_options = dict(response.envelope.query_options)
+        for option_name in [ 'enforce_edge_directionality', 'max_results', 'page_size', 'page_number' ]:
+            if option_name in query and query[option_name] is not None:
+                query_options[option_name] = query[option_name]
+
+        with response.profiler.span('result_cache_key'):
+            response.result_cache_key = get_query_result_cache().get_cache_key(message.query_graph.to_dict(), workflow=query.get('workflow'),
+                                                                              mode=mode, query_options=query_options)
+        if response.result_cache_key is not None:
+            response.result_cache_status = 'bypass' if query.get('bypass_cache') else 'miss'
+
+
+    #######################################################################################
+    def get_cached_answer(self, response):
+        if getattr(response, 'result_cache_status', None) != 'miss':
+            return None
+        try:
+            return get_query_result_cache().get(response.result_cache_key)
+        except Exception as error:
+            response.warning(f"Unable to read the query result cache: {error}")
+            return None
+
+
+    #######################################################################################
+    def cache_answer(self, response):
+        if getattr(response, 'result_cache_status', None) not in [ 'miss', 'bypass' ] or response.status != 'OK':
+            return
+        try:
+            with response.profiler.span('store_cached_answer'):
+                answer = { 'message': response.envelope.message.to_dict(), 'query_plan': response.query_plan,
+                           'total_results_count': getattr(response, 'total_results_count', None) }
+                get_query_result_cache().put(response.result_cache_key, answer)
+        except Exception as error:
+            response.warning(f"Unable to store the answer in the query result cache: {error}")
+
+
     #######################################################################################
     def examine_incoming_query(self, query, mode='ARAX'):
 
@@ -552,6 +619,7 @@ class ARAXQuery:
 
         #### Connect to the message store just once, even if we won't use it
         response.debug(f"Connecting to ResponseCache")
+        from response_cache import ResponseCache
         response_cache = ResponseCache()  #  also calls connect
 
         #### Create a messenger object for basic message processing
@@ -690,7 +758,6 @@ class ARAXQuery:
             from ARAX_filter_kg import ARAXFilterKG
             from ARAX_resultify import ARAXResultify
             from ARAX_filter_results import ARAXFilterResults
-            from ARAX_infer import ARAXInfer
             from ARAX_connect import ARAXConnect
             expander = ARAXExpander()
             filter = ARAXFilter()
@@ -698,7 +765,7 @@ class ARAXQuery:
             filter_kg = ARAXFilterKG()
             resultifier = ARAXResultify()
             filter_results = ARAXFilterResults()
-            infer = ARAXInfer()
+            infer = None  # Infer (and its ML models and data) is only loaded for queries that use it
             connect = ARAXConnect()
             self.message = message
 
@@ -747,8 +814,29 @@ class ARAXQuery:
             action_stats = { }
             actions = result.data['actions']
             action = None
-            for action in actions:
+            overlays_applied_until = 0
+
+            #### If an equivalent query was answered recently, reuse that answer instead of processing the actions
+            cached_answer = self.get_cached_answer(response)
+            if cached_answer is not None:
+                response.info(f"Found a cached answer to an equivalent query (computed from the same data), so reusing it")
+                response.result_cache_status = 'hit'
+                cached_message = messenger.from_dict(cached_answer['message'])
+                cached_message.query_graph = message.query_graph
+                message = cached_message
+                response.envelope.message = message
+                self.message = message
+                response.query_plan = cached_answer['query_plan']
+                if cached_answer['total_results_count'] is not None:
+                    response.total_results_count = cached_answer['total_results_count']
+                action = actions[-1] if actions else None
+
+            for action_index, action in enumerate(actions if cached_answer is None else []):
+                if action_index < overlays_applied_until:
+                    response.info(f"Action '{action['command']}' with parameters {action['parameters']} was already applied together with the previous overlay")
+                    continue
                 response.info(f"Processing action '{action['command']}' with parameters {action['parameters']}")
+                action_span = response.profiler.start_span(action['command'], parameters=str(action['parameters']))
                 nonstandard_result = False
                 skip_merge = False
 
@@ -790,12 +878,21 @@ class ARAXQuery:
                         resultifier.apply(response, action['parameters'], mode=mode)
 
                     elif action['command'] == 'overlay':  # recognize the overlay command
-                        overlay.apply(response, action['parameters'])
+                        #### Consecutive overlays that don't depend on each other are applied concurrently
+                        overlay_actions = overlay.get_independent_overlays(response, actions[action_index:]) if self.concurrent_overlays else [action]
+                        if len(overlay_actions) > 1:
+                            overlay.apply_concurrently(response, [overlay_action['parameters'] for overlay_action in overlay_actions])
+                            overlays_applied_until = action_index + len(overlay_actions)
+                        else:
+                            overlay.apply(response, action['parameters'])
 
                     elif action['command'] == 'filter_kg':  # recognize the filter_kg command
                         filter_kg.apply(response, action['parameters'])
 
                     elif action['command'] == 'infer':  # recognize the infer command
+                        if infer is None:
+                            from ARAX_infer import ARAXInfer
+                            infer = ARAXInfer()
                         infer.apply(response, action['parameters'])
 
                     elif action['command'] == 'filter_results':  # recognize the filter_results command
@@ -820,7 +917,8 @@ class ARAXQuery:
                         response.info(f"Running experimental reranker on results")
                         try:
                             ranker = ARAXRanker()
-                            ranker.aggregate_scores_dmk(response)
+                            with response.profiler.span('rank'):
+                                ranker.aggregate_scores_dmk(response)
                         except Exception as error:
                             exception_type, exception_value, exception_traceback = sys.exc_info()
                             response.error(f"An uncaught error occurred: {error}: {repr(traceback.format_exception(exception_type, exception_value, exception_traceback))}", error_code="UncaughtARAXiError")
@@ -840,6 +938,7 @@ class ARAXQuery:
                     if mode == 'asynchronous':
                         self.send_to_callback(callback, response)
                     return response
+                response.profiler.end_span(action_span)
 
                 #### If we're in an error state return now
                 if response.status != 'OK':
@@ -854,7 +953,8 @@ class ARAXQuery:
                     response.info(f"Running experimental reranker on results")
                     try:
                         ranker = ARAXRanker()
-                        ranker.aggregate_scores_dmk(response)
+                        with response.profiler.span('rank'):
+                            ranker.aggregate_scores_dmk(response)
                     except Exception as error:
                         exception_type, exception_value, exception_traceback = sys.exc_info()
                         response.error(f"An uncaught error occurred: {error}: {repr(traceback.format_exception(exception_type, exception_value, exception_traceback))}", error_code="UncaughtARAXiError")
@@ -862,9 +962,13 @@ class ARAXQuery:
                             self.send_to_callback(callback, response)
                         return response
 
-            if mode != 'RTXKG2':  # KG2 doesn't use virtual edges or edit the QG, so no transformation needed
+            if mode != 'RTXKG2' and cached_answer is None:  # KG2 doesn't use virtual edges or edit the QG, so no transformation needed
                 result_transformer = ResultTransformer()
-                result_transformer.transform(response)
+                with response.profiler.span('transform_results'):
+                    result_transformer.transform(response)
+
+            if cached_answer is None:
+                self.cache_answer(response)
 
             #### At the end, process the explicit return() action, or implicitly perform one
             return_action = { 'command': 'return', 'parameters': { 'response': 'true', 'store': 'true' } }
@@ -940,7 +1044,8 @@ class ARAXQuery:
             response_id = None
             if return_action['parameters']['store'] == 'true':
                 response.debug(f"Storing resulting Message")
-                response_id = response_cache.add_new_response(response)
+                with response.profiler.span('store_response'):
+                    response_id = response_cache.add_new_response(response)
                 response.info(f"Result was stored with id {response_id}. It can be viewed at https://arax.ncats.io/?r={response_id}")
             response.response_id = response_id
 
@@ -1009,6 +1114,8 @@ class ARAXQuery:
             response.error(f"Did not received a positive acknowledgement from sending the Response to callback URL {callback} after {send_attempts} tries. Work may be lost", error_code="UnreachableCallback")
 
         self.track_query_finish()
+        wait_for_pending_writes()
+        flush_tracker_updates()
         os._exit(0)
 
 
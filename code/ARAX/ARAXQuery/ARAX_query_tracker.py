@@ -8,19 +8,28 @@ import re
 import signal
 import socket
 import json
-import psutil
+import zlib
+import pickle
+import hashlib
+import atexit
+import queue
+import threading
 
 from datetime import datetime, timezone
 import sqlalchemy
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import Column, Integer, Float, String, DateTime, PickleType
-from sqlalchemy.orm import scoped_session
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import Column, Integer, Float, String, DateTime, LargeBinary, Index
+from sqlalchemy.orm import sessionmaker, defer
+from sqlalchemy.types import TypeDecorator
 from sqlalchemy import text
 
 DEBUG = False
 
+HEARTBEAT_INTERVAL = 15     # seconds between heartbeats from a process that is running queries
+HEARTBEAT_TIMEOUT = 120     # an ongoing query whose process has not sent a heartbeat for this long is considered dead
+FINAL_STATUSES = [ 'Completed', 'Died', 'Reset' ]
+
 sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../../")
 from RTXConfiguration import RTXConfiguration
 sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../../UI/OpenAPI/python-flask-server/")
@@ -28,6 +37,39 @@ from openapi_server.models.async_query_status_response import AsyncQueryStatusRe
 
 Base = declarative_base()
 
+
+def encode_input_query(input_query):
+    """
+    Serialize an input query to compact JSON once, returning (zlib-compressed JSON, sha256 of the JSON).
+    The hash lets identical queries be found without decoding their inputs.
+    """
+    serialized = json.dumps(input_query, sort_keys=True, separators=(',', ':'), default=str).encode('utf-8')
+    return zlib.compress(serialized, 6), hashlib.sha256(serialized).hexdigest()
+
+
+def decode_input_query(blob):
+    if blob is None:
+        return None
+    #### Rows written before input queries were stored as compressed JSON hold pickles (which start with the protocol marker)
+    if blob[:1] == b'\x80':
+        return pickle.loads(blob)
+    return json.loads(zlib.decompress(blob))
+
+
+class CompressedJSON(TypeDecorator):
+    """A BLOB column holding compressed JSON; it reads the pickles left by the PickleType column it replaces"""
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None or isinstance(value, bytes):
+            return value
+        return encode_input_query(value)[0]
+
+    def process_result_value(self, value, dialect):
+        return decode_input_query(value)
+
+
 class ARAXQuery(Base):
     __tablename__ = 'arax_query'
     query_id = Column(Integer, primary_key=True)
@@ -40,12 +82,18 @@ class ARAXQuery(Base):
     hostname = Column(String(255), nullable=True)
     instance_name = Column(String(255), nullable=False)
     origin = Column(String(255), nullable=False)
-    input_query = Column(PickleType, nullable=False) ## blob object
+    input_query = Column(CompressedJSON, nullable=False) ## blob object
     message_id = Column(Integer, nullable=True)
     message_code = Column(String(255), nullable=True)
     code_description = Column(String(255), nullable=True)
     remote_address = Column(String(50), nullable=False)
     start_timestamp = Column(Integer, nullable=True)
+    input_query_hash = Column(String(64), nullable=True)
+    result_cache_status = Column(String(10), nullable=True) ## hit, miss or bypass if the query result cache was consulted
+    __table_args__ = (
+        Index('start_timestamp_idx', 'start_timestamp'),
+        Index('input_query_hash_idx', 'input_query_hash'),
+    )
 
 class ARAXOngoingQuery(Base):
     __tablename__ = 'arax_ongoing_query'
@@ -60,30 +108,240 @@ class ARAXOngoingQuery(Base):
     hostname = Column(String(255), nullable=True)
     instance_name = Column(String(255), nullable=False)
     origin = Column(String(255), nullable=False)
-    input_query = Column(PickleType, nullable=False) ## blob object
+    input_query = Column(CompressedJSON, nullable=False) ## blob object
     message_id = Column(Integer, nullable=True)
     message_code = Column(String(255), nullable=True)
     code_description = Column(String(255), nullable=True)
     remote_address = Column(String(50), nullable=False)
     start_timestamp = Column(Integer, nullable=True)
+    __table_args__ = (
+        Index('ongoing_query_id_idx', 'query_id'),
+        Index('ongoing_instance_idx', 'instance_name', 'hostname', 'domain'),
+    )
+
+#### Processes running queries periodically update their queries' rows here, so that dead queries can be found
+#### without inspecting process tables (which only works on the same host anyway)
+class ARAXQueryHeartbeat(Base):
+    __tablename__ = 'arax_query_heartbeat'
+    query_id = Column(Integer, primary_key=True, autoincrement=False)
+    pid = Column(Integer, nullable=False)
+    hostname = Column(String(255), nullable=True)
+    last_heartbeat = Column(Float, nullable=False) ## epoch seconds
+    __table_args__ = (
+        Index('last_heartbeat_idx', 'last_heartbeat'),
+    )
 
-class ARAXQueryTracker:
 
-   #### Constructor
+##################################################################################################
+#### Engines are shared by all tracker instances in a process. A forked child must not reuse its parent's
+#### pooled connections, so it creates its own engine and keeps the inherited one referenced (but unused)
+#### so that garbage collection does not close the parent's connections from the child
+_engines = {}
+_inherited_engines = []
+_engines_lock = threading.Lock()
+
+
+def _reset_engines_after_fork():
+    # A child forked while another thread held the lock would otherwise wait on it forever
+    global _engines_lock
+    _engines_lock = threading.Lock()
+    _inherited_engines.extend(engine for _, engine in _engines.values())
+    _engines.clear()
+
+
+os.register_at_fork(after_in_child=_reset_engines_after_fork)
+
+
+def _get_engine(database_url):
+    with _engines_lock:
+        pid, engine = _engines.get(database_url, (None, None))
+        if pid != os.getpid():
+            if engine is not None:
+                _inherited_engines.append(engine)
+            engine = create_engine(database_url, pool_pre_ping=True)
+            _migrate_tables(engine)
+            _engines[database_url] = (os.getpid(), engine)
+        return engine
+
+
+def _migrate_tables(engine):
+    """Create any missing tables and add the columns introduced after the original tracker tables were created"""
+    database_info = sqlalchemy.inspect(engine)
+    if not all(database_info.has_table(table_name) for table_name in Base.metadata.tables):
+        eprint(f"WARNING: some query tracker tables do not exist; creating them")
+        Base.metadata.create_all(engine)
+        database_info = sqlalchemy.inspect(engine)
+    column_names = { column['name'] for column in database_info.get_columns(ARAXQuery.__tablename__) }
+    for column_name, column_type in [ ('input_query_hash', 'VARCHAR(64)'), ('result_cache_status', 'VARCHAR(10)') ]:
+        if column_name not in column_names:
+            eprint(f"INFO: Adding column {column_name} to table {ARAXQuery.__tablename__}")
+            with engine.begin() as connection:
+                connection.execute(text(f"ALTER TABLE {ARAXQuery.__tablename__} ADD COLUMN {column_name} {column_type} NULL"))
+
+
+def _apply_tracker_update(session, tracker_id, attributes):
+    tracker_entry = session.query(ARAXQuery).options(defer(ARAXQuery.input_query)).filter(ARAXQuery.query_id==tracker_id).first()
+    if tracker_entry is not None:
+        end_datetime = datetime.now()
+        elapsed = end_datetime - datetime.fromisoformat(tracker_entry.start_datetime)
+        tracker_entry.end_datetime = end_datetime.isoformat(' ', 'seconds')
+        tracker_entry.elapsed = elapsed.seconds
+        tracker_entry.status = attributes['status'][:254]
+        tracker_entry.message_id = attributes['message_id']
+        tracker_entry.message_code = attributes['message_code'][:254]
+        tracker_entry.code_description = attributes['code_description'][:254]
+        if attributes.get('result_cache_status') is not None:
+            tracker_entry.result_cache_status = attributes['result_cache_status']
+
+    if 'status' in attributes and attributes['status'] in FINAL_STATUSES:
+        session.query(ARAXOngoingQuery).filter(ARAXOngoingQuery.query_id==tracker_id).delete(synchronize_session=False)
+        session.query(ARAXQueryHeartbeat).filter(ARAXQueryHeartbeat.query_id==tracker_id).delete(synchronize_session=False)
+
+
+class ARAXQueryTrackerWriter:
+    """
+    A per-process worker thread that applies queued tracker status updates in batches (one transaction for
+    whatever has accumulated) and writes heartbeats for the queries this process is running.
+    """
+
     def __init__(self):
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._thread = None
+        self._thread_pid = None
+        self._heartbeat_query_ids = {}
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None or self._thread_pid != os.getpid() or not self._thread.is_alive():
+                if self._thread_pid != os.getpid():
+                    #### Queued work and heartbeats inherited from a parent process belong to the parent
+                    self._queue = queue.Queue()
+                    self._heartbeat_query_ids = {}
+                self._thread = threading.Thread(target=self._run, name='ARAXQueryTrackerWriter', daemon=True)
+                self._thread_pid = os.getpid()
+                self._thread.start()
+
+    def submit_update(self, session_factory, tracker_id, attributes):
+        self._ensure_thread()
+        self._queue.put((session_factory, tracker_id, attributes))
+
+    def register_heartbeat(self, session_factory, query_id):
+        self._ensure_thread()
+        with self._lock:
+            self._heartbeat_query_ids[query_id] = session_factory
+
+    def unregister_heartbeat(self, query_id):
+        with self._lock:
+            if self._thread_pid == os.getpid():
+                self._heartbeat_query_ids.pop(query_id, None)
+
+    def flush(self, timeout=None):
+        """Block until all queued updates are written (or timeout seconds pass). Returns True if all were written."""
+        if self._thread is None or self._thread_pid != os.getpid():
+            return True
+        deadline = None if timeout is None else time.time() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.time() > deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def _run(self):
+        last_heartbeat = 0
+        while True:
+            updates = []
+            try:
+                updates.append(self._queue.get(timeout=HEARTBEAT_INTERVAL))
+                while True:
+                    updates.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            try:
+                if updates:
+                    self._write_updates(updates)
+                if time.time() - last_heartbeat >= HEARTBEAT_INTERVAL:
+                    self._write_heartbeats()
+                    last_heartbeat = time.time()
+            except Exception as error:
+                eprint(f"ERROR: ARAXQueryTrackerWriter failed: {error}")
+            finally:
+                for _ in updates:
+                    self._queue.task_done()
+
+    def _write_updates(self, updates):
+        updates_by_factory = {}
+        for session_factory, tracker_id, attributes in updates:
+            updates_by_factory.setdefault(session_factory, []).append((tracker_id, attributes))
+        for session_factory, factory_updates in updates_by_factory.items():
+            session = session_factory()
+            try:
+                for tracker_id, attributes in factory_updates:
+                    _apply_tracker_update(session, tracker_id, attributes)
+                session.commit()
+            except Exception as error:
+                #### Fall back to one transaction per update so that one bad update does not lose the others
+                session.rollback()
+                eprint(f"WARNING: Batched tracker update failed ({error}); applying updates one at a time")
+                for tracker_id, attributes in factory_updates:
+                    try:
+                        _apply_tracker_update(session, tracker_id, attributes)
+                        session.commit()
+                    except Exception:
+                        session.rollback()
+                        eprint(f"ERROR: Unable to update tracker entry {tracker_id}, probably due to MySQL connection flakiness")
+            finally:
+                session.close()
+
+    def _write_heartbeats(self):
+        with self._lock:
+            query_ids_by_factory = {}
+            for query_id, session_factory in self._heartbeat_query_ids.items():
+                query_ids_by_factory.setdefault(session_factory, []).append(query_id)
+        now = time.time()
+        for session_factory, query_ids in query_ids_by_factory.items():
+            session = session_factory()
+            try:
+                session.query(ARAXQueryHeartbeat).filter(ARAXQueryHeartbeat.query_id.in_(query_ids)).update(
+                    { 'last_heartbeat': now, 'pid': os.getpid() }, synchronize_session=False)
+                session.commit()
+            except Exception as error:
+                session.rollback()
+                eprint(f"ERROR: Unable to write query heartbeats: {error}")
+            finally:
+                session.close()
+
+
+_tracker_writer = ARAXQueryTrackerWriter()
+#### (its lock too may have been held by another thread when the process forked)
+os.register_at_fork(after_in_child=lambda: setattr(_tracker_writer, '_lock', threading.Lock()))
+
+
+def flush_tracker_updates(timeout=None):
+    """Wait for queued tracker updates to be written; processes that leave via os._exit() must call this first"""
+    return _tracker_writer.flush(timeout)
+
+
+atexit.register(flush_tracker_updates)
+
+
+class ARAXQueryTracker:
+
+   #### Constructor. Uses the mysql database by default; engine_type='sqlite' uses a local sqlite database (at
+   #### database_path if given), e.g. for testing
+    def __init__(self, engine_type=None, database_path=None):
         if DEBUG:
             timestamp = str(datetime.now().isoformat())
             eprint(f"{timestamp}: DEBUG: In ARAXQueryTracker init")
 
         self.rtxConfig = RTXConfiguration()
-        self.databaseName = "QueryTracker"
-        self.engine_type = 'sqlite'
+        self.engine_type = engine_type or 'mysql'
+        self.databaseName = "ResponseCache" if self.engine_type == 'mysql' else "QueryTracker"
+        self.database_path = database_path
         self.session = None
         self.engine = None
+        self.session_factory = None
 
-        if self.rtxConfig.is_production_server or True:
-            self.databaseName = "ResponseCache"
-            self.engine_type = 'mysql'
         self.connect()
 
         if DEBUG:
@@ -133,9 +391,10 @@ class ARAXQueryTracker:
 
     ##################################################################################################
     def create_indexes(self):
-        eprint("INFO: Creating indexes on table ARAXQuery")
-        start_timestamp_index = sqlalchemy.Index('start_timestamp_idx', ARAXQuery.start_timestamp)
-        start_timestamp_index.create(bind=self.engine)
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                eprint(f"INFO: Creating index {index.name} on table {table.name} if it does not exist")
+                index.create(bind=self.engine, checkfirst=True)
 
 
     ##################################################################################################
@@ -147,33 +406,32 @@ class ARAXQueryTracker:
 
         # If the engine_type is mysql then connect to the MySQL database
         if self.engine_type == 'mysql':
-            engine = create_engine("mysql+pymysql://" + self.rtxConfig.mysql_feedback_username + ":" +
-                self.rtxConfig.mysql_feedback_password + "@" + self.rtxConfig.mysql_feedback_host + "/" + self.databaseName)
+            database_url = "mysql+pymysql://" + self.rtxConfig.mysql_feedback_username + ":" + \
+                self.rtxConfig.mysql_feedback_password + "@" + self.rtxConfig.mysql_feedback_host + "/" + self.databaseName
 
         # Else just use SQLite
         else:
-            database_path = os.path.dirname(os.path.abspath(__file__)) + '/' + self.databaseName + '.sqlite'
-            engine = create_engine("sqlite:///"+database_path)
+            database_url = "sqlite:///" + self.get_sqlite_database_path()
 
-        #DBSession = sessionmaker(bind=engine)
-        #session = DBSession()
+        #### The engine (and its connection pool) is shared by all trackers in this process; it also creates
+        #### any missing tables and columns the first time it is set up
+        engine = _get_engine(database_url)
 
         if DEBUG:
             timestamp = str(datetime.now().isoformat())
             eprint(f"{timestamp}: DEBUG: ARAXQueryTracker establishing session")
 
         session_factory = sessionmaker(bind=engine)
-        Session = scoped_session(session_factory)
-        session = Session()
-
-        self.session = session
+        self.session_factory = session_factory
+        self.session = session_factory()
         self.engine = engine
 
-        #### If the tables don't exist, then create the database
-        database_info = sqlalchemy.inspect(engine)
-        if not database_info.has_table(ARAXQuery.__tablename__) or not database_info.has_table(ARAXOngoingQuery.__tablename__):
-            eprint(f"WARNING: {self.engine_type} tables do not exist; creating them")
-            Base.metadata.create_all(engine)
+
+    ##################################################################################################
+    def get_sqlite_database_path(self):
+        if self.database_path is not None:
+            return self.database_path
+        return os.path.dirname(os.path.abspath(__file__)) + '/' + self.databaseName + '.sqlite'
 
 
     ##################################################################################################
@@ -181,8 +439,9 @@ class ARAXQueryTracker:
         if self.session is None:
             return
         try:
+            #### The engine is shared with the other trackers in this process, so only the session is closed
             self.session.close()
-            self.engine.dispose()
+            self.session = None
             if DEBUG:
                 timestamp = str(datetime.now().isoformat())
                 eprint(f"{timestamp}: DEBUG: ARAXQueryTracker disconnecting session")
@@ -203,7 +462,7 @@ class ARAXQueryTracker:
 
         # Else just use SQLite
         else:
-            database_path = os.path.dirname(os.path.abspath(__file__)) + '/' + self.databaseName + '.sqlite'
+            database_path = self.get_sqlite_database_path()
             if os.path.exists(database_path):
                 os.remove(database_path)
             engine = create_engine("sqlite:///"+database_path)
@@ -214,40 +473,24 @@ class ARAXQueryTracker:
 
 
     ##################################################################################################
-    def update_tracker_entry(self, tracker_id, attributes):
+    #### Queue a status update for a tracker entry; it is written in the background (batched with any other
+    #### pending updates) unless wait is True. Final statuses also remove the query from the ongoing queries
+    def update_tracker_entry(self, tracker_id, attributes, wait=False):
         if tracker_id is None:
             eprint("ERROR: update_tracker_entry: tracker_id is None")
             return
 
-        session = self.session
-        if session is None:
+        if self.session_factory is None:
             eprint("ERROR: update_tracker_entry: session is None")
             return
 
-        try:
-            tracker_entries = session.query(ARAXQuery).filter(ARAXQuery.query_id==tracker_id).all()
-            if len(tracker_entries) > 0:
-                tracker_entry = tracker_entries[0]
-                end_datetime = datetime.now()
-                elapsed = end_datetime - datetime.fromisoformat(tracker_entry.start_datetime)
-                tracker_entry.end_datetime = end_datetime.isoformat(' ', 'seconds')
-                tracker_entry.elapsed = elapsed.seconds
-                tracker_entry.status = attributes['status'][:254]
-                tracker_entry.message_id = attributes['message_id']
-                tracker_entry.message_code = attributes['message_code'][:254]
-                tracker_entry.code_description = attributes['code_description'][:254]
-            session.commit()
+        #### Once a process reports that it is done with a query (or handed it to an async child), it stops its heartbeat
+        if 'status' in attributes and ( attributes['status'] in FINAL_STATUSES or attributes['status'] == 'Running Async' ):
+            _tracker_writer.unregister_heartbeat(tracker_id)
 
-            if 'status' in attributes and attributes['status'] in [ 'Completed', 'Died', 'Reset' ]:
-                try:
-                    session.query(ARAXOngoingQuery).filter(ARAXOngoingQuery.query_id==tracker_id).delete()
-                    session.commit()
-                    eprint(f"INFO: Deleted ARAXOngoingQuery.query_id={tracker_id}")
-                except:
-                    eprint(f"ERROR: Unable to delete ARAXOngoingQuery.query_id={tracker_id}")
-                    session.commit()
-        except:
-            eprint("ERROR: Unable to update_tracker_entry, probably due to MySQL connection flakiness")
+        _tracker_writer.submit_update(self.session_factory, tracker_id, attributes)
+        if wait:
+            _tracker_writer.flush()
 
 
     ##################################################################################################
@@ -278,6 +521,11 @@ class ARAXQueryTracker:
         else:
             return_value += 'ERROR: No ongoing_tracker_entries  '
 
+        #### If this process has taken over the query (e.g. an async child), it now sends the heartbeats
+        if attributes.get('pid') == os.getpid():
+            session.merge(ARAXQueryHeartbeat(query_id=tracker_id, pid=os.getpid(), hostname=socket.gethostname(), last_heartbeat=time.time()))
+            _tracker_writer.register_heartbeat(self.session_factory, tracker_id)
+
         session.commit()
 
         if len(return_value) == 0:
@@ -332,6 +580,9 @@ class ARAXQueryTracker:
         start_datetime = datetime.now().isoformat(' ', 'seconds')
         start_timestamp = datetime.now().timestamp()
 
+        #### Serialize and compress the input query once for both tables
+        input_query, input_query_hash = encode_input_query(attributes['input_query'])
+
         remote_address = attributes['remote_address']
         if remote_address in ongoing_queries_by_remote_address and ongoing_queries_by_remote_address[remote_address] > MAX_CONCURRENT_FROM_REMOTE and attributes['submitter'] is not None and attributes['submitter'] != 'infores:arax':
             try:
@@ -344,7 +595,8 @@ class ARAXQueryTracker:
                     hostname = instance_info['hostname'],
                     instance_name = instance_info['instance_name'],
                     origin = attributes['submitter'],
-                    input_query = attributes['input_query'],
+                    input_query = input_query,
+                    input_query_hash = input_query_hash,
                     remote_address = attributes['remote_address'],
                     end_datetime = start_datetime,
                     elapsed = 0,
@@ -372,7 +624,8 @@ class ARAXQueryTracker:
                 hostname = instance_info['hostname'],
                 instance_name = instance_info['instance_name'],
                 origin=attributes['submitter'],
-                input_query=attributes['input_query'],
+                input_query=input_query,
+                input_query_hash=input_query_hash,
                 remote_address=attributes['remote_address'])
             session.add(tracker_entry)
             session.commit()
@@ -395,13 +648,16 @@ class ARAXQueryTracker:
                 hostname = instance_info['hostname'],
                 instance_name = instance_info['instance_name'],
                 origin=attributes['submitter'],
-                input_query=attributes['input_query'],
+                input_query=input_query,
                 remote_address=attributes['remote_address'])
             session.add(ongoing_tracker_entry)
+            session.merge(ARAXQueryHeartbeat(query_id=tracker_id, pid=os.getpid(), hostname=instance_info['hostname'],
+                                             last_heartbeat=time.time()))
             session.commit()
-            ongoing_tracker_id = tracker_entry.ongoing_query_id
+            _tracker_writer.register_heartbeat(self.session_factory, tracker_id)
         except:
-            ongoing_tracker_id = 1
+            session.rollback()
+            eprint(f"ERROR: Unable to create ARAXOngoingQuery record for query_id={tracker_id}")
 
         return tracker_id
 
@@ -411,13 +667,15 @@ class ARAXQueryTracker:
         if self.session is None:
             return
 
+        #### The (potentially large) input queries are only loaded if accessed
         if ongoing_queries:
-            return self.session.query(ARAXOngoingQuery).all()
+            return self.session.query(ARAXOngoingQuery).options(defer(ARAXOngoingQuery.input_query)).all()
 
         else:
             timestamp = datetime.now().timestamp()
             timestamp -= last_n_hours * 60 * 60
-            return self.session.query(ARAXQuery).filter(ARAXQuery.start_timestamp > timestamp).all()
+            return self.session.query(ARAXQuery).options(defer(ARAXQuery.input_query)).filter(
+                ARAXQuery.start_timestamp > timestamp).order_by(ARAXQuery.start_timestamp).all()
             #return self.session.query(ARAXQuery).filter(
             #    text("""TIMESTAMPDIFF(HOUR, STR_TO_DATE(start_datetime, '%Y-%m-%d %T'), NOW()) < :n""")).params(n=last_n_hours).all()
 
@@ -426,7 +684,8 @@ class ARAXQueryTracker:
     def check_ongoing_queries(self):
         '''
         Gets the current list of ongoing queries in the tracking table and assesses if any need
-        to be marked as died and computes the final number of active ones.
+        to be marked as died (their process has stopped sending heartbeats) and computes the final
+        number of active ones.
         '''
         if self.session is None:
             return
@@ -435,41 +694,34 @@ class ARAXQueryTracker:
 
         #### Enclosing in commits seems to reduce the problem of threads being out of sync
         self.session.commit()
-        ongoing_queries = self.session.query(ARAXOngoingQuery).filter(
+        ongoing_queries = self.session.query(ARAXOngoingQuery.query_id, ARAXOngoingQuery.remote_address,
+                                             ARAXOngoingQuery.start_timestamp, ARAXQueryHeartbeat.last_heartbeat).outerjoin(
+            ARAXQueryHeartbeat, ARAXQueryHeartbeat.query_id == ARAXOngoingQuery.query_id).filter(
             ARAXOngoingQuery.domain == instance_info['domain'],
             ARAXOngoingQuery.hostname == instance_info['hostname'],
             ARAXOngoingQuery.instance_name == instance_info['instance_name']).all()
         self.session.commit()
 
-        n_ongoing_queries = len(ongoing_queries)
-        #eprint(f"INFO: There are currently {n_ongoing_queries} ongoing queries in this instance")
-
         entries_to_delete = []
         ongoing_queries_by_remote_address = {}
+        now = time.time()
 
-        for ongoing_query in ongoing_queries:
-            try:
-                pid = ongoing_query.pid
-            except:
-                eprint("WARNING: ongoing query probably deleted by another thread")
-                continue
-
-            if psutil.pid_exists(pid):
-                status = 'This PID exists'
-                remote_address = ongoing_query.remote_address
+        for query_id, remote_address, start_timestamp, last_heartbeat in ongoing_queries:
+            #### Queries started before heartbeats were introduced have no heartbeat row; judge those by their start
+            last_seen = last_heartbeat if last_heartbeat is not None else (start_timestamp or 0)
+            if now - last_seen <= HEARTBEAT_TIMEOUT:
                 if remote_address not in ongoing_queries_by_remote_address:
                     ongoing_queries_by_remote_address[remote_address] = 0
                 ongoing_queries_by_remote_address[remote_address] += 1
             else:
-                status = 'This PID no longer exists'
-                entries_to_delete.append(ongoing_query.query_id)
+                entries_to_delete.append(query_id)
 
         for query_id in entries_to_delete:
             attributes = {
                 'status': 'Died',
                 'message_id': None,
                 'message_code': 'FoundDead',
-                'code_description': 'The PID for this query is no longer running. Reason unknown.'
+                'code_description': f"The process for this query stopped sending heartbeats more than {HEARTBEAT_TIMEOUT} seconds ago. Reason unknown."
             }
             self.update_tracker_entry(query_id, attributes)
 
@@ -560,14 +812,28 @@ class ARAXQueryTracker:
                 'response_id': entry.message_id,
                 'status': entry.message_code,
                 'description': entry.code_description,
-                'remote_address': entry.remote_address
+                'remote_address': entry.remote_address,
+                'result_cache': getattr(entry, 'result_cache_status', None)
             } )
 
         result['recent_queries'].reverse()
+        result['result_cache_stats'] = self.get_result_cache_stats(entries)
         result['current_datetime'] = datetime.now().strftime("%Y-%m-%d %T")
         return result
 
 
+    ##################################################################################################
+    #### Summarize how often the query result cache answered the given tracked queries
+    @staticmethod
+    def get_result_cache_stats(entries):
+        statuses = [ getattr(entry, 'result_cache_status', None) for entry in entries ]
+        n_hits = statuses.count('hit')
+        n_misses = statuses.count('miss')
+        n_bypasses = statuses.count('bypass')
+        return { 'hits': n_hits, 'misses': n_misses, 'bypasses': n_bypasses,
+                 'hit_rate': round(n_hits / (n_hits + n_misses), 3) if n_hits + n_misses > 0 else None }
+
+
     ##################################################################################################
     def terminate_job(self, terminate_pid, authorization):
         if self.session is None:
@@ -678,7 +944,7 @@ class ARAXQueryTracker:
         instance_name = self.get_instance_name()
 
         eprint(f"Clearing unfinished entries for this instances")
-        entries = self.session.query(ARAXQuery).filter(ARAXQuery.instance_name == instance_name).filter( (ARAXQuery.elapsed == None) | (ARAXQuery.status == 'Running Async') )
+        entries = self.session.query(ARAXQuery).options(defer(ARAXQuery.input_query)).filter(ARAXQuery.instance_name == instance_name).filter( (ARAXQuery.elapsed == None) | (ARAXQuery.status == 'Running Async') ).all()
         eprint(f" - found {len(entries)} entries")
 
         for entry in entries:
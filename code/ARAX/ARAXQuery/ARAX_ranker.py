@@ -1,16 +1,15 @@
 #!/bin/env python3
+from __future__ import annotations
 import math
 import os
-import networkx as nx
 import numpy as np
-import scipy.stats
 import sys
 import json
 import ast
 import re
 
 
-from typing import Set, Union, Dict, List, Callable
+from typing import Set, Union, Dict, List, Callable, TYPE_CHECKING
 from ARAX_response import ARAXResponse
 from query_graph_info import QueryGraphInfo
 
@@ -20,6 +19,10 @@ from openapi_server.models.result import Result
 from openapi_server.models.edge import Edge
 from openapi_server.models.attribute import Attribute
 
+#### networkx and scipy are only needed to score results, so they are imported by the functions that use them
+if TYPE_CHECKING:
+    import networkx as nx
+
 edge_confidence_manual_agent = 0.99
 
 def _get_nx_edges_by_attr(G: Union[nx.MultiDiGraph, nx.MultiGraph], key: str, val: str) -> Set[tuple]:
@@ -32,6 +35,7 @@ def _get_nx_edges_by_attr(G: Union[nx.MultiDiGraph, nx.MultiGraph], key: str, va
 
 
 def _get_query_graph_networkx_from_query_graph(query_graph: QueryGraph) -> nx.MultiDiGraph:
+    import networkx as nx
     query_graph_nx = nx.MultiDiGraph()
     query_graph_nx.add_nodes_from([key for key, node in query_graph.nodes.items() if 'creative_DTD_qnode' not in key and 'creative_CRG_qnode' not in key])
     edge_list = [[edge.subject, edge.object, key, {'weight': 0.0}] for key,edge in query_graph.edges.items() if 'creative_DTD_qedge' not in key and 'creative_CRG_qedge' not in key]
@@ -147,6 +151,7 @@ def _get_weighted_graphs_networkx_from_result_graphs(kg_edge_id_to_edge: Dict[st
 def _collapse_nx_multigraph_to_weighted_graph(graph_nx: Union[nx.MultiDiGraph,
                                                               nx.MultiGraph]) -> Union[nx.DiGraph,
                                                                                        nx.Graph]:
+    import networkx as nx
     if type(graph_nx) == nx.MultiGraph:
         ret_graph = nx.Graph()
     elif type(graph_nx) == nx.MultiDiGraph:
@@ -164,12 +169,14 @@ def _collapse_nx_multigraph_to_weighted_graph(graph_nx: Union[nx.MultiDiGraph,
 # "rank"), where ties have the same (average) rank (the reason for using scipy.stats
 # here is specifically in order to handle ties correctly)
 def _quantile_rank_list(x: List[float]) -> np.array:
+    import scipy.stats
     y = scipy.stats.rankdata(x, method='max')
     return y/len(y)
 
 
 def _score_networkx_graphs_by_max_flow(result_graphs_nx: List[Union[nx.MultiDiGraph,
                                                                     nx.MultiGraph]]) -> List[float]:
+    import networkx as nx
     max_flow_values = []
     for result_graph_nx in result_graphs_nx:
         if len(result_graph_nx) > 1:
@@ -197,6 +204,7 @@ def _score_networkx_graphs_by_max_flow(result_graphs_nx: List[Union[nx.MultiDiGr
 
 def _score_networkx_graphs_by_longest_path(result_graphs_nx: List[Union[nx.MultiDiGraph,
                                                                         nx.MultiGraph]]) -> List[float]:
+    import networkx as nx
     result_scores = []
     for result_graph_nx in result_graphs_nx:
         apsp_dict = dict(nx.algorithms.shortest_paths.unweighted.all_pairs_shortest_path_length(result_graph_nx))
@@ -217,6 +225,7 @@ def _score_networkx_graphs_by_longest_path(result_graphs_nx: List[Union[nx.Multi
 
 def _score_networkx_graphs_by_frobenius_norm(result_graphs_nx: List[Union[nx.MultiDiGraph,
                                                                           nx.MultiGraph]]) -> List[float]:
+    import networkx as nx
     result_scores = []
     for result_graph_nx in result_graphs_nx:
         adj_matrix = nx.to_numpy_matrix(result_graph_nx)
@@ -2,8 +2,114 @@
 import sys
 def eprint(*args, **kwargs): print(*args, file=sys.stderr, **kwargs)
 
+import collections
 import datetime
 import os
+import time
+
+from ARAX_profiler import ARAXProfiler
+
+class ARAXLogBuffer:
+    """Compact store of the messages logged to a response. Each message is kept as a (sequence number, time, level,
+    code, message) tuple and only converted to a TRAPI LogEntry dict when the log is read or serialized. DEBUG and
+    INFO messages are kept in a ring buffer: beyond max_low_level_entries of them, the oldest are dropped (and counted,
+    which is reported in the log). WARNING and ERROR messages are never dropped.
+
+    The buffer reads like a list of LogEntry dicts, and has a to_dict() so that an envelope whose logs are this buffer
+    serializes them as such.
+    """
+
+    WARNING = 30
+    level_names = { 10: 'DEBUG', 20: 'INFO', 30: 'WARNING', 40: 'ERROR' }
+
+    def __init__(self, max_low_level_entries=20000):
+        self.max_low_level_entries = max_low_level_entries
+        self.low_level_records = collections.deque()
+        self.high_level_records = []
+        self.n_records = 0
+        self.n_dropped = { 10: 0, 20: 0 }
+        self.last_dropped = None    # (sequence number, time) of the latest dropped record
+
+
+    def add(self, created, level, code, message):
+        record = (self.n_records, created, level, code, message)
+        #### The record is stored before n_records counts it, so that readers never miss a counted record
+        if level >= self.WARNING:
+            self.high_level_records.append(record)
+        else:
+            self.low_level_records.append(record)
+        self.n_records += 1
+        if len(self.low_level_records) > self.max_low_level_entries:
+            dropped_record = self.low_level_records.popleft()
+            self.n_dropped[dropped_record[2]] += 1
+            self.last_dropped = dropped_record[:2]
+
+
+    def add_buffer(self, log_buffer):
+        """Appends the records of another buffer (e.g. of a response being merged), including its dropped counts"""
+        if log_buffer.last_dropped is not None:
+            for level, n_dropped in log_buffer.n_dropped.items():
+                self.n_dropped[level] += n_dropped
+            #### Report the other buffer's dropped messages just before its remaining ones
+            self.last_dropped = (self.n_records - 0.5, log_buffer.last_dropped[1])
+        for record in log_buffer.get_records_since(0):
+            self.add(*record[1:])
+
+
+    def get_records_since(self, sequence_number, end_sequence_number=None):
+        """Returns the retained records with a sequence number from sequence_number up to (not including)
+        end_sequence_number (default: all), in order"""
+        if end_sequence_number is None:
+            end_sequence_number = self.n_records
+        #### Snapshot the records first, since another thread may be adding to them
+        low_level_records = list(self.low_level_records)
+        high_level_records = self.high_level_records[:]
+        new_records = []
+        for records in [ low_level_records, high_level_records ]:
+            i_record = len(records)
+            while i_record > 0 and records[i_record - 1][0] >= sequence_number:
+                i_record -= 1
+            new_records.extend([ record for record in records[i_record:] if record[0] < end_sequence_number ])
+        new_records.sort()
+        return new_records
+
+
+    def get_entries_since(self, sequence_number):
+        """Returns the LogEntry dicts of messages logged since sequence_number, and the sequence number to ask for next"""
+        next_sequence_number = self.n_records
+        records = self.get_records_since(sequence_number, next_sequence_number)
+        entries = [ self._get_entry(record) for record in records ]
+        if self.last_dropped is not None and sequence_number <= self.last_dropped[0] < next_sequence_number:
+            entries = self._insert_dropped_entry(entries, records)
+        return entries, next_sequence_number
+
+
+    def _get_entry(self, record):
+        return { 'timestamp': datetime.datetime.fromtimestamp(record[1]).isoformat(), 'level': self.level_names[record[2]],
+                 'code': record[3], 'message': record[4] }
+
+
+    def _insert_dropped_entry(self, entries, records):
+        i_entry = 0
+        while i_entry < len(records) and records[i_entry][0] < self.last_dropped[0]:
+            i_entry += 1
+        dropped_counts = ' and '.join([ f"{n_dropped} {self.level_names[level]}" for level, n_dropped in self.n_dropped.items() if n_dropped > 0 ])
+        entry = { 'timestamp': datetime.datetime.fromtimestamp(self.last_dropped[1]).isoformat(), 'level': 'INFO', 'code': 'LogMessagesDropped',
+                  'message': f"{dropped_counts} messages were dropped from this log to limit its size" }
+        return entries[:i_entry] + [ entry ] + entries[i_entry:]
+
+
+    def to_dict(self):
+        return self.get_entries_since(0)[0]
+
+    def __iter__(self):
+        return iter(self.to_dict())
+
+    def __len__(self):
+        return len(self.low_level_records) + len(self.high_level_records) + (1 if self.last_dropped is not None else 0)
+
+    def __getitem__(self, index):
+        return self.to_dict()[index]
 
 
 class ARAXResponse:
@@ -14,6 +120,7 @@ class ARAXResponse:
     WARNING = 30
     ERROR = 40
     level_names = { 10: 'DEBUG', 20: 'INFO', 30: 'WARNING', 40: 'ERROR' }
+    level_numbers = { 'DEBUG': 10, 'INFO': 20, 'WARNING': 30, 'ERROR': 40 }
     equal_or_greater_levels = {
         'DEBUG': { 'DEBUG': 1, 'INFO': 1, 'WARNING': 1, 'ERROR': 1 },
         'INFO': { 'INFO': 1, 'WARNING': 1, 'ERROR': 1 },
@@ -22,6 +129,10 @@ class ARAXResponse:
         }
     output = None
     #output = 'STDERR'
+    #### Messages below this level are discarded before they are formatted (see set_log_level())
+    log_level = DEBUG
+    #### Number of DEBUG and INFO messages kept in a response's log; older ones are dropped beyond this
+    max_low_level_log_entries = 20000
 
     #### Constructor
     def __init__(self, status='OK', logging_level=WARNING, error_code='OK', message='Normal completion'):
@@ -30,12 +141,13 @@ class ARAXResponse:
         self.logging_level = logging_level
         self.error_code = error_code
         self.message = message
-        self.messages = []
+        self.messages = ARAXLogBuffer(self.max_low_level_log_entries)
         self.n_messages = 0
         self.n_errors = 0
         self.n_warnings = 0
         self.data = {}
         self.envelope = None
+        self.profiler = ARAXProfiler()
 
         self.query_plan = { 'qedge_keys': {}, 'counter': 0 }
 
@@ -45,8 +157,9 @@ class ARAXResponse:
         """Public method that adds a DEBUG level message to the response object logger.
         DEBUG level messages should only be of interest to code developers.
 
-        :param message: A natural English statement describing ongoing events.
-        :type message: str
+        :param message: A natural English statement describing ongoing events, or a function returning one
+            (which is only called if the message is kept, so that costly messages in loops are only built if needed).
+        :type message: str or callable
         """
 
         if code is None:
@@ -60,8 +173,9 @@ class ARAXResponse:
         INFO level messages should be of interest to ordinary users regarding the
         inner workings of the process or about innocuous assumptions made.
 
-        :param message: A natural English statement describing ongoing events.
-        :type message: str
+        :param message: A natural English statement describing ongoing events, or a function returning one
+            (which is only called if the message is kept, so that costly messages in loops are only built if needed).
+        :type message: str or callable
         """
 
         if code is None:
@@ -108,6 +222,8 @@ class ARAXResponse:
         # Some backwards compatibility
         if error_code is not None and code == 'UnknownError':
             code = error_code
+        if callable(message):
+            message = message()
 
         self._add_message( message, self.ERROR, code=code )
         self.n_errors += 1
@@ -121,31 +237,62 @@ class ARAXResponse:
     def _add_message(self, message, level, code=None):
         """Private method called by the public methods to actually add the message to the log.
 
-        :param message: A natural English statement describing the message.
-        :type message: str
+        :param message: A natural English statement describing the message, or a function returning one.
+        :type message: str or callable
         :param level: One of the four numerical levels (i.e. 10, 20, 30, 40).
         :type level: int
         :param code: A terse machine-readable and human-readable code (e.g, KPNotAvailable).
         :type code: str
         """
 
-        timestamp = str(datetime.datetime.now().isoformat())
-        pid = os.getpid()
-        self.messages.append( { 'timestamp': timestamp, 'level': self.level_names[level], 'code': code, 'message': message } )
         self.n_messages += 1
+        #### Skip messages below the log level before doing any work on them
+        if level < self.log_level and self.output is None:
+            return
 
-        # Create a pretty printable message prefix
-        prefix = f"{timestamp} {self.level_names[level]}: ({pid}) "
-        if code is not None:
-            prefix += f"[{code}] "
+        if callable(message):
+            message = message()
+        created = time.time()
+        if level >= self.log_level:
+            self.messages.add(created, level, code, message)
 
         if self.output is not None:
+            # Create a pretty printable message prefix
+            prefix = f"{datetime.datetime.fromtimestamp(created).isoformat()} {self.level_names[level]}: ({os.getpid()}) "
+            if code is not None:
+                prefix += f"[{code}] "
             if self.output == 'STDOUT':
                 print(f"{prefix}{message}", flush=True)
             if self.output == 'STDERR':
                 eprint(f"{prefix}{message}", flush=True)
 
 
+    #### Set the minimum level of messages to keep
+    def set_log_level(self, level):
+        """Public method that sets the minimum level of messages kept in this response's log (e.g. from the
+        log_level of a TRAPI Query). Messages below it are still counted, but are discarded without being formatted.
+
+        :param level: A numerical level (e.g. response.INFO) or level name (e.g. 'INFO').
+        :type level: int or str
+        """
+        if isinstance(level, str):
+            level = self.level_numbers.get(level.upper(), self.DEBUG)
+        self.log_level = level
+
+
+    #### Return the messages logged since a previous call
+    def get_messages_since(self, position=0):
+        """Public method that returns the messages (as TRAPI LogEntry dicts) logged since position, and the
+        position to pass next time. Useful for streaming the log while a query is running.
+
+        :param position: The position returned by the previous call (0 to start from the beginning).
+        :type position: int
+        :return: A tuple of (list of messages, next position)
+        :rtype: tuple
+        """
+        return self.messages.get_entries_since(position)
+
+
     #### Merge a new response into an existing response
     def merge(self, response_to_merge):
         """Public method that merges the content of the passed response to the self response
@@ -160,8 +307,8 @@ class ARAXResponse:
         self.n_messages += response_to_merge.n_messages
         self.n_errors += response_to_merge.n_errors
         self.n_warnings += response_to_merge.n_warnings
-        for message in response_to_merge.messages:
-            self.messages.append(message)
+        self.messages.add_buffer(response_to_merge.messages)
+        self.profiler.merge(response_to_merge.profiler)
         if response_to_merge.status != 'OK':
             self.status = response_to_merge.status
             self.error_code = response_to_merge.error_code
@@ -287,6 +434,35 @@ class ResponseTests(unittest.TestCase):
     def test_show(self):
         self.assertGreater(len(self.response.show(level=self.response.INFO)), 285)
 
+    def test_log_level(self):
+        response = ARAXResponse()
+        response.set_log_level('INFO')
+        response.debug(lambda: self.fail('A message below the log level should not be built'))
+        response.info(lambda: 'Built lazily')
+        self.assertEqual(response.n_messages, 2)
+        self.assertEqual([ message['message'] for message in response.messages ], [ 'Built lazily' ])
+
+    def test_dropped_messages(self):
+        response = ARAXResponse()
+        response.messages.max_low_level_entries = 3
+        for i_message in range(5):
+            response.debug(f"Message {i_message}")
+            response.warning(f"Warning {i_message}")
+        messages = response.messages_list(level=response.DEBUG)
+        self.assertEqual(len([ message for message in messages if message['level'] == 'WARNING' ]), 5)
+        self.assertEqual([ message['message'] for message in messages if message['level'] == 'DEBUG' ], [ 'Message 2', 'Message 3', 'Message 4' ])
+        #### The dropped messages are reported where the last of them was logged
+        self.assertEqual(messages[1]['code'], 'LogMessagesDropped')
+        self.assertTrue(messages[1]['message'].startswith('2 DEBUG messages'))
+
+    def test_get_messages_since(self):
+        messages, position = self.response.get_messages_since()
+        self.response.info('One more thing')
+        new_messages, position = self.response.get_messages_since(position)
+        self.assertEqual(len(messages), 4)
+        self.assertEqual([ message['message'] for message in new_messages ], [ 'One more thing' ])
+        self.assertEqual(self.response.get_messages_since(position)[0], [])
+
 
 ##########################################################################################
 def main():
@@ -25,6 +25,8 @@ sys.path.append(os.path.sep.join([*pathlist[:(rtx_index + 1)], 'code', 'ARAX', '
 from ARAX_response import ARAXResponse
 sys.path.append(os.path.sep.join([*pathlist[:(rtx_index + 1)], 'code', 'ARAX', 'ARAXQuery', 'Expand']))
 from smartapi import SmartAPI
+sys.path.append(os.path.sep.join([*pathlist[:(rtx_index + 1)], 'code', 'ARAX', 'ResponseCache']))
+from query_result_cache import invalidate_query_result_cache
 
 
 class KPInfoCacher:
@@ -33,7 +35,10 @@ class KPInfoCacher:
         self.rtx_config = RTXConfiguration()
         version_string = f"{self.rtx_config.trapi_major_version}--{self.rtx_config.maturity}"
         self.cache_refresh_pid_path = f"{os.path.dirname(os.path.abspath(__file__))}/cache_refresh.pid"
-        self.smart_api_and_meta_map_cache = f"{os.path.dirname(os.path.abspath(__file__))}/cache_smart_api_and_meta_map_{version_string}.pkl"
+        if self.rtx_config.kp_info_cache_override:
+            self.smart_api_and_meta_map_cache = self.rtx_config.kp_info_cache_override
+        else:
+            self.smart_api_and_meta_map_cache = f"{os.path.dirname(os.path.abspath(__file__))}/cache_smart_api_and_meta_map_{version_string}.pkl"
 
     def refresh_kp_info_caches(self):
         """
@@ -54,6 +59,7 @@ class KPInfoCacher:
             if not smart_api_kp_registrations:
                 print(f"Didn't get any KP registrations back from SmartAPI!")
             previous_cache_exists = pathlib.Path(self.smart_api_and_meta_map_cache).exists()
+            previous_cache_contents = self._load_previous_cache() if previous_cache_exists else None
             if smart_api_kp_registrations or not previous_cache_exists:
                 # Transform the info into the format we want
                 allowed_kp_urls = {kp_registration["infores_name"]: self._get_kp_url_from_smartapi_registration(kp_registration)
@@ -77,10 +83,18 @@ class KPInfoCacher:
                                 "meta_map_cache": meta_map
                             }
             
-            with open(f"{self.smart_api_and_meta_map_cache}.tmp", "wb") as smart_api__and_meta_map_cache_temp:
-                pickle.dump(common_cache, smart_api__and_meta_map_cache_temp)
-            os.rename(f"{self.smart_api_and_meta_map_cache}.tmp",
-                      self.smart_api_and_meta_map_cache)   
+            if common_cache == previous_cache_contents:
+                # Nothing changed, so keep the cache file as it is (it is part of the query result cache's data
+                # version) and only mark it as fresh
+                eprint(f"The KP info caches are unchanged")
+                pathlib.Path(self.smart_api_and_meta_map_cache).touch()
+            else:
+                with open(f"{self.smart_api_and_meta_map_cache}.tmp", "wb") as smart_api__and_meta_map_cache_temp:
+                    pickle.dump(common_cache, smart_api__and_meta_map_cache_temp)
+                os.rename(f"{self.smart_api_and_meta_map_cache}.tmp",
+                          self.smart_api_and_meta_map_cache)
+                # Answers to queries cached before this refresh may have come from different KPs
+                invalidate_query_result_cache()
             eprint(f"The process with process ID {current_pid} has FINISHED refreshing the KP info caches")
 
         except Exception as e:
@@ -94,6 +108,15 @@ class KPInfoCacher:
         except Exception:
             pass
 
+    def _load_previous_cache(self) -> Optional[dict]:
+        # (a cache that can't be read is simply replaced by the refresh)
+        try:
+            with open(self.smart_api_and_meta_map_cache, "rb") as cache_file:
+                return pickle.load(cache_file)
+        except Exception as e:
+            eprint(f"Unable to read the pre-existing KP info cache: {e}")
+            return None
+
     def _get_kp_url_from_smartapi_registration(self, kp_smart_api_registration: dict) -> Optional[str]:
         if kp_smart_api_registration.get("servers"):
 
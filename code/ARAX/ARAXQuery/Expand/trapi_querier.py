@@ -245,42 +245,45 @@ class TRAPIQuerier:
         waiting_message = f"Query with {num_input_curies} curies sent: waiting for response"
         self.log.update_query_plan(qedge_key, self.kp_infores_curie, "Waiting", waiting_message, query=query_sent)
         start = time.time()
-        if self.force_local and self.kp_infores_curie == 'infores:rtx-kg2':
-            json_response = self._answer_query_force_local(request_body)
-        # Otherwise send the query graph to the KP's TRAPI API
-        else:
-            self.log.debug(f"{self.kp_infores_curie}: Sending query to {self.kp_infores_curie} API ({self.kp_endpoint})")
-            async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(verify_ssl=False)) as session:
-                try:
-                    async with session.post(f"{self.kp_endpoint}/query",
-                                            json=request_body,
-                                            headers={'accept': 'application/json'},
-                                            timeout=query_timeout) as response:
-                        if response.status == 200:
-                            json_response = await response.json()
-                        else:
-                            wait_time = round(time.time() - start)
-                            http_error_message = f"Returned HTTP error {response.status} after {wait_time} seconds"
-                            self.log.warning(f"{self.kp_infores_curie}: {http_error_message}. Query sent to KP was: {request_body}")
-                            self.log.update_query_plan(qedge_key, self.kp_infores_curie, "Error", http_error_message)
-                            return QGOrganizedKnowledgeGraph()
-                except asyncio.exceptions.TimeoutError:
-                    timeout_message = f"Query timed out after {query_timeout} seconds"
-                    self.log.warning(f"{self.kp_infores_curie}: {timeout_message}")
-                    self.log.update_query_plan(qedge_key, self.kp_infores_curie, "Timed out", timeout_message)
-                    return QGOrganizedKnowledgeGraph()
-                except Exception as ex:
-                    wait_time = round(time.time() - start)
-                    exception_message = f"Request threw exception after {wait_time} seconds: {type(ex)}"
-                    self.log.warning(f"{self.kp_infores_curie}: {exception_message}")
-                    self.log.update_query_plan(qedge_key, self.kp_infores_curie, "Error", exception_message)
-                    return QGOrganizedKnowledgeGraph()
-
-        wait_time = round(time.time() - start)
-        answer_kg = self._load_kp_json_response(json_response, query_graph)
-        done_message = f"Returned {len(answer_kg.edges_by_qg_id.get(qedge_key, dict()))} edges in {wait_time} seconds"
-        self.log.update_query_plan(qedge_key, self.kp_infores_curie, "Done", done_message)
-        return answer_kg
+        try:
+            if self.force_local and self.kp_infores_curie == 'infores:rtx-kg2':
+                json_response = self._answer_query_force_local(request_body)
+            # Otherwise send the query graph to the KP's TRAPI API
+            else:
+                self.log.debug(f"{self.kp_infores_curie}: Sending query to {self.kp_infores_curie} API ({self.kp_endpoint})")
+                async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(verify_ssl=False)) as session:
+                    try:
+                        async with session.post(f"{self.kp_endpoint}/query",
+                                                json=request_body,
+                                                headers={'accept': 'application/json'},
+                                                timeout=query_timeout) as response:
+                            if response.status == 200:
+                                json_response = await response.json()
+                            else:
+                                wait_time = round(time.time() - start)
+                                http_error_message = f"Returned HTTP error {response.status} after {wait_time} seconds"
+                                self.log.warning(f"{self.kp_infores_curie}: {http_error_message}. Query sent to KP was: {request_body}")
+                                self.log.update_query_plan(qedge_key, self.kp_infores_curie, "Error", http_error_message)
+                                return QGOrganizedKnowledgeGraph()
+                    except asyncio.exceptions.TimeoutError:
+                        timeout_message = f"Query timed out after {query_timeout} seconds"
+                        self.log.warning(f"{self.kp_infores_curie}: {timeout_message}")
+                        self.log.update_query_plan(qedge_key, self.kp_infores_curie, "Timed out", timeout_message)
+                        return QGOrganizedKnowledgeGraph()
+                    except Exception as ex:
+                        wait_time = round(time.time() - start)
+                        exception_message = f"Request threw exception after {wait_time} seconds: {type(ex)}"
+                        self.log.warning(f"{self.kp_infores_curie}: {exception_message}")
+                        self.log.update_query_plan(qedge_key, self.kp_infores_curie, "Error", exception_message)
+                        return QGOrganizedKnowledgeGraph()
+
+            wait_time = round(time.time() - start)
+            answer_kg = self._load_kp_json_response(json_response, query_graph)
+            done_message = f"Returned {len(answer_kg.edges_by_qg_id.get(qedge_key, dict()))} edges in {wait_time} seconds"
+            self.log.update_query_plan(qedge_key, self.kp_infores_curie, "Done", done_message)
+            return answer_kg
+        finally:
+            self.log.profiler.add_span("kp_query", start, time.time() - start, kp=self.kp_infores_curie, qedge_key=qedge_key)
 
     def _answer_query_using_kp(self, query_graph: QueryGraph) -> QGOrganizedKnowledgeGraph:
         # TODO: Delete this method once we're ready to let go of the multiprocessing (vs. asyncio) option
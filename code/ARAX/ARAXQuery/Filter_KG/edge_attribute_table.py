@@ -0,0 +1,113 @@
+#!/bin/env python3
+# Columnar table of the edge attributes of a knowledge graph, shared by the Filter_KG edge filters
+import numpy as np
+
+
+class EdgeAttributeTable:
+    """One row per (edge, attribute) of a knowledge graph, stored as numpy columns: edge key, attribute type id,
+    original attribute name and value (plus, for each attribute filtered on, its values as floats). Filters select
+    rows with vectorized masks instead of walking every edge's attributes in Python.
+
+    The table is kept in response.data (see get()) so that a chain of filter_kg steps only builds it once. Before each
+    use it is brought up to date with the knowledge graph: rows of removed edges are dropped, and edges that are new
+    or whose number of attributes changed (e.g. an overlay added one) are (re)loaded. Changes to the value of an
+    existing attribute in place are not noticed; nothing in ARAX does that between filter steps.
+    """
+
+    def __init__(self, knowledge_graph):
+        self.knowledge_graph = knowledge_graph
+        self.n_attributes = {}
+        self.edge_keys = np.empty(0, dtype=object)
+        self.attribute_type_ids = np.empty(0, dtype=object)
+        self.original_attribute_names = np.empty(0, dtype=object)
+        self.raw_values = np.empty(0, dtype=object)
+        #### Float values of the rows of each attribute name asked for so far (only converted when needed)
+        self.numeric_values = {}
+        self.refresh()
+
+    @classmethod
+    def get(cls, response, knowledge_graph):
+        """Returns the up to date table of the knowledge graph, reusing the one cached in the response if possible"""
+        table = response.data.get('edge_attribute_table')
+        if table is None or table.knowledge_graph is not knowledge_graph:
+            table = cls(knowledge_graph)
+            response.data['edge_attribute_table'] = table
+        else:
+            table.refresh()
+        return table
+
+    def refresh(self):
+        """Brings the table up to date with the edges (and numbers of attributes) now in the knowledge graph"""
+        edges = self.knowledge_graph.edges if self.knowledge_graph.edges is not None else {}
+        changed_edge_keys = []
+        for key, edge in edges.items():
+            n_attributes = len(edge.attributes) if edge.attributes else 0
+            if self.n_attributes.get(key) != n_attributes:
+                changed_edge_keys.append(key)
+        removed_edge_keys = [key for key in self.n_attributes if key not in edges]
+        if not changed_edge_keys and not removed_edge_keys:
+            return
+
+        # Drop the rows of removed and changed edges, then add rows for the new and changed ones
+        stale_edge_keys = set(changed_edge_keys).union(removed_edge_keys)
+        keep = np.fromiter((key not in stale_edge_keys for key in self.edge_keys), dtype=bool, count=len(self.edge_keys))
+        for key in removed_edge_keys:
+            del self.n_attributes[key]
+        # (Built column by column, as a tuple per row would make the garbage collector scan the whole KG repeatedly)
+        new_edge_keys = []
+        new_attributes = []
+        for key in changed_edge_keys:
+            attributes = edges[key].attributes or []
+            self.n_attributes[key] = len(attributes)
+            new_edge_keys.extend([key] * len(attributes))
+            new_attributes.extend(attributes)
+        self.edge_keys = np.concatenate([self.edge_keys[keep], self._to_object_array(new_edge_keys)])
+        self.attribute_type_ids = np.concatenate([self.attribute_type_ids[keep],
+                                                  self._to_object_array([attribute.attribute_type_id for attribute in new_attributes])])
+        self.original_attribute_names = np.concatenate([self.original_attribute_names[keep],
+                                                        self._to_object_array([attribute.original_attribute_name for attribute in new_attributes])])
+        self.raw_values = np.concatenate([self.raw_values[keep], self._to_object_array([attribute.value for attribute in new_attributes])])
+        self.numeric_values = {}
+
+        # Keep the rows in the order of the edges in the knowledge graph, as the filters' tie-breaking depends on it
+        if changed_edge_keys and len(changed_edge_keys) < len(edges):
+            edge_positions = {key: position for position, key in enumerate(edges)}
+            order = np.argsort(np.fromiter((edge_positions[key] for key in self.edge_keys), dtype=np.int64,
+                                           count=len(self.edge_keys)), kind='stable')
+            self.edge_keys = self.edge_keys[order]
+            self.attribute_type_ids = self.attribute_type_ids[order]
+            self.original_attribute_names = self.original_attribute_names[order]
+            self.raw_values = self.raw_values[order]
+
+    def get_attribute_mask(self, attribute_names):
+        """Returns a boolean mask of the rows whose attribute type id or original attribute name is one of the names"""
+        # (Not np.isin, which sorts the column and so can't compare the None names with the others)
+        mask = np.zeros(len(self.edge_keys), dtype=bool)
+        for attribute_name in attribute_names:
+            mask |= (self.attribute_type_ids == attribute_name) | (self.original_attribute_names == attribute_name)
+        return mask
+
+    def get_numeric_values(self, attribute_name):
+        """Returns the edge keys and float values of the rows of the attribute, in knowledge graph order. Raises a
+        ValueError if any of its values is not a number."""
+        if attribute_name not in self.numeric_values:
+            mask = self.get_attribute_mask([attribute_name])
+            edge_keys = self.edge_keys[mask]
+            values = np.empty(len(edge_keys), dtype=float)
+            for index, (key, value) in enumerate(zip(edge_keys, self.raw_values[mask])):
+                try:
+                    values[index] = float(value)
+                except (TypeError, ValueError):
+                    raise ValueError(f"could not convert the value {value!r} of attribute {attribute_name} of edge {key} to a float")
+            self.numeric_values[attribute_name] = (edge_keys, values)
+        return self.numeric_values[attribute_name]
+
+    def get_edge_keys_with_value(self, attribute_names, value):
+        """Returns the set of keys of the edges with an attribute (of one of the names) equal to the value"""
+        mask = self.get_attribute_mask(attribute_names)
+        return {key for key, raw_value in zip(self.edge_keys[mask], self.raw_values[mask]) if raw_value == value}
+
+    @staticmethod
+    def _to_object_array(values):
+        # (Not np.array(), which would turn values that are lists into extra dimensions)
+        return np.fromiter(values, dtype=object, count=len(values))
@@ -5,6 +5,7 @@ import os
 import traceback
 import numpy as np
 import math
+import heapq
 
 # relative imports
 sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../OpenAPI/python-flask-server/")
@@ -13,6 +14,8 @@ from openapi_server.models.attribute import Attribute as EdgeAttribute
 sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../../../reasoningtool/kg-construction/")
 from NormGoogleDistance import NormGoogleDistance as NGD
 
+from Filter_KG.edge_attribute_table import EdgeAttributeTable
+
 
 def sort_index(lst, desc):
     #modified from http://stackoverflow.com/questions/3382352/equivalent-of-numpy-argsort-in-basic-python/, answer by the user unutbu
@@ -60,54 +63,31 @@ class SortResults:
         self.response.info(f"Sorting the results by edge attribute")
         params = self.parameters
         try:
-            edge_values = {}
-            # iterate over the edges find the attribute values
-            for key, edge in self.message.knowledge_graph.edges.items():  # iterate over the edges
-                edge_relation = None
-                edge_values[key] = {'value': None, 'relation': None}
-                if 'qedge_keys' in params and params['qedge_keys'] is not None and len(params['qedge_keys']) > 0:
-                    if key not in params['qedge_keys']:
-                        continue
-                if hasattr(edge, 'attributes'):  # check if they have attributes
-                    if edge.attributes:  # if there are any edge attributes
-                        for attribute in edge.attributes:  # for each attribute
-                            if attribute.original_attribute_name == params['edge_attribute'] or attribute.attribute_type_id == params['edge_attribute']:  # check if it's the desired one
-                                try:
-                                    edge_values[key] = {'value': float(attribute.value), 'relation': None}
-                                except ValueError:
-                                    edge_values[key] = {'value': attribute.value, 'relation': None}
-                            if attribute.original_attribute_name == "virtual_relation_label":
-                                edge_relation = attribute.value
-                        edge_values[key]['relation'] = edge_relation
-            if params['descending']:
-                value_list=[-math.inf]*len(self.message.results)
-            else:
-                value_list=[math.inf]*len(self.message.results)
-            i = 0
+            # look up the attribute values (and virtual relation labels) of the edges in the shared attribute table
+            table = EdgeAttributeTable.get(self.response, self.message.knowledge_graph)
+            mask = table.get_attribute_mask([params['edge_attribute']])
+            edge_values = {key: self.to_sort_value(value) for key, value in zip(table.edge_keys[mask], table.raw_values[mask])}
+            relation_mask = table.original_attribute_names == "virtual_relation_label"
+            edge_relations = dict(zip(table.edge_keys[relation_mask], table.raw_values[relation_mask]))
+            if 'qedge_keys' in params and params['qedge_keys'] is not None and len(params['qedge_keys']) > 0:
+                edge_values = {key: value for key, value in edge_values.items() if key in params['qedge_keys']}
+                edge_relations = {key: value for key, value in edge_relations.items() if key in params['qedge_keys']}
             type_flag = 'edge_relation' in params
+            # compute each result's value in one pass through its edge bindings
+            value_list = []
             for result in self.message.results:
+                result_value = None
                 for analysis in result.analyses:
                     for binding_list in analysis.edge_bindings.values():
                         for binding in binding_list:
                             # need to test this for TRAPI 1.0 after expand (and resultify?)is updated to see if binding.id matches edge_key
-                            if edge_values[binding.id]['value'] is not None:
-                                if not type_flag or (type_flag and params['edge_relation'] == edge_values[binding.id]['relation']):
-                                    if abs(value_list[i]) == math.inf:
-                                        value_list[i] = edge_values[binding.id]['value']
-                                    else:
-                                        # this will take the sum off all edges with the attribute if we want to change to max edit this line
-                                        value_list[i] += edge_values[binding.id]['value']
-                    i+=1
-            idx = sort_index(value_list, params['descending'])
-            self.message.results = [self.message.results[i] for i in idx]
-            if 'max_results' in params:
-                prune_val = self.parameters['prune_kg']
-                self.parameters['prune_kg'] = False
-                self.limit_number_of_results()
-                self.parameters['prune_kg'] = prune_val
-            if params['prune_kg']:
-                self.prune_kg()
-            self.message.n_results = len(self.message.results)
+                            value = edge_values.get(binding.id)
+                            if value is not None:
+                                if not type_flag or params['edge_relation'] == edge_relations.get(binding.id):
+                                    # this will take the sum off all edges with the attribute if we want to change to max edit this line
+                                    result_value = value if result_value is None else result_value + value
+                value_list.append(result_value if result_value is not None else self.get_missing_value())
+            self.sort_and_limit_results(value_list)
         except:
             tb = traceback.format_exc()
             error_type, error, _ = sys.exc_info()
@@ -132,16 +112,7 @@ class SortResults:
             for result in self.message.results:
                 value_list[i] = len([binding for analysis in result.analyses for binding_list in analysis.edge_bindings.values() for binding in binding_list])
                 i+=1
-            idx = sort_index(value_list, params['descending'])
-            self.message.results = [self.message.results[i] for i in idx]
-            if 'max_results' in params:
-                prune_val = self.parameters['prune_kg']
-                self.parameters['prune_kg'] = False
-                self.limit_number_of_results()
-                self.parameters['prune_kg'] = prune_val
-            if params['prune_kg']:
-                self.prune_kg()
-            self.message.n_results = len(self.message.results)
+            self.sort_and_limit_results(value_list)
         except:
             tb = traceback.format_exc()
             error_type, error, _ = sys.exc_info()
@@ -166,16 +137,7 @@ class SortResults:
             for result in self.message.results:
                 value_list[i] = result.analyses[0].score
                 i+=1
-            idx = sort_index(value_list, params['descending'])
-            self.message.results = [self.message.results[i] for i in idx]
-            if 'max_results' in params:
-                prune_val = self.parameters['prune_kg']
-                self.parameters['prune_kg'] = False
-                self.limit_number_of_results()
-                self.parameters['prune_kg'] = prune_val
-            if params['prune_kg']:
-                self.prune_kg()
-            self.message.n_results = len(self.message.results)
+            self.sort_and_limit_results(value_list)
         except:
             tb = traceback.format_exc()
             error_type, error, _ = sys.exc_info()
@@ -198,7 +160,6 @@ class SortResults:
             node_values = {}
             # iterate over the nodes find the attribute values
             for key, node in self.message.knowledge_graph.nodes.items():  # iterate over the nodes
-                node_values[key] = {'value': None, 'category': node.categories}
                 if 'qnode_keys' in params and params['qnode_keys'] is not None and len(params['qnode_keys']) > 0:
                     if key not in params['qnode_keys']:
                         continue
@@ -207,39 +168,23 @@ class SortResults:
                         for attribute in node.attributes:  # for each attribute
                             if attribute.original_attribute_name == params['node_attribute'] or attribute.attribute_type_id == params['node_attribute']:  # check if it's the desired one
                                 if attribute.original_attribute_name == 'pubmed_ids':
-                                    node_values[key] = {'value': attribute.value.count("PMID"), 'category': node.categories}
+                                    node_values[key] = attribute.value.count("PMID")
                                 else:
-                                    try:
-                                        node_values[key] = {'value': float(attribute.value), 'category': node.categories}
-                                    except ValueError:
-                                        node_values[key] = {'value': attribute.value, 'category': node.categories}
-            if params['descending']:
-                value_list=[-math.inf]*len(self.message.results)
-            else:
-                value_list=[math.inf]*len(self.message.results)
-            i = 0
+                                    node_values[key] = self.to_sort_value(attribute.value)
             type_flag = 'node_category' in params
+            # compute each result's value in one pass through its node bindings
+            value_list = []
             for result in self.message.results:
+                result_value = None
                 for binding_list in result.node_bindings.values():
                     for binding in binding_list:
-                        if node_values[binding.id]['value'] is not None:
-                            if not type_flag or (type_flag and params['node_category'] == node_values[binding.id]['category']):
-                                if abs(value_list[i]) == math.inf:
-                                    value_list[i] = node_values[binding.id]['value']
-                                else:
-                                    # this will take the sum off all nodes with the attribute if we want to change to max edit this line
-                                    value_list[i] += node_values[binding.id]['value']
-                i+=1
-            idx = sort_index(value_list, params['descending'])
-            self.message.results = [self.message.results[i] for i in idx]
-            if 'max_results' in params:
-                prune_val = self.parameters['prune_kg']
-                self.parameters['prune_kg'] = False
-                self.limit_number_of_results()
-                self.parameters['prune_kg'] = prune_val
-            if params['prune_kg']:
-                self.prune_kg()
-            self.message.n_results = len(self.message.results)
+                        value = node_values.get(binding.id)
+                        if value is not None:
+                            if not type_flag or params['node_category'] == self.message.knowledge_graph.nodes[binding.id].categories:
+                                # this will take the sum off all nodes with the attribute if we want to change to max edit this line
+                                result_value = value if result_value is None else result_value + value
+                value_list.append(result_value if result_value is not None else self.get_missing_value())
+            self.sort_and_limit_results(value_list)
         except:
             tb = traceback.format_exc()
             error_type, error, _ = sys.exc_info()
@@ -264,16 +209,7 @@ class SortResults:
             for result in self.message.results:
                 value_list[i] = len([binding for binding_list in result.node_bindings.values() for binding in binding_list])
                 i+=1
-            idx = sort_index(value_list, params['descending'])
-            self.message.results = [self.message.results[i] for i in idx]
-            if 'max_results' in params:
-                prune_val = self.parameters['prune_kg']
-                self.parameters['prune_kg'] = False
-                self.limit_number_of_results()
-                self.parameters['prune_kg'] = prune_val
-            if params['prune_kg']:
-                self.prune_kg()
-            self.message.n_results = len(self.message.results)
+            self.sort_and_limit_results(value_list)
         except:
             tb = traceback.format_exc()
             error_type, error, _ = sys.exc_info()
@@ -285,6 +221,36 @@ class SortResults:
 
         return self.response
 
+    def sort_and_limit_results(self, value_list):
+        """
+        sort the results by their values and, if max_results was given, keep only that many (selected with a heap
+        rather than sorting them all), then prune the kg if requested
+        :param value_list: list of the sort values of the results
+        """
+        params = self.parameters
+        results = self.message.results
+        if 'max_results' in params and 0 <= params['max_results'] < len(results):
+            # same as sorting and truncating, including the order of ties
+            select = heapq.nlargest if params['descending'] else heapq.nsmallest
+            idx = select(params['max_results'], range(len(results)), key=value_list.__getitem__)
+        else:
+            idx = sort_index(value_list, params['descending'])
+        self.message.results = [results[i] for i in idx]
+        if params['prune_kg']:
+            self.prune_kg()
+        self.message.n_results = len(self.message.results)
+
+    def get_missing_value(self):
+        # results without the attribute go last
+        return -math.inf if self.parameters['descending'] else math.inf
+
+    @staticmethod
+    def to_sort_value(value):
+        try:
+            return float(value)
+        except ValueError:
+            return value
+
     def prune_kg(self):
         """
         prune the kg to match the results
@@ -293,8 +259,6 @@ class SortResults:
         try:
             node_keys = set()
             edge_keys = set()
-            nodes_to_remove = set()
-            edges_to_remove = set()
             for result in self.message.results:
                 for node_binding_list in result.node_bindings.values():
                     for node_binding in node_binding_list:
@@ -303,23 +267,20 @@ class SortResults:
                     for edge_binding_list in analysis.edge_bindings.values():
                         for edge_binding in edge_binding_list:
                             edge_keys.add(edge_binding.id)
-            #node_keys_to_remove = set()
-            for key, node in self.message.knowledge_graph.nodes.items():
-                if key not in node_keys:
-                    nodes_to_remove.add(key)
-                    #node_keys_to_remove.add(node.id)
-            #self.message.knowledge_graph.nodes = [val for idx, val in enumerate(self.message.knowledge_graph.nodes) if idx not in nodes_to_remove]
+            knowledge_graph = self.message.knowledge_graph
+            # the unreferenced nodes and edges are found with set differences rather than a scan of the whole kg
+            nodes_to_remove = knowledge_graph.nodes.keys() - node_keys
             for key in nodes_to_remove:
-                del self.message.knowledge_graph.nodes[key]
-            edges_to_remove = set()
-            # iterate over edges find edges connected to the nodes
-            for key, edge in self.message.knowledge_graph.edges.items():
-                if key not in edge_keys or edge.subject in nodes_to_remove or edge.object in nodes_to_remove:
-                    edges_to_remove.add(key)
-            # remove edges
-            #self.message.knowledge_graph.edges = [val for idx, val in enumerate(self.message.knowledge_graph.edges) if idx not in edges_to_remove]
+                del knowledge_graph.nodes[key]
+            edges_to_remove = knowledge_graph.edges.keys() - edge_keys
+            # referenced edges connected to removed nodes go too
+            if nodes_to_remove:
+                for key in edge_keys:
+                    edge = knowledge_graph.edges.get(key)
+                    if edge is not None and (edge.subject in nodes_to_remove or edge.object in nodes_to_remove):
+                        edges_to_remove.add(key)
             for key in edges_to_remove:
-                del self.message.knowledge_graph.edges[key]
+                del knowledge_graph.edges[key]
         except:
             tb = traceback.format_exc()
             error_type, error, _ = sys.exc_info()
@@ -327,10 +288,3 @@ class SortResults:
             self.response.error(f"Something went wrong prunning the KG")
         else:
             self.response.info(f"KG successfully pruned to match results")
-
-
-
-
-    
-
-    
@@ -6,11 +6,17 @@ Author: Chunyu Ma
 import os
 import sys
 import argparse
+import time
 import sqlite3
 import logging
+import json
+import zlib
+import threading
+from collections import OrderedDict
+from typing import Optional
 import pandas as pd
 import numpy as np
-import tqdm
+from tqdm import tqdm
 
 # import internal modules
 pathlist = os.path.realpath(__file__).split(os.path.sep)
@@ -22,6 +28,7 @@ from ARAX_database_manager import ARAXDatabaseManager
 
 
 DEBUG = True
+MAX_SQL_PARAMETERS = 900  # stay below SQLITE_MAX_VARIABLE_NUMBER (999 in older sqlite builds)
 
 def get_logger(logname):
     """
@@ -38,6 +45,39 @@ def get_logger(logname):
 
     return logger
 
+class _LookupCache(object):
+    """
+    A small thread-safe LRU of recent score/path lookups, shared by all ExplainableDTD instances in this process
+    (ARAX creates a new ExplainableDTD for every infer call).
+    """
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_lookup_cache = _LookupCache()
+
+
 class ExplainableDTD(object):
 
     # Constructor
@@ -55,6 +95,7 @@ class ExplainableDTD(object):
         self.is_connected = False
         self.test_iter = 1
         self.success_con = False
+        self.build = build
 
         if build:
             if path_to_score_results is None:
@@ -103,8 +144,8 @@ class ExplainableDTD(object):
     def connect(self):
         database = f"{self.outdir}/{self.database_name}"
         if self.is_connected is False:
-            # Get if locally
-            if os.path.exists(database):
+            # Get if locally (or create it if it is being built)
+            if os.path.exists(database) or self.build:
                 self.connection = sqlite3.connect(database)
                 self.logger.info("Connecting to database")
                 self.test_iter += 1
@@ -149,85 +190,150 @@ class ExplainableDTD(object):
             self.connection.execute(f"CREATE TABLE PREDICTION_SCORE_TABLE( drug_id VARCHAR(255), drug_name VARCHAR(255), disease_id VARCHAR(255), disease_name VARCHAR(255), tn_score FLOAT, tp_score FLOAT, unknown_score FLOAT)")
             self.connection.execute(f"DROP TABLE IF EXISTS PATH_RESULT_TABLE")
             self.connection.execute(f"CREATE TABLE PATH_RESULT_TABLE(  drug_id VARCHAR(255), drug_name VARCHAR(255), disease_id VARCHAR(255), disease_name VARCHAR(255), path VARCHAR(255), path_score FLOAT )")
+            self.connection.execute(f"DROP TABLE IF EXISTS PACKED_PATH_RESULT_TABLE")
             self.logger.info(f"Creating tables is completed")
 
     ## Populate the tables
     def populate_table(self):
 
         if self.success_con is True:
+            # bulk loading: the database is rebuilt from scratch on failure anyway
+            self.connection.execute("PRAGMA journal_mode = OFF")
+            self.connection.execute("PRAGMA synchronous = OFF")
+
             # save score results to local database
-            score_reulst_list = os.listdir(self.path_to_score_results)
-            for file_name in tqdm(score_reulst_list):
-
-                with open(f"{self.path_to_score_results}/{file_name}", 'r') as file_in:
-                    content_list = file_in.readlines()
-                    col_name = content_list.pop(0)
-                    insert_command1 = f"INSERT INTO PREDICTION_SCORE_TABLE("
-                    insert_command2 = f" values ("
-                    for col in col_name.strip().split("\t"):
-                        insert_command1 = insert_command1 + f"{col},"
-                        insert_command2 = insert_command2 + f"?,"
-
-                    insert_command = insert_command1 + ")" + insert_command2 + ")"
-                    insert_command = insert_command.replace(',)', ')')
-
-                    if DEBUG:
-                        print(insert_command, flush=True)
-                        print(tuple(content_list[0].strip().split("\t")), flush=True)
-
-                    for line in content_list:
-                        line = tuple(line.strip().split("\t"))
-                        self.connection.execute(insert_command, line)
-
-                    self.connection.commit()
-            self.connection.commit()
+            self._load_result_files(self.path_to_score_results, "PREDICTION_SCORE_TABLE")
 
             # save path results to local database
-            path_reulst_list = os.listdir(self.path_to_path_results)
-            for file_name in tqdm(path_reulst_list):
-
-                with open(f"{self.path_to_path_results}/{file_name}", 'r') as file_in:
-                    content_list = file_in.readlines()
-                    col_name = content_list.pop(0)
-                    insert_command1 = f"INSERT INTO PATH_RESULT_TABLE("
-                    insert_command2 = f" values ("
-                    for col in col_name.strip().split("\t"):
-                        insert_command1 = insert_command1 + f"{col},"
-                        insert_command2 = insert_command2 + f"?,"
-
-                    insert_command = insert_command1 + ")" + insert_command2 + ")"
-                    insert_command = insert_command.replace(',)', ')')
-
-                    if DEBUG:
-                        print(insert_command, flush=True)
-                        print(tuple(content_list[0].strip().split("\t")), flush=True)
-
-                    for line in content_list:
-                        line = tuple(line.strip().split("\t"))
-                        self.connection.execute(insert_command, line)
-
-                    self.connection.commit()
-            self.connection.commit()
+            self._load_result_files(self.path_to_path_results, "PATH_RESULT_TABLE")
 
             self.logger.info(f"Populating tables is completed")
 
+    def _load_result_files(self, path_to_results: str, table_name: str):
+        result_file_list = os.listdir(path_to_results)
+        for file_name in tqdm(result_file_list):
+
+            with open(f"{path_to_results}/{file_name}", 'r') as file_in:
+                col_names = file_in.readline().strip().split("\t")
+                insert_command = f"INSERT INTO {table_name}({','.join(col_names)}) values ({','.join('?' * len(col_names))})"
+
+                if DEBUG:
+                    print(insert_command, flush=True)
+
+                self.connection.executemany(insert_command, (tuple(line.strip().split("\t")) for line in file_in if line.strip()))
+                self.connection.commit()
+
+    def pack_path_table(self):
+        """
+        Re-encode PATH_RESULT_TABLE into PACKED_PATH_RESULT_TABLE, which stores one row per drug-disease pair
+        (clustered on disease_id, drug_id) with all of the pair's [path, path_score] records, in their original
+        order, as a zlib-compressed JSON blob. The row-per-path table is dropped afterwards.
+        """
+
+        if self.success_con is True:
+            self.logger.info(f"Packing PATH_RESULT_TABLE into PACKED_PATH_RESULT_TABLE")
+            self.connection.execute(f"DROP TABLE IF EXISTS PACKED_PATH_RESULT_TABLE")
+            self.connection.execute(f"CREATE TABLE PACKED_PATH_RESULT_TABLE( disease_id VARCHAR(255), drug_id VARCHAR(255), paths BLOB, PRIMARY KEY (disease_id, drug_id) ) WITHOUT ROWID")
+            self.connection.execute(f"CREATE INDEX idx_PACKED_PATH_RESULT_TABLE_drug_id ON PACKED_PATH_RESULT_TABLE(drug_id)")
+            cursor = self.connection.execute(f"select drug_id,disease_id,path,path_score from PATH_RESULT_TABLE order by disease_id,drug_id,rowid")
+
+            def _packed_rows():
+                current_pair, current_paths = None, []
+                for drug_id, disease_id, path, path_score in cursor:
+                    if (drug_id, disease_id) != current_pair:
+                        if current_pair:
+                            yield current_pair[1], current_pair[0], self._encode_paths(current_paths)
+                        current_pair, current_paths = (drug_id, disease_id), []
+                    current_paths.append([path, path_score])
+                if current_pair:
+                    yield current_pair[1], current_pair[0], self._encode_paths(current_paths)
+
+            # the rows are inserted as they are packed, so only one pair's paths are ever held in memory
+            self.connection.executemany(f"INSERT INTO PACKED_PATH_RESULT_TABLE(disease_id,drug_id,paths) values (?,?,?)", _packed_rows())
+            self.connection.execute(f"DROP TABLE PATH_RESULT_TABLE")
+            self.connection.commit()
+            self.connection.execute("VACUUM")
+            self.logger.info(f"Packing PATH_RESULT_TABLE is completed")
+
     def create_indexes(self):
 
         if self.success_con is True:
+            # covering indexes: a lookup by disease (or drug) is answered from the index alone, already ordered by tp_score
             self.logger.info(f"Creating INDEXes on PREDICTION_SCORE_TABLE",)
-            self.connection.execute(f"CREATE INDEX idx_PREDICTION_SCORE_TABLE_drug_id ON PREDICTION_SCORE_TABLE(drug_id)")
-            self.connection.execute(f"CREATE INDEX idx_PREDICTION_SCORE_TABLE_drug_name ON PREDICTION_SCORE_TABLE(drug_name)")
-            self.connection.execute(f"CREATE INDEX idx_PREDICTION_SCORE_TABLE_disease_id ON PREDICTION_SCORE_TABLE(disease_id)")
-            self.connection.execute(f"CREATE INDEX idx_PREDICTION_SCORE_TABLE_disease_name ON PREDICTION_SCORE_TABLE(disease_name)")
+            self.connection.execute(f"CREATE INDEX idx_PREDICTION_SCORE_TABLE_disease_id ON PREDICTION_SCORE_TABLE(disease_id, tp_score DESC, drug_id, drug_name, disease_name, tn_score, unknown_score)")
+            self.connection.execute(f"CREATE INDEX idx_PREDICTION_SCORE_TABLE_drug_id ON PREDICTION_SCORE_TABLE(drug_id, tp_score DESC, disease_id, drug_name, disease_name, tn_score, unknown_score)")
 
-            self.logger.info(f"Creating INDEXes on PREDICTION_SCORE_TABLE",)
-            self.connection.execute(f"CREATE INDEX idx_PATH_RESULT_TABLE_drug_id ON PATH_RESULT_TABLE(drug_id)")
-            self.connection.execute(f"CREATE INDEX idx_PATH_RESULT_TABLE_drug_name ON PATH_RESULT_TABLE(drug_name)")
-            self.connection.execute(f"CREATE INDEX idx_PATH_RESULT_TABLE_disease_id ON PATH_RESULT_TABLE(disease_id)")
-            self.connection.execute(f"CREATE INDEX idx_PATH_RESULT_TABLE_disease_name ON PATH_RESULT_TABLE(disease_name)")
+            if not self.has_packed_paths:
+                self.logger.info(f"Creating INDEXes on PATH_RESULT_TABLE",)
+                self.connection.execute(f"CREATE INDEX idx_PATH_RESULT_TABLE_disease_id ON PATH_RESULT_TABLE(disease_id, drug_id)")
+                self.connection.execute(f"CREATE INDEX idx_PATH_RESULT_TABLE_drug_id ON PATH_RESULT_TABLE(drug_id, disease_id)")
 
+            self.connection.execute("ANALYZE")
+            self.connection.commit()
             self.logger.info(f"INFO: Creating INDEXes is completed")
 
+    @property
+    def has_packed_paths(self) -> bool:
+        """Whether the connected database stores its paths in PACKED_PATH_RESULT_TABLE (databases built before it was added do not)."""
+        cursor = self.connection.execute("select count(*) from sqlite_master where type='table' and name='PACKED_PATH_RESULT_TABLE'")
+        return cursor.fetchone()[0] > 0
+
+    @staticmethod
+    def _encode_paths(paths: list) -> bytes:
+        return zlib.compress(json.dumps(paths, separators=(',', ':')).encode('utf-8'))
+
+    @staticmethod
+    def _decode_paths(blob: bytes) -> list:
+        return json.loads(zlib.decompress(blob).decode('utf-8'))
+
+    @staticmethod
+    def _as_curie_list(curie_ids, arg_name: str, method_name: str):
+        if isinstance(curie_ids, str):
+            return [curie_ids]
+        elif isinstance(curie_ids, list):
+            return sorted(set(curie_ids))
+        else:
+            print(f"The '{arg_name}' in {method_name} should be a string or a list", flush=True)
+            return None
+
+    def _fetch_batched(self, select_clause: str, order_clause: str, drug_curie_ids: Optional[list], disease_curie_ids: Optional[list]) -> list:
+        """
+        Run 'select_clause where <filters> order_clause' with parameterized IN-lists, splitting the curies into
+        batches that stay under sqlite's bound-parameter limit. Each (drug, disease) pair is fetched by exactly one
+        batch, but the rows are only ordered within each batch.
+        """
+        filters = [('disease_id', disease_curie_ids), ('drug_id', drug_curie_ids)]
+        filters = [(column, curies) for column, curies in filters if curies is not None]
+        # batch over the longest list; the other (if any) is bound in full if it leaves room for a reasonable batch,
+        # and is otherwise batched too (every batch of one list is then combined with every batch of the other)
+        filters.sort(key=lambda item: len(item[1]), reverse=True)
+        (batch_column, batch_curies), other_filters = filters[0], filters[1:]
+        other_batch_size = min(len(other_filters[0][1]), MAX_SQL_PARAMETERS // 2) if other_filters else 0
+        batch_size = MAX_SQL_PARAMETERS - other_batch_size
+        rows = []
+        for start in range(0, len(batch_curies), batch_size):
+            batch = batch_curies[start:start + batch_size]
+            for other_batch in self._get_batches(other_filters, other_batch_size):
+                where_clauses = [f"{batch_column} in ({','.join('?' * len(batch))})"]
+                where_clauses += [f"{column} in ({','.join('?' * len(curies))})" for column, curies in other_batch]
+                params = batch + [curie for _, curies in other_batch for curie in curies]
+                cursor = self.connection.execute(f"{select_clause} where {' and '.join(where_clauses)} {order_clause}", params)
+                rows += cursor.fetchall()
+        return rows
+
+    @staticmethod
+    def _get_batches(filters: list, batch_size: int) -> list:
+        # the (column, curies) filters with their curies split into batches; a single batch without filters if none
+        if not filters:
+            return [[]]
+        column, curies = filters[0]
+        return [[(column, curies[start:start + batch_size])] for start in range(0, len(curies), batch_size)]
+
+    def _cache_key(self, kind: str, drug_curie_ids: Optional[list], disease_curie_ids: Optional[list]) -> tuple:
+        return (f"{self.outdir}/{self.database_name}", kind,
+                tuple(drug_curie_ids) if drug_curie_ids is not None else None,
+                tuple(disease_curie_ids) if disease_curie_ids is not None else None)
+
     def get_score_table(self, drug_curie_ids=None, disease_curie_ids=None):
         """get the score table for given drug and/or disease curie ids
 
@@ -236,61 +342,30 @@ class ExplainableDTD(object):
             disease_curie_ids (str|list): a string of disease curie id or a list of disease curies, e.g. "MONDO:0008753" or ["MONDO:0008753","MONDO:0005148","MONDO:0005155"]
 
         Returns:
-            res_table (pd.DataFrame): the score table for given drug and/or disease curie ids
+            res_table (pd.DataFrame): the score table for given drug and/or disease curie ids, sorted by tp_score (descending)
         """
-        
-        if drug_curie_ids or disease_curie_ids:
-            cursor = self.connection.cursor()
-            columns = ["drug_id","drug_name","disease_id","disease_name","tn_score","tp_score","unknown_score"]
-            if drug_curie_ids and disease_curie_ids:
-                if isinstance(drug_curie_ids, str) and isinstance(disease_curie_ids, str):
-                    cursor.execute(f"select drug_id,drug_name,disease_id,disease_name,tn_score,tp_score,unknown_score from PREDICTION_SCORE_TABLE where drug_id='{drug_curie_ids}' and disease_id='{disease_curie_ids}';")
-                    res = cursor.fetchall()
-                    return pd.DataFrame(res, columns=columns)
-                elif isinstance(drug_curie_ids, list) and isinstance(disease_curie_ids, list):
-                    cursor.execute(f"select drug_id,drug_name,disease_id,disease_name,tn_score,tp_score,unknown_score from PREDICTION_SCORE_TABLE where drug_id in {tuple(set(drug_curie_ids))} and disease_id in {tuple(set(disease_curie_ids))};")
-                    res = cursor.fetchall()
-                    return pd.DataFrame(res, columns=columns)
-                elif isinstance(drug_curie_ids, str) and isinstance(disease_curie_ids, list):
-                    cursor.execute(f"select drug_id,drug_name,disease_id,disease_name,tn_score,tp_score,unknown_score from PREDICTION_SCORE_TABLE where drug_id='{drug_curie_ids}' and disease_id in {tuple(set(disease_curie_ids))};")
-                    res = cursor.fetchall()
-                    return pd.DataFrame(res, columns=columns)
-                elif isinstance(drug_curie_ids, list) and isinstance(disease_curie_ids, str):
-                    cursor.execute(f"select drug_id,drug_name,disease_id,disease_name,tn_score,tp_score,unknown_score from PREDICTION_SCORE_TABLE where drug_id in {tuple(set(drug_curie_ids))} and disease_id='{disease_curie_ids}';")
-                    res = cursor.fetchall()
-                    return pd.DataFrame(res, columns=columns)
-                else:
-                    print("The 'drug_curie_ids' and 'disease_curie_ids' in get_score_table should be a string or a list", flush=True)
-                    return pd.DataFrame([], columns=columns)
-            elif drug_curie_ids:
-                if isinstance(drug_curie_ids, str):
-                    cursor.execute(f"select drug_id,drug_name,disease_id,disease_name,tn_score,tp_score,unknown_score from PREDICTION_SCORE_TABLE where drug_id='{drug_curie_ids}';")
-                    res = cursor.fetchall()
-                    return pd.DataFrame(res, columns=columns)
-                elif isinstance(drug_curie_ids, list):
-                    cursor.execute(f"select drug_id,drug_name,disease_id,disease_name,tn_score,tp_score,unknown_score from PREDICTION_SCORE_TABLE where drug_id in {tuple(set(drug_curie_ids))};")
-                    res = cursor.fetchall()
-                    return pd.DataFrame(res, columns=columns)
-                else:
-                    print("The 'drug_curie_ids' in get_score_table should be a string or a list", flush=True)
-                    return pd.DataFrame([], columns=columns)
-            elif disease_curie_ids:
-                if isinstance(disease_curie_ids, str):
-                    cursor.execute(f"select drug_id,drug_name,disease_id,disease_name,tn_score,tp_score,unknown_score from PREDICTION_SCORE_TABLE where disease_id='{disease_curie_ids}';")
-                    res = cursor.fetchall()
-                    res_table = pd.DataFrame(res, columns=columns)
-                elif isinstance(disease_curie_ids, list):
-                    cursor.execute(f"select drug_id,drug_name,disease_id,disease_name,tn_score,tp_score,unknown_score from PREDICTION_SCORE_TABLE where disease_id in {tuple(set(disease_curie_ids))};")
-                    res = cursor.fetchall()
-                    res_table = pd.DataFrame(res, columns=columns)
-                else:
-                    print("The 'disease_curie_ids' in get_score_table should be a string or a list", flush=True)
-                    res_table = pd.DataFrame([], columns=columns)
-                return res_table
-        else:
+
+        columns = ["drug_id","drug_name","disease_id","disease_name","tn_score","tp_score","unknown_score"]
+        if not drug_curie_ids and not disease_curie_ids:
             print("Please provide at least one of drug_curie_ids or disease_curie_ids", flush=True)
             return pd.DataFrame([], columns=columns)
 
+        drug_curie_list = self._as_curie_list(drug_curie_ids, 'drug_curie_ids', 'get_score_table') if drug_curie_ids else None
+        disease_curie_list = self._as_curie_list(disease_curie_ids, 'disease_curie_ids', 'get_score_table') if disease_curie_ids else None
+        if (drug_curie_ids and drug_curie_list is None) or (disease_curie_ids and disease_curie_list is None):
+            return pd.DataFrame([], columns=columns)
+
+        cache_key = self._cache_key('score', drug_curie_list, disease_curie_list)
+        res = _lookup_cache.get(cache_key)
+        if res is None:
+            rows = self._fetch_batched(f"select {','.join(columns)} from PREDICTION_SCORE_TABLE", "order by tp_score desc",
+                                       drug_curie_list, disease_curie_list)
+            res = pd.DataFrame(rows, columns=columns)
+            # the batches are each sorted; merge them into one ranking
+            res = res.sort_values(by='tp_score', ascending=False, kind='stable').reset_index(drop=True)
+            _lookup_cache.put(cache_key, res)
+        return res.copy()
+
     def get_top_path(self, drug_curie_ids=None, disease_curie_ids=None):
         """get the top path for given drug and/or disease curie ids
 
@@ -301,58 +376,31 @@ class ExplainableDTD(object):
         Returns:
             top_paths (dict): the top paths for given drug and/or disease curie ids
         """
-        if drug_curie_ids or disease_curie_ids:
-            cursor = self.connection.cursor()
-            columns = ["drug_id","drug_name","disease_id","disease_name","path","path_score"]
-            top_paths = dict()
-            if drug_curie_ids and disease_curie_ids:
-                if isinstance(drug_curie_ids, str) and isinstance(disease_curie_ids, str):
-                    cursor.execute(f"select drug_id,drug_name,disease_id,disease_name,path,path_score from PATH_RESULT_TABLE where drug_id='{drug_curie_ids}' and disease_id='{disease_curie_ids}';")
-                    self._extracted_from_get_top_path(cursor, columns, top_paths)
-                elif isinstance(drug_curie_ids, list) and isinstance(disease_curie_ids, list):
-                    cursor.execute(f"select drug_id,drug_name,disease_id,disease_name,path,path_score from PATH_RESULT_TABLE where drug_id in {tuple(set(drug_curie_ids))} and disease_id in {tuple(set(disease_curie_ids))};")
-                    self._extracted_from_get_top_path(cursor, columns, top_paths)
-                elif isinstance(drug_curie_ids, str) and isinstance(disease_curie_ids, list):
-                    cursor.execute(f"select drug_id,drug_name,disease_id,disease_name,path,path_score from PATH_RESULT_TABLE where drug_id='{drug_curie_ids}' and disease_id in {tuple(set(disease_curie_ids))};")
-                    self._extracted_from_get_top_path(cursor, columns, top_paths)
-                elif isinstance(drug_curie_ids, list) and isinstance(disease_curie_ids, str):
-                    cursor.execute(f"select drug_id,drug_name,disease_id,disease_name,path,path_score from PATH_RESULT_TABLE where drug_id in {tuple(set(drug_curie_ids))} and disease_id='{disease_curie_ids}';")
-                    self._extracted_from_get_top_path(cursor, columns, top_paths)
-                else:
-                    print("The 'drug_curie_ids' and 'disease_curie_ids' in get_top_path should be a string or a list", flush=True)
-                return top_paths
-            elif drug_curie_ids:
-                if isinstance(drug_curie_ids, str):
-                    cursor.execute(f"select drug_id,drug_name,disease_id,disease_name,path,path_score from PATH_RESULT_TABLE where drug_id='{drug_curie_ids}';")
-                    self._extracted_from_get_top_path(cursor, columns, top_paths)
-                elif isinstance(drug_curie_ids, list):
-                    cursor.execute(f"select drug_id,drug_name,disease_id,disease_name,path,path_score from PATH_RESULT_TABLE where drug_id in {tuple(set(drug_curie_ids))};")
-                    self._extracted_from_get_top_path(cursor, columns, top_paths)
-                else:
-                    print("The 'drug_curie_ids' in get_top_path should be a string or a list", flush=True)
-                return top_paths
-            elif disease_curie_ids:
-                if isinstance(disease_curie_ids, str):
-                    cursor.execute(f"select drug_id,drug_name,disease_id,disease_name,path,path_score from PATH_RESULT_TABLE where disease_id='{disease_curie_ids}';")
-                    self._extracted_from_get_top_path(cursor, columns, top_paths)
-                elif isinstance(disease_curie_ids, list):
-                    cursor.execute(f"select drug_id,drug_name,disease_id,disease_name,path,path_score from PATH_RESULT_TABLE where disease_id in {tuple(set(disease_curie_ids))};")
-                    self._extracted_from_get_top_path(cursor, columns, top_paths)
-                else:
-                    print("The 'disease_curie_ids' in get_top_path should be a string or a list", flush=True)
-
-                return top_paths
-        else:
+        if not drug_curie_ids and not disease_curie_ids:
             print("Please provide at least one of drug_curie_ids or disease_curie_ids", flush=True)
             return dict()
 
-    def _extracted_from_get_top_path(self, cursor, columns, top_paths):
-        res = cursor.fetchall()
-        temp_df = pd.DataFrame(res, columns=columns)
-        for drug_id, disease_id in temp_df[['drug_id','disease_id']].drop_duplicates().values:
-            temp = np.array(temp_df.loc[(temp_df['drug_id']==drug_id) & (temp_df['disease_id']==disease_id),['path','path_score']].values).tolist()
-            if len(temp) > 0:
-                top_paths[(drug_id, disease_id)] = temp
+        drug_curie_list = self._as_curie_list(drug_curie_ids, 'drug_curie_ids', 'get_top_path') if drug_curie_ids else None
+        disease_curie_list = self._as_curie_list(disease_curie_ids, 'disease_curie_ids', 'get_top_path') if disease_curie_ids else None
+        if (drug_curie_ids and drug_curie_list is None) or (disease_curie_ids and disease_curie_list is None):
+            return dict()
+
+        cache_key = self._cache_key('path', drug_curie_list, disease_curie_list)
+        top_paths = _lookup_cache.get(cache_key)
+        if top_paths is None:
+            top_paths = dict()
+            if self.has_packed_paths:
+                rows = self._fetch_batched("select drug_id,disease_id,paths from PACKED_PATH_RESULT_TABLE", "",
+                                           drug_curie_list, disease_curie_list)
+                for drug_id, disease_id, paths in rows:
+                    top_paths[(drug_id, disease_id)] = self._decode_paths(paths)
+            else:
+                rows = self._fetch_batched("select drug_id,disease_id,path,path_score from PATH_RESULT_TABLE", "order by rowid",
+                                           drug_curie_list, disease_curie_list)
+                for drug_id, disease_id, path, path_score in rows:
+                    top_paths.setdefault((drug_id, disease_id), []).append([path, path_score])
+            _lookup_cache.put(cache_key, top_paths)
+        return {pair: list(paths) for pair, paths in top_paths.items()}
 
 ####################################################################################################
 
@@ -361,35 +409,44 @@ def main():
     parser = argparse.ArgumentParser(description="Tests or builds the ExplainableDTD Database", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
     parser.add_argument('--build', action="store_true", required=False, help="If set, (re)build the index from scratch", default=False)
     parser.add_argument('--test', action="store_true", required=False, help="If set, run a test of database by doing several lookups", default=False)
-    parser.add_argument('--path_to_score_results', type=str, required=True, help="Path to a folder containing the prediction score results of all diseases")
-    parser.add_argument('--path_to_path_results', type=str, required=True, help="Path to a folder containing the path results of all diseases")
+    parser.add_argument('--benchmark', action="store_true", required=False, help="If set, time cold and cached score/path lookups for the --benchmark_diseases", default=False)
+    parser.add_argument('--benchmark_diseases', type=str, nargs='+', required=False, help="Disease curies to use for --benchmark", default=["MONDO:0005148", "MONDO:0008753", "MONDO:0005155"])
+    parser.add_argument('--path_to_score_results', type=str, required=False, help="Path to a folder containing the prediction score results of all diseases (required with --build)")
+    parser.add_argument('--path_to_path_results', type=str, required=False, help="Path to a folder containing the path results of all diseases (required with --build)")
     parser.add_argument('--database_name', type=str, required=False, help="Database name", default="ExplainableDTD.db")
     parser.add_argument('--outdir', type=str, required=False, help="Path to a folder where the database is generated", default="./")
     args = parser.parse_args()
 
-    if not args.build and not args.test:
+    if not args.build and not args.test and not args.benchmark:
         parser.print_help()
         sys.exit(2)
 
-    EDTDdb = ExplainableDTD(args.path_to_score_results, args.path_to_path_results, database_name=args.database_name, outdir=args.outdir)
+    EDTDdb = ExplainableDTD(args.path_to_score_results, args.path_to_path_results, database_name=args.database_name, outdir=args.outdir, build=args.build)
 
     # To (re)build
     if args.build:
         EDTDdb.create_tables()
         EDTDdb.populate_table()
+        EDTDdb.pack_path_table()
         EDTDdb.create_indexes()
 
-    # Exit here if tests are not requested
-    if not args.test:
-        return
-
-    print("==== Testing for search for top drugs by disease id ====", flush=True)
-    print(EDTDdb.get_top_drugs_for_disease('MONDO:0005148'))
-    # print(EDTDdb.get_top_drugs_for_disease(["MONDO:0008753","MONDO:0005148","MONDO:0005155"]))
-
-    print("==== Testing for search for top paths by disease id ====", flush=True)
-    print(EDTDdb.get_top_paths_for_disease('MONDO:0005148'))
-    # print(EDTDdb.get_top_paths_for_disease(["MONDO:0008753","MONDO:0005148","MONDO:0005155"]))
+    if args.test:
+        print("==== Testing for search for top drugs by disease id ====", flush=True)
+        print(EDTDdb.get_score_table(disease_curie_ids='MONDO:0005148'))
+        # print(EDTDdb.get_score_table(disease_curie_ids=["MONDO:0008753","MONDO:0005148","MONDO:0005155"]))
+
+        print("==== Testing for search for top paths by disease id ====", flush=True)
+        print(EDTDdb.get_top_path(disease_curie_ids='MONDO:0005148'))
+        # print(EDTDdb.get_top_path(disease_curie_ids=["MONDO:0008753","MONDO:0005148","MONDO:0005155"]))
+
+    if args.benchmark:
+        print("==== Benchmarking lookups by disease id ====", flush=True)
+        for disease_curie in args.benchmark_diseases:
+            for attempt in ['cold', 'cached']:
+                start = time.time()
+                top_scores = EDTDdb.get_score_table(disease_curie_ids=disease_curie)
+                top_paths = EDTDdb.get_top_path(disease_curie_ids=disease_curie)
+                print(f"{disease_curie} ({attempt}): {len(top_scores)} scores, {len(top_paths)} drug-disease path sets in {(time.time() - start) * 1000:.2f} ms", flush=True)
 
 ####################################################################################################
 
@@ -6,6 +6,8 @@ import numpy as np
 import pandas as pd
 import sqlite3
 import requests
+import threading
+from collections import OrderedDict
 # import graph_tool.all as gt
 from tqdm import tqdm, trange
 pathlist = os.getcwd().split(os.path.sep)
@@ -139,61 +141,207 @@ def extract_path(path_result: openapi_server.models.result.Result, mapping: Dict
         res.update({qnode_id2:curie2})
     return res
 
-class creativeCRG:
+class xCRGModelStore:
+    """
+    Holds everything xCRG needs that does not depend on the query: the chemical/gene embeddings, the
+    increase/decrease models, the curie->row indexes and the relevant biolink categories. One store is
+    loaded per process (see get_xcrg_model_store) so that infer calls do not reload the npz and joblib
+    files; the server loads it before it forks its query children, which share it copy-on-write.
+    The prediction frames it returns are copies, so callers may change them.
+    """
 
-    def __init__(self, response: ARAXResponse, data_path: str):
+    max_cached_predictions = 512
 
-        ## set up parameters
-        self.response = response
-        self.bh = BiolinkHelper()
-        self.predicate_depth_map = self.bh.get_predicate_depth_map()
-        self.relevant_node_categories = ['biolink:Drug', 'biolink:PathologicalProcess', 'biolink:GeneOrGeneProduct', 'biolink:ChemicalEntity',
-                                         'biolink:SmallMolecule', 'biolink:Gene', 'biolink:BiologicalProcess', 'biolink:Pathway', 'biolink:Disease',
-                                         'biolink:Transcript', 'biolink:Cell', 'biolink:GeneFamily', 'biolink:GeneProduct', 'biolink:Exon',
-                                         'biolink:DiseaseOrPhenotypicFeature', 'biolink:PhenotypicFeature', 'biolink:MolecularActivity', 'biolink:GeneGroupingMixin',
-                                         'biolink:CellularComponent', 'biolink:RNAProduct', 'biolink:Protein', 'biolink:BiologicalProcessOrActivity', 'biolink:PhysiologicalProcess',
-                                          'biolink:NoncodingRNAProduct', 'biolink:ProteinFamily', 'biolink:ProteinDomain']
-        self.relevant_node_categories = self.bh.get_descendants(self.relevant_node_categories)
-        
+    def __init__(self, data_path: str):
         self.data_path = data_path
-        self.chemical_type = ['biolink:ChemicalEntity', 'biolink:ChemicalMixture','biolink:SmallMolecule']
-        self.gene_type = ['biolink:Gene','biolink:Protein']
 
-        ## load datasets
-        self.response.info(f"loading embeddings and models into memory")
-        
+        bh = BiolinkHelper()
+        self.predicate_depth_map = bh.get_predicate_depth_map()
+        relevant_node_categories = ['biolink:Drug', 'biolink:PathologicalProcess', 'biolink:GeneOrGeneProduct', 'biolink:ChemicalEntity',
+                                    'biolink:SmallMolecule', 'biolink:Gene', 'biolink:BiologicalProcess', 'biolink:Pathway', 'biolink:Disease',
+                                    'biolink:Transcript', 'biolink:Cell', 'biolink:GeneFamily', 'biolink:GeneProduct', 'biolink:Exon',
+                                    'biolink:DiseaseOrPhenotypicFeature', 'biolink:PhenotypicFeature', 'biolink:MolecularActivity', 'biolink:GeneGroupingMixin',
+                                    'biolink:CellularComponent', 'biolink:RNAProduct', 'biolink:Protein', 'biolink:BiologicalProcessOrActivity', 'biolink:PhysiologicalProcess',
+                                    'biolink:NoncodingRNAProduct', 'biolink:ProteinFamily', 'biolink:ProteinDomain']
+        self.relevant_node_categories = set(bh.get_descendants(relevant_node_categories))
+
         # load embeddings
         chemical_gene_embeddings_name = RTXConfig.xcrg_embeddings_path.split("/")[-1]
         npzfile = np.load(os.path.join(self.data_path, chemical_gene_embeddings_name), allow_pickle=True)
         self.chemical_curies = npzfile['chemical_curies'].tolist()
         self.chemical_curie_types = npzfile['chemical_curie_types'].tolist()
-        self.chemical_embs = npzfile['chemical_embs']
+        self.chemical_embs = np.ascontiguousarray(npzfile['chemical_embs'])
         self.gene_curies = npzfile['gene_curies'].tolist()
         self.gene_curie_types = npzfile['gene_curie_types'].tolist()
-        self.gene_embs = npzfile['gene_embs']
+        self.gene_embs = np.ascontiguousarray(npzfile['gene_embs'])
+        self.num_chemicals = len(self.chemical_curies)
+        self.num_genes = len(self.gene_curies)
+        self.chemical_curie_to_row = {curie: row for row, curie in enumerate(self.chemical_curies)}
+        self.gene_curie_to_row = {curie: row for row, curie in enumerate(self.gene_curies)}
 
+        # Feature matrices are laid out as [chemical embedding | gene embedding]; keep one pre-concatenated
+        # matrix per direction with the candidate side filled in, so a prediction only has to broadcast
+        # the query embedding into the other half instead of tiling and hstacking on every call
+        chemical_dim = self.chemical_embs.shape[1]
+        self._chemical_candidates_X = np.hstack([self.chemical_embs, np.zeros((self.num_chemicals, self.gene_embs.shape[1]), dtype=self.chemical_embs.dtype)])
+        self._gene_candidates_X = np.hstack([np.zeros((self.num_genes, chemical_dim), dtype=self.gene_embs.dtype), self.gene_embs])
+        self._chemical_dim = chemical_dim
 
         # load ML models
-        self.increase_model = load_ML_CRGmodel(self.response, self.data_path, 'increase')
-        self.decrease_model = load_ML_CRGmodel(self.response, self.data_path, 'decrease')
+        response = ARAXResponse()
+        self.models = {model_type: load_ML_CRGmodel(response, self.data_path, model_type) for model_type in ['increase', 'decrease']}
+        if response.status != 'OK' or None in self.models.values():
+            raise ValueError(f"Unable to load the xCRG models from {self.data_path}: {response.show(level=ARAXResponse.ERROR)}")
+
+        path_list = os.path.realpath(__file__).split(os.path.sep)
+        rtx_index = path_list.index("RTX")
+        tf_list_file_path = os.path.sep.join([*path_list[:(rtx_index + 1)], 'code', 'ARAX', 'ARAXQuery','Infer','data','xCRG_data','transcription_factors.json'])
+        with open(tf_list_file_path) as fp:
+            self.tf_list = json.loads(fp.read())['tf']
+
+        self._lock = threading.Lock()
+        self._prediction_cache = OrderedDict()
+
+    def _get_cached(self, key: tuple):
+        with self._lock:
+            res = self._prediction_cache.get(key)
+            if res is not None:
+                self._prediction_cache.move_to_end(key)
+            return res
+
+    def _set_cached(self, key: tuple, res: pd.DataFrame):
+        with self._lock:
+            self._prediction_cache[key] = res
+            self._prediction_cache.move_to_end(key)
+            while len(self._prediction_cache) > self.max_cached_predictions:
+                self._prediction_cache.popitem(last=False)
+
+    @staticmethod
+    def _top_n_rows(tp_probs: np.ndarray, N: int) -> np.ndarray:
+        """Return the row indexes of the N highest probabilities, highest first."""
+        if N < len(tp_probs):
+            top_rows = np.argpartition(-tp_probs, N - 1)[:N]
+        else:
+            top_rows = np.arange(len(tp_probs))
+        # stable sort keeps the original (npz) order among ties, as the previous pandas sort did
+        return top_rows[np.argsort(-tp_probs[top_rows], kind='stable')]
+
+    def top_N_chemicals_for_gene(self, gene_curie: str, N: int, model_type: str) -> Optional[pd.DataFrame]:
+        """
+        Return the N chemicals with the highest predicted probability of regulating the given gene, sorted
+        by 'tp_prob' (descending), or None if the model was not trained with the gene.
+        """
+        cache_key = ('chemicals', gene_curie, model_type, N)
+        res = self._get_cached(cache_key)
+        if res is not None:
+            return res.copy()
+        row = self.gene_curie_to_row.get(gene_curie)
+        if row is None:
+            return None
+        with self._lock:
+            X = self._chemical_candidates_X
+            X[:, self._chemical_dim:] = self.gene_embs[row]
+            probas = self.models[model_type].predict_proba(X)
+        top_rows = self._top_n_rows(probas[:, 1], N)
+        res = pd.DataFrame({'chemical_id': [self.chemical_curies[i] for i in top_rows],
+                            'gene_id': [gene_curie] * len(top_rows),
+                            'tn_prob': probas[top_rows, 0],
+                            'tp_prob': probas[top_rows, 1]})
+        self._set_cached(cache_key, res)
+        return res.copy()
+
+    def top_N_genes_for_chemical(self, chemical_curie: str, N: int, model_type: str) -> Optional[pd.DataFrame]:
+        """
+        Return the N genes with the highest predicted probability of being regulated by the given chemical,
+        sorted by 'tp_prob' (descending), or None if the model was not trained with the chemical.
+        """
+        cache_key = ('genes', chemical_curie, model_type, N)
+        res = self._get_cached(cache_key)
+        if res is not None:
+            return res.copy()
+        row = self.chemical_curie_to_row.get(chemical_curie)
+        if row is None:
+            return None
+        with self._lock:
+            X = self._gene_candidates_X
+            X[:, :self._chemical_dim] = self.chemical_embs[row]
+            probas = self.models[model_type].predict_proba(X)
+        top_rows = self._top_n_rows(probas[:, 1], N)
+        res = pd.DataFrame({'chemical_id': [chemical_curie] * len(top_rows),
+                            'gene_id': [self.gene_curies[i] for i in top_rows],
+                            'tn_prob': probas[top_rows, 0],
+                            'tp_prob': probas[top_rows, 1]})
+        self._set_cached(cache_key, res)
+        return res.copy()
+
+
+_xcrg_model_stores = dict()
+_xcrg_model_stores_lock = threading.Lock()
+
+
+def _reset_xcrg_model_store_locks():
+    # A child forked while another thread held one of these locks would otherwise wait on it forever
+    global _xcrg_model_stores_lock
+    _xcrg_model_stores_lock = threading.Lock()
+    for store in _xcrg_model_stores.values():
+        store._lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_xcrg_model_store_locks)
+
+
+def get_xcrg_model_store(data_path: str) -> xCRGModelStore:
+    """
+    Return the process-wide xCRGModelStore for data_path, loading it on first use. Raises an exception if the
+    embeddings or models can't be loaded.
+    """
+    data_path = os.path.realpath(data_path)
+    with _xcrg_model_stores_lock:
+        store = _xcrg_model_stores.get(data_path)
+        if store is None:
+            store = xCRGModelStore(data_path)
+            _xcrg_model_stores[data_path] = store
+        return store
+
+
+class creativeCRG:
+
+    def __init__(self, response: ARAXResponse, data_path: str):
+
+        ## set up parameters
+        self.response = response
+        self.data_path = data_path
+        self.chemical_type = ['biolink:ChemicalEntity', 'biolink:ChemicalMixture','biolink:SmallMolecule']
+        self.gene_type = ['biolink:Gene','biolink:Protein']
+
+        ## get the embeddings and models (only loaded from disk the first time in this process)
+        if os.path.realpath(data_path) not in _xcrg_model_stores:
+            self.response.info(f"loading embeddings and models into memory")
+        self.store = get_xcrg_model_store(data_path)
+        self.predicate_depth_map = self.store.predicate_depth_map
+        self.relevant_node_categories = self.store.relevant_node_categories
+        self.chemical_curies = self.store.chemical_curies
+        self.chemical_curie_types = self.store.chemical_curie_types
+        self.chemical_embs = self.store.chemical_embs
+        self.gene_curies = self.store.gene_curies
+        self.gene_curie_types = self.store.gene_curie_types
+        self.gene_embs = self.store.gene_embs
+        self.increase_model = self.store.models['increase']
+        self.decrease_model = self.store.models['decrease']
+        self.tf_list = self.store.tf_list
 
         # initialize Node Synonymizer
         self.synonymizer = NodeSynonymizer()
 
         ## initialize other variables
-        self.num_chemicals = len(self.chemical_curies)
-        self.num_genes = len(self.gene_curies)
+        self.num_chemicals = self.store.num_chemicals
+        self.num_genes = self.store.num_genes
         self._top_N_chemicals_dict = dict()
         self._top_N_chemicals_dict['increase'] = dict()
         self._top_N_chemicals_dict['decrease'] = dict()
         self._top_N_genes_dict = dict()
         self._top_N_genes_dict['increase'] = dict()
         self._top_N_genes_dict['decrease'] = dict()
-        path_list = os.path.realpath(__file__).split(os.path.sep)
-        rtx_index = path_list.index("RTX")
-        tf_list_file_path = os.path.sep.join([*path_list[:(rtx_index + 1)], 'code', 'ARAX', 'ARAXQuery','Infer','data','xCRG_data','transcription_factors.json'])
-        with open(tf_list_file_path) as fp:
-                self.tf_list = json.loads(fp.read())['tf']
 
     def get_tf_neighbors(self):        
         status_code, response = call_plover(self.tf_list,respect_predicate_symmetry=False)
@@ -278,51 +426,25 @@ class creativeCRG:
             if model_type not in ['increase', 'decrease']:
                 self.response.warning(f"The parameter 'model_type' allows either 'increase' or 'decrease'. But {model_type} is provided.")
                 return None
-            if preferred_query_gene not in self._top_N_genes_dict[model_type]:
-                ## check if the query gene curie was trained in the specific model and if so, get its embedding
-                if preferred_query_gene not in self.gene_curies:
-                    self.response.warning(f"The increase-type model was not trained with gene curie {preferred_query_gene}.")
-                    return None
-                else:
-                    query_gene_array = np.tile(self.gene_embs[self.gene_curies.index(preferred_query_gene)].reshape(1,-1),(self.num_chemicals,1))
-                ## get all chemical embeddings
-                chemical_array = self.chemical_embs
-                ## do prediction
-                X = np.hstack([chemical_array,query_gene_array])
-                if model_type == 'increase':
-                    probas = self.increase_model.predict_proba(X)
-                else:
-                    probas = self.decrease_model.predict_proba(X)
-                res = pd.concat([pd.DataFrame(self.chemical_curies),pd.DataFrame([preferred_query_gene] * self.num_chemicals),pd.DataFrame(probas)], axis=1)
-                res.columns = ['chemical_id','gene_id','tn_prob','tp_prob']
-                res = res.sort_values(by=['tp_prob'],ascending=False).reset_index(drop=True)
-                self._top_N_genes_dict[model_type][preferred_query_gene] = res
-
-                ## filter results according to threshold
-                if threshold:
-                    res = res.loc[res['tp_prob'] >= threshold,:].reset_index(drop=True)
-                
-                ## give warning if the number of result records is smaller than the requirement
-                if len(res) == 0:
-                    self.response.warning(f"No chemical-gene pair meets the requirement of threshold >={threshold}. Perhaps try using more loose threshold.")
-                if len(res) < N:
-                    self.response.warning(f"No chemical-gene pair meets the requirement of threshold >={threshold} and top{N}. Only has {len(res)} satisfiable results.")
-
-                return res.iloc[:N,:]
-            else:
+            ## the store scores every chemical but keeps only the top N (cached per gene, direction and N);
+            ## it returns None if the model was not trained with the query gene curie
+            res = self.store.top_N_chemicals_for_gene(preferred_query_gene, N, model_type)
+            if res is None:
+                self.response.warning(f"The {model_type}-type model was not trained with gene curie {preferred_query_gene}.")
+                return None
+            self._top_N_genes_dict[model_type][preferred_query_gene] = res
 
-                ## filter results according to threshold
-                res = self._top_N_genes_dict[model_type][preferred_query_gene]
-                if threshold:
-                    res = res.loc[res['tp_prob'] >= threshold,:].reset_index(drop=True)
+            ## filter results according to threshold
+            if threshold:
+                res = res.loc[res['tp_prob'] >= threshold,:].reset_index(drop=True)
 
-                ## give warning if the number of result records is smaller than the requirement
-                if len(res) == 0:
-                    self.response.warning(f"No chemical-gene pair meets the requirement of threshold >={threshold}. Perhaps try using more loose threshold.")
-                if len(res) < N:
-                    self.response.warning(f"No chemical-gene pair meets the requirement of threshold >={threshold} and top{N}. Only has {len(res)} satisfiable results.")
+            ## give warning if the number of result records is smaller than the requirement
+            if len(res) == 0:
+                self.response.warning(f"No chemical-gene pair meets the requirement of threshold >={threshold}. Perhaps try using more loose threshold.")
+            if len(res) < N:
+                self.response.warning(f"No chemical-gene pair meets the requirement of threshold >={threshold} and top{N}. Only has {len(res)} satisfiable results.")
 
-                return res.iloc[:N,:]
+            return res.iloc[:N,:]
         else:
             self.response.warning(f"The parameter 'query_gene' is not provided. Please give a gene curie to the parameter 'query_gene'.")
             return None
@@ -353,52 +475,25 @@ class creativeCRG:
             if model_type not in ['increase', 'decrease']:
                 self.response.warning(f"The parameter 'model_type' allows either 'increase' or 'decrease'. But {model_type} is provided.")
                 return None
-            if preferred_query_chemical not in self._top_N_chemicals_dict[model_type]:
-                ## check if the query chemical curie was trained in the specific model and if so, get its embedding 
-                if preferred_query_chemical not in self.chemical_curies:
-                    self.response.warning(f"The increase-type model was not trained with chemical curie {query_chemical}.")
-                    return None
-                else:
-                    query_chemical_array = np.tile(self.chemical_embs[self.chemical_curies.index(preferred_query_chemical)].reshape(1,-1),(self.num_genes,1))
-                ## get all gene embeddings
-                gene_array = self.gene_embs
-                ## do prediction
-                X = np.hstack([query_chemical_array,gene_array])
-                if model_type == 'increase':
-                    probas = self.increase_model.predict_proba(X)
-                else:
-                    probas = self.decrease_model.predict_proba(X)
-                res = pd.concat([pd.DataFrame([preferred_query_chemical] * self.num_genes),pd.DataFrame(self.gene_curies),pd.DataFrame(probas)], axis=1)
-                res.columns = ['chemical_id','gene_id','tn_prob','tp_prob']
-                res = res.sort_values(by=['tp_prob'],ascending=False).reset_index(drop=True)
-                self._top_N_chemicals_dict[model_type][preferred_query_chemical] = res
-
-                ## filter results according to threshold
-                if threshold:
-                    res = res.loc[res['tp_prob'] >= threshold,:].reset_index(drop=True)
-
-                ## give warning if the number of result records is smaller than the requirement
-                if len(res) == 0:
-                    self.response.warning(f"No chemical-gene pair meets the requirement of threshold >={threshold}. Perhaps try using more loose threshold.")
-                if len(res) < N:
-                    self.response.warning(f"No chemical-gene pair meets the requirement of threshold >={threshold} and top{N}. Only has {len(res)} satisfiable results.")
-
-                return res.iloc[:N,:]
-            else:
-
-                ## filter results according to threshold
-                res = self._top_N_chemicals_dict[model_type][preferred_query_chemical]
+            ## the store scores every gene but keeps only the top N (cached per chemical, direction and N);
+            ## it returns None if the model was not trained with the query chemical curie
+            res = self.store.top_N_genes_for_chemical(preferred_query_chemical, N, model_type)
+            if res is None:
+                self.response.warning(f"The {model_type}-type model was not trained with chemical curie {query_chemical}.")
+                return None
+            self._top_N_chemicals_dict[model_type][preferred_query_chemical] = res
 
-                if threshold:
-                    res = res.loc[res['tp_prob'] >= threshold,:].reset_index(drop=True)
+            ## filter results according to threshold
+            if threshold:
+                res = res.loc[res['tp_prob'] >= threshold,:].reset_index(drop=True)
 
-                ## give warning if the number of result records is smaller than the requirement
-                if len(res) == 0:
-                    self.response.warning(f"No chemical-gene pair meets the requirement of threshold >={threshold}. Perhaps try using more loose threshold.")
-                if len(res) < N:
-                    self.response.warning(f"No chemical-gene pair meets the requirement of threshold >={threshold} and top{N}. Only has {len(res)} satisfiable results.")
+            ## give warning if the number of result records is smaller than the requirement
+            if len(res) == 0:
+                self.response.warning(f"No chemical-gene pair meets the requirement of threshold >={threshold}. Perhaps try using more loose threshold.")
+            if len(res) < N:
+                self.response.warning(f"No chemical-gene pair meets the requirement of threshold >={threshold} and top{N}. Only has {len(res)} satisfiable results.")
 
-                return res.iloc[:N,:]
+            return res.iloc[:N,:]
 
         else:
             self.response.warning(f"The parameter 'query_chemical' is not provided. Please assign a chemical curie to the parameter 'query_chemical'.")
@@ -1 +1 @@
-time python ~/work/RTX/code/ARAX/ARAXQuery/Overlay/GraphSage_train/py_scripts/create_embedding_sqlite_database.py --embfile ~/work/RTX/code/reasoningtool/MLDrugRepurposing/Test_graphsage/kg2_3_4/graphsage_out/graphsage_mean_big_0.001000_l100_r10_512dim_70training_2layer_512batch_96neighbor_kg2canonical_2_3_4.emb --mapfile ~/work/RTX/code/reasoningtool/MLDrugRepurposing/Test_graphsage/kg2_3_4/graphsage_input/id_map.txt --output ~/work/RTX/code/ARAX/ARAXQuery/Overlay/predictor/retrain_data
\ No newline at end of file
+time python ~/work/RTX/code/ARAX/ARAXQuery/Overlay/GraphSage_train/py_scripts/graphsage_pipeline.py --stages sqlite --output ~/work/RTX/code/reasoningtool/MLDrugRepurposing/Test_graphsage/kg2_6_3/graphsage_input --database ~/work/RTX/code/ARAX/ARAXQuery/Overlay/predictor/retrain_data/GRAPH_v1.0.sqlite
\ No newline at end of file
@@ -0,0 +1,376 @@
+## This script runs the steps that prepare GraphSage's input (eg. G.json, id_map.json, class_map.json, walks.txt, please
+# see https://github.com/williamleif/GraphSAGE for more details) and that turn its output into the node embeddings used
+# by the DTD model, as resumable stages (it replaces graphsage_data_generation.py, generate_random_walk.py,
+# transform_format.py and create_embedding_sqlite_database.py):
+#   prepare:    encodes the graph (graph_edges.txt) with integer node ids, saves its adjacency in CSR format (.npy files)
+#               and writes GraphSage's input files
+#   walks:      generates the random walks over the training subgraph in parallel, chunk by chunk
+#   (GraphSage itself is then run with python 2.7, see 2_run_graphsage_unsupervised_train.sh)
+#   embeddings: saves GraphSage's embeddings (val.npy, val.txt) as a memory-mappable matrix (embeddings.npy, one row
+#               per node id) plus its curie index (embedding_curies.txt)
+#   sqlite:     builds the GRAPH table of the embedding database (GRAPH_v1.0.sqlite) used by the DTD predictor
+# Each completed stage is recorded in pipeline_state.json in the output folder, with its parameters and the sizes and
+# modification times of its inputs, and is skipped when run again unless any of these changed (or --force is given).
+# The walks stage also keeps each completed chunk, so an interrupted run picks up where it stopped.
+
+import os
+import sys
+import json
+import time
+import random
+import sqlite3
+import argparse
+import multiprocessing
+import numpy as np
+
+STAGES = ['prepare', 'walks', 'embeddings', 'sqlite']
+STATE_FILE = 'pipeline_state.json'
+
+
+########## checkpointing ###############
+def _get_file_signature(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime]
+
+
+def _load_state(outpath):
+    state_path = os.path.join(outpath, STATE_FILE)
+    if not os.path.exists(state_path):
+        return dict()
+    with open(state_path, 'r') as f:
+        return json.load(f)
+
+
+def _write_atomically(path, write_function, mode='w'):
+    ## write to a temporary file first, so that an interrupted stage never leaves a partial file behind
+    temp_path = f"{path}.tmp{os.getpid()}"
+    with open(temp_path, mode) as f:
+        write_function(f)
+    os.replace(temp_path, path)
+
+
+def run_stage(outpath, stage, stage_function, inputs, params, outputs, force=False):
+    """
+    Runs a stage unless it already completed with the same parameters and inputs and its outputs are still there.
+    Returns True if the stage was run, False if it was skipped.
+    """
+    state = _load_state(outpath)
+    record = {'params': params, 'inputs': {path: _get_file_signature(path) for path in inputs}}
+    previous_record = state.get(stage)
+    if not force and previous_record is not None and previous_record['params'] == record['params'] and \
+            previous_record['inputs'] == record['inputs'] and all(os.path.exists(path) for path in outputs):
+        print(f"INFO: Stage '{stage}' already completed; skipping it", flush=True)
+        return False
+
+    print(f"INFO: Running stage '{stage}'", flush=True)
+    start = time.time()
+    stage_function()
+    record['completed_at'] = time.strftime("%Y-%m-%d %H:%M:%S")
+    state = _load_state(outpath)
+    state[stage] = record
+    _write_atomically(os.path.join(outpath, STATE_FILE), lambda f: json.dump(state, f, indent=2))
+    print(f"INFO: Stage '{stage}' completed in {round(time.time() - start, 1)} seconds", flush=True)
+    return True
+
+
+########## stage 'prepare' ###############
+def _read_two_column_file(path):
+    ## reads a tab-separated file with a header line into two lists of its columns
+    first_column = []
+    second_column = []
+    with open(path, 'r') as f:
+        next(f)
+        for line in f:
+            fields = line.rstrip('\n').split('\t')
+            if len(fields) >= 2:
+                first_column.append(fields[0])
+                second_column.append(fields[1])
+    return first_column, second_column
+
+
+def encode_graph(graph_file, outpath, node_class_file=None, validation_percent=0.3, seed=100, feature_dim=256):
+    """
+    Numbers the nodes of the graph (0..n-1 in curie order, as in id_map.txt), and saves the undirected adjacency of the
+    whole graph (graph_indptr.npy, graph_indices.npy) and of its training subgraph (walk_indptr.npy, walk_indices.npy),
+    which leaves out the validation nodes, in CSR format. Then writes GraphSage's input files.
+    """
+    sources, targets = _read_two_column_file(graph_file)
+    curies = sorted(set(sources).union(targets))
+    curie_to_id = {curie: node_id for node_id, curie in enumerate(curies)}
+    n_nodes = len(curies)
+    edges = np.array([[curie_to_id[source] for source in sources], [curie_to_id[target] for target in targets]], dtype=np.int64).reshape(2, -1)
+    del sources, targets
+    print(f"INFO: {n_nodes} nodes and {edges.shape[1]} edges", flush=True)
+
+    ## output the id map file
+    _write_atomically(os.path.join(outpath, 'id_map.txt'),
+                      lambda f: f.write('curie\tid\n' + ''.join(f"{curie}\t{node_id}\n" for node_id, curie in enumerate(curies))))
+
+    ## use part of the nodes as validation data (the same ones as graphsage_data_generation.py picks)
+    shuffled_ids = list(range(n_nodes))
+    random.Random(seed).shuffle(shuffled_ids)
+    is_validation = np.zeros(n_nodes, dtype=bool)
+    is_validation[shuffled_ids[0:int(n_nodes * validation_percent)]] = True
+    np.save(os.path.join(outpath, 'validation_mask.npy'), is_validation)
+
+    ## save the adjacency of the whole graph and of the training subgraph (no duplicate edges, as in a networkx Graph)
+    indptr, indices = _to_csr(edges, n_nodes)
+    np.save(os.path.join(outpath, 'graph_indptr.npy'), indptr)
+    np.save(os.path.join(outpath, 'graph_indices.npy'), indices)
+    training_edges = edges[:, ~is_validation[edges[0]] & ~is_validation[edges[1]]]
+    indptr, indices = _to_csr(training_edges, n_nodes)
+    np.save(os.path.join(outpath, 'walk_indptr.npy'), indptr)
+    np.save(os.path.join(outpath, 'walk_indices.npy'), indices)
+    del training_edges
+
+    _write_graphsage_input(outpath, curies, edges, is_validation, node_class_file, feature_dim)
+
+
+def _to_csr(edges, n_nodes):
+    both_directions = np.unique(np.concatenate([edges, edges[::-1]], axis=1), axis=1)
+    indptr = np.zeros(n_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(both_directions[0], minlength=n_nodes), out=indptr[1:])
+    return indptr, both_directions[1].astype(np.int64)
+
+
+def _write_graphsage_input(outpath, curies, edges, is_validation, node_class_file, feature_dim):
+    ## generate the node label vectors (one-hot vectors of the node categories, in category order)
+    if node_class_file is not None:
+        class_curies, classes = _read_two_column_file(node_class_file)
+        curie_to_class = dict(zip(class_curies, classes))
+        categories = sorted(set(classes))
+        category_vectors = {category: [0.0] * len(categories) for category in categories}
+        for index, category in enumerate(categories):
+            category_vectors[category][index] = 1.0
+        _write_atomically(os.path.join(outpath, 'category_map.txt'),
+                          lambda f: f.write('category\tcategory_vec\n' + ''.join(f"{category}\t{category_vectors[category]}\n" for category in categories)))
+        labels = [category_vectors[curie_to_class[curie]] for curie in curies]
+    else:
+        print('No class label file was given. All nodes will be set to the same label.', flush=True)
+        labels = [[1] for _ in curies]
+
+    ## generate the Graph json file, writing its nodes and links piece by piece rather than building it all in memory
+    order = np.lexsort((edges[1], edges[0]))
+    def write_graph(f):
+        f.write('{"directed": false, "graph": {"name": "disjoint_union(,)"}, "nodes": [')
+        for node_id in range(len(curies)):
+            feature = labels[node_id] if node_class_file is not None else [0.0] * feature_dim
+            f.write((', ' if node_id else '') + json.dumps({'test': False, 'id': node_id, 'feature': feature, 'label': [1],
+                                                             'val': bool(is_validation[node_id])}))
+        f.write('], "links": [')
+        for index, edge_index in enumerate(order):
+            f.write((', ' if index else '') + json.dumps({'test_removed': False, 'train_removed': False,
+                                                          'source': int(edges[0, edge_index]), 'target': int(edges[1, edge_index])}))
+        f.write('], "multigraph": false}')
+    _write_atomically(os.path.join(outpath, 'data-G.json'), write_graph)
+
+    _write_atomically(os.path.join(outpath, 'data-class_map.json'),
+                      lambda f: json.dump({str(node_id): label for node_id, label in enumerate(labels)}, f))
+    _write_atomically(os.path.join(outpath, 'data-id_map.json'),
+                      lambda f: json.dump({str(node_id): node_id for node_id in range(len(curies))}, f))
+
+
+########## stage 'walks' ###############
+_walk_graph = None
+
+
+def _load_walk_graph(outpath):
+    ## each worker process memory-maps the adjacency once, rather than getting a copy of the graph
+    global _walk_graph
+    _walk_graph = (np.load(os.path.join(outpath, 'walk_indptr.npy'), mmap_mode='r'),
+                   np.load(os.path.join(outpath, 'walk_indices.npy'), mmap_mode='r'))
+
+
+def _get_chunk_path(outpath, chunk_index):
+    return os.path.join(outpath, 'walks', f"part-{chunk_index:06d}.txt")
+
+
+def generate_walks_for_chunk(args):
+    """
+    Runs the random walks from the chunk's start nodes, all walks of the chunk in step together, and writes the
+    co-occurring (start node, visited node) pairs of each walk to the chunk's part file (self co-occurrences are useless)
+    """
+    outpath, chunk_index, start_nodes, number_of_walks, walk_length, seed = args
+    indptr, indices = _walk_graph
+    start_nodes = np.asarray(start_nodes, dtype=np.int64)
+    degrees = np.asarray(indptr[start_nodes + 1] - indptr[start_nodes])
+    walk_starts = np.repeat(start_nodes[degrees > 0], number_of_walks)
+    rng = np.random.default_rng([seed, chunk_index])
+
+    visited = np.empty((len(walk_starts), walk_length), dtype=np.int64)
+    current_nodes = walk_starts
+    for step in range(walk_length):
+        visited[:, step] = current_nodes
+        if step + 1 < walk_length:
+            offsets = indptr[current_nodes]
+            current_nodes = np.asarray(indices[offsets + (rng.random(len(current_nodes)) * (indptr[current_nodes + 1] - offsets)).astype(np.int64)])
+
+    def write_pairs(f):
+        for start_node, walk in zip(walk_starts, visited):
+            walk = walk[walk != start_node]
+            if len(walk):
+                f.write(''.join(f"{start_node}\t{node}\n" for node in walk.tolist()))
+    _write_atomically(_get_chunk_path(outpath, chunk_index), write_pairs)
+    return chunk_index
+
+
+def generate_walks(outpath, number_of_walks=10, walk_length=100, chunk_size=10000, processes=-1, seed=100):
+    """
+    Generates the random walks from every node of the training subgraph (data-walks.txt), in chunks of start nodes run
+    in parallel. Chunks already written by an earlier (interrupted) run with the same parameters are not run again.
+    """
+    is_validation = np.load(os.path.join(outpath, 'validation_mask.npy'))
+    training_nodes = np.flatnonzero(~is_validation)
+    chunks = [training_nodes[start:start + chunk_size] for start in range(0, len(training_nodes), chunk_size)]
+    os.makedirs(os.path.join(outpath, 'walks'), exist_ok=True)
+
+    ## a chunk written with other parameters can't be reused
+    walk_params_path = os.path.join(outpath, 'walks', 'params.json')
+    walk_params = {'number_of_walks': number_of_walks, 'walk_length': walk_length, 'chunk_size': chunk_size, 'seed': seed,
+                   'graph': _get_file_signature(os.path.join(outpath, 'walk_indices.npy'))}
+    previous_walk_params = None
+    if os.path.exists(walk_params_path):
+        with open(walk_params_path, 'r') as f:
+            previous_walk_params = json.load(f)
+    if previous_walk_params != walk_params:
+        for file_name in os.listdir(os.path.join(outpath, 'walks')):
+            os.remove(os.path.join(outpath, 'walks', file_name))
+        _write_atomically(walk_params_path, lambda f: json.dump(walk_params, f))
+
+    remaining_chunks = [chunk_index for chunk_index in range(len(chunks)) if not os.path.exists(_get_chunk_path(outpath, chunk_index))]
+    print(f"INFO: {len(training_nodes)} training nodes in {len(chunks)} chunks; {len(remaining_chunks)} chunks left to run", flush=True)
+    if remaining_chunks:
+        work = [(outpath, chunk_index, chunks[chunk_index], number_of_walks, walk_length, seed) for chunk_index in remaining_chunks]
+        with multiprocessing.Pool(processes=None if processes == -1 else processes, initializer=_load_walk_graph, initargs=(outpath,)) as executor:
+            for n_done, _ in enumerate(executor.imap_unordered(generate_walks_for_chunk, work), start=1):
+                if n_done % 10 == 0 or n_done == len(work):
+                    print(f"{int(n_done * 100.0 / len(work))}%..", end='', flush=True)
+        print('', flush=True)
+
+    def concatenate_chunks(f):
+        for chunk_index in range(len(chunks)):
+            with open(_get_chunk_path(outpath, chunk_index), 'r') as chunk_file:
+                while True:
+                    data = chunk_file.read(1 << 24)
+                    if not data:
+                        break
+                    f.write(data)
+    _write_atomically(os.path.join(outpath, 'data-walks.txt'), concatenate_chunks)
+
+
+########## stage 'embeddings' ###############
+def save_embeddings(graphsage_output, outpath):
+    """
+    Saves GraphSage's embeddings (val.npy, with the node id of each row in val.txt) as embeddings.npy, whose row i is
+    the embedding of node id i (NaN for nodes GraphSage has no embedding of), and the curie of each row in
+    embedding_curies.txt
+    """
+    embeddings = np.load(os.path.join(graphsage_output, 'val.npy'), mmap_mode='r')
+    with open(os.path.join(graphsage_output, 'val.txt'), 'r') as f:
+        node_ids = np.array([int(line) for line in f if line.strip()], dtype=np.int64)
+    curies, _ = _read_two_column_file(os.path.join(outpath, 'id_map.txt'))
+    if len(node_ids) != embeddings.shape[0]:
+        sys.exit(f"Error Occurred! val.txt has {len(node_ids)} node ids but val.npy has {embeddings.shape[0]} rows.")
+
+    temp_path = os.path.join(outpath, f"embeddings.npy.tmp{os.getpid()}")
+    matrix = np.lib.format.open_memmap(temp_path, mode='w+', dtype=embeddings.dtype, shape=(len(curies), embeddings.shape[1]))
+    matrix[:] = np.nan
+    matrix[node_ids] = embeddings
+    matrix.flush()
+    del matrix
+    os.replace(temp_path, os.path.join(outpath, 'embeddings.npy'))
+    _write_atomically(os.path.join(outpath, 'embedding_curies.txt'), lambda f: f.write(''.join(f"{curie}\n" for curie in curies)))
+    n_missing = len(curies) - len(np.unique(node_ids))
+    if n_missing:
+        print(f"Warning: GraphSage output has no embedding for {n_missing} nodes", flush=True)
+
+
+def load_embeddings(outpath):
+    """Returns the curies and the (memory-mapped) embedding matrix whose rows are their embeddings"""
+    with open(os.path.join(outpath, 'embedding_curies.txt'), 'r') as f:
+        curies = [line.rstrip('\n') for line in f]
+    return curies, np.load(os.path.join(outpath, 'embeddings.npy'), mmap_mode='r')
+
+
+########## stage 'sqlite' ###############
+def build_embedding_database(outpath, database_path):
+    """Builds the GRAPH table (curie and one column per dimension) of the embedding database from embeddings.npy"""
+    curies, matrix = load_embeddings(outpath)
+    temp_path = f"{database_path}.tmp{os.getpid()}"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    conn = sqlite3.connect(temp_path)
+    conn.execute("CREATE TABLE GRAPH(curie VARCHAR(255)" + ''.join(f", col{num} INT" for num in range(1, matrix.shape[1] + 1)) + ")")
+    insert_command = "INSERT INTO GRAPH VALUES (" + ','.join(['?'] * (matrix.shape[1] + 1)) + ")"
+    batch_size = 50000
+    for start in range(0, len(curies), batch_size):
+        rows = matrix[start:start + batch_size]
+        keep = ~np.isnan(rows).any(axis=1)
+        conn.executemany(insert_command, ((curie, *row) for curie, row, kept in zip(curies[start:start + batch_size], rows.tolist(), keep) if kept))
+        print(f"{int(min(start + batch_size, len(curies)) * 100.0 / len(curies))}%..", end='', flush=True)
+    conn.commit()
+    print('', flush=True)
+    conn.execute("CREATE INDEX idx_GRAPH_curie ON GRAPH(curie)")
+    conn.commit()
+    conn.close()
+    os.replace(temp_path, database_path)
+
+
+########## running the pipeline ###############
+def run_pipeline(outpath, stages=STAGES, graph_file=None, node_class_file=None, validation_percent=0.3, seed=100, feature_dim=256,
+                 number_of_walks=10, walk_length=100, chunk_size=10000, processes=-1, graphsage_output=None,
+                 database_path=None, force=False):
+    os.makedirs(outpath, exist_ok=True)
+    if database_path is None:
+        database_path = os.path.join(outpath, 'GRAPH_v1.0.sqlite')
+    for stage in stages:
+        if stage == 'prepare':
+            if graph_file is None or not os.path.exists(graph_file):
+                sys.exit('Error Occurred! Please provide the correct path of your graph file.')
+            inputs = [graph_file] + ([node_class_file] if node_class_file is not None else [])
+            run_stage(outpath, stage, lambda: encode_graph(graph_file, outpath, node_class_file, validation_percent, seed, feature_dim), inputs,
+                      {'validation_percent': validation_percent, 'seed': seed, 'feature_dim': feature_dim},
+                      [os.path.join(outpath, file_name) for file_name in ['id_map.txt', 'validation_mask.npy', 'walk_indptr.npy', 'walk_indices.npy', 'data-G.json']],
+                      force)
+        elif stage == 'walks':
+            run_stage(outpath, stage, lambda: generate_walks(outpath, number_of_walks, walk_length, chunk_size, processes, seed),
+                      [os.path.join(outpath, 'walk_indices.npy')],
+                      {'number_of_walks': number_of_walks, 'walk_length': walk_length, 'chunk_size': chunk_size, 'seed': seed},
+                      [os.path.join(outpath, 'data-walks.txt')], force)
+        elif stage == 'embeddings':
+            if graphsage_output is None or not os.path.exists(os.path.join(graphsage_output, 'val.npy')):
+                sys.exit("Error Occurred! Can't find the val.npy file. Please provide the correct path of graphsage output folder.")
+            run_stage(outpath, stage, lambda: save_embeddings(graphsage_output, outpath),
+                      [os.path.join(graphsage_output, 'val.npy'), os.path.join(graphsage_output, 'val.txt'), os.path.join(outpath, 'id_map.txt')],
+                      {}, [os.path.join(outpath, 'embeddings.npy'), os.path.join(outpath, 'embedding_curies.txt')], force)
+        elif stage == 'sqlite':
+            run_stage(outpath, stage, lambda: build_embedding_database(outpath, database_path),
+                      [os.path.join(outpath, 'embeddings.npy')], {'database_path': database_path}, [database_path], force)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stages", type=str, help="Comma-separated stages to run, in order (default: prepare,walks)", default="prepare,walks")
+    parser.add_argument("--graph", type=str, help="The filename or path of the graph file (.txt)")
+    parser.add_argument("--node_class", type=str, help="The filename or path of the node class label file (.txt)", default=None)
+    parser.add_argument("-s", "--seed", type=int, help="Random seed (default: 100)", default=100)
+    parser.add_argument("-fd", "--feature_dim", type=int, help="The node feature dimension (when there is no node class label file)", default=256)
+    parser.add_argument("-vp", "--validation_percent", type=float, help="The percentage of validation data (default: 0.3)", default=0.3)
+    parser.add_argument("-l", "--walk_length", type=int, help="Random walk length", default=100)
+    parser.add_argument("-r", "--number_of_walks", type=int, help="Number of random walks per node", default=10)
+    parser.add_argument("-b", "--chunk_size", type=int, help="Number of start nodes in each chunk of random walks", default=10000)
+    parser.add_argument("-p", "--process", type=int, help="Number of processes to be used", default=-1)
+    parser.add_argument("--graphsage_output", type=str, help="The full path of graphsage output folder (for the embeddings stage)", default=None)
+    parser.add_argument("--database", type=str, help="The path of the embedding database to build (default: <output>/GRAPH_v1.0.sqlite)", default=None)
+    parser.add_argument("--force", action='store_true', help="Run the stages even if they already completed")
+    parser.add_argument("-o", "--output", type=str, help="The path of output folder", default="./graphsage_input")
+    args = parser.parse_args()
+
+    stages = [stage.strip() for stage in args.stages.split(',') if stage.strip()]
+    unknown_stages = [stage for stage in stages if stage not in STAGES]
+    if unknown_stages:
+        sys.exit(f"Error Occurred! Unknown stages: {unknown_stages}. The stages are: {','.join(STAGES)}")
+    run_pipeline(os.path.realpath(args.output), stages=stages, graph_file=args.graph, node_class_file=args.node_class,
+                 validation_percent=args.validation_percent, seed=args.seed, feature_dim=args.feature_dim, number_of_walks=args.number_of_walks,
+                 walk_length=args.walk_length, chunk_size=args.chunk_size, processes=args.process,
+                 graphsage_output=args.graphsage_output, database_path=args.database, force=args.force)
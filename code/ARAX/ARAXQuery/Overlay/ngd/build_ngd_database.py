@@ -3,32 +3,31 @@
 This class builds a sqlite database that maps (canonicalized) curies to PubMed articles they appear in. It creates these
 mappings using data from a PubMed XML download and from KG2.
 There are two halves to the (full) build process:
-1. Create an intermediary artifact called "conceptname_to_pmids.db"
+1. Create an intermediary artifact called "conceptname_to_pmids.sqlite"
      - Contains mappings from "concept names" to the list of articles (PMIDs) they appear in (where "concept names"
        include MESH Descriptor/Qualifier names, Keywords, and Chemical names)
-     - These mappings are obtained by scraping all of the PubMed XML files (which are automatically downloaded)
+     - These mappings are obtained by scraping all of the PubMed XML files (which are automatically downloaded), in
+       parallel (see pubmed_ingest.py)
      - This file needs updating very infrequently (i.e., only with new PubMed releases)
 2. Create the final file called "curie_to_pmids.sqlite"
      - Contains mappings from canonicalized curies to their list of PMIDs based on the data scraped from Pubmed AND
        from KG2 data (node.publications and edge.publications)
      - The NodeSynonymizer is used to link curies to concept names from step 1
-Usage: python build_ngd_database.py [--test] [--full]
-       By default, only step 2 above will be performed. To do a "full" build, use the --full flag.
+Usage: python build_ngd_database.py [--test] [--full] [--resume] [--processes N]
+       By default, only step 2 above will be performed. To do a "full" build, use the --full flag. If a full build
+       crashes, rerun it with --resume as well to pick up where it left off.
 """
 import argparse
-import gzip
 import json
 import logging
 import os
-import pathlib
 import sqlite3
 import subprocess
 import sys
 import time
 import traceback
-from typing import List, Dict, Set, Union
+from typing import Iterator, List, Dict, Tuple
 
-from lxml import etree
 import pickledb
 from neo4j import GraphDatabase
 
@@ -40,29 +39,34 @@ sys.path.append(os.path.sep.join([*pathlist[:(RTXindex + 1)], 'code', 'ARAX', 'N
 from node_synonymizer import NodeSynonymizer
 sys.path.append(os.path.sep.join([*pathlist[:(RTXindex + 1)], 'code']))  # code directory
 from RTXConfiguration import RTXConfiguration
+sys.path.append(NGD_DIR)
+import pubmed_ingest
 
 
 class NGDDatabaseBuilder:
-    def __init__(self, is_test):
+    def __init__(self, is_test, num_processes=None):
         logging.basicConfig(level=logging.INFO,
                             format='%(asctime)s %(levelname)s: %(message)s',
                             handlers=[logging.FileHandler("ngdbuild.log"),
                                       logging.StreamHandler()])
         self.pubmed_directory_path = f"{NGD_DIR}/pubmed_xml_files"
-        self.conceptname_to_pmids_db_name = "conceptname_to_pmids.db"
+        self.pubmed_partials_directory_path = f"{NGD_DIR}/pubmed_partials"
+        self.conceptname_to_pmids_db_name = "conceptname_to_pmids.sqlite"
         self.conceptname_to_pmids_db_path = f"{NGD_DIR}/{self.conceptname_to_pmids_db_name}"
+        self.legacy_conceptname_to_pmids_db_path = f"{NGD_DIR}/conceptname_to_pmids.db"  # PickleDB made by older builds
         self.curie_to_pmids_db_name = "curie_to_pmids.sqlite"
         self.curie_to_pmids_db_path = f"{NGD_DIR}/{self.curie_to_pmids_db_name}"
+        self.curie_to_pmids_staging_db_path = f"{NGD_DIR}/curie_to_pmids_staging.sqlite"
         self.status = 'OK'
         self.synonymizer = NodeSynonymizer()
         self.is_test = is_test
+        self.num_processes = num_processes
 
-    def build_ngd_database(self, do_full_build: bool):
+    def build_ngd_database(self, do_full_build: bool, resume: bool = False):
         if do_full_build:
-            self.build_conceptname_to_pmids_db()
+            self.build_conceptname_to_pmids_db(resume)
         else:
-            conceptname_to_pmids_db = pathlib.Path(self.conceptname_to_pmids_db_path)
-            if not conceptname_to_pmids_db.exists():
+            if not os.path.exists(self.conceptname_to_pmids_db_path) and not os.path.exists(self.legacy_conceptname_to_pmids_db_path):
                 logging.error(f"You did not specify to do a full build, but the artifact necessary for a partial "
                               f"build ({self.conceptname_to_pmids_db_name}) does not yet exist. Either use --full "
                               f"to do a full build or put your {self.conceptname_to_pmids_db_name} into the right"
@@ -71,19 +75,25 @@ class NGDDatabaseBuilder:
         if self.status == 'OK':
             self.build_curie_to_pmids_db()
 
-    def build_conceptname_to_pmids_db(self):
-        # This function extracts curie -> PMIDs mappings from the latest Pubmed XML files (saves data in a pickle DB)
+    def build_conceptname_to_pmids_db(self, resume: bool = False):
+        # This function extracts concept name -> PMIDs mappings from the latest Pubmed XML files (saves data in sqlite)
         logging.info(f"Starting to build {self.conceptname_to_pmids_db_name} from pubmed files..")
         start = time.time()
-        logging.info(f" Deleting any pre-existing Pubmed files..")
-        subprocess.call(["rm", "-rf", self.pubmed_directory_path])
-        logging.info(f" Downloading latest Pubmed XML files (baseline and update files)..")
-        subprocess.check_call(["wget", "-r", "ftp://ftp.ncbi.nlm.nih.gov/pubmed", "-P", self.pubmed_directory_path])
+        if resume:
+            logging.info(f" Resuming; downloading only Pubmed XML files that are missing or newer than local copies "
+                         f"(files that are downloaded again are scraped again too)..")
+            subprocess.check_call(["wget", "-r", "-N", "ftp://ftp.ncbi.nlm.nih.gov/pubmed", "-P", self.pubmed_directory_path])
+        else:
+            logging.info(f" Deleting any pre-existing Pubmed files and partial scraping results..")
+            subprocess.call(["rm", "-rf", self.pubmed_directory_path, self.pubmed_partials_directory_path])
+            logging.info(f" Downloading latest Pubmed XML files (baseline and update files)..")
+            subprocess.check_call(["wget", "-r", "ftp://ftp.ncbi.nlm.nih.gov/pubmed", "-P", self.pubmed_directory_path])
+        partial_file_paths = []
         for sub_dir_name in ["baseline", "updatefiles"]:
             xml_file_sub_dir = f"{self.pubmed_directory_path}/ftp.ncbi.nlm.nih.gov/pubmed/{sub_dir_name}"
             all_file_names = [os.fsdecode(file) for file in os.listdir(xml_file_sub_dir)]
-            pubmed_file_names = [file_name for file_name in all_file_names if file_name.lower().startswith('pubmed')
-                                 and file_name.lower().endswith('.xml.gz')]
+            pubmed_file_names = sorted(file_name for file_name in all_file_names if file_name.lower().startswith('pubmed')
+                                       and file_name.lower().endswith('.xml.gz'))
 
             # Make sure the files seem to have been downloaded ok
             if not pubmed_file_names:
@@ -97,67 +107,49 @@ class NGDDatabaseBuilder:
                                     f"but it's a little weird.")
 
             logging.info(f" Starting to process {sub_dir_name} PubMed files..")
-            conceptname_to_pmids_map = dict()
-            # Go through each downloaded pubmed file and build our dictionary of mappings
             pubmed_file_names_to_process = pubmed_file_names if not self.is_test else pubmed_file_names[:1]
-            num_skipped_files = 0
-            for file_name in pubmed_file_names_to_process:
-                logging.info(f"  Starting to process file '{file_name}'.. ({pubmed_file_names_to_process.index(file_name) + 1}"
-                             f" of {len(pubmed_file_names_to_process)})")
-                file_start_time = time.time()
-                try:
-                    file_contents_tree = etree.parse(f"{xml_file_sub_dir}/{file_name}")
-                except Exception:
-                    logging.warning(f"File {file_name} threw an exception when trying to do etree.parse() on it!")
-                    num_skipped_files += 1
-                else:
-                    pubmed_articles = file_contents_tree.xpath("//PubmedArticle")
-
-                    for article in pubmed_articles:
-                        # Link each concept name to the PMID of this article
-                        current_pmid = article.xpath(".//MedlineCitation/PMID/text()")[0]
-                        descriptor_names = article.xpath(".//MedlineCitation/MeshHeadingList/MeshHeading/DescriptorName/text()")
-                        qualifier_names = article.xpath(".//MedlineCitation/MeshHeadingList/MeshHeading/QualifierName/text()")
-                        chemical_names = article.xpath(".//MedlineCitation/ChemicalList/Chemical/NameOfSubstance/text()")
-                        gene_symbols = article.xpath(".//MedlineCitation/GeneSymbolList/GeneSymbol/text()")
-                        keywords = article.xpath(".//MedlineCitation/KeywordList/Keyword/text()")
-                        all_concept_names = descriptor_names + qualifier_names + chemical_names + gene_symbols + keywords
-                        unique_concept_names = {concept_name for concept_name in all_concept_names if concept_name}
-                        for concept_name in unique_concept_names:
-                            self._add_pmids_mapping(concept_name, current_pmid, conceptname_to_pmids_map)
-
-                    self._destroy_etree(file_contents_tree)  # Hack around lxml memory leak
-                logging.info(f"    took {round((time.time() - file_start_time) / 60, 2)} minutes")
-            if num_skipped_files:
-                logging.warning(f"Was unable to process {num_skipped_files} of {len(pubmed_file_names_to_process)} "
-                                f"{sub_dir_name} files because they threw an exception on etree.parse()")
-
-        # Save the data to the PickleDB after we're done
-        logging.info("  Loading data into PickleDB..")
-        conceptname_to_pmids_db = pickledb.load(self.conceptname_to_pmids_db_path, False)
-        for concept_name, pmid_list in conceptname_to_pmids_map.items():
-            conceptname_to_pmids_db.set(concept_name, list({self._create_pmid_curie_from_local_id(pmid) for pmid in pmid_list}))
-        logging.info("  Saving PickleDB file..")
-        conceptname_to_pmids_db.dump()
+            pubmed_file_paths = [f"{xml_file_sub_dir}/{file_name}" for file_name in pubmed_file_names_to_process]
+            partials_dir_path = f"{self.pubmed_partials_directory_path}/{sub_dir_name}"
+            failed_file_paths = pubmed_ingest.process_pubmed_files(pubmed_file_paths, partials_dir_path,
+                                                                   num_processes=self.num_processes)
+            if failed_file_paths:
+                logging.warning(f"Was unable to process {len(failed_file_paths)} of {len(pubmed_file_paths)} "
+                                f"{sub_dir_name} files because they threw an exception when parsing them")
+            partial_file_paths += [pubmed_ingest.get_partial_file_path(partials_dir_path, file_path)
+                                   for file_path in pubmed_file_paths if file_path not in failed_file_paths]
+
+        # Merge the per-file results into a sqlite database after we're done
+        logging.info(f"  Merging {len(partial_file_paths)} partial files into {self.conceptname_to_pmids_db_name}..")
+        num_concept_names = pubmed_ingest.save_conceptname_to_pmids_db(partial_file_paths, self.conceptname_to_pmids_db_path)
+        logging.info(f"  Saved PMIDs for {num_concept_names} concept names")
         logging.info(f"Done! Building {self.conceptname_to_pmids_db_name} took {round(((time.time() - start) / 60) / 60, 3)} hours")
 
     def build_curie_to_pmids_db(self):
         # This function creates a final sqlite database of curie->PMIDs mappings using data scraped from Pubmed AND KG2
         logging.info(f"Starting to build {self.curie_to_pmids_db_name}..")
         start = time.time()
-        curie_to_pmids_map = dict()
-        self._add_pmids_from_pubmed_scrape(curie_to_pmids_map)
+        # Mappings from each source are written to a staging table and combined per curie at the end, so that they
+        # never all have to be held in memory
+        if os.path.exists(self.curie_to_pmids_staging_db_path):
+            os.remove(self.curie_to_pmids_staging_db_path)
+        staging_connection = sqlite3.connect(self.curie_to_pmids_staging_db_path)
+        staging_connection.execute("PRAGMA journal_mode = OFF")
+        staging_connection.execute("PRAGMA synchronous = OFF")
+        staging_connection.execute("CREATE TABLE curie_pmids (curie TEXT, pmids TEXT)")
+        self._add_pmids_from_pubmed_scrape(staging_connection)
         if self.status != 'OK':
+            staging_connection.close()
             return
-        self._add_pmids_from_kg2_edges(curie_to_pmids_map)
-        self._add_pmids_from_kg2_nodes(curie_to_pmids_map)
-        logging.info(f"  In the end, found PMID lists for {len(curie_to_pmids_map)} (canonical) curies")
-        self._save_data_in_sqlite_db(curie_to_pmids_map)
+        self._add_pmids_from_kg2_edges(staging_connection)
+        self._add_pmids_from_kg2_nodes(staging_connection)
+        self._save_data_in_sqlite_db(staging_connection)
+        staging_connection.close()
+        os.remove(self.curie_to_pmids_staging_db_path)
         logging.info(f"Done! Building {self.curie_to_pmids_db_name} took {round((time.time() - start) / 60)} minutes.")
 
     # Helper methods
 
-    def _add_pmids_from_kg2_edges(self, curie_to_pmids_map):
+    def _add_pmids_from_kg2_edges(self, staging_connection: sqlite3.Connection):
         logging.info(f"  Getting PMIDs from edges in KG2 neo4j..")
         edge_query = f"match (n)-[e]->(m) where e.publications is not null " \
                      f"return distinct n.id, m.id, e.publications{' limit 100' if self.is_test else ''}"
@@ -165,15 +157,17 @@ class NGDDatabaseBuilder:
         logging.info(f"  Processing results..")
         node_ids = {result['n.id'] for result in edge_results}.union(result['m.id'] for result in edge_results)
         canonicalized_curies_dict = self._get_canonicalized_curies_dict(list(node_ids))
+        rows = []
         for result in edge_results:
             canonicalized_node_ids = {canonicalized_curies_dict[result['n.id']],
                                       canonicalized_curies_dict[result['m.id']]}
             pmids = self._extract_and_format_pmids(result['e.publications'])
             if pmids:  # Sometimes publications list includes only non-PMID identifiers (like ISBN)
                 for canonical_curie in canonicalized_node_ids:
-                    self._add_pmids_mapping(canonical_curie, pmids, curie_to_pmids_map)
+                    rows.append((canonical_curie, self._get_pmids_json(pmids)))
+        self._stage_pmids_mappings(rows, staging_connection)
 
-    def _add_pmids_from_kg2_nodes(self, curie_to_pmids_map):
+    def _add_pmids_from_kg2_nodes(self, staging_connection: sqlite3.Connection):
         logging.info(f"  Getting PMIDs from nodes in KG2 neo4j..")
         node_query = f"match (n) where n.publications is not null " \
                      f"return distinct n.id, n.publications{' limit 100' if self.is_test else ''}"
@@ -181,52 +175,75 @@ class NGDDatabaseBuilder:
         logging.info(f"  Processing results..")
         node_ids = {result['n.id'] for result in node_results}
         canonicalized_curies_dict = self._get_canonicalized_curies_dict(list(node_ids))
+        rows = []
         for result in node_results:
             canonical_curie = canonicalized_curies_dict[result['n.id']]
             pmids = self._extract_and_format_pmids(result['n.publications'])
             if pmids:  # Sometimes publications list includes only non-PMID identifiers (like ISBN)
-                self._add_pmids_mapping(canonical_curie, pmids, curie_to_pmids_map)
+                rows.append((canonical_curie, self._get_pmids_json(pmids)))
+        self._stage_pmids_mappings(rows, staging_connection)
+
+    def _add_pmids_from_pubmed_scrape(self, staging_connection: sqlite3.Connection):
+        # Load the data from the first half of the build process (scraping pubmed), a batch of concept names at a time
+        logging.info(f"  Loading concept names scraped from pubmed ({self.conceptname_to_pmids_db_name})..")
+        num_concept_names = 0
+        num_recognized_concepts = 0
+        num_mapped_curies = 0
+        with open(f"{NGD_DIR}/unrecognized_pubmed_concept_names.txt", "w+") as unrecognized_concepts_file:
+            for conceptname_to_pmids_batch in self._iter_conceptname_to_pmids_batches():
+                # Get canonical curies for this batch of concept names using the NodeSynonymizer
+                concept_names = [concept_name for concept_name, _ in conceptname_to_pmids_batch]
+                num_concept_names += len(concept_names)
+                logging.info(f"  Sending NodeSynonymizer.get_canonical_curies() a batch of {len(concept_names)} concept names..")
+                canonical_curies_dict = self.synonymizer.get_canonical_curies(names=concept_names)
+                if not canonical_curies_dict:
+                    logging.error(f"NodeSynonymizer didn't return anything!")
+                    self.status = 'ERROR'
+                    return
 
-    def _add_pmids_from_pubmed_scrape(self, curie_to_pmids_map):
-        # Load the data from the first half of the build process (scraping pubmed)
-        logging.info(f"  Loading pickle DB containing pubmed scrapings ({self.conceptname_to_pmids_db_name})..")
-        conceptname_to_pmids_db = pickledb.load(self.conceptname_to_pmids_db_path, False)
-        if not conceptname_to_pmids_db.getall():
+                # Map the canonical curie for each recognized concept to the concept's PMID list
+                rows = []
+                for concept_name, pmids in conceptname_to_pmids_batch:
+                    if canonical_curies_dict.get(concept_name):
+                        rows.append((canonical_curies_dict[concept_name].get('preferred_curie'), json.dumps(pmids)))
+                    else:
+                        # Store which concept names the NodeSynonymizer didn't know about, for learning purposes
+                        unrecognized_concepts_file.write(f"{concept_name}\n")
+                num_recognized_concepts += len(rows)
+                num_mapped_curies += self._stage_pmids_mappings(rows, staging_connection)
+
+        if not num_concept_names:
             logging.error(f"{self.conceptname_to_pmids_db_name} must exist in order to do a partial build. Use "
                           f"--full to do a full build or put your {self.conceptname_to_pmids_db_name} into the right"
                           f" place ({self.conceptname_to_pmids_db_path}).")
             self.status = 'ERROR'
             return
+        logging.info(f"  NodeSynonymizer recognized {round((num_recognized_concepts / num_concept_names) * 100)}%"
+                     f" of concept names scraped from pubmed.")
+        logging.info(f"  Unrecognized concept names were written to unrecognized_pubmed_concept_names.txt.")
+        logging.info(f"  Mapped canonical curies to PMIDs for {num_mapped_curies} concept names based on pubmed scrapings.")
+
+    def _iter_conceptname_to_pmids_batches(self) -> Iterator[List[Tuple[str, List[int]]]]:
+        if os.path.exists(self.conceptname_to_pmids_db_path):
+            yield from pubmed_ingest.load_conceptname_to_pmids(self.conceptname_to_pmids_db_path)
+        elif os.path.exists(self.legacy_conceptname_to_pmids_db_path):
+            logging.info(f"  Using PickleDB made by an older build ({self.legacy_conceptname_to_pmids_db_path})..")
+            conceptname_to_pmids_db = pickledb.load(self.legacy_conceptname_to_pmids_db_path, False)
+            conceptname_to_pmids = [(concept_name, sorted(filter(None, {self._get_local_id_as_int(pmid) for pmid in pmids})))
+                                    for concept_name, pmids in conceptname_to_pmids_db.db.items()]
+            for batch_start in range(0, len(conceptname_to_pmids), 100000):
+                yield conceptname_to_pmids[batch_start:batch_start + 100000]
 
-        # Get canonical curies for all of the concept names in our big pubmed pickleDB using the NodeSynonymizer
-        concept_names = list(conceptname_to_pmids_db.getall())
-        logging.info(f"  Sending NodeSynonymizer.get_canonical_curies() a list of {len(concept_names)} concept names..")
-        canonical_curies_dict = self.synonymizer.get_canonical_curies(names=concept_names)
-        logging.info(f"  Got results back from NodeSynonymizer. (Returned dict contains {len(canonical_curies_dict)} keys.)")
-
-        # Map all of the concept names scraped from pubmed to curies
-        if canonical_curies_dict:
-            recognized_concepts = {concept for concept in canonical_curies_dict if canonical_curies_dict.get(concept)}
-            logging.info(f"  NodeSynonymizer recognized {round((len(recognized_concepts) / len(concept_names)) * 100)}%"
-                         f" of concept names scraped from pubmed.")
-            # Store which concept names the NodeSynonymizer didn't know about, for learning purposes
-            unrecognized_concepts = set(canonical_curies_dict).difference(recognized_concepts)
-            with open(f"{NGD_DIR}/unrecognized_pubmed_concept_names.txt", "w+") as unrecognized_concepts_file:
-                unrecognized_concepts_file.write(f"{unrecognized_concepts}")
-            logging.info(f"  Unrecognized concept names were written to unrecognized_pubmed_concept_names.txt.")
-
-            # Map the canonical curie for each recognized concept to the concept's PMID list
-            logging.info(f"  Mapping canonical curies to PMIDs..")
-            for concept_name in recognized_concepts:
-                canonical_curie = canonical_curies_dict[concept_name].get('preferred_curie')
-                pmids_for_this_concept = conceptname_to_pmids_db.get(concept_name)
-                self._add_pmids_mapping(canonical_curie, pmids_for_this_concept, curie_to_pmids_map)
-            logging.info(f"  Mapped {len(curie_to_pmids_map)} canonical curies to PMIDs based on pubmed scrapings.")
-        else:
-            logging.error(f"NodeSynonymizer didn't return anything!")
-            self.status = 'ERROR'
+    @staticmethod
+    def _stage_pmids_mappings(rows: List[Tuple[str, str]], staging_connection: sqlite3.Connection) -> int:
+        staging_connection.executemany("INSERT INTO curie_pmids (curie, pmids) VALUES (?, ?)", rows)
+        staging_connection.commit()
+        return len(rows)
 
-    def _save_data_in_sqlite_db(self, curie_to_pmids_map):
+    def _get_pmids_json(self, pmid_curies: List[str]) -> str:
+        return json.dumps(sorted(filter(None, {self._get_local_id_as_int(pmid) for pmid in pmid_curies})))
+
+    def _save_data_in_sqlite_db(self, staging_connection: sqlite3.Connection):
         logging.info("  Loading data into sqlite database..")
         # Remove any preexisting version of this database
         if os.path.exists(self.curie_to_pmids_db_path):
@@ -234,20 +251,35 @@ class NGDDatabaseBuilder:
         connection = sqlite3.connect(self.curie_to_pmids_db_path)
         cursor = connection.cursor()
         cursor.execute("CREATE TABLE curie_to_pmids (curie TEXT, pmids TEXT)")
+        logging.info(f"  Combining staged PMID lists for each curie and inserting them into the database..")
+        batch = []
+        for curie, pmids in self._iter_combined_staged_pmids(staging_connection):
+            batch.append((curie, json.dumps(pmids)))
+            if len(batch) >= 5000:
+                cursor.executemany(f"INSERT INTO curie_to_pmids (curie, pmids) VALUES (?, ?)", batch)
+                batch = []
+        cursor.executemany(f"INSERT INTO curie_to_pmids (curie, pmids) VALUES (?, ?)", batch)
         cursor.execute("CREATE UNIQUE INDEX unique_curie ON curie_to_pmids (curie)")
-        logging.info(f"  Gathering row data..")
-        rows = [[curie, json.dumps(list(filter(None, {self._get_local_id_as_int(pmid) for pmid in pmids})))]
-                for curie, pmids in curie_to_pmids_map.items()]
-        rows_in_chunks = self._divide_list_into_chunks(rows, 5000)
-        logging.info(f"  Inserting row data into database..")
-        for chunk in rows_in_chunks:
-            cursor.executemany(f"INSERT INTO curie_to_pmids (curie, pmids) VALUES (?, ?)", chunk)
-            connection.commit()
+        connection.commit()
         # Log how many rows we've added in the end (for debugging purposes)
         cursor.execute(f"SELECT COUNT(*) FROM curie_to_pmids")
         count = cursor.fetchone()[0]
         logging.info(f"  Done saving data in sqlite; database contains {count} rows.")
         cursor.close()
+        connection.close()
+
+    @staticmethod
+    def _iter_combined_staged_pmids(staging_connection: sqlite3.Connection) -> Iterator[Tuple[str, List[int]]]:
+        # sqlite sorts the staged rows by curie (on disk if need be), so only one curie's PMIDs are in memory at a time
+        current_curie, current_pmids = None, set()
+        for curie, pmids_json in staging_connection.execute("SELECT curie, pmids FROM curie_pmids ORDER BY curie"):
+            if curie != current_curie:
+                if current_curie is not None:
+                    yield current_curie, sorted(current_pmids)
+                current_curie, current_pmids = curie, set()
+            current_pmids.update(json.loads(pmids_json))
+        if current_curie is not None:
+            yield current_curie, sorted(current_pmids)
 
     def _get_canonicalized_curies_dict(self, curies: List[str]) -> Dict[str, str]:
         logging.info(f"  Sending a batch of {len(curies)} curies to NodeSynonymizer.get_canonical_curies()")
@@ -267,15 +299,6 @@ class NGDDatabaseBuilder:
         formatted_pmids = [self._create_pmid_curie_from_local_id(pmid.replace('PMID', '').replace(':', '')) for pmid in pmids]
         return formatted_pmids
 
-    @staticmethod
-    def _add_pmids_mapping(key: str, value_to_append: Union[str, List[str]], mappings_dict: Dict[str, List[str]]):
-        if key not in mappings_dict:
-            mappings_dict[key] = []
-        if isinstance(value_to_append, list):
-            mappings_dict[key] += value_to_append
-        else:
-            mappings_dict[key].append(value_to_append)
-
     @staticmethod
     def _create_pmid_curie_from_local_id(pmid):
         return f"PMID:{pmid}"
@@ -289,22 +312,6 @@ class NGDDatabaseBuilder:
         stripped_id_str = "".join([character for character in local_id_str if character.isdigit()])
         return int(stripped_id_str) if stripped_id_str else None
 
-    @staticmethod
-    def _destroy_etree(file_contents_tree):
-        # Thank you to https://stackoverflow.com/a/49139904 for this method; important to prevent memory blow-up
-        root = file_contents_tree.getroot()
-        element_tracker = {root: [0, None]}
-        for element in root.iterdescendants():
-            parent = element.getparent()
-            element_tracker[element] = [element_tracker[parent][0] + 1, parent]
-        element_tracker = sorted([(depth, parent, child) for child, (depth, parent)
-                                  in element_tracker.items()], key=lambda x: x[0], reverse=True)
-        for _, parent, child in element_tracker:
-            if parent is None:
-                break
-            parent.remove(child)
-        del file_contents_tree
-
     @staticmethod
     def _run_cypher_query(cypher_query: str) -> List[Dict[str, any]]:
         rtxc = RTXConfiguration()
@@ -324,30 +331,22 @@ class NGDDatabaseBuilder:
         else:
             return query_results
 
-    @staticmethod
-    def _divide_list_into_chunks(input_list: List[any], chunk_size: int) -> List[List[any]]:
-        num_chunks = len(input_list) // chunk_size if len(input_list) % chunk_size == 0 else (len(input_list) // chunk_size) + 1
-        start_index = 0
-        stop_index = chunk_size
-        all_chunks = []
-        for num in range(num_chunks):
-            chunk = input_list[start_index:stop_index] if stop_index <= len(input_list) else input_list[start_index:]
-            all_chunks.append(chunk)
-            start_index += chunk_size
-            stop_index += chunk_size
-        return all_chunks
-
 
 def main():
     # Load command-line arguments
     arg_parser = argparse.ArgumentParser(description="Builds database of curie->PMID mappings needed for NGD")
     arg_parser.add_argument("--full", dest="full", action="store_true", default=False)
     arg_parser.add_argument("--test", dest="test", action="store_true", default=False)
+    arg_parser.add_argument("--resume", dest="resume", action="store_true", default=False,
+                            help="Resume a full build that crashed: keep the downloaded PubMed files (only fetching "
+                                 "newer ones) and skip files that were already scraped")
+    arg_parser.add_argument("--processes", dest="num_processes", type=int, default=None,
+                            help="Number of processes to scrape PubMed files with (default: one per cpu)")
     args = arg_parser.parse_args()
 
     # Build the database(s)
-    database_builder = NGDDatabaseBuilder(args.test)
-    database_builder.build_ngd_database(args.full)
+    database_builder = NGDDatabaseBuilder(args.test, num_processes=args.num_processes)
+    database_builder.build_ngd_database(args.full, resume=args.resume)
 
 
 if __name__ == '__main__':
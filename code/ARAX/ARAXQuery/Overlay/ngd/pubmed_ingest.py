@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Parallel, resumable scraping of PubMed XML files into concept name -> PMIDs mappings (the first half of the NGD
+database build; see build_ngd_database.py).
+Each PubMed file is streamed with lxml's iterparse() in a worker process, and its concept name -> PMIDs mappings are
+written to a sorted, gzipped 'partial' file next to the other partials. A partial is only put into place once it is
+complete, and records the size and modification time of its PubMed file, so a crashed build can be resumed by skipping
+files that already have an up-to-date one. The partials are then combined with a k-way merge (which holds only one line
+per partial in memory, and merges at most MAX_MERGE_FAN_IN files at a time to stay under the open file limit) into a
+sqlite table of concept name -> PMIDs.
+"""
+import gzip
+import heapq
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from multiprocessing import Pool
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from lxml import etree
+
+CONCEPT_NAME_PATHS = ["MeshHeadingList/MeshHeading/DescriptorName",
+                      "MeshHeadingList/MeshHeading/QualifierName",
+                      "ChemicalList/Chemical/NameOfSubstance",
+                      "GeneSymbolList/GeneSymbol",
+                      "KeywordList/Keyword"]
+MAX_MERGE_FAN_IN = 256  # (well under the usual limit of 1024 open files)
+
+
+def get_partial_file_path(partials_dir_path: str, pubmed_file_path: str) -> str:
+    return f"{partials_dir_path}/{os.path.basename(pubmed_file_path)}.tsv.gz"
+
+
+def parse_pubmed_file(pubmed_file_path: str) -> Dict[str, Set[int]]:
+    # Streams through the PubmedArticle elements of one (gzipped) PubMed XML file, linking each concept name to PMIDs
+    conceptname_to_pmids = dict()
+    with gzip.open(pubmed_file_path, "rb") as pubmed_file:
+        for _, article in etree.iterparse(pubmed_file, events=("end",), tag="PubmedArticle"):
+            citation = article.find("MedlineCitation")
+            pmid = citation.findtext("PMID") if citation is not None else None
+            if pmid and pmid.strip().isdigit():
+                concept_names = {element.text for path in CONCEPT_NAME_PATHS
+                                 for element in citation.iterfind(path) if element.text}
+                for concept_name in concept_names:
+                    conceptname_to_pmids.setdefault(concept_name, set()).add(int(pmid))
+            # Free the parsed article (and any already-processed siblings) so memory use stays flat
+            article.clear()
+            while article.getprevious() is not None:
+                del article.getparent()[0]
+    return conceptname_to_pmids
+
+
+def get_source_file_header(pubmed_file_path: str) -> str:
+    # The first line of a partial file: the size and modification time of the PubMed file it was made from
+    file_stat = os.stat(pubmed_file_path)
+    return f"#source\t{file_stat.st_size}\t{file_stat.st_mtime_ns}\n"
+
+
+def is_partial_file_current(partial_file_path: str, pubmed_file_path: str) -> bool:
+    # (a PubMed file that was downloaded again since its partial was made, e.g. by wget -N, must be processed again)
+    if not os.path.exists(partial_file_path):
+        return False
+    with gzip.open(partial_file_path, "rt") as partial_file:
+        return partial_file.readline() == get_source_file_header(pubmed_file_path)
+
+
+def _write_partial_lines(conceptnames_and_pmids: Iterator[Tuple[str, List[int]]], partial_file_path: str,
+                         header: str = ""):
+    # Written to a temporary file first so a partial is all or nothing
+    temp_file_path = f"{partial_file_path}.{os.getpid()}.tmp"
+    with gzip.open(temp_file_path, "wt", compresslevel=3) as partial_file:
+        partial_file.write(header)
+        for concept_name, pmids in conceptnames_and_pmids:
+            partial_file.write(f"{json.dumps(concept_name)}\t{','.join(str(pmid) for pmid in pmids)}\n")
+    os.replace(temp_file_path, partial_file_path)
+
+
+def write_partial_file(conceptname_to_pmids: Dict[str, Set[int]], partial_file_path: str, header: str = ""):
+    # One line per concept name, sorted by concept name (after the header line, if any)
+    _write_partial_lines(((concept_name, sorted(conceptname_to_pmids[concept_name]))
+                          for concept_name in sorted(conceptname_to_pmids)), partial_file_path, header)
+
+
+def read_partial_file(partial_file_path: str) -> Iterator[Tuple[str, List[int]]]:
+    with gzip.open(partial_file_path, "rt") as partial_file:
+        for line in partial_file:
+            if line.startswith("#"):  # (concept names are JSON strings, so they start with a quote)
+                continue
+            concept_name_json, pmids = line.rstrip("\n").split("\t")
+            yield json.loads(concept_name_json), [int(pmid) for pmid in pmids.split(",")]
+
+
+def process_pubmed_file(pubmed_file_path: str, partials_dir_path: str) -> Tuple[str, Optional[str]]:
+    # Worker function: returns the file path and an error message (None if the partial file was written)
+    start = time.time()
+    try:
+        header = get_source_file_header(pubmed_file_path)
+        conceptname_to_pmids = parse_pubmed_file(pubmed_file_path)
+        write_partial_file(conceptname_to_pmids, get_partial_file_path(partials_dir_path, pubmed_file_path), header)
+    except Exception as error:
+        return pubmed_file_path, f"{type(error).__name__}: {error}"
+    logging.info(f"    Processed {os.path.basename(pubmed_file_path)} ({len(conceptname_to_pmids)} concept names) "
+                 f"in {round(time.time() - start)} seconds")
+    return pubmed_file_path, None
+
+
+def process_pubmed_files(pubmed_file_paths: List[str], partials_dir_path: str,
+                         num_processes: Optional[int] = None) -> List[str]:
+    """
+    Writes a partial file for each PubMed file that doesn't already have an up-to-date one, using a pool of
+    num_processes (default: one per cpu). Returns the paths of the files that couldn't be processed.
+    """
+    os.makedirs(partials_dir_path, exist_ok=True)
+    file_paths_to_process = [file_path for file_path in pubmed_file_paths
+                             if not is_partial_file_current(get_partial_file_path(partials_dir_path, file_path), file_path)]
+    num_already_done = len(pubmed_file_paths) - len(file_paths_to_process)
+    if num_already_done:
+        logging.info(f"  Resuming: {num_already_done} of {len(pubmed_file_paths)} PubMed files were already processed")
+    num_processes = num_processes if num_processes else os.cpu_count()
+    logging.info(f"  Processing {len(file_paths_to_process)} PubMed files using {num_processes} processes..")
+    failed_file_paths = []
+    if not file_paths_to_process:
+        return failed_file_paths
+    with Pool(num_processes) as pool:
+        results = pool.starmap(process_pubmed_file, [(file_path, partials_dir_path) for file_path in file_paths_to_process],
+                               chunksize=1)
+    for file_path, error_message in results:
+        if error_message:
+            logging.warning(f"File {os.path.basename(file_path)} threw an exception when parsing it: {error_message}")
+            failed_file_paths.append(file_path)
+    return failed_file_paths
+
+
+def merge_partial_files(partial_file_paths: List[str], max_fan_in: int = MAX_MERGE_FAN_IN) -> Iterator[Tuple[str, List[int]]]:
+    """
+    Yields each concept name in the sorted partial files once, with all of its PMIDs (sorted). If there are more than
+    max_fan_in files, groups of them are first merged into temporary partial files (next to the first one), so that
+    no more than max_fan_in files are ever open at once.
+    """
+    temp_dir_path = None
+    num_merged_files = 0
+    try:
+        while len(partial_file_paths) > max_fan_in:
+            if temp_dir_path is None:
+                temp_dir_path = tempfile.mkdtemp(prefix="merged_partials_", dir=os.path.dirname(os.path.abspath(partial_file_paths[0])))
+            logging.info(f"  Merging {len(partial_file_paths)} partial files in groups of {max_fan_in}..")
+            merged_file_paths = []
+            for group_start in range(0, len(partial_file_paths), max_fan_in):
+                merged_file_path = f"{temp_dir_path}/{num_merged_files}.tsv.gz"
+                num_merged_files += 1
+                _write_partial_lines(_merge_sorted_partial_files(partial_file_paths[group_start:group_start + max_fan_in]),
+                                     merged_file_path)
+                merged_file_paths.append(merged_file_path)
+            # (the temporary files merged in this pass aren't needed anymore)
+            for file_path in partial_file_paths:
+                if os.path.dirname(file_path) == temp_dir_path:
+                    os.remove(file_path)
+            partial_file_paths = merged_file_paths
+        yield from _merge_sorted_partial_files(partial_file_paths)
+    finally:
+        if temp_dir_path is not None:
+            shutil.rmtree(temp_dir_path, ignore_errors=True)
+
+
+def _merge_sorted_partial_files(partial_file_paths: List[str]) -> Iterator[Tuple[str, List[int]]]:
+    # k-way merge of the sorted partial files; yields each concept name once, with all of its PMIDs (sorted)
+    merged_lines = heapq.merge(*[read_partial_file(file_path) for file_path in partial_file_paths],
+                               key=lambda concept_name_and_pmids: concept_name_and_pmids[0])
+    current_concept_name, current_pmids = None, set()
+    for concept_name, pmids in merged_lines:
+        if concept_name != current_concept_name:
+            if current_concept_name is not None:
+                yield current_concept_name, sorted(current_pmids)
+            current_concept_name, current_pmids = concept_name, set()
+        current_pmids.update(pmids)
+    if current_concept_name is not None:
+        yield current_concept_name, sorted(current_pmids)
+
+
+def save_conceptname_to_pmids_db(partial_file_paths: List[str], db_path: str, batch_size: int = 10000) -> int:
+    """
+    Merges the partial files into a sqlite database with a conceptname_to_pmids (concept_name, pmids) table, where
+    pmids is a JSON list of integer PMIDs. Returns the number of concept names saved.
+    """
+    temp_db_path = f"{db_path}.tmp"
+    if os.path.exists(temp_db_path):
+        os.remove(temp_db_path)
+    connection = sqlite3.connect(temp_db_path)
+    connection.execute("PRAGMA journal_mode = OFF")
+    connection.execute("PRAGMA synchronous = OFF")
+    connection.execute("CREATE TABLE conceptname_to_pmids (concept_name TEXT PRIMARY KEY, pmids TEXT)")
+    num_concept_names = 0
+    batch = []
+    for concept_name, pmids in merge_partial_files(partial_file_paths):
+        batch.append((concept_name, json.dumps(pmids)))
+        if len(batch) >= batch_size:
+            connection.executemany("INSERT INTO conceptname_to_pmids (concept_name, pmids) VALUES (?, ?)", batch)
+            num_concept_names += len(batch)
+            batch = []
+    connection.executemany("INSERT INTO conceptname_to_pmids (concept_name, pmids) VALUES (?, ?)", batch)
+    num_concept_names += len(batch)
+    connection.commit()
+    connection.close()
+    os.replace(temp_db_path, db_path)
+    return num_concept_names
+
+
+def load_conceptname_to_pmids(db_path: str, batch_size: int = 100000) -> Iterator[List[Tuple[str, List[int]]]]:
+    # Yields the (concept name, PMIDs) rows of a database made by save_conceptname_to_pmids_db(), in batches
+    connection = sqlite3.connect(db_path)
+    cursor = connection.execute("SELECT concept_name, pmids FROM conceptname_to_pmids")
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        yield [(concept_name, json.loads(pmids)) for concept_name, pmids in rows]
+    connection.close()
@@ -149,6 +149,66 @@ class PredictDrugTreatsDisease:
 
         return curies_in_model
 
+    def convert_all_to_trained_curies(self, input_curies):
+        """
+        Like convert_to_trained_curies, for many input curies with one call of the synonymizer (unknown curies map to None)
+        """
+        if len(input_curies) == 0:
+            return dict()
+        return self.synonymizer.get_canonical_curies(curies=list(input_curies), return_all_categories=True)
+
+    @staticmethod
+    def _has_type(normalizer_result, label_list):
+        if normalizer_result is None:
+            return False
+        all_types = [item.replace('biolink:','').replace('_','').lower() for item in list(normalizer_result['all_categories'].keys())]
+        return len(set(label_list).intersection(set(all_types))) > 0
+
+    def get_treat_probabilities(self, drug_disease_pairs):
+        """
+        Gets the probabilities of all the (drug, disease) pairs of trained curies at once (see predictor.get_treat_probs)
+        :return: a dict of the probability of each pair, None if there is none
+        """
+        count, probabilities = self.pred.get_treat_probs(list(set(drug_disease_pairs)))
+        if count != 0:
+            if count == 1:
+                self.response.warning(f"Total {count} curie was not found from DTD database")
+            else:
+                self.response.warning(f"Total {count} curie were not found from DTD database")
+        return probabilities
+
+    def get_virtual_edge_probabilities(self, source_curies, target_curies):
+        """
+        Gets the probabilities of all pairs of the source and target nodes at once, for the virtual edges between them
+        :return: a dict of the probability of each (source, target) pair that has one of at least the threshold
+        """
+        normalizer_results = self.convert_all_to_trained_curies(set(source_curies).union(target_curies))
+        pair_drug_disease = dict()
+        for (source_curie, target_curie) in itertools.product(source_curies, target_curies):
+            converted_source_curie = normalizer_results.get(source_curie)
+            converted_target_curie = normalizer_results.get(target_curie)
+            if converted_source_curie is None or converted_target_curie is None:
+                continue
+            if self.use_prob_db is True:
+                # the source may be the drug or the disease
+                if self._has_type(converted_source_curie, self.drug_ancestor_label_list):
+                    if self._has_type(converted_target_curie, self.disease_ancestor_label_list):
+                        pair_drug_disease[(source_curie, target_curie)] = (converted_source_curie['preferred_curie'], converted_target_curie['preferred_curie'])
+                elif self._has_type(converted_source_curie, self.disease_ancestor_label_list):
+                    if self._has_type(converted_target_curie, self.drug_ancestor_label_list):
+                        pair_drug_disease[(source_curie, target_curie)] = (converted_target_curie['preferred_curie'], converted_source_curie['preferred_curie'])
+            else:
+                # *The types of input nodes are not checked here #issue1240
+                pair_drug_disease[(source_curie, target_curie)] = (converted_source_curie['preferred_curie'], converted_target_curie['preferred_curie'])
+
+        treat_probabilities = self.get_treat_probabilities(pair_drug_disease.values())
+        probabilities = dict()
+        for pair, drug_disease in pair_drug_disease.items():
+            probability = treat_probabilities[drug_disease]
+            if probability is not None and np.isfinite(probability) and probability >= self.threshold:
+                probabilities[pair] = probability
+        return probabilities
+
     def predict_drug_treats_disease(self):
         """
         Iterate over all the edges in the knowledge graph, add the drug-disease treatment probability for appropriate edges
@@ -200,93 +260,14 @@ class PredictDrugTreatsDisease:
                                 curie_to_name[node_key] = node.name
 
                     added_flag = False  # check to see if any edges where added
+                    # get the probabilities of all pairs of these nodes at once
+                    probabilities = self.get_virtual_edge_probabilities(source_curies_to_decorate, target_curies_to_decorate)
                     # iterate over all pairs of these nodes, add the virtual edge, decorate with the correct attribute
 
                     for (source_curie, target_curie) in itertools.product(source_curies_to_decorate, target_curies_to_decorate):
                         # self.response.debug(f"Predicting probability that {curie_to_name[source_curie]} treats {curie_to_name[target_curie]}")
                         # create the edge attribute if it can be
-                        # loop over all equivalent curies and take the highest probability
-
-                        max_probability = 0
-                        if self.use_prob_db is True:
-
-                            converted_source_curie = self.convert_to_trained_curies(source_curie)
-                            if converted_source_curie is None:
-                                continue
-                            else:
-                                all_types = [item.replace('biolink:','').replace('_','').lower() for item in list(converted_source_curie['all_categories'].keys())]
-                                if (len(set(self.drug_ancestor_label_list).intersection(set(all_types))) > 0):
-                                    converted_source_curie = converted_source_curie['preferred_curie']
-                                    converted_target_curie = self.convert_to_trained_curies(target_curie)
-                                    if converted_target_curie is None:
-                                        continue
-                                    else:
-                                        all_types = [item.replace('biolink:','').replace('_','').lower() for item in list(converted_target_curie['all_categories'].keys())]
-                                        if (len(set(self.disease_ancestor_label_list).intersection(set(all_types))) > 0):
-                                            converted_target_curie = converted_target_curie['preferred_curie']
-                                        else:
-                                            continue
-                                elif (len(set(self.disease_ancestor_label_list).intersection(set(all_types))) > 0):
-                                    converted_target_curie = converted_source_curie['preferred_curie']
-                                    converted_source_curie = self.convert_to_trained_curies(target_curie)
-                                    if converted_source_curie is None:
-                                        continue
-                                    else:
-                                        all_types = [item.replace('biolink:','').replace('_','').lower() for item in list(converted_source_curie['all_categories'].keys())]
-                                        if (len(set(self.drug_ancestor_label_list).intersection(set(all_types))) > 0):
-                                            converted_source_curie = converted_source_curie['preferred_curie']
-                                        else:
-                                            continue
-                                else:
-                                    continue
-
-                            probability = self.pred.get_prob_from_DTD_db(converted_source_curie, converted_target_curie)
-
-                            if probability is not None:
-                                if np.isfinite(probability) and probability >= self.threshold:
-                                    max_probability = probability
-
-                        else:
-
-                            converted_source_curie = self.convert_to_trained_curies(source_curie)
-                            if converted_source_curie is None:
-                                continue
-                            else:
-                                # *The code below was commented because we don't need to check the type of input nodes #issue1240
-                                # preferred_type = converted_source_curie['preferred_type']
-                                # if preferred_type == "drug" or preferred_type == "chemical_substance" or preferred_type == "biolink:Drug" or preferred_type == "biolink:ChemicalSubstance":
-                                converted_source_curie = converted_source_curie['preferred_curie']
-                                # else:
-                                #     continue
-                            converted_target_curie = self.convert_to_trained_curies(target_curie)
-                            if converted_target_curie is None:
-                                continue
-                            else:
-                                # *The code below was commented because we don't need to check the type of input nodes #issue1240
-                                # preferred_type = converted_target_curie['preferred_type']
-                                # if preferred_type == "disease" or preferred_type == "phenotypic_feature" or preferred_type == "biolink:Disease" or preferred_type == "biolink:PhenotypicFeature":
-                                converted_target_curie = converted_target_curie['preferred_curie']
-                                # else:
-                                #     continue
-
-                            count, probability = self.pred.prob_single(converted_source_curie, converted_target_curie)
-
-                            if count != 0:
-                                if count == 1:
-                                    self.response.warning(f"Total {count} curie was not found from DTD database")
-                                else:
-                                    self.response.warning(f"Total {count} curie were not found from DTD database")
-
-                            if probability is not None:
-                                probability = probability[0]
-                                if np.isfinite(probability) and probability >= self.threshold:
-                                    max_probability = probability
-                        # if len(res) != 0:
-                        #     all_probabilities = self.pred.prob_all(res)
-                        #     if isinstance(all_probabilities, list):
-                        #         max_probability = max([value for value in all_probabilities if np.isfinite(value)])
-
-                        value = max_probability
+                        value = probabilities.get((source_curie, target_curie), 0)
 
                         #probability = self.pred.prob_single('ChEMBL:' + source_curie[22:], target_curie)  # FIXME: when this was trained, it was ChEMBL:123, not CHEMBL.COMPOUND:CHEMBL123
                         #if probability and np.isfinite(probability):  # finite, that's ok, otherwise, stay with default
@@ -365,93 +346,14 @@ class PredictDrugTreatsDisease:
                         curie_to_name[node_key] = node.name
 
             added_flag = False  # check to see if any edges where added
+            # get the probabilities of all pairs of these nodes at once
+            probabilities = self.get_virtual_edge_probabilities(source_curies_to_decorate, target_curies_to_decorate)
             # iterate over all pairs of these nodes, add the virtual edge, decorate with the correct attribute
 
             for (source_curie, target_curie) in itertools.product(source_curies_to_decorate, target_curies_to_decorate):
                 # self.response.debug(f"Predicting probability that {curie_to_name[source_curie]} treats {curie_to_name[target_curie]}")
                 # create the edge attribute if it can be
-                # loop over all equivalent curies and take the highest probability
-
-                max_probability = 0
-                if self.use_prob_db is True:
-
-                    converted_source_curie = self.convert_to_trained_curies(source_curie)
-                    if converted_source_curie is None:
-                        continue
-                    else:
-                        all_types = [item.replace('biolink:','').replace('_','').lower() for item in list(converted_source_curie['all_categories'].keys())]
-                        if (len(set(self.drug_ancestor_label_list).intersection(set(all_types))) > 0):
-                            converted_source_curie = converted_source_curie['preferred_curie']
-                            converted_target_curie = self.convert_to_trained_curies(target_curie)
-                            if converted_target_curie is None:
-                                continue
-                            else:
-                                all_types = [item.replace('biolink:','').replace('_','').lower() for item in list(converted_target_curie['all_categories'].keys())]
-                                if (len(set(self.disease_ancestor_label_list).intersection(set(all_types))) > 0):
-                                    converted_target_curie = converted_target_curie['preferred_curie']
-                                else:
-                                    continue
-                        elif (len(set(self.disease_ancestor_label_list).intersection(set(all_types))) > 0):
-                            converted_target_curie = converted_source_curie['preferred_curie']
-                            converted_source_curie = self.convert_to_trained_curies(target_curie)
-                            if converted_source_curie is None:
-                                continue
-                            else:
-                                all_types = [item.replace('biolink:','').replace('_','').lower() for item in list(converted_source_curie['all_categories'].keys())]
-                                if (len(set(self.drug_ancestor_label_list).intersection(set(all_types))) > 0):
-                                    converted_source_curie = converted_source_curie['preferred_curie']
-                                else:
-                                    continue
-                        else:
-                            continue
-
-                    probability = self.pred.get_prob_from_DTD_db(converted_source_curie, converted_target_curie)
-
-                    if probability is not None:
-                        if np.isfinite(probability) and probability >= self.threshold:
-                            max_probability = probability
-
-                else:
-
-                    converted_source_curie = self.convert_to_trained_curies(source_curie)
-                    if converted_source_curie is None:
-                        continue
-                    else:
-                        # *The code below was commented because we don't need to check the type of input nodes #issue1240
-                        # preferred_type = converted_source_curie['preferred_type']
-                        # if preferred_type == "drug" or preferred_type == "chemical_substance" or preferred_type == "biolink:Drug" or preferred_type == "biolink:ChemicalSubstance":
-                        converted_source_curie = converted_source_curie['preferred_curie']
-                        # else:
-                        #     continue
-                    converted_target_curie = self.convert_to_trained_curies(target_curie)
-                    if converted_target_curie is None:
-                        continue
-                    else:
-                        # *The code below was commented because we don't need to check the type of input nodes #issue1240
-                        # preferred_type = converted_target_curie['preferred_type']
-                        # if preferred_type == "disease" or preferred_type == "phenotypic_feature" or preferred_type == "biolink:Disease" or preferred_type == "biolink:PhenotypicFeature":
-                        converted_target_curie = converted_target_curie['preferred_curie']
-                        # else:
-                        #     continue
-
-                    count, probability = self.pred.prob_single(converted_source_curie, converted_target_curie)
-
-                    if count != 0:
-                        if count == 1:
-                            self.response.warning(f"Total {count} curie was not found from DTD database")
-                        else:
-                            self.response.warning(f"Total {count} curie were not found from DTD database")
-
-                    if probability is not None:
-                        probability = probability[0]
-                        if np.isfinite(probability) and probability >= self.threshold:
-                            max_probability = probability
-                # if len(res) != 0:
-                #     all_probabilities = self.pred.prob_all(res)
-                #     if isinstance(all_probabilities, list):
-                #         max_probability = max([value for value in all_probabilities if np.isfinite(value)])
-
-                value = max_probability
+                value = probabilities.get((source_curie, target_curie), 0)
 
                 #probability = self.pred.prob_single('ChEMBL:' + source_curie[22:], target_curie)  # FIXME: when this was trained, it was ChEMBL:123, not CHEMBL.COMPOUND:CHEMBL123
                 #if probability and np.isfinite(probability):  # finite, that's ok, otherwise, stay with default
@@ -519,121 +421,44 @@ class PredictDrugTreatsDisease:
                 for node_key, node in self.message.knowledge_graph.nodes.items():
                     curie_to_type[node_key] = node.categories
                     curie_to_name[node_key] = node.name
-                # then iterate over the edges and decorate if appropriate
+                # first find the drug-disease edges (in either direction), as (drug, disease) node pairs
+                edge_drug_disease_curies = dict()
                 for edge_key, edge in self.message.knowledge_graph.edges.items():
                     # Make sure the edge_attributes are not None
                     if not edge.attributes:
                         edge.attributes = []  # should be an array, but why not a list?
-                    # now go and actually get the probability
                     source_curie = edge.subject
                     target_curie = edge.object
                     source_types = [item.replace('biolink:','').replace('_','').lower() for item in curie_to_type[source_curie]]
                     target_types = [item.replace('biolink:','').replace('_','').lower() for item in curie_to_type[target_curie]]
 
                     if len(set(source_types).intersection(set(self.drug_ancestor_label_list))) > 0 and len(set(target_types).intersection(set(self.disease_ancestor_label_list))) > 0:
-                        # loop over all pairs of equivalent curies and take the highest probability
-                        # self.response.debug(f"Predicting treatment probability between {curie_to_name[source_curie]} and {curie_to_name[target_curie]}")
-                        max_probability = 0
-                        converted_source_curie = self.convert_to_trained_curies(source_curie)
-                        if converted_source_curie is None:
-                            continue
-                        else:
-                            all_types = [item.replace('biolink:','').replace('_','').lower() for item in list(converted_source_curie['all_categories'].keys())]
-                            if (len(set(self.drug_ancestor_label_list).intersection(set(all_types))) > 0):
-                                converted_source_curie = converted_source_curie['preferred_curie']
-                            else:
-                                continue
-                        converted_target_curie = self.convert_to_trained_curies(target_curie)
-                        if converted_target_curie is None:
-                            continue
-                        else:
-                            all_types = [item.replace('biolink:','').replace('_','').lower() for item in list(converted_target_curie['all_categories'].keys())]
-                            if (len(set(self.disease_ancestor_label_list).intersection(set(all_types))) > 0):
-                                converted_target_curie = converted_target_curie['preferred_curie']
-                            else:
-                                continue
-                        if self.use_prob_db is True:
-                            probability = self.pred.get_prob_from_DTD_db(converted_source_curie, converted_target_curie)
-                            if probability is not None:
-                                if np.isfinite(probability):
-                                    max_probability = probability
-                        else:
-                            count, probability = self.pred.prob_single(converted_source_curie, converted_target_curie)
-
-                            if count != 0:
-                                if count == 1:
-                                    self.response.warning(f"Total {count} curie was not found from DTD database")
-                                else:
-                                    self.response.warning(f"Total {count} curie were not found from DTD database")
-
-                            if probability is not None:
-                                probability = probability[0]
-                                if np.isfinite(probability) and probability >= self.threshold:
-                                    max_probability = probability
-                        # res = list(itertools.product(converted_source_curie, converted_target_curie))
-                        # if len(res) != 0:
-                        #     all_probabilities = self.pred.prob_all(res)
-                        #     if isinstance(all_probabilities, list):
-                        #         max_probability = max([value for value in all_probabilities if np.isfinite(value)])
-
-                        value = max_probability
-
+                        edge_drug_disease_curies[edge_key] = (source_curie, target_curie)
                     elif len(set(target_types).intersection(set(self.drug_ancestor_label_list))) > 0 and len(set(source_types).intersection(set(self.disease_ancestor_label_list))) > 0:
-                        #probability = self.pred.prob_single('ChEMBL:' + target_curie[22:], source_curie)  # FIXME: when this was trained, it was ChEMBL:123, not CHEMBL.COMPOUND:CHEMBL123
-                        #if probability and np.isfinite(probability):  # finite, that's ok, otherwise, stay with default
-                        #    value = probability[0]
-                        # self.response.debug(f"Predicting treatment probability between {curie_to_name[source_curie]} and {curie_to_name[target_curie]}")
-                        max_probability = 0
-                        converted_source_curie = self.convert_to_trained_curies(source_curie)
-                        if converted_source_curie is None:
-                            continue
-                        else:
-                            all_types = [item.replace('biolink:','').replace('_','').lower() for item in list(converted_source_curie['all_categories'].keys())]
-                            if (len(set(self.disease_ancestor_label_list).intersection(set(all_types))) > 0):
-                                converted_source_curie = converted_source_curie['preferred_curie']
-                            else:
-                                continue
-                        converted_target_curie = self.convert_to_trained_curies(target_curie)
-                        if converted_target_curie is None:
-                            continue
-                        else:
-                            all_types = [item.replace('biolink:','').replace('_','').lower() for item in list(converted_target_curie['all_categories'].keys())]
-                            if (len(set(self.drug_ancestor_label_list).intersection(set(all_types))) > 0):
-                                converted_target_curie = converted_target_curie['preferred_curie']
-                            else:
-                                continue
-
-                        if self.use_prob_db is True:
-                            probability = self.pred.get_prob_from_DTD_db(converted_target_curie, converted_source_curie)
-                            if probability is not None:
-                                if np.isfinite(probability):
-                                    max_probability = probability
-                        else:
-                            count, probability = self.pred.prob_single(converted_target_curie, converted_source_curie)
-
-                            if count != 0:
-                                if count == 1:
-                                    self.response.warning(f"Total {count} curie was not found from DTD database")
-                                else:
-                                    self.response.warning(f"Total {count} curie were not found from DTD database")
-
-                            if probability is not None:
-                                probability = probability[0]
-                                if np.isfinite(probability) and probability >= self.threshold:
-                                    max_probability = probability
-                        # res = list(itertools.product(converted_target_curie, converted_source_curie))
-                        # if len(res) != 0:
-                        #     all_probabilities = self.pred.prob_all(res)
-                        #     if isinstance(all_probabilities, list):
-                        #         max_probability = max([value for value in all_probabilities if np.isfinite(value)])
-
-                        value = max_probability
-
-                    else:
-                        continue
+                        edge_drug_disease_curies[edge_key] = (target_curie, source_curie)
+
+                # then convert all their nodes to the trained curies at once, keeping the pairs whose converted drug
+                # and disease still have drug and disease types, and get all their probabilities at once
+                normalizer_results = self.convert_all_to_trained_curies({curie for pair in edge_drug_disease_curies.values() for curie in pair})
+                edge_drug_disease = dict()
+                for edge_key, (drug_curie, disease_curie) in edge_drug_disease_curies.items():
+                    converted_drug_curie = normalizer_results.get(drug_curie)
+                    converted_disease_curie = normalizer_results.get(disease_curie)
+                    if self._has_type(converted_drug_curie, self.drug_ancestor_label_list) and self._has_type(converted_disease_curie, self.disease_ancestor_label_list):
+                        edge_drug_disease[edge_key] = (converted_drug_curie['preferred_curie'], converted_disease_curie['preferred_curie'])
+                probabilities = self.get_treat_probabilities(edge_drug_disease.values())
+
+                # then decorate the edges
+                for edge_key, drug_disease in edge_drug_disease.items():
+                    probability = probabilities[drug_disease]
+                    value = 0
+                    if probability is not None and np.isfinite(probability):
+                        # (here the threshold is only applied to the model's probabilities)
+                        if self.use_prob_db is True or probability >= self.threshold:
+                            value = probability
                     if value != 0:
                         edge_attribute = EdgeAttribute(attribute_type_id=attribute_type, original_attribute_name=attribute_name, value=str(value), value_url=url)  # populate the attribute
-                        edge.attributes.append(edge_attribute)  # append it to the list of attributes
+                        self.message.knowledge_graph.edges[edge_key].attributes.append(edge_attribute)  # append it to the list of attributes
             except:
                 tb = traceback.format_exc()
                 error_type, error, _ = sys.exc_info()
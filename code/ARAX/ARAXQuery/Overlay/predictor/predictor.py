@@ -2,13 +2,10 @@ import os
 import pandas as pd
 import numpy as np
 import sqlite3
-try:
-    from sklearn.externals import joblib
-except:
-    try:
-        from sklearn.utils import _joblib as joblib
-    except:
-        import joblib
+import functools
+import json
+import threading
+from collections import OrderedDict
 
 
 import sys
@@ -18,6 +15,26 @@ sys.path.append(os.path.sep.join([*pathlist[:(RTXindex + 1)], 'code']))
 from RTXConfiguration import RTXConfiguration
 RTXConfig = RTXConfiguration()
 
+#### Per-process LRU cache of the treat probabilities of recent (drug, disease) pairs, from the DTD database or the
+#### model, so that the same pairs coming up again (e.g. in the next query about a disease) are not looked up again.
+#### Keyed by the files the probabilities come from (with their inodes, so that a refreshed file is not served stale)
+PAIR_PROBABILITY_CACHE_SIZE = 200000
+_pair_probabilities_lock = threading.Lock()
+_pair_probabilities = OrderedDict()
+
+
+@functools.lru_cache(maxsize=None)
+def load_model(model_file):
+    """Loads a pickled model, only once per process (sklearn/joblib are only imported then)"""
+    try:
+        from sklearn.externals import joblib
+    except:
+        try:
+            from sklearn.utils import _joblib as joblib
+        except:
+            import joblib
+    return joblib.load(model_file)
+
 
 class predictor():
     def __init__(self, DTD_prob_file=os.path.sep.join([*pathlist[:(RTXindex + 1)], 'code', 'ARAX', 'KnowledgeSources', 'Prediction', RTXConfig.dtd_prob_path.split('/')[-1]]), model_file=os.path.sep.join([*pathlist[:(RTXindex + 1)], 'code', 'ARAX', 'KnowledgeSources', 'Prediction', RTXConfig.log_model_path.split('/')[-1]]), use_prob_db=True, live = None):
@@ -25,13 +42,22 @@ class predictor():
             model_file = os.path.sep.join([*pathlist[:(RTXindex + 1)], 'code', 'ARAX', 'KnowledgeSources', 'Prediction', RTXConfig.log_model_path.split('/')[-1]])
             DTD_prob_file = os.path.sep.join([*pathlist[:(RTXindex + 1)], 'code', 'ARAX', 'KnowledgeSources', 'Prediction', RTXConfig.dtd_prob_path.split('/')[-1]])
         self.use_prob_db = use_prob_db
+        self.DTD_prob_file = DTD_prob_file
+        self.graph_database = None
         if self.use_prob_db is True:
             self.connection = sqlite3.connect(DTD_prob_file)
         else:
-            self.model = joblib.load(model_file)
+            #### The model itself is loaded when it's first used (see the model property)
+            if not os.path.exists(model_file):
+                raise FileNotFoundError(f"Model file {model_file} not found")
+            self.model_file = model_file
             self.graph_cur = None
             self.X = None
 
+    @property
+    def model(self):
+        return load_model(self.model_file)
+
     def prob(self, X):
         """
         Predicts the probability of feature vectors being of each class
@@ -83,6 +109,7 @@ class predictor():
         if self.use_prob_db is not True:
             conn = sqlite3.connect(graph_database)
             self.graph_cur = conn.cursor()
+            self.graph_database = graph_database
 
             if file is not None:
                 data = pd.read_csv(file, index_col=None)
@@ -328,6 +355,84 @@ class predictor():
             else:
                 return res[2]
 
+    def get_treat_probs(self, drug_disease_pairs):
+        """
+        Gets the treat probabilities of many (drug, disease) pairs of canonical curies at once: recently seen pairs come
+        from the per-process cache, and the others with one query of the DTD probability database (or, when not using
+        it, one query of the graph database for their feature vectors and one call of the model)
+
+        :param drug_disease_pairs: A list of tuples of the curie ids of the drug and the disease
+        return the number of curies not found in the graph database (summed over the pairs, as prob_single counts them;
+        always 0 with the DTD probability database), and a dict of the probability of each pair (None if there is none)
+        """
+        cache_source = self._get_cache_source()
+        results = dict()
+        missing_pairs = []
+        with _pair_probabilities_lock:
+            for pair in set(drug_disease_pairs):
+                key = (cache_source, *pair)
+                if key in _pair_probabilities:
+                    _pair_probabilities.move_to_end(key)
+                    results[pair] = _pair_probabilities[key]
+                else:
+                    missing_pairs.append(pair)
+
+        if len(missing_pairs) != 0:
+            if self.use_prob_db is True:
+                new_results = self._get_probs_from_DTD_db_for_pairs(missing_pairs)
+            else:
+                new_results = self._prob_pairs(missing_pairs)
+            results.update(new_results)
+            with _pair_probabilities_lock:
+                for pair, result in new_results.items():
+                    _pair_probabilities[(cache_source, *pair)] = result
+                while len(_pair_probabilities) > PAIR_PROBABILITY_CACHE_SIZE:
+                    _pair_probabilities.popitem(last=False)
+
+        count = sum(results[pair][1] for pair in drug_disease_pairs)
+        return [count, {pair: probability for pair, (probability, _) in results.items()}]
+
+    def _get_cache_source(self):
+        if self.use_prob_db is True:
+            files = [self.DTD_prob_file]
+        else:
+            files = [self.model_file, self.graph_database]
+        return tuple((file, os.stat(file).st_ino if file is not None and os.path.exists(file) else None) for file in files)
+
+    def _get_probs_from_DTD_db_for_pairs(self, drug_disease_pairs):
+        """Looks the pairs up in the DTD probability database with one join (using its disease index)"""
+        rows = self.connection.execute("SELECT P.drug, P.disease, P.probability FROM json_each(?) AS J "
+                                       "JOIN DTD_PROBABILITY AS P ON P.disease = json_extract(J.value, '$[1]') AND P.drug = json_extract(J.value, '$[0]')",
+                                       (json.dumps(drug_disease_pairs),)).fetchall()
+        results = {pair: (None, 0) for pair in drug_disease_pairs}
+        for drug, disease, probability in rows:
+            #### As in get_prob_from_DTD_db, the first row of a pair is used
+            if results[(drug, disease)][0] is None:
+                results[(drug, disease)] = (probability, 0)
+        return results
+
+    def _prob_pairs(self, drug_disease_pairs):
+        """Gets the feature vectors of all the pairs' curies with one query, and runs the model on them all at once"""
+        if self.graph_cur is None:
+            self.import_file(None)
+        curies = list({curie for pair in drug_disease_pairs for curie in pair})
+        features = dict()
+        for row in self.graph_cur.execute("SELECT * FROM GRAPH WHERE curie IN (SELECT value FROM json_each(?))", (json.dumps(curies),)):
+            features[row[0]] = np.array(row[1:], dtype=float)
+
+        results = dict()
+        scored_pairs = []
+        for (drug, disease) in drug_disease_pairs:
+            count = (drug not in features) + (disease not in features)
+            results[(drug, disease)] = (None, count)
+            if count == 0:
+                scored_pairs.append((drug, disease))
+        if len(scored_pairs) != 0:
+            X = np.array([features[drug] * features[disease] for drug, disease in scored_pairs])  # use 'Hadamard product' method
+            for pair, probability in zip(scored_pairs, self.prob(X)[:, 1]):
+                results[pair] = (float(probability), 0)
+        return results
+
     def get_probs_from_DTD_db_based_on_disease(self, disease_id_list):
         """
         Get the probabilities of all pairs of source and target curie ids from DTD probability database based on given disease ids
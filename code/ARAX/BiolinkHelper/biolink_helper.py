@@ -2,6 +2,7 @@
 """
 Usage:  python biolink_helper.py [biolink version number, e.g. 3.0.3]
 """
+from __future__ import annotations
 
 import argparse
 import datetime
@@ -11,9 +12,12 @@ import sys
 import pathlib
 import pickle
 from collections import defaultdict
-from typing import Optional, List, Set, Dict, Union, Tuple
+from typing import Optional, List, Set, Dict, Union, Tuple, TYPE_CHECKING
 
-import networkx as nx
+#### networkx is only needed to build the Biolink DAGs (the lookup map is normally loaded from its cache file), so the
+#### methods that build them import it
+if TYPE_CHECKING:
+    import networkx as nx
 import requests
 import yaml
 
@@ -298,6 +302,7 @@ class BiolinkHelper:
         return biolink_lookup_map
 
     def _build_predicate_dag(self, biolink_model: dict) -> nx.DiGraph:
+        import networkx as nx
         predicate_dag = nx.DiGraph()
 
         # NOTE: 'slots' includes some things that aren't predicates, but we don't care; doesn't hurt to include them
@@ -340,6 +345,7 @@ class BiolinkHelper:
         return predicate_dag
 
     def _build_category_dag(self, biolink_model: dict) -> nx.DiGraph:
+        import networkx as nx
         category_dag = nx.DiGraph()
 
         for class_name_english, info in biolink_model["classes"].items():
@@ -371,6 +377,7 @@ class BiolinkHelper:
         return category_dag
 
     def _build_aspect_dag(self, biolink_model: dict) -> nx.DiGraph:
+        import networkx as nx
         aspect_dag = nx.DiGraph()
 
         aspect_enum_field_name = "gene_or_gene_product_or_chemical_entity_aspect_enum" if self.biolink_version.startswith("3.0") else "GeneOrGeneProductOrChemicalEntityAspectEnum"
@@ -385,6 +392,7 @@ class BiolinkHelper:
         return aspect_dag
 
     def _build_direction_dag(self, biolink_model: dict) -> nx.DiGraph:
+        import networkx as nx
         direction_dag = nx.DiGraph()
 
         direction_enum_field_name = "direction_qualifier_enum" if self.biolink_version.startswith("3.0") else "DirectionQualifierEnum"
@@ -399,6 +407,7 @@ class BiolinkHelper:
         return direction_dag
     
     def _get_depths_from_root(self, dag)-> Dict[str,int]:
+        import networkx as nx
         node_depths = {}
         for node in nx.topological_sort(dag):
             # Skip if the node is the start node
@@ -416,10 +425,12 @@ class BiolinkHelper:
     
     @staticmethod
     def _get_ancestors_nx(nx_graph: nx.DiGraph, node_id: str) -> List[str]:
+        import networkx as nx
         return list(nx.ancestors(nx_graph, node_id).union({node_id}))
 
     @staticmethod
     def _get_descendants_nx(nx_graph: nx.DiGraph, node_id: str) -> List[str]:
+        import networkx as nx
         return list(nx.descendants(nx_graph, node_id).union({node_id}))
 
     @staticmethod
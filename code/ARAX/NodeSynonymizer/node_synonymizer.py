@@ -1,16 +1,21 @@
 import argparse
 import ast
+import contextlib
+import copy
 import json
 import os
 import pathlib
 import sqlite3
 import string
 import sys
+import threading
 import time
-from collections import defaultdict
-from typing import Optional, Union, List, Set, Dict, Tuple
+from collections import defaultdict, OrderedDict
+from typing import Optional, Union, List, Set, Dict, Tuple, TYPE_CHECKING
 
-import pandas as pd
+#### pandas is slow to import and only needed for a few methods, so those import it themselves
+if TYPE_CHECKING:
+    import pandas as pd
 
 pathlist = os.path.realpath(__file__).split(os.path.sep)
 RTXindex = pathlist.index("RTX")
@@ -28,6 +33,30 @@ from openapi_server.models.attribute import Attribute
 from openapi_server.models.retrieval_source import RetrievalSource
 
 
+# Each process keeps a pool of read-only connections to each synonymizer sqlite, shared by all NodeSynonymizer
+# instances (so creating one is cheap and its queries hit a warm page cache). Each query checks out its own connection,
+# so concurrent threads (e.g. Flask workers serving /entity) don't wait on each other. A pool is dropped after a fork or
+# if its database file is replaced (e.g., by the database manager).
+_connection_pools_lock = threading.Lock()
+_connection_pools = dict()
+MAX_IDLE_CONNECTIONS = 8
+# Bounded LRU cache of normalizer results for single entities (popular curies/names are looked up over and over)
+_normalizer_results_cache = OrderedDict()
+NORMALIZER_RESULTS_CACHE_SIZE = 20000
+
+
+def _reset_after_fork():
+    # A child forked while another thread held the lock (e.g. a query forked while /entity was being served) would
+    # otherwise wait on it forever, so the child gets a new lock and starts with empty pools and cache
+    global _connection_pools_lock
+    _connection_pools_lock = threading.Lock()
+    _connection_pools.clear()
+    _normalizer_results_cache.clear()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
 class NodeSynonymizer:
 
     def __init__(self, sqlite_file_name: Optional[str] = None):
@@ -46,12 +75,6 @@ class NodeSynonymizer:
         if not pathlib.Path(self.database_path).exists():
             raise ValueError(f"Specified synonymizer does not exist locally."
                              f" It should be at: {self.database_path}")
-        else:
-            self.db_connection = sqlite3.connect(self.database_path)
-
-    def __del__(self):
-        if hasattr(self, "db_connection"):
-            self.db_connection.close()
 
     # --------------------------------------- EXTERNAL MAIN METHODS ----------------------------------------------- #
 
@@ -299,6 +322,10 @@ class NodeSynonymizer:
         # Convert any input curies to Set format
         entities_set = self._convert_to_set_format(entities)
 
+        # Take the results for any entities looked up recently from the cache, and look up only the others
+        cached_results_dict = self._get_cached_normalizer_results(entities_set, output_format)
+        entities_set = entities_set.difference(cached_results_dict)
+
         # First try looking up input entities as curies
         equivalent_curies_dict = self.get_equivalent_nodes(curies=entities_set, include_unrecognized_entities=False)
         unrecognized_entities = entities_set.difference(equivalent_curies_dict)
@@ -369,9 +396,12 @@ class NodeSynonymizer:
                     del normalizer_info[dict_key]
         # Otherwise add in cluster graphs
         else:
-            for normalizer_info in results_dict.values():
-                if normalizer_info:
-                    normalizer_info["knowledge_graph"] = self._get_cluster_graph(normalizer_info)
+            normalizer_infos = [normalizer_info for normalizer_info in results_dict.values() if normalizer_info]
+            for normalizer_info, cluster_graph in zip(normalizer_infos, self._get_cluster_graphs(normalizer_infos)):
+                normalizer_info["knowledge_graph"] = cluster_graph
+
+        self._cache_normalizer_results(results_dict, output_format)
+        results_dict.update(cached_results_dict)
 
         if debug:
             print(f"Took {round(time.time() - start, 5)} seconds")
@@ -436,7 +466,7 @@ class NodeSynonymizer:
             return set(some_value)
         elif isinstance(some_value, str):
             return {some_value}
-        elif isinstance(some_value, pd.Series):
+        elif "pandas" in sys.modules and isinstance(some_value, sys.modules["pandas"].Series):  # (No Series without pandas)
             return set(some_value.values)
         elif some_value is None:
             return set()
@@ -472,38 +502,56 @@ class NodeSynonymizer:
         curie_chunks[0] = curie_chunks[0].upper()
         return ":".join(curie_chunks)
 
-    def _get_cluster_graph(self, normalizer_info: dict) -> dict:
-        kg = KnowledgeGraph()
-        cluster_id = normalizer_info["id"]["identifier"]
-
-        # Add TRAPI nodes for each cluster member
-        trapi_nodes = {node["identifier"]: self._convert_to_trapi_node(node)
-                       for node in normalizer_info["nodes"]}
-        # Indicate which one is the cluster representative (i.e., 'preferred' identifier
-        trapi_nodes[cluster_id].attributes.append(Attribute(attribute_type_id="biolink:description",
-                                                            value_type_id="metatype:String",
-                                                            value="This node is the preferred/canonical identifier "
-                                                                  "for this concept cluster.",
-                                                            attribute_source="infores:arax"))
-        kg.nodes = trapi_nodes
-
-        # Add TRAPI edges for any intra-cluster edges
-        sql_query = f"SELECT intra_cluster_edge_ids FROM clusters WHERE cluster_id = '{cluster_id}'"
-        results = self._execute_sql_query(sql_query)
-        if results:
-            cluster_row = results[0]
-            intra_cluster_edge_ids_str = "[]" if cluster_row[0] == "nan" else cluster_row[0]
-            intra_cluster_edge_ids = ast.literal_eval(intra_cluster_edge_ids_str)  # Lists are stored as strings in sqlite
-
-            edges_query = f"SELECT * FROM edges WHERE id IN ('{self._convert_to_str_format(intra_cluster_edge_ids)}')"
-            edge_rows = self._execute_sql_query(edges_query)
-            edges_df = self._load_records_into_dataframe(edge_rows, "edges")
-            edge_dicts = edges_df.to_dict(orient="records")
-            trapi_edges = {edge["id"]: self._convert_to_trapi_edge(edge)
-                           for edge in edge_dicts}
-            kg.edges = trapi_edges
-
-        return kg.to_dict()
+    def _get_cluster_graphs(self, normalizer_infos: List[dict]) -> List[dict]:
+        """
+        Builds the cluster graph of each normalizer result. All of their intra-cluster edges are looked up together
+        (in batches), so that many entities don't mean many queries.
+        """
+        if not normalizer_infos:
+            return []
+
+        # Get the IDs of the intra-cluster edges of all of these clusters
+        cluster_ids = {normalizer_info["id"]["identifier"] for normalizer_info in normalizer_infos}
+        sql_query_template = f"""
+                    SELECT C.cluster_id, C.intra_cluster_edge_ids
+                    FROM clusters as C
+                    WHERE C.cluster_id in ('{self.placeholder_lookup_values_str}')"""
+        cluster_rows = self._run_sql_query_in_batches(sql_query_template, cluster_ids)
+        # Lists are stored as strings in sqlite
+        cluster_ids_to_edge_ids = {cluster_id: ast.literal_eval("[]" if edge_ids_str in {"nan", None} else edge_ids_str)
+                                   for cluster_id, edge_ids_str in cluster_rows}
+
+        # Then get all of those edges
+        all_edge_ids = set().union(*cluster_ids_to_edge_ids.values())
+        sql_query_template = f"""
+                    SELECT * FROM edges WHERE id in ('{self.placeholder_lookup_values_str}')"""
+        edge_rows = self._run_sql_query_in_batches(sql_query_template, all_edge_ids)
+        column_names = [column_info[1] for column_info in self._execute_sql_query("PRAGMA table_info(edges)")]
+        edge_dicts = {edge_dict["id"]: edge_dict for edge_dict in (dict(zip(column_names, row)) for row in edge_rows)}
+
+        cluster_graphs = []
+        for normalizer_info in normalizer_infos:
+            kg = KnowledgeGraph()
+            cluster_id = normalizer_info["id"]["identifier"]
+
+            # Add TRAPI nodes for each cluster member
+            trapi_nodes = {node["identifier"]: self._convert_to_trapi_node(node)
+                           for node in normalizer_info["nodes"]}
+            # Indicate which one is the cluster representative (i.e., 'preferred' identifier
+            trapi_nodes[cluster_id].attributes.append(Attribute(attribute_type_id="biolink:description",
+                                                                value_type_id="metatype:String",
+                                                                value="This node is the preferred/canonical identifier "
+                                                                      "for this concept cluster.",
+                                                                attribute_source="infores:arax"))
+            kg.nodes = trapi_nodes
+
+            # Add TRAPI edges for any intra-cluster edges
+            if cluster_id in cluster_ids_to_edge_ids:
+                kg.edges = {edge_id: self._convert_to_trapi_edge(edge_dicts[edge_id])
+                            for edge_id in cluster_ids_to_edge_ids[cluster_id] if edge_id in edge_dicts}
+
+            cluster_graphs.append(kg.to_dict())
+        return cluster_graphs
 
     def _convert_to_trapi_edge(self, edge_dict: dict) -> Edge:
         # Fix the predicate used for name similarity edges created during the synonymizer build..
@@ -606,6 +654,57 @@ class NodeSynonymizer:
             "preferred_category": self._add_biolink_prefix(preferred_category)
         }
 
+    def _get_cached_normalizer_results(self, entities_set: Set[str], output_format: Optional[str]) -> dict:
+        # (Results are cached per database file, so those from a file that has since been replaced are never served)
+        database_file_id = os.stat(self.database_path).st_ino
+        cached_results_dict = dict()
+        with _connection_pools_lock:
+            for entity in entities_set:
+                cache_key = (self.database_path, database_file_id, entity, output_format)
+                if cache_key in _normalizer_results_cache:
+                    _normalizer_results_cache.move_to_end(cache_key)
+                    cached_results_dict[entity] = _normalizer_results_cache[cache_key]
+        # Callers get their own copies, which they may modify
+        return copy.deepcopy(cached_results_dict)
+
+    def _cache_normalizer_results(self, results_dict: dict, output_format: Optional[str]):
+        database_file_id = os.stat(self.database_path).st_ino
+        results_dict_copy = copy.deepcopy(results_dict)
+        with _connection_pools_lock:
+            for entity, normalizer_info in results_dict_copy.items():
+                _normalizer_results_cache[(self.database_path, database_file_id, entity, output_format)] = normalizer_info
+            while len(_normalizer_results_cache) > NORMALIZER_RESULTS_CACHE_SIZE:
+                _normalizer_results_cache.popitem(last=False)
+
+    @contextlib.contextmanager
+    def _get_connection(self):
+        """
+        Checks out one of this process's read-only connections to the synonymizer sqlite (opening one if none is
+        idle), and puts it back in the pool when done.
+        """
+        file_id = os.stat(self.database_path).st_ino
+        with _connection_pools_lock:
+            pid, pool_file_id, idle_connections = _connection_pools.get(self.database_path, (None, None, None))
+            if pid != os.getpid() or pool_file_id != file_id:
+                if pid == os.getpid():
+                    for idle_connection in idle_connections:
+                        idle_connection.close()
+                idle_connections = []
+                _connection_pools[self.database_path] = (os.getpid(), file_id, idle_connections)
+            connection = idle_connections.pop() if idle_connections else None
+        if connection is None:
+            connection = sqlite3.connect(f"file:{self.database_path}?mode=ro", uri=True, check_same_thread=False)
+        try:
+            yield connection
+        finally:
+            with _connection_pools_lock:
+                # (Unless the pool has been replaced in the meantime, or already has enough idle connections)
+                if _connection_pools[self.database_path][2] is idle_connections and len(idle_connections) < MAX_IDLE_CONNECTIONS:
+                    idle_connections.append(connection)
+                    connection = None
+            if connection is not None:
+                connection.close()
+
     def _run_sql_query_in_batches(self, sql_query_template: str, lookup_values: Set[str]) -> list:
         """
         Sqlite has a max length allowed for SQL statements, so we divide really long curie/name lists into batches.
@@ -620,10 +719,11 @@ class NodeSynonymizer:
         return all_matching_rows
 
     def _execute_sql_query(self, sql_query: str) -> list:
-        cursor = self.db_connection.cursor()
-        cursor.execute(sql_query)
-        matching_rows = cursor.fetchall()
-        cursor.close()
+        with self._get_connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute(sql_query)
+            matching_rows = cursor.fetchall()
+            cursor.close()
         return matching_rows
 
     def _map_to_capitalized_curies(self, curies_set: Set[str]) -> Tuple[Dict[str, str], Set[str]]:
@@ -637,7 +737,8 @@ class NodeSynonymizer:
         simplified_names = set(names_to_simplified_names.values())
         return names_to_simplified_names, simplified_names
 
-    def _load_records_into_dataframe(self, records: list, table_name: str) -> pd.DataFrame:
+    def _load_records_into_dataframe(self, records: list, table_name: str) -> "pd.DataFrame":
+        import pandas as pd
         column_info = self._execute_sql_query(f"PRAGMA table_info({table_name})")
         column_names = [column_info[1] for column_info in column_info]
         records_df = pd.DataFrame(records, columns=column_names)
@@ -0,0 +1,148 @@
+#!/usr/bin/python3
+# Local cache of messages fetched from the ARS, shared by all service processes. Messages that are
+# finished (Done/Error) never change and are kept until evicted; messages that are still running are
+# refetched once they are a few seconds old, revalidating with ETag/Last-Modified when the ARS sends them.
+
+import sys
+def eprint(*args, **kwargs): print(*args, file=sys.stderr, **kwargs)
+
+import os
+import time
+import collections
+import concurrent.futures
+from typing import Dict, Iterable, Optional
+
+import requests
+import requests_cache
+
+from component_store import ComponentStore
+
+ARS_FINAL_STATUSES = { 'Done', 'Error', 'Completed' }
+RUNNING_MESSAGE_TTL = 10        # seconds
+ARS_REQUEST_TIMEOUT = 60        # seconds
+MAX_CONCURRENT_FETCHES = 8
+
+ARSFetchResult = collections.namedtuple('ARSFetchResult', ['status_code', 'content_size', 'response_dict'])
+
+
+def get_message_status(response_dict) -> Optional[str]:
+    """The status of an ARS message: top-level for trace=y parents, under fields for ordinary messages"""
+    if not isinstance(response_dict, dict):
+        return None
+    if response_dict.get('status') is not None:
+        return str(response_dict['status'])
+    fields = response_dict.get('fields')
+    if isinstance(fields, dict) and fields.get('status') is not None:
+        return str(fields['status'])
+    return None
+
+
+def is_final_message(response_dict) -> bool:
+    return get_message_status(response_dict) in ARS_FINAL_STATUSES
+
+
+def is_parent_message(response_dict) -> bool:
+    """True if the ARS message is a parent (query) message from the default or workflow agent rather than an ARA's child message"""
+    if not isinstance(response_dict, dict) or 'fields' not in response_dict:
+        return False
+    fields = response_dict['fields']
+    if 'name' in fields and fields['name'] != '':
+        return fields['name'] == 'ars-default-agent' or fields['name'] == 'ars-workflow-agent'
+    return 'actor' in fields and ( str(fields['actor']) == '9' or str(fields['actor']) == '19' )
+
+
+class ARSFetchCache:
+
+    def __init__(self, path: str, running_message_ttl: float = RUNNING_MESSAGE_TTL, max_bytes: int = 2 * 1024 ** 3):
+        self.store = ComponentStore(path, max_bytes=max_bytes, eviction_check_interval=100)
+        self.running_message_ttl = running_message_ttl
+
+
+    ##################################################################################################
+    #### Fetch one message (pk) from an ARS host, via the cache
+    def fetch_message(self, ars_host: str, pk: str, trace: bool = False) -> ARSFetchResult:
+        """
+        Returns an ARSFetchResult. response_dict is None if the content could not be decoded as JSON.
+        Connection errors propagate as requests exceptions, as they would from requests.get().
+        """
+        with requests_cache.disabled():
+            return self._fetch_message(ars_host, pk, trace)
+
+
+    ##################################################################################################
+    #### Fetch several messages from the same ARS host concurrently. Returns a dict of pk -> ARSFetchResult or exception
+    def fetch_messages(self, ars_host: str, pks: Iterable[str], trace: bool = False, max_workers: int = MAX_CONCURRENT_FETCHES) -> Dict[str, object]:
+        pks = list(pks)
+        results = {}
+        if len(pks) == 0:
+            return results
+        #### requests_cache.disabled() patches requests globally, so it is entered once here rather than in every thread
+        with requests_cache.disabled():
+            with concurrent.futures.ThreadPoolExecutor(max_workers=min(max_workers, len(pks))) as executor:
+                futures = { executor.submit(self._fetch_message, ars_host, pk, trace): pk for pk in pks }
+                for future in concurrent.futures.as_completed(futures):
+                    try:
+                        results[futures[future]] = future.result()
+                    except Exception as error:
+                        results[futures[future]] = error
+        return results
+
+
+    def _fetch_message(self, ars_host: str, pk: str, trace: bool) -> ARSFetchResult:
+        key = self._get_message_key(ars_host, pk, trace)
+        entry = self.store.get(key)
+        headers = { 'accept': 'application/json' }
+        if entry is not None:
+            if entry['final'] or time.time() - entry['fetched_at'] < self.running_message_ttl:
+                return ARSFetchResult(200, entry['content_size'], entry['response_dict'])
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        url = f"https://{ars_host}/ars/api/messages/{pk}"
+        if trace:
+            url += '?trace=y'
+        response_content = requests.get(url, headers=headers, timeout=ARS_REQUEST_TIMEOUT)
+
+        if response_content.status_code == 304 and entry is not None:
+            entry['fetched_at'] = time.time()
+            self.store.put(key, entry)
+            return ARSFetchResult(200, entry['content_size'], entry['response_dict'])
+
+        content_size = len(response_content.content)
+        if response_content.status_code != 200:
+            return ARSFetchResult(response_content.status_code, content_size, None)
+        try:
+            response_dict = response_content.json()
+        except Exception:
+            return ARSFetchResult(200, content_size, None)
+
+        self.store.put(key, { 'fetched_at': time.time(), 'final': is_final_message(response_dict), 'content_size': content_size,
+                              'etag': response_content.headers.get('ETag'), 'last_modified': response_content.headers.get('Last-Modified'),
+                              'response_dict': response_dict })
+        return ARSFetchResult(200, content_size, response_dict)
+
+
+    @staticmethod
+    def _get_message_key(ars_host: str, pk: str, trace: bool) -> str:
+        return f"message:{ars_host}:{pk}:{'trace' if trace else 'plain'}"
+
+
+    ##################################################################################################
+    #### Memoized validation results. Only results for finished messages are stored, since those cannot change
+    def get_validation_result(self, pk: str, trapi_version: str, biolink_version: str) -> Optional[dict]:
+        return self.store.get(f"validation:{pk}:{trapi_version}:{biolink_version}")
+
+    def put_validation_result(self, pk: str, trapi_version: str, biolink_version: str, validation_result: dict):
+        self.store.put(f"validation:{pk}:{trapi_version}:{biolink_version}", validation_result)
+
+
+_ars_fetch_cache = None
+
+
+def get_ars_fetch_cache() -> ARSFetchCache:
+    global _ars_fetch_cache
+    if _ars_fetch_cache is None:
+        _ars_fetch_cache = ARSFetchCache(os.path.dirname(os.path.abspath(__file__)) + "/ars_fetch_cache.sqlite")
+    return _ars_fetch_cache
@@ -0,0 +1,185 @@
+#!/usr/bin/python3
+# Single-file store for the knowledge graph components (nodes, edges) and trimmed responses cached by
+# ResponseCache when serving ARS responses. Replaces one small JSON file per component with one sqlite file.
+
+import sys
+def eprint(*args, **kwargs): print(*args, file=sys.stderr, **kwargs)
+
+import os
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+from typing import Iterable, Optional, Tuple
+
+COMPRESSION_NONE = 0
+COMPRESSION_ZLIB = 1
+
+
+class ComponentStore:
+    """
+    Key-value store of JSON components backed by one sqlite file.
+
+    Identical components are stored once: keys point at a content hash. When the stored content exceeds
+    max_bytes, the least recently used keys (and any content no longer referenced) are evicted until the
+    store is back under low_water_fraction of the limit.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 2 * 1024 ** 3, compress: bool = True,
+                 low_water_fraction: float = 0.8, eviction_check_interval: int = 1000):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.low_water_fraction = low_water_fraction
+        self.eviction_check_interval = eviction_check_interval
+        self._connection = None
+        self._connection_pid = None
+        self._puts_since_eviction_check = 0
+        self._lock = threading.RLock()
+
+    #### sqlite connections must not be shared across fork(), so each process opens its own
+    def _get_connection(self) -> sqlite3.Connection:
+        if self._connection is None or self._connection_pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS component_content (content_hash TEXT PRIMARY KEY, compression INTEGER NOT NULL, "
+                               "size INTEGER NOT NULL, content BLOB NOT NULL) WITHOUT ROWID")
+            connection.execute("CREATE TABLE IF NOT EXISTS component_key (key TEXT PRIMARY KEY, content_hash TEXT NOT NULL, "
+                               "last_access REAL NOT NULL) WITHOUT ROWID")
+            connection.execute("CREATE INDEX IF NOT EXISTS component_key_last_access ON component_key (last_access)")
+            connection.execute("CREATE INDEX IF NOT EXISTS component_key_content_hash ON component_key (content_hash)")
+            self._connection = connection
+            self._connection_pid = os.getpid()
+            self._puts_since_eviction_check = 0
+        return self._connection
+
+    def _encode(self, component) -> Tuple[str, int, bytes]:
+        serialized = json.dumps(component, sort_keys=True, separators=(',', ':')).encode('utf-8')
+        content_hash = hashlib.sha256(serialized).hexdigest()
+        if self.compress:
+            return content_hash, COMPRESSION_ZLIB, zlib.compress(serialized, 6)
+        return content_hash, COMPRESSION_NONE, serialized
+
+    @staticmethod
+    def _decode(compression: int, content: bytes):
+        if compression == COMPRESSION_ZLIB:
+            content = zlib.decompress(content)
+        return json.loads(content)
+
+    def put(self, key: str, component):
+        self.put_many([(key, component)])
+
+    def put_many(self, items: Iterable[Tuple[str, object]]):
+        """Store many (key, component) pairs in a single transaction"""
+        now = time.time()
+        content_rows = {}
+        key_rows = []
+        for key, component in items:
+            content_hash, compression, content = self._encode(component)
+            content_rows[content_hash] = (content_hash, compression, len(content), content)
+            key_rows.append((key, content_hash, now))
+        if not key_rows:
+            return
+        with self._lock:
+            connection = self._get_connection()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                connection.executemany("INSERT OR IGNORE INTO component_content (content_hash, compression, size, content) VALUES (?,?,?,?)",
+                                       content_rows.values())
+                connection.executemany("INSERT OR REPLACE INTO component_key (key, content_hash, last_access) VALUES (?,?,?)", key_rows)
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            self._puts_since_eviction_check += len(key_rows)
+            if self._puts_since_eviction_check >= self.eviction_check_interval:
+                self._puts_since_eviction_check = 0
+                self.evict()
+
+    def get(self, key: str):
+        """Return the component stored under key, or None if it is not (or no longer) in the store"""
+        with self._lock:
+            connection = self._get_connection()
+            row = connection.execute("SELECT c.compression, c.content FROM component_key AS k JOIN component_content AS c "
+                                     "ON c.content_hash = k.content_hash WHERE k.key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            connection.execute("UPDATE component_key SET last_access = ? WHERE key = ?", (time.time(), key))
+        return self._decode(*row)
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return self._get_connection().execute("SELECT 1 FROM component_key WHERE key = ?", (key,)).fetchone() is not None
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return self._get_connection().execute("SELECT COALESCE(SUM(size), 0) FROM component_content").fetchone()[0]
+
+    def evict(self, max_batch_size: int = 1000) -> int:
+        """Evict least recently used keys while the store is over max_bytes. Returns the number of keys evicted."""
+        n_evicted = 0
+        with self._lock:
+            total_bytes = self.total_bytes()
+            if total_bytes <= self.max_bytes:
+                return 0
+            target_bytes = self.max_bytes * self.low_water_fraction
+            connection = self._get_connection()
+            while total_bytes > target_bytes:
+                #### Evict roughly the fraction of keys that corresponds to the excess bytes
+                n_keys = connection.execute("SELECT COUNT(*) FROM component_key").fetchone()[0]
+                batch_size = min(max_batch_size, max(1, int(n_keys * (total_bytes - target_bytes) / total_bytes)))
+                connection.execute("BEGIN IMMEDIATE")
+                try:
+                    cursor = connection.execute("DELETE FROM component_key WHERE key IN "
+                                                "(SELECT key FROM component_key ORDER BY last_access LIMIT ?)", (batch_size,))
+                    n_deleted = cursor.rowcount
+                    connection.execute("DELETE FROM component_content WHERE NOT EXISTS "
+                                       "(SELECT 1 FROM component_key AS k WHERE k.content_hash = component_content.content_hash)")
+                    connection.execute("COMMIT")
+                except BaseException:
+                    connection.execute("ROLLBACK")
+                    raise
+                if n_deleted == 0:
+                    break
+                n_evicted += n_deleted
+                total_bytes = self.total_bytes()
+        if n_evicted:
+            eprint(f"INFO: ComponentStore evicted {n_evicted} components from {self.path}")
+        return n_evicted
+
+    def clear(self):
+        """Delete the store file (and its WAL files) so the next access starts with an empty store"""
+        with self._lock:
+            if self._connection is not None and self._connection_pid == os.getpid():
+                self._connection.close()
+            self._connection = None
+            self._connection_pid = None
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(self.path + suffix):
+                    os.remove(self.path + suffix)
+
+
+def main():
+    import argparse
+    argparser = argparse.ArgumentParser(description='Inspect a ResponseCache component store')
+    argparser.add_argument('path', type=str, help='Path to the component store sqlite file')
+    argparser.add_argument('--get', type=str, help='Print the component stored under this key')
+    argparser.add_argument('--evict', action='store_true', help='Evict least recently used components down to the size limit')
+    argparser.add_argument('--max_bytes', type=int, default=2 * 1024 ** 3, help='Size limit used with --evict')
+    params = argparser.parse_args()
+
+    store = ComponentStore(params.path, max_bytes=params.max_bytes)
+    if params.get:
+        print(json.dumps(store.get(params.get), indent=2, sort_keys=True))
+    if params.evict:
+        print(f"Evicted {store.evict()} components")
+    connection = store._get_connection()
+    n_keys = connection.execute("SELECT COUNT(*) FROM component_key").fetchone()[0]
+    n_contents = connection.execute("SELECT COUNT(*) FROM component_content").fetchone()[0]
+    print(f"{n_keys} keys, {n_contents} distinct components, {store.total_bytes()} bytes")
+
+
+if __name__ == "__main__": main()
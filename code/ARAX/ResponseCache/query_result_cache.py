@@ -0,0 +1,177 @@
+#!/usr/bin/python3
+# Cache of the answers to recent TRAPI queries, shared by all service processes. Queries are keyed by a canonical
+# form of their query graph and workflow, so that semantically identical queries (e.g. with synonymous curies or
+# categories listed differently) are answered once. Answers expire after a TTL, and whenever the KG2 databases or
+# the KP info caches are refreshed.
+
+import sys
+def eprint(*args, **kwargs): print(*args, file=sys.stderr, **kwargs)
+
+import os
+import json
+import time
+import hashlib
+from typing import Optional
+
+from component_store import ComponentStore
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../..")
+from RTXConfiguration import RTXConfiguration
+
+QUERY_RESULT_TTL = 4 * 60 * 60      # seconds
+INVALIDATED_AT_KEY = 'invalidated_at'
+
+knowledge_sources_dir = os.path.dirname(os.path.abspath(__file__))+"/../KnowledgeSources"
+db_versions_path = f"{knowledge_sources_dir}/db_versions.json"
+
+
+class QueryResultCache:
+
+    def __init__(self, path: str, ttl: float = QUERY_RESULT_TTL, max_bytes: int = 4 * 1024 ** 3):
+        self.store = ComponentStore(path, max_bytes=max_bytes, eviction_check_interval=20)
+        self.ttl = ttl
+        self.rtx_config = RTXConfiguration()
+        self._synonymizer = None
+        self._biolink_helper = None
+        self._file_hashes = {}
+
+
+    ##################################################################################################
+    #### Compute the cache key of a query, or None if its query graph can't be canonicalized
+    def get_cache_key(self, query_graph: dict, workflow: Optional[list] = None, mode: str = 'ARAX',
+                      query_options: Optional[dict] = None) -> Optional[str]:
+        """
+        The key is a hash of the query graph with each qnode's curies replaced by their sorted canonical curies and
+        each category and predicate list expanded to the sorted list of their Biolink descendants, together with the
+        workflow, mode and query options (all serialized with sorted keys). Qnode and qedge keys are kept as they
+        are, since results refer to them.
+        """
+        try:
+            canonical_query = { 'query_graph': self._get_canonical_query_graph(query_graph), 'workflow': workflow,
+                                'mode': mode, 'query_options': query_options or {} }
+        except Exception as error:
+            eprint(f"WARNING: Unable to canonicalize query graph for the query result cache: {error}")
+            return None
+        serialized = json.dumps(canonical_query, sort_keys=True, separators=(',', ':'), default=str)
+        return 'query:' + hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+
+    def _get_canonical_query_graph(self, query_graph: dict) -> dict:
+        all_curies = { curie for qnode in query_graph['nodes'].values() for curie in (qnode.get('ids') or []) }
+        canonical_curies = {}
+        if all_curies:
+            for curie, canonical_info in self._get_synonymizer().get_canonical_curies(list(all_curies)).items():
+                if canonical_info is not None:
+                    canonical_curies[curie] = canonical_info['preferred_curie']
+
+        canonical_qnodes = {}
+        for qnode_key, qnode in query_graph['nodes'].items():
+            canonical_qnode = { key: value for key, value in qnode.items() if value is not None }
+            if qnode.get('ids'):
+                canonical_qnode['ids'] = sorted({ canonical_curies.get(curie, curie) for curie in qnode['ids'] })
+            if qnode.get('categories'):
+                canonical_qnode['categories'] = self._get_descendants(qnode['categories'])
+            canonical_qnodes[qnode_key] = canonical_qnode
+
+        canonical_qedges = {}
+        for qedge_key, qedge in query_graph['edges'].items():
+            canonical_qedge = { key: value for key, value in qedge.items() if value is not None }
+            if qedge.get('predicates'):
+                canonical_qedge['predicates'] = self._get_descendants(qedge['predicates'])
+            canonical_qedges[qedge_key] = canonical_qedge
+
+        return { 'nodes': canonical_qnodes, 'edges': canonical_qedges }
+
+
+    def _get_descendants(self, biolink_items: list) -> list:
+        if self._biolink_helper is None:
+            sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../BiolinkHelper")
+            from biolink_helper import BiolinkHelper
+            self._biolink_helper = BiolinkHelper()
+        return sorted(set(self._biolink_helper.get_descendants(biolink_items)))
+
+
+    def _get_synonymizer(self):
+        if self._synonymizer is None:
+            sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../NodeSynonymizer")
+            from node_synonymizer import NodeSynonymizer
+            self._synonymizer = NodeSynonymizer()
+        return self._synonymizer
+
+
+    ##################################################################################################
+    #### The version of the data answers are computed from; answers computed from other data are not served
+    def get_data_version(self) -> str:
+        """Changes whenever the contents of the databases (db_versions.json) or the KP info cache change, or ARAX itself"""
+        data_files = [ db_versions_path, self._get_kp_info_cache_path() ]
+        data_file_hashes = [ self._get_file_hash(path) for path in data_files ]
+        return json.dumps([ self.rtx_config.arax_version, self.rtx_config.trapi_version, self.rtx_config.kg2c_sqlite_version,
+                            self.rtx_config.node_synonymizer_version, data_file_hashes ])
+
+
+    def _get_file_hash(self, path: str) -> Optional[str]:
+        #### A hash of the file's contents, only computed again when its size or modification time changes
+        try:
+            file_stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        stat_key = (file_stat.st_size, file_stat.st_mtime_ns)
+        if self._file_hashes.get(path, (None, None))[0] != stat_key:
+            file_hash = hashlib.sha256()
+            with open(path, 'rb') as infile:
+                for chunk in iter(lambda: infile.read(1024 * 1024), b''):
+                    file_hash.update(chunk)
+            self._file_hashes[path] = (stat_key, file_hash.hexdigest())
+        return self._file_hashes[path][1]
+
+
+    def _get_kp_info_cache_path(self) -> str:
+        #### Same path as KPInfoCacher uses (not imported here, as that would pull in all of Expand)
+        if self.rtx_config.kp_info_cache_override:
+            return self.rtx_config.kp_info_cache_override
+        version_string = f"{self.rtx_config.trapi_major_version}--{self.rtx_config.maturity}"
+        return f"{os.path.dirname(os.path.abspath(__file__))}/../ARAXQuery/Expand/cache_smart_api_and_meta_map_{version_string}.pkl"
+
+
+    ##################################################################################################
+    #### Get and store answers
+    def get(self, key: str) -> Optional[dict]:
+        """
+        Returns the cached answer (a dict with message, total_results_count and query_plan) for the key, or None if
+        there is none that is still valid
+        """
+        entry = self.store.get(key)
+        if entry is None:
+            return None
+        invalidated_at = self.store.get(INVALIDATED_AT_KEY) or 0
+        if entry['stored_at'] < invalidated_at or time.time() - entry['stored_at'] > self.ttl or \
+                entry['data_version'] != self.get_data_version():
+            return None
+        return entry['answer']
+
+
+    def put(self, key: str, answer: dict):
+        self.store.put(key, { 'stored_at': time.time(), 'data_version': self.get_data_version(), 'answer': answer })
+
+
+    def invalidate(self):
+        """Makes all answers cached so far invalid (in every process), e.g. after the data they came from changed"""
+        self.store.put(INVALIDATED_AT_KEY, time.time())
+
+
+_query_result_cache = None
+
+
+def get_query_result_cache() -> QueryResultCache:
+    global _query_result_cache
+    if _query_result_cache is None:
+        _query_result_cache = QueryResultCache(os.path.dirname(os.path.abspath(__file__)) + "/query_result_cache.sqlite")
+    return _query_result_cache
+
+
+def invalidate_query_result_cache():
+    """Called when the databases or KP info caches are refreshed; never fails the refresh"""
+    try:
+        get_query_result_cache().invalidate()
+    except Exception as error:
+        eprint(f"WARNING: Unable to invalidate the query result cache: {error}")
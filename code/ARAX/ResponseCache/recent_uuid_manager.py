@@ -12,6 +12,7 @@ import requests_cache
 import copy
 
 from node_synonymizer import NodeSynonymizer
+from ars_fetch_cache import get_ars_fetch_cache, is_parent_message, ARSFetchResult
 
 
 class RecentUUIDManager:
@@ -69,6 +70,12 @@ class RecentUUIDManager:
         if container_key not in response_dict:
             return( { "status": 404, "title": "Error decoding Response", "detail": f"Cannot decode recent PK list from ARS {ars_host}: cannot find {container_key}", "type": "about:blank" }, 404)
 
+        #### Fetch all the pks, and then the traces of the parent pks, concurrently into the ARS fetch cache
+        ars_fetch_cache = get_ars_fetch_cache()
+        prefetched = ars_fetch_cache.fetch_messages(ars_host, response_dict[container_key])
+        parent_pks = [ pk for pk, result in prefetched.items() if isinstance(result, ARSFetchResult) and is_parent_message(result.response_dict) ]
+        ars_fetch_cache.fetch_messages(ars_host, parent_pks, trace=True)
+
         have_timestamps = True
         uuid_list = []
         for uuid in response_dict[container_key]:
@@ -100,55 +107,47 @@ class RecentUUIDManager:
 
         debug = False
 
+        ars_fetch_cache = get_ars_fetch_cache()
         if debug:
             eprint(f"Trying to fetch {uuid} from {ars_host}...")
         try:
-            response_content = requests.get(f"https://{ars_host}/ars/api/messages/{uuid}", headers={'accept': 'application/json'})
+            fetch_result = ars_fetch_cache.fetch_message(ars_host, uuid)
         except Exception as e:
             return( { "status": 404, "title": f"Remote host {ars_host} unavailable", "detail": f"Connection attempts to {ars_host} triggered an exception: {e}", "type": "about:blank" }, 404)
 
-        status_code = response_content.status_code
+        status_code = fetch_result.status_code
         if debug:
             eprint(f"--- Fetch of {uuid} from {ars_host} yielded {status_code}")
 
         if status_code != 200:
             if debug:
                 eprint("Cannot fetch from ARS the UUID {uuid}")
-                eprint(str(response_content.content))
             return( { "status": 404, "title": "Response not found", "detail": f"Cannot fetch from ARS a UUID {uuid}", "type": "about:blank" }, 404)
 
 
         #### Unpack the response content into a dict
-        try:
-            response_dict = response_content.json()
-        except:
+        response_dict = fetch_result.response_dict
+        if response_dict is None:
             return( { "status": 404, "title": "Error decoding Response", "detail": f"Cannot decode UUID {uuid} data from {ars_host}", "type": "about:blank" }, 404)
 
 
-        is_parent_pk = False
-        if 'fields' in response_dict:
-            if 'name' in response_dict['fields'] and response_dict['fields']['name'] != '':
-                if response_dict['fields']['name'] == 'ars-default-agent' or response_dict['fields']['name'] == 'ars-workflow-agent':
-                    is_parent_pk = True
-                else:
-                    is_parent_pk = False
-            elif 'actor' in response_dict['fields'] and ( str(response_dict['fields']['actor']) == '9' or str(response_dict['fields']['actor']) == '19' ):
-                is_parent_pk = True
+        is_parent_pk = is_parent_message(response_dict)
 
         if is_parent_pk == True:
-            with requests_cache.disabled():
-                if debug:
-                    eprint(f"INFO: This is a parent UUID. Fetching trace=y for {uuid}")
-                response_content = requests.get(f"https://{ars_host}/ars/api/messages/{uuid}?trace=y", headers={'accept': 'application/json'})
-            status_code = response_content.status_code
+            if debug:
+                eprint(f"INFO: This is a parent UUID. Fetching trace=y for {uuid}")
+            try:
+                fetch_result = ars_fetch_cache.fetch_message(ars_host, uuid, trace=True)
+            except Exception as e:
+                return( { "status": 404, "title": f"Remote host {ars_host} unavailable", "detail": f"Connection attempts to {ars_host} triggered an exception: {e}", "type": "about:blank" }, 404)
+            status_code = fetch_result.status_code
 
             if status_code != 200:
                 return( { "status": 404, "title": "Response not found", "detail": "Failed attempting to fetch trace=y from ARS with UUID {uuid}", "type": "about:blank" }, 404)
 
             #### Unpack the response content into a dict and dump
-            try:
-                response_dict = response_content.json()
-            except:
+            response_dict = fetch_result.response_dict
+            if response_dict is None:
                 return( { "status": 404, "title": "Error decoding Response", "detail": f"Cannot decode UUID {uuid} data from {ars_host}", "type": "about:blank" }, 404)
 
             return response_dict
@@ -16,12 +16,9 @@ import collections
 import requests
 import json
 import requests
-import requests_cache
-from flask import Flask,redirect
 import copy
 import multiprocessing
 
-import boto3
 import timeit
 import uuid
 import shutil
@@ -36,7 +33,8 @@ from sqlalchemy import desc
 from sqlalchemy import inspect
 
 #sys.path = ['/mnt/data/python/TestValidator'] + sys.path
-from reasoner_validator.validator import TRAPIResponseValidator
+#### reasoner_validator and requests_cache are slow to import, so they are only imported where responses are validated
+#### or fetched
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../..")
 from RTXConfiguration import RTXConfiguration
@@ -47,14 +45,20 @@ from ARAX_attribute_parser import ARAXAttributeParser
 sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../../UI/OpenAPI/python-flask-server/")
 from openapi_server.models.response import Response as Envelope
 
+from response_storage import S3ResponseStore, LocalDirectoryResponseStore, load_envelope, get_background_writer
+from component_store import ComponentStore
+from ars_fetch_cache import get_ars_fetch_cache, is_final_message, is_parent_message
+
 trapi_version = '1.5.0'
 biolink_version = '4.2.1'
 
+#### Nodes, edges and trimmed ARS responses are cached in a single sqlite file, which is reset when the service starts.
+#### The old one-file-per-component cache directory is removed if still present
 component_cache_dir = os.path.dirname(os.path.abspath(__file__))+"/json_cache"
 if os.path.exists(component_cache_dir):
     shutil.rmtree(component_cache_dir)
-if not os.path.exists(component_cache_dir):
-    os.mkdir(component_cache_dir)
+component_store = ComponentStore(os.path.dirname(os.path.abspath(__file__))+"/component_cache.sqlite", max_bytes=4 * 1024 ** 3)
+component_store.clear()
 
 
 def validate_envelope(process_params):
@@ -235,12 +239,7 @@ class ResponseCache:
             servername = 'arax.ncats.io'
         envelope.id = f"https://{servername}/api/arax/v1.4/response/{response_id}"
 
-        #### New system to store the responses in an S3 bucket
-        rtx_config = RTXConfiguration()
-        KEY_ID = rtx_config.config_secrets['s3']['access']
-        ACCESS_KEY = rtx_config.config_secrets['s3']['secret']
-        succeeded_to_s3 = False
-
+        #### New system to store the responses in an S3 bucket (or its configured stand-in)
         #### Get information needed to decide which bucket to write to
         bucket_config = self.get_configs()
         datetime_now = str(datetime.now())
@@ -248,65 +247,64 @@ class ResponseCache:
         if DEBUG:
             print(f"DEBUG: Datetime now is: {datetime_now}")
             print(f"DEBUG: Cutover date is: {s3_bucket_migration_datetime}")
-        buckets = {
-            'old': { 'region_name': 'us-west-2', 'bucket_name': 'arax-response-storage' },
-            'new': { 'region_name': 'us-east-1', 'bucket_name': 'arax-response-storage-2' }
-        }
 
         if s3_bucket_migration_datetime:  # Only save the response in S3 if we know which bucket to use
 
             #### Set the bucket info
             if datetime_now > s3_bucket_migration_datetime:
                 bucket_tag = 'new'
-                if DEBUG:
-                    print(f"DEBUG: Since we're after the cutover date, use {bucket_tag} " +
-                        f"{buckets[bucket_tag]['region_name']} S3 bucket {buckets[bucket_tag]['bucket_name']}")
             else:
                 bucket_tag = 'old'
-                if DEBUG:
-                    print(f"DEBUG: Since we're before the cutover date, use {bucket_tag} " +
-                        f"{buckets[bucket_tag]['region_name']} S3 bucket {buckets[bucket_tag]['bucket_name']}")
-
-            serialized_response = json.dumps(envelope.to_dict(), sort_keys=True, indent=2)
+            store = self.get_response_store(bucket_tag)
+            if DEBUG:
+                print(f"DEBUG: Based on the cutover date, use {bucket_tag} {store}")
 
-            try:
-                region_name = buckets[bucket_tag]['region_name']
-                bucket_name = buckets[bucket_tag]['bucket_name']
-                eprint(f"INFO: Attempting to write to S3 bucket {region_name}:{bucket_name}:{response_filename}")
+            #### Serialization, compression and upload (with retries) happen on a background thread so that
+            #### the response can be returned right away. The query process waits for it before exiting.
+            response_id = stored_response.response_id
+            def save_locally_on_failure(key, body):
+                self.save_response_locally(response_id, body)
+            response.info(f"Queued response {response_filename} for writing to {store}")
+            get_background_writer().submit(store, response_filename, envelope.to_dict(), on_failure=save_locally_on_failure)
+        else:
+            response.warning(f"Not saving response to S3 because I don't know the S3BucketMigrationDatetime")
 
-                t0 = timeit.default_timer()
-                s3 = boto3.resource('s3', region_name=region_name, aws_access_key_id=KEY_ID, aws_secret_access_key=ACCESS_KEY)
-                s3.Object(bucket_name, response_filename).put(Body=serialized_response)
-                t1 = timeit.default_timer()
+        return stored_response.response_id
 
-                response.info(f"INFO: Successfully wrote {response_filename} to {region_name} S3 bucket {bucket_name} in {t1-t0} seconds")
-                succeeded_to_s3 = True
 
-            except:
-                response.error(f"Unable to write response {response_filename} to {region_name} S3 bucket {bucket_name}", error_code="InternalError")
+    ##################################################################################################
+    #### Return the store for the old or new response bucket, or its configured stand-in
+    def get_response_store(self, bucket_tag):
+        storage_override = self.rtxConfig.response_storage_override
+        if storage_override is not None and not storage_override.startswith('http'):
+            return LocalDirectoryResponseStore(storage_override)
 
+        buckets = {
+            'old': { 'region_name': 'us-west-2', 'bucket_name': 'arax-response-storage' },
+            'new': { 'region_name': 'us-east-1', 'bucket_name': 'arax-response-storage-2' }
+        }
+        return S3ResponseStore(buckets[bucket_tag]['region_name'], buckets[bucket_tag]['bucket_name'],
+            self.rtxConfig.config_secrets['s3']['access'], self.rtxConfig.config_secrets['s3']['secret'],
+            endpoint_url=storage_override)
 
-            #### if the S3 write failed, store it as a JSON file on the filesystem
-            if not succeeded_to_s3:
-                response_dir = os.path.dirname(os.path.abspath(__file__)) + '/../../../data/responses_1_0'
-                if not os.path.exists(response_dir):
-                    try:
-                        os.mkdir(response_dir)
-                    except:
-                        eprint(f"ERROR: Unable to create dir {response_dir}")
 
-                if os.path.exists(response_dir):
-                    response_filename = f"{stored_response.response_id}.json"
-                    response_path = f"{response_dir}/{response_filename}"
-                    try:
-                        with open(response_path, 'w') as outfile:
-                            json.dump(serialized_response, outfile, sort_keys=True, indent=2)
-                    except:
-                        eprint(f"ERROR: Unable to write response to file {response_path}")
-        else:
-            response.warning(f"Not saving response to S3 because I don't know the S3BucketMigrationDatetime")
+    ##################################################################################################
+    #### Store a serialized response in the local responses directory (fallback if S3 is unavailable)
+    def save_response_locally(self, response_id, body):
+        response_dir = os.path.dirname(os.path.abspath(__file__)) + '/../../../data/responses_1_0'
+        if not os.path.exists(response_dir):
+            try:
+                os.mkdir(response_dir)
+            except:
+                eprint(f"ERROR: Unable to create dir {response_dir}")
 
-        return stored_response.response_id
+        if os.path.exists(response_dir):
+            response_path = f"{response_dir}/{response_id}.json"
+            try:
+                with open(response_path, 'wb') as outfile:
+                    outfile.write(body)
+            except:
+                eprint(f"ERROR: Unable to write response to file {response_path}")
 
 
     ##################################################################################################
@@ -334,8 +332,8 @@ class ResponseCache:
                 response_filename = f"{stored_response.response_id}.json"
                 response_path = f"{response_dir}/{response_filename}"
                 try:
-                    with open(response_path) as infile:
-                        envelope = json.load(infile)
+                    with open(response_path, 'rb') as infile:
+                        envelope = load_envelope(infile)
                     found_response_locally = True
                     eprint(f"INFO: Wow, found the response locally at '{response_path}'. It must be very old")
                 except:
@@ -343,9 +341,6 @@ class ResponseCache:
 
                 #### If the file wasn't local, try it in S3
                 if not found_response_locally:
-                    rtx_config = RTXConfiguration()
-                    KEY_ID = rtx_config.config_secrets['s3']['access']
-                    ACCESS_KEY = rtx_config.config_secrets['s3']['secret']
 
                     #### Get information needed to decide which bucket to look in
                     bucket_config = self.get_configs()
@@ -353,51 +348,39 @@ class ResponseCache:
                     if DEBUG:
                         print(f"DEBUG: Datetime now is: {datetime_now}")
                         print(f"DEBUG: Cutover date is: {bucket_config['S3BucketMigrationDatetime']}")
-                    buckets = {
-                        'old': { 'region_name': 'us-west-2', 'bucket_name': 'arax-response-storage' },
-                        'new': { 'region_name': 'us-east-1', 'bucket_name': 'arax-response-storage-2' }
-                    }
 
                     for attempt in  [ 'expected_bucket', 'other_bucket' ]:
 
                         if attempt == 'expected_bucket':
                             if datetime_now > bucket_config['S3BucketMigrationDatetime']:
                                 bucket_tag = 'new'
-                                if DEBUG:
-                                    print(f"DEBUG: Since we're after the cutover date, use {bucket_tag} " +
-                                        f"{buckets[bucket_tag]['region_name']} S3 bucket {buckets[bucket_tag]['bucket_name']}")
                             else:
                                 bucket_tag = 'old'
-                                if DEBUG:
-                                    print(f"DEBUG: Since we're before the cutover date, use {bucket_tag} " +
-                                        f"{buckets[bucket_tag]['region_name']} S3 bucket {buckets[bucket_tag]['bucket_name']}")
+                            store = self.get_response_store(bucket_tag)
+                            if DEBUG:
+                                print(f"DEBUG: Based on the cutover date, use {bucket_tag} {store}")
                         else:
-                            print(f"ERROR: Failed in our attempt at using the {bucket_tag} " +
-                                    f"{buckets[bucket_tag]['region_name']} S3 bucket {buckets[bucket_tag]['bucket_name']}")
+                            print(f"ERROR: Failed in our attempt at using the {bucket_tag} {store}")
                             if bucket_tag == 'old':
                                 bucket_tag = 'new'
                             else:
                                 bucket_tag = 'old'
-                            print(f"INFO: Instead will try failing over to the {bucket_tag} " +
-                                    f"{buckets[bucket_tag]['region_name']} S3 bucket {buckets[bucket_tag]['bucket_name']}")
+                            store = self.get_response_store(bucket_tag)
+                            print(f"INFO: Instead will try failing over to the {bucket_tag} {store}")
 
                         try:
-                            region_name = buckets[bucket_tag]['region_name']
-                            bucket_name = buckets[bucket_tag]['bucket_name']
-                            s3 = boto3.resource('s3', region_name=region_name, aws_access_key_id=KEY_ID, aws_secret_access_key=ACCESS_KEY)
-
                             response_filename = f"/responses/{response_id}.json"
-                            eprint(f"INFO: Attempting to read {region_name}:{bucket_name}:{response_filename} from S3")
+                            eprint(f"INFO: Attempting to read {response_filename} from {store}")
                             t0 = timeit.default_timer()
 
-                            content = s3.Object(bucket_name, response_filename).get()["Body"].read()
-                            envelope = json.loads(content)
+                            #### Stored responses may be compressed or (older ones) plain JSON; load_envelope handles both
+                            envelope = store.get(response_filename)
                             t1 = timeit.default_timer()
-                            eprint(f"INFO: Successfully read {response_filename} from {region_name} S3 bucket {bucket_name} in {t1-t0} seconds")
+                            eprint(f"INFO: Successfully read {response_filename} from {store} in {t1-t0} seconds")
                             break
 
                         except:
-                            eprint(f"ERROR: Unable to read {region_name}:{bucket_name}:{response_filename} from S3")
+                            eprint(f"ERROR: Unable to read {response_filename} from {store}")
                             if attempt == 'other_bucket':
                                 return( { "status": 404, "title": "Response not found", "detail": "There is no response corresponding to response_id="+str(response_id), "type": "about:blank" }, 404)
 
@@ -411,6 +394,7 @@ class ResponseCache:
 
                         #### Perform the validation
                         eprint(f"Validating TRAPI with version {schema_version} and {biolink_version}")
+                        from reasoner_validator.validator import TRAPIResponseValidator
                         validator = TRAPIResponseValidator(trapi_version=schema_version, biolink_version=biolink_version)
                         validator.check_compliance_of_trapi_response(envelope)
                         validation_messages_text = validator.dumps()
@@ -470,6 +454,7 @@ class ResponseCache:
             if response_id.startswith('CQ'):
                 url = f"https://peptideatlas.org/tmp/{response_id}"
 
+            import requests_cache
             with requests_cache.disabled():
                 if debug:
                     eprint(f"Trying {url}...")
@@ -504,6 +489,7 @@ class ResponseCache:
             try:
                 if enable_validation:
 
+                    from reasoner_validator.validator import TRAPIResponseValidator
                     validator = TRAPIResponseValidator(trapi_version=schema_version, biolink_version=biolink_version)
                     validator.check_compliance_of_trapi_response(envelope)
                     raw_messages: Dict[str, List[Dict[str,str]]] = validator.get_all_messages()
@@ -548,10 +534,8 @@ class ResponseCache:
             debug = False
 
             #### See if this thing is cached already
-            filename = f"{component_cache_dir}/{response_id}.json"
-            if os.path.exists(filename):
-                with open(filename) as infile:
-                    envelope = json.load(infile)
+            envelope = component_store.get(response_id)
+            if envelope is not None:
                 return envelope
 
             #### If it started with Z, this is a special temporary cache, and if it's not there, all is lost
@@ -565,16 +549,17 @@ class ResponseCache:
                 attribute_caching = False
                 response_id = response_id[1:]
 
+            #### ARS messages are fetched through a local cache: finished messages are not fetched again
+            ars_fetch_cache = get_ars_fetch_cache()
             ars_hosts = [ 'ars-prod.transltr.io', 'ars.test.transltr.io', 'ars.ci.transltr.io', 'ars-dev.transltr.io', 'ars.transltr.io' ]
             for ars_host in ars_hosts:
-                with requests_cache.disabled():
-                    if debug:
-                        eprint(f"Trying {ars_host}...")
-                    try:
-                        response_content = requests.get(f"https://{ars_host}/ars/api/messages/"+response_id, headers={'accept': 'application/json'})
-                    except Exception as e:
-                        return( { "status": 404, "title": f"Remote host {ars_host} unavailable", "detail": f"Connection attempts to {ars_host} triggered an exception: {e}", "type": "about:blank" }, 404)
-                status_code = response_content.status_code
+                if debug:
+                    eprint(f"Trying {ars_host}...")
+                try:
+                    fetch_result = ars_fetch_cache.fetch_message(ars_host, response_id)
+                except Exception as e:
+                    return( { "status": 404, "title": f"Remote host {ars_host} unavailable", "detail": f"Connection attempts to {ars_host} triggered an exception: {e}", "type": "about:blank" }, 404)
+                status_code = fetch_result.status_code
                 if debug:
                     eprint(f"--- Fetch of {response_id} from {ars_host} yielded {status_code}")
                 if status_code == 200:
@@ -585,11 +570,10 @@ class ResponseCache:
             if status_code != 200:
                 if debug:
                     eprint("Cannot fetch from ARS a response corresponding to response_id="+str(response_id))
-                    eprint(str(response_content.content))
                 return( { "status": 404, "title": "Response not found", "detail": "Cannot fetch from ARS a response corresponding to response_id="+str(response_id), "type": "about:blank" }, 404)
 
 
-            content_size = len(response_content.content)
+            content_size = fetch_result.content_size
             if content_size < 1000:
                 content_size = '{:.2f} kB'.format(content_size/1000)
             elif content_size < 1000000:
@@ -600,9 +584,8 @@ class ResponseCache:
                 content_size = '{:.0f} MB'.format(content_size/1000000)
 
             #### Unpack the response content into a dict
-            try:
-                response_dict = response_content.json()
-            except:
+            response_dict = fetch_result.response_dict
+            if response_dict is None:
                 return( { "status": 404, "title": "Error decoding Response", "detail": "Cannot decode ARS response_id="+str(response_id)+" to a Translator Response", "type": "about:blank" }, 404)
 
             #### Debugging
@@ -611,29 +594,22 @@ class ResponseCache:
                 temp['fields']['data'] = '...'
                 eprint(json.dumps(temp,indent=2,sort_keys=True))
 
-            is_parent_pk = False
-            if 'fields' in response_dict:
-                if 'name' in response_dict['fields'] and response_dict['fields']['name'] != '':
-                    if response_dict['fields']['name'] == 'ars-default-agent' or response_dict['fields']['name'] == 'ars-workflow-agent':
-                        is_parent_pk = True
-                    else:
-                        is_parent_pk = False
-                elif 'actor' in response_dict['fields'] and ( str(response_dict['fields']['actor']) == '9' or str(response_dict['fields']['actor']) == '19' ):
-                    is_parent_pk = True
+            is_parent_pk = is_parent_message(response_dict)
             if is_parent_pk == True:
-                with requests_cache.disabled():
-                    if debug:
-                        eprint(f"INFO: This is a parent UUID. Fetching trace=y for {response_id}")
-                    response_content = requests.get(f"https://{ars_host}/ars/api/messages/" + response_id + '?trace=y', headers={'accept': 'application/json'})
-                status_code = response_content.status_code
+                if debug:
+                    eprint(f"INFO: This is a parent UUID. Fetching trace=y for {response_id}")
+                try:
+                    fetch_result = ars_fetch_cache.fetch_message(ars_host, response_id, trace=True)
+                except Exception as e:
+                    return( { "status": 404, "title": f"Remote host {ars_host} unavailable", "detail": f"Connection attempts to {ars_host} triggered an exception: {e}", "type": "about:blank" }, 404)
+                status_code = fetch_result.status_code
 
                 if status_code != 200:
                     return( { "status": 404, "title": "Response not found", "detail": "Failed attempting to fetch trace=y from ARS with response_id="+str(response_id), "type": "about:blank" }, 404)
 
                 #### Unpack the response content into a dict and dump
-                try:
-                    response_dict = response_content.json()
-                except:
+                response_dict = fetch_result.response_dict
+                if response_dict is None:
                     return( { "status": 404, "title": "Error decoding Response", "detail": "Cannot decode ARS response_id="+str(response_id)+" to a Translator Response", "type": "about:blank" }, 404)
 
                 response_dict['ars_host'] = ars_host
@@ -729,47 +705,58 @@ class ResponseCache:
                     return envelope
 
 
-                #### Perform a validation on it
+                #### Perform a validation on it, unless this finished message was validated before
                 enable_validation = True
                 schema_version = trapi_version
-                try:
-                    if enable_validation:
-
-                        #### Set up the validator
-                        validator = TRAPIResponseValidator(trapi_version=schema_version, biolink_version=biolink_version)
-
-                        eprint(f"Validating response with trapi_version={schema_version}, biolink_version={biolink_version}")
-                        validator.check_compliance_of_trapi_response(envelope)
-
-                        raw_messages: Dict[str, List[Dict[str,str]]] = validator.get_all_messages()
-                        messages = raw_messages['Validate TRAPI Response']['Standards Test']
-                        validation_messages_text = validator.dumps()
+                message_is_final = is_final_message(response_dict)
+                memoized_validation_result = None
+                validator_crashed = False
+                if message_is_final:
+                    memoized_validation_result = ars_fetch_cache.get_validation_result(response_id, schema_version, biolink_version)
+                if memoized_validation_result is not None:
+                    envelope['validation_result'] = memoized_validation_result
+                    envelope['validation_result']['size'] = content_size
+                else:
+                    try:
+                        if enable_validation:
+
+                            #### Set up the validator
+                            from reasoner_validator.validator import TRAPIResponseValidator
+                            validator = TRAPIResponseValidator(trapi_version=schema_version, biolink_version=biolink_version)
+
+                            eprint(f"Validating response with trapi_version={schema_version}, biolink_version={biolink_version}")
+                            validator.check_compliance_of_trapi_response(envelope)
+
+                            raw_messages: Dict[str, List[Dict[str,str]]] = validator.get_all_messages()
+                            messages = raw_messages['Validate TRAPI Response']['Standards Test']
+                            validation_messages_text = validator.dumps()
+
+                            critical_errors = 0
+                            errors = 0
+                            if 'critical' in messages and len(messages['critical']) > 0:
+                                critical_errors = len(messages['critical'])
+                            if 'error' in messages and len(messages['error']) > 0:
+                                errors = len(messages['error'])
+                            if critical_errors > 0:
+                                envelope['validation_result'] = { 'status': 'FAIL', 'version': schema_version, 'size': content_size, 'message': 'There were critical validator errors', 'validation_messages': messages, 'validation_messages_text': validation_messages_text }
+                            elif errors > 0:
+                                envelope['validation_result'] = { 'status': 'ERROR', 'version': schema_version, 'size': content_size, 'message': 'There were validator errors', 'validation_messages': messages, 'validation_messages_text': validation_messages_text }
+                            else:
+                                envelope['validation_result'] = { 'status': 'PASS', 'version': schema_version, 'size': content_size, 'message': '', 'validation_messages': messages, 'validation_messages_text': validation_messages_text }
 
-                        critical_errors = 0
-                        errors = 0
-                        if 'critical' in messages and len(messages['critical']) > 0:
-                            critical_errors = len(messages['critical'])
-                        if 'error' in messages and len(messages['error']) > 0:
-                            errors = len(messages['error'])
-                        if critical_errors > 0:
-                            envelope['validation_result'] = { 'status': 'FAIL', 'version': schema_version, 'size': content_size, 'message': 'There were critical validator errors', 'validation_messages': messages, 'validation_messages_text': validation_messages_text }
-                        elif errors > 0:
-                            envelope['validation_result'] = { 'status': 'ERROR', 'version': schema_version, 'size': content_size, 'message': 'There were validator errors', 'validation_messages': messages, 'validation_messages_text': validation_messages_text }
                         else:
-                            envelope['validation_result'] = { 'status': 'PASS', 'version': schema_version, 'size': content_size, 'message': '', 'validation_messages': messages, 'validation_messages_text': validation_messages_text }
+                            envelope['validation_result'] = { 'status': 'PASS', 'version': schema_version, 'size': content_size, 'message': 'Validation disabled. too many dependency failures', 'validation_messages': { "errors": [], "warnings": [], "information": [ 'Validation has been temporarily disabled due to problems with dependencies. Will return again soon.' ] } }
 
-                    else:
-                        envelope['validation_result'] = { 'status': 'PASS', 'version': schema_version, 'size': content_size, 'message': 'Validation disabled. too many dependency failures', 'validation_messages': { "errors": [], "warnings": [], "information": [ 'Validation has been temporarily disabled due to problems with dependencies. Will return again soon.' ] } }
-
-                except Exception as error:
-                    timestamp = str(datetime.now().isoformat())
-                    if 'logs' not in envelope or envelope['logs'] is None:
-                        envelope['logs'] = []
-                    envelope['logs'].append( { "code": 'ValidatorFailed', "level": "ERROR", "message": "TRAPI validator crashed with error: " + str(error),
-                        "timestamp": timestamp } )
-                    if 'description' not in envelope or envelope['description'] is None:
-                        envelope['description'] = ''
-                    envelope['validation_result'] = { 'status': 'FAIL', 'version': schema_version, 'size': content_size, 'message': 'TRAPI validator crashed with error: ' + str(error) + ' --- ' + envelope['description'] }
+                    except Exception as error:
+                        timestamp = str(datetime.now().isoformat())
+                        if 'logs' not in envelope or envelope['logs'] is None:
+                            envelope['logs'] = []
+                        envelope['logs'].append( { "code": 'ValidatorFailed', "level": "ERROR", "message": "TRAPI validator crashed with error: " + str(error),
+                            "timestamp": timestamp } )
+                        if 'description' not in envelope or envelope['description'] is None:
+                            envelope['description'] = ''
+                        envelope['validation_result'] = { 'status': 'FAIL', 'version': schema_version, 'size': content_size, 'message': 'TRAPI validator crashed with error: ' + str(error) + ' --- ' + envelope['description'] }
+                        validator_crashed = True
 
                 #### Try to add the resource_id
                 if 'name' in response_dict['fields'] and response_dict['fields']['name'] is not None:
@@ -806,16 +793,16 @@ class ResponseCache:
                     envelope['validation_result']['n_edges'] = n_edges
 
                     #### Count provenance information
-                    attribute_parser = ARAXAttributeParser(envelope,envelope['message'])
-                    envelope['validation_result']['provenance_summary'] = attribute_parser.summarize_provenance_info()
+                    if 'provenance_summary' not in envelope['validation_result']:
+                        attribute_parser = ARAXAttributeParser(envelope,envelope['message'])
+                        envelope['validation_result']['provenance_summary'] = attribute_parser.summarize_provenance_info()
 
                     #### Strip highly verbose information
+                    cached_components = []
                     if attribute_caching is True and 'nodes' in envelope['message']['knowledge_graph'] and envelope['message']['knowledge_graph']['nodes'] is not None:
                         for node_key, node in envelope['message']['knowledge_graph']['nodes'].items():
                             component_uuid = 'Z' + str(uuid.uuid4())
-                            filename = f"{component_cache_dir}/{component_uuid}.json"
-                            with open(filename, 'w') as outfile:
-                                json.dump(node, outfile)
+                            cached_components.append((component_uuid, dict(node)))
                             node['attributes'] = None
                             node['detail_lookup'] = component_uuid
                     eprint(f"attribute_caching={attribute_caching}")
@@ -828,9 +815,7 @@ class ResponseCache:
                                         edge['has_these_support_graphs'] = attribute['value']
                                         eprint(f"has_these_support_graphs={attribute['value']}")
                             component_uuid = 'Z' + str(uuid.uuid4())
-                            filename = f"{component_cache_dir}/{component_uuid}.json"
-                            with open(filename, 'w') as outfile:
-                                json.dump(edge, outfile)
+                            cached_components.append((component_uuid, dict(edge)))
                             edge['detail_lookup'] = component_uuid
                             edge['attributes'] = None
                             edge['sources'] = None
@@ -845,13 +830,11 @@ class ResponseCache:
                     else:
                         content_size = '{:.0f} MB'.format(content_size/1000000)
                     envelope['validation_result']['size'] = content_size
-                    filename = f"{component_cache_dir}/{original_response_id}.json"
-                    with open(filename, 'w') as outfile:
-                        json.dump(envelope, outfile)
-
-
-
+                    cached_components.append((original_response_id, envelope))
+                    component_store.put_many(cached_components)
 
+                if message_is_final and memoized_validation_result is None and not validator_crashed:
+                    ars_fetch_cache.put_validation_result(response_id, schema_version, biolink_version, envelope['validation_result'])
 
                 return envelope
             return( { "status": 404, "title": "Cannot find Response (in 'fields' and 'data') in ARS response packet", "detail": "Cannot decode ARS response_id="+str(response_id)+" to a Translator Response", "type": "about:blank" }, 404)
@@ -0,0 +1,227 @@
+#!/usr/bin/python3
+# Storage engine for ARAX responses: compact, compressed serialization, S3 (or MinIO) and local directory
+# backends, and a background writer so that storing a response does not hold up returning it
+
+import sys
+def eprint(*args, **kwargs): print(*args, file=sys.stderr, **kwargs)
+
+import os
+import io
+import gzip
+import json
+import time
+import queue
+import atexit
+import threading
+import timeit
+from typing import Callable, Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+
+##################################################################################################
+#### Serialization
+
+def default_compression() -> str:
+    """zstd if the zstandard package is installed, gzip otherwise"""
+    return 'zstd' if zstandard is not None else 'gzip'
+
+
+def serialize_envelope(envelope_dict: dict, compression: Optional[str] = None) -> bytes:
+    """
+    Serialize a response envelope without indentation and compress it. compression is 'zstd', 'gzip' or 'none';
+    None means default_compression().
+    """
+    if compression is None:
+        compression = default_compression()
+    serialized = json.dumps(envelope_dict, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    if compression == 'zstd':
+        return zstandard.ZstdCompressor(level=3).compress(serialized)
+    elif compression == 'gzip':
+        return gzip.compress(serialized, compresslevel=5)
+    elif compression == 'none':
+        return serialized
+    raise ValueError(f"Unknown response compression '{compression}'")
+
+
+class _PrefixedStream(io.RawIOBase):
+    """A read-only stream that first returns some already-read bytes and then the rest of an underlying stream"""
+
+    def __init__(self, prefix: bytes, stream):
+        self._prefix = prefix
+        self._stream = stream
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self._prefix:
+            n_bytes = min(len(buffer), len(self._prefix))
+            buffer[:n_bytes] = self._prefix[:n_bytes]
+            self._prefix = self._prefix[n_bytes:]
+            return n_bytes
+        chunk = self._stream.read(len(buffer))
+        buffer[:len(chunk)] = chunk
+        return len(chunk)
+
+
+def load_envelope(stream) -> dict:
+    """
+    Decode a stored response from a binary file-like object (an open file or the Body of an S3 object),
+    decompressing it on the fly. Compression is detected from the content, so responses stored before
+    compression was introduced (plain, indented JSON) are read as well.
+    """
+    prefix = stream.read(4)
+    reader = io.BufferedReader(_PrefixedStream(prefix, stream))
+    if prefix.startswith(GZIP_MAGIC):
+        reader = gzip.GzipFile(fileobj=reader, mode='rb')
+    elif prefix.startswith(ZSTD_MAGIC):
+        if zstandard is None:
+            raise ValueError("Stored response is zstd-compressed but the zstandard package is not installed")
+        reader = zstandard.ZstdDecompressor().stream_reader(reader)
+    return json.load(io.TextIOWrapper(reader, encoding='utf-8'))
+
+
+##################################################################################################
+#### Backends
+
+class S3ResponseStore:
+    """Stores responses in an S3 bucket. endpoint_url allows an S3-compatible server such as MinIO to stand in."""
+
+    def __init__(self, region_name: str, bucket_name: str, access_key_id: str, secret_access_key: str, endpoint_url: Optional[str] = None):
+        self.region_name = region_name
+        self.bucket_name = bucket_name
+        self.access_key_id = access_key_id
+        self.secret_access_key = secret_access_key
+        self.endpoint_url = endpoint_url
+
+    def __str__(self):
+        return f"{self.region_name} S3 bucket {self.bucket_name}"
+
+    def _get_bucket_object(self, key: str):
+        import boto3
+        s3 = boto3.resource('s3', region_name=self.region_name, endpoint_url=self.endpoint_url,
+                            aws_access_key_id=self.access_key_id, aws_secret_access_key=self.secret_access_key)
+        return s3.Object(self.bucket_name, key)
+
+    def put(self, key: str, body: bytes):
+        self._get_bucket_object(key).put(Body=body, ContentType='application/json')
+
+    def get(self, key: str) -> dict:
+        return load_envelope(self._get_bucket_object(key).get()["Body"])
+
+
+class LocalDirectoryResponseStore:
+    """Stores responses as files under a local directory, e.g. for development and testing without S3"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def __str__(self):
+        return f"local directory {self.directory}"
+
+    def _get_path(self, key: str) -> str:
+        return os.path.join(self.directory, key.lstrip('/'))
+
+    def put(self, key: str, body: bytes):
+        path = self._get_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as outfile:
+            outfile.write(body)
+        os.replace(temp_path, path)
+
+    def get(self, key: str) -> dict:
+        with open(self._get_path(key), 'rb') as infile:
+            return load_envelope(infile)
+
+
+##################################################################################################
+#### Background writer
+
+class BackgroundResponseWriter:
+    """
+    Serializes, compresses and uploads responses on a worker thread, retrying failed uploads with exponential
+    backoff. If all attempts fail, on_failure(envelope_key, body) is called (e.g. to save the response locally).
+    """
+
+    def __init__(self, max_attempts: int = 4, initial_retry_delay: float = 1.0):
+        self.max_attempts = max_attempts
+        self.initial_retry_delay = initial_retry_delay
+        self._queue = queue.Queue()
+        self._thread = None
+        self._thread_pid = None
+        self._lock = threading.Lock()
+
+    def _ensure_thread(self):
+        # A forked query child inherits the parent's writer object but not its thread, so start one per process
+        with self._lock:
+            if self._thread is None or self._thread_pid != os.getpid() or not self._thread.is_alive():
+                self._queue = queue.Queue()
+                self._thread = threading.Thread(target=self._run, name='BackgroundResponseWriter', daemon=True)
+                self._thread_pid = os.getpid()
+                self._thread.start()
+
+    def submit(self, store, key: str, envelope_dict: dict, compression: Optional[str] = None,
+               on_failure: Optional[Callable[[str, bytes], None]] = None):
+        self._ensure_thread()
+        self._queue.put((store, key, envelope_dict, compression, on_failure))
+
+    def _run(self):
+        while True:
+            store, key, envelope_dict, compression, on_failure = self._queue.get()
+            try:
+                self._write(store, key, envelope_dict, compression, on_failure)
+            except Exception as error:
+                eprint(f"ERROR: BackgroundResponseWriter failed to write {key}: {error}")
+            finally:
+                self._queue.task_done()
+
+    def _write(self, store, key: str, envelope_dict: dict, compression: Optional[str], on_failure):
+        t0 = timeit.default_timer()
+        body = serialize_envelope(envelope_dict, compression)
+        retry_delay = self.initial_retry_delay
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                store.put(key, body)
+                eprint(f"INFO: Wrote {key} ({len(body)} bytes) to {store} in {timeit.default_timer() - t0:.3f} seconds")
+                return
+            except Exception as error:
+                eprint(f"ERROR: Attempt {attempt} of {self.max_attempts} to write {key} to {store} failed: {error}")
+                if attempt < self.max_attempts:
+                    time.sleep(retry_delay)
+                    retry_delay *= 2
+        if on_failure is not None:
+            on_failure(key, body)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until all submitted responses are written (or timeout seconds pass). Returns True if all were written."""
+        if self._thread is None or self._thread_pid != os.getpid():
+            return True
+        deadline = None if timeout is None else time.time() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.time() > deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+
+_background_writer = BackgroundResponseWriter()
+
+
+def get_background_writer() -> BackgroundResponseWriter:
+    return _background_writer
+
+
+def wait_for_pending_writes(timeout: Optional[float] = None) -> bool:
+    """Wait for queued responses to be stored; processes that leave via os._exit() must call this first"""
+    return _background_writer.wait(timeout)
+
+
+atexit.register(wait_for_pending_writes)
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+A local stand-in for the KPs and Plover that ARAX queries, for the offline benchmark (see run_benchmark.py).
+Responses are replayed from recorded fixtures: one gzipped JSON file per (service, endpoint, request) under the
+fixtures directory, where the request body is canonicalized (dict keys and lists of plain values sorted) so that
+the same query graph always finds the same fixture. In record mode, requests are instead forwarded to the real
+service and the responses saved as fixtures.
+A latency/size profile shapes replayed responses: a fixed latency, a per-MB transfer time and seeded jitter are
+slept before responding, and a size factor adds that many copies of every returned edge (with a different primary
+knowledge source, so ARAX keeps them as distinct edges).
+Usage: python mock_kp_server.py [--fixtures fixtures] [--port 8765] [--profile recorded]
+"""
+import argparse
+import copy
+import gzip
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+
+import requests
+
+def eprint(*args, **kwargs): print(*args, file=sys.stderr, **kwargs)
+
+DEFAULT_FIXTURES_DIR = f"{os.path.dirname(os.path.abspath(__file__))}/fixtures"
+PLOVER_SERVICE = "plover"
+
+
+def canonicalize(value):
+    # Returns a copy of a JSON value with dict keys and lists of plain values sorted (e.g. curie lists built from sets)
+    if isinstance(value, dict):
+        return {key: canonicalize(value[key]) for key in sorted(value)}
+    elif isinstance(value, list):
+        items = [canonicalize(item) for item in value]
+        if all(item is None or isinstance(item, (str, int, float, bool)) for item in items):
+            return sorted(items, key=lambda item: (str(type(item)), item is None or item))
+        return items
+    return value
+
+
+def get_fixture_key(method: str, endpoint: str, body: Optional[dict]) -> str:
+    canonical_request = json.dumps([method, endpoint, canonicalize(body)], sort_keys=True)
+    return hashlib.sha1(canonical_request.encode()).hexdigest()[:16]
+
+
+class FixtureStore:
+
+    def __init__(self, fixtures_dir: str):
+        self.fixtures_dir = fixtures_dir
+
+    def _get_path(self, service: str, endpoint: str, key: str) -> str:
+        service_dir = service.replace(":", "_")
+        return f"{self.fixtures_dir}/{service_dir}/{endpoint.replace('/', '_')}-{key}.json.gz"
+
+    def load(self, service: str, method: str, endpoint: str, body: Optional[dict]) -> Optional[dict]:
+        path = self._get_path(service, endpoint, get_fixture_key(method, endpoint, body))
+        if not os.path.exists(path):
+            return None
+        with gzip.open(path, "rt") as fixture_file:
+            return json.load(fixture_file)
+
+    def save(self, service: str, method: str, endpoint: str, body: Optional[dict], status: int, response: any):
+        path = self._get_path(service, endpoint, get_fixture_key(method, endpoint, body))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fixture = {"service": service, "method": method, "endpoint": endpoint, "request": body,
+                   "status": status, "response": response}
+        # Written to a temporary file first so that concurrent requests never see a partial fixture
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with gzip.open(temp_path, "wt", compresslevel=3) as fixture_file:
+            json.dump(fixture, fixture_file)
+        os.replace(temp_path, path)
+
+    def get_kp_meta_kgs(self) -> Dict[str, dict]:
+        """Returns the recorded /meta_knowledge_graph response of each KP (by infores curie)"""
+        meta_kgs = dict()
+        if not os.path.isdir(self.fixtures_dir):
+            return meta_kgs
+        for service_dir in sorted(os.listdir(self.fixtures_dir)):
+            path = self._get_path(service_dir, "meta_knowledge_graph", get_fixture_key("GET", "meta_knowledge_graph", None))
+            if os.path.exists(path):
+                with gzip.open(path, "rt") as fixture_file:
+                    fixture = json.load(fixture_file)
+                if fixture["status"] == 200 and isinstance(fixture["response"], dict):
+                    meta_kgs[fixture["service"]] = fixture["response"]
+        return meta_kgs
+
+
+def _get_copy_of_edge(edge: any, copy_num: int) -> any:
+    # Changes the primary knowledge source of a TRAPI edge (dict) or Plover edge (list) so that ARAX doesn't merge it
+    edge = copy.deepcopy(edge)
+    if isinstance(edge, dict):
+        primary_sources = {source["resource_id"] for source in edge.get("sources") or []
+                           if source.get("resource_role") == "primary_knowledge_source"}
+        for source in edge.get("sources") or []:
+            if source.get("resource_id") in primary_sources:
+                source["resource_id"] = f"{source['resource_id']}-copy{copy_num}"
+            if source.get("upstream_resource_ids"):
+                source["upstream_resource_ids"] = [f"{resource_id}-copy{copy_num}" if resource_id in primary_sources
+                                                   else resource_id for resource_id in source["upstream_resource_ids"]]
+    elif isinstance(edge, list) and len(edge) > 3:
+        edge[3] = f"{edge[3]}-copy{copy_num}"
+    return edge
+
+
+def scale_response(response: any, size_factor: int) -> any:
+    """Returns the response with size_factor - 1 extra copies of each edge (TRAPI or Plover response)"""
+    if size_factor <= 1 or not isinstance(response, dict):
+        return response
+    response = copy.deepcopy(response)
+    if isinstance(response.get("message"), dict):
+        message = response["message"]
+        edges = (message.get("knowledge_graph") or {}).get("edges") or {}
+        for edge_key, edge in list(edges.items()):
+            for copy_num in range(1, size_factor):
+                edges[f"{edge_key}_copy{copy_num}"] = _get_copy_of_edge(edge, copy_num)
+        for result in message.get("results") or []:
+            all_edge_bindings = [analysis.get("edge_bindings") or {} for analysis in result.get("analyses") or []]
+            all_edge_bindings.append(result.get("edge_bindings") or {})
+            for edge_bindings in all_edge_bindings:
+                for bindings in edge_bindings.values():
+                    bindings.extend([{**binding, "id": f"{binding['id']}_copy{copy_num}"}
+                                     for binding in list(bindings) for copy_num in range(1, size_factor)])
+    elif isinstance(response.get("edges"), dict):
+        for edges in response["edges"].values():
+            for edge_key, edge in list(edges.items()):
+                for copy_num in range(1, size_factor):
+                    edges[f"{edge_key}_copy{copy_num}"] = _get_copy_of_edge(edge, copy_num)
+    return response
+
+
+class MockKPServer(ThreadingHTTPServer):
+    """
+    Serves KP endpoints at /kp/<infores curie>/<endpoint> and Plover endpoints at /plover/<endpoint>. A profile is a
+    dict with latency_s, seconds_per_mb, jitter_s, size_factor and seed (all optional), plus optional per-service
+    overrides of those under "services" (e.g. {"services": {"plover": {"latency_s": 0.05}}}). upstream_urls (service
+    -> URL) turns on record mode.
+    """
+    daemon_threads = True
+
+    def __init__(self, port: int, fixtures_dir: str = DEFAULT_FIXTURES_DIR, profile: Optional[dict] = None,
+                 upstream_urls: Optional[Dict[str, str]] = None):
+        super().__init__(("127.0.0.1", port), MockKPRequestHandler)
+        self.fixture_store = FixtureStore(fixtures_dir)
+        self.profile = profile if profile else dict()
+        self.upstream_urls = upstream_urls
+        self.stats_lock = threading.Lock()
+        self.stats = self._get_empty_stats()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def get_kp_url(self, kp_infores_curie: str) -> str:
+        return f"{self.url}/kp/{kp_infores_curie}"
+
+    @staticmethod
+    def _get_empty_stats() -> dict:
+        return {"requests": 0, "fixture_misses": 0, "bytes_sent": 0, "delay_s": 0.0}
+
+    def pop_stats(self) -> dict:
+        # Returns the request stats gathered since the last call
+        with self.stats_lock:
+            stats, self.stats = self.stats, self._get_empty_stats()
+        return stats
+
+    def _add_stats(self, **stats):
+        with self.stats_lock:
+            for stat_name, value in stats.items():
+                self.stats[stat_name] += value
+
+    def _get_profile_setting(self, service: str, setting_name: str, default: any) -> any:
+        service_profile = self.profile.get("services", dict()).get(service, dict())
+        return service_profile.get(setting_name, self.profile.get(setting_name, default))
+
+    def get_response(self, service: str, method: str, endpoint: str, body: Optional[dict]) -> Tuple[int, any]:
+        if self.upstream_urls is not None:
+            return self._get_upstream_response(service, method, endpoint, body)
+        fixture = self.fixture_store.load(service, method, endpoint, body)
+        if fixture is None:
+            self._add_stats(fixture_misses=1)
+            eprint(f"No fixture for {method} {service}/{endpoint} (key {get_fixture_key(method, endpoint, body)})")
+            return 404, {"detail": f"No recorded response for this {service} request"}
+        return fixture["status"], scale_response(fixture["response"], self._get_profile_setting(service, "size_factor", 1))
+
+    def _get_upstream_response(self, service: str, method: str, endpoint: str, body: Optional[dict]) -> Tuple[int, any]:
+        upstream_url = self.upstream_urls.get(service)
+        if not upstream_url:
+            return 404, {"detail": f"No upstream URL for {service}"}
+        try:
+            upstream_response = requests.request(method, f"{upstream_url}/{endpoint}", json=body, timeout=600,
+                                                 headers={'accept': 'application/json'})
+            status, response = upstream_response.status_code, upstream_response.json()
+        except Exception as error:
+            eprint(f"Recording {service}/{endpoint} failed: {error}")
+            return 502, {"detail": f"Upstream request failed: {error}"}
+        self.fixture_store.save(service, method, endpoint, body, status, response)
+        return status, response
+
+    def get_delay(self, service: str, method: str, endpoint: str, body: Optional[dict], num_bytes: int) -> float:
+        # Seeded by the request, so a given request is delayed the same amount on every run
+        rng = random.Random(f"{self._get_profile_setting(service, 'seed', 0)}-{get_fixture_key(method, endpoint, body)}")
+        return (self._get_profile_setting(service, "latency_s", 0.0) +
+                self._get_profile_setting(service, "seconds_per_mb", 0.0) * num_bytes / 1e6 +
+                self._get_profile_setting(service, "jitter_s", 0.0) * rng.random())
+
+
+class MockKPRequestHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        self._respond("GET")
+
+    def do_POST(self):
+        self._respond("POST")
+
+    def _respond(self, method: str):
+        path_parts = self.path.split("?")[0].strip("/").split("/")
+        if path_parts[0] == PLOVER_SERVICE and len(path_parts) > 1:
+            service, endpoint = PLOVER_SERVICE, "/".join(path_parts[1:])
+        elif path_parts[0] == "kp" and len(path_parts) > 2:
+            service, endpoint = path_parts[1], "/".join(path_parts[2:])
+        else:
+            self._send(404, {"detail": f"Unknown path {self.path}"})
+            return
+        body = None
+        if method == "POST":
+            content_length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(content_length)) if content_length else None
+
+        status, response = self.server.get_response(service, method, endpoint, body)
+        response_bytes = json.dumps(response).encode()
+        delay = 0.0
+        if self.server.upstream_urls is None:
+            delay = self.server.get_delay(service, method, endpoint, body, len(response_bytes))
+            time.sleep(delay)
+        self.server._add_stats(requests=1, bytes_sent=len(response_bytes), delay_s=delay)
+        self._send(status, response_bytes)
+
+    def _send(self, status: int, response: any):
+        response_bytes = response if isinstance(response, bytes) else json.dumps(response).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(response_bytes)))
+        self.end_headers()
+        self.wfile.write(response_bytes)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_mock_kp_server(port: int = 0, fixtures_dir: str = DEFAULT_FIXTURES_DIR, profile: Optional[dict] = None,
+                         upstream_urls: Optional[Dict[str, str]] = None) -> MockKPServer:
+    """Starts a mock KP server in a background thread (port 0 picks a free port; see server.url)"""
+    server = MockKPServer(port, fixtures_dir, profile, upstream_urls)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serves recorded KP and Plover responses")
+    parser.add_argument("--fixtures", type=str, default=DEFAULT_FIXTURES_DIR, help="Fixtures directory")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on")
+    parser.add_argument("--profile", type=str, default=None,
+                        help="Name of a profile in benchmark_workflows.json to shape responses with")
+    arguments = parser.parse_args()
+
+    profile = dict()
+    if arguments.profile:
+        with open(f"{os.path.dirname(os.path.abspath(__file__))}/benchmark_workflows.json") as catalog_file:
+            profile = json.load(catalog_file)["profiles"][arguments.profile]
+    server = MockKPServer(arguments.port, arguments.fixtures, profile)
+    eprint(f"Serving {arguments.fixtures} at {server.url} (KPs at {server.url}/kp/<infores curie>, "
+           f"Plover at {server.url}/{PLOVER_SERVICE})")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
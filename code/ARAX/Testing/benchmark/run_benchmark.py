@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Offline end-to-end benchmark of ARAX: runs the workflows in benchmark_workflows.json through ARAXQuery.query()
+against the mock KP/Plover server (see mock_kp_server.py), so that timings aren't dominated by network noise.
+Each workflow run happens in its own forked process and reports wall time per stage (ARAXi action), peak RSS,
+net allocated memory blocks and garbage collections. Results can be saved as a baseline and compared against one,
+exiting with status 1 if any workflow got slower, bigger or returned a different number of results.
+Fixtures are recorded once with --record (which queries the real KPs and Plover through the mock server).
+Usage: python run_benchmark.py [--profile recorded] [--workflows a,b] [--repeat 3] [--baseline baseline.json]
+       python run_benchmark.py --record
+"""
+import argparse
+import copy
+import gc
+import json
+import multiprocessing
+import os
+import pickle
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import requests
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from mock_kp_server import DEFAULT_FIXTURES_DIR, MockKPServer, PLOVER_SERVICE, start_mock_kp_server
+pathlist = os.path.realpath(__file__).split(os.path.sep)
+rtx_index = pathlist.index("RTX")
+sys.path.append(os.path.sep.join([*pathlist[:(rtx_index + 1)], 'code']))
+from RTXConfiguration import RTXConfiguration
+sys.path.append(os.path.sep.join([*pathlist[:(rtx_index + 1)], 'code', 'ARAX', 'ARAXQuery']))
+from ARAX_query import ARAXQuery
+from ARAX_response import ARAXResponse
+sys.path.append(os.path.sep.join([*pathlist[:(rtx_index + 1)], 'code', 'ARAX', 'ARAXQuery', 'Expand']))
+from kp_info_cacher import KPInfoCacher
+
+def eprint(*args, **kwargs): print(*args, file=sys.stderr, **kwargs)
+
+DEFAULT_CATALOG_PATH = f"{os.path.dirname(os.path.abspath(__file__))}/benchmark_workflows.json"
+# A metric only counts as regressed if it is worse than the baseline by the tolerance plus these absolute amounts
+MIN_TIME_SLACK_S = 0.25
+MIN_RSS_SLACK_MB = 50.0
+
+
+def get_upstream_urls() -> Dict[str, str]:
+    """Returns the real URLs of the KPs (from the KP info cache) and Plover, for recording fixtures"""
+    smart_api_info, _ = KPInfoCacher().load_kp_info_caches(ARAXResponse())
+    upstream_urls = {kp: url for kp, url in smart_api_info["allowed_kp_urls"].items() if url}
+    upstream_urls[PLOVER_SERVICE] = RTXConfiguration().plover_url
+    return upstream_urls
+
+
+def write_kp_info_cache(server: MockKPServer, cache_path: str) -> List[str]:
+    """
+    Writes a KP info cache (in KPInfoCacher's format) listing the KPs that have a recorded meta knowledge graph,
+    all served by the mock server. Returns the KPs' infores curies.
+    """
+    meta_kgs = server.fixture_store.get_kp_meta_kgs()
+    smart_api_cache = {"allowed_kp_urls": {kp: server.get_kp_url(kp) for kp in meta_kgs},
+                       "kps_excluded_by_version": set(),
+                       "kps_excluded_by_maturity": set()}
+    meta_map = {kp: {"predicates": KPInfoCacher._convert_meta_kg_to_meta_map(meta_kg),
+                     "prefixes": {category: meta_node["id_prefixes"] for category, meta_node in meta_kg["nodes"].items()}}
+                for kp, meta_kg in meta_kgs.items()}
+    with open(cache_path, "wb") as cache_file:
+        pickle.dump({"smart_api_cache": smart_api_cache, "meta_map_cache": meta_map}, cache_file)
+    return sorted(meta_kgs)
+
+
+def get_stage_times(spans: List[dict]) -> Dict[str, float]:
+    # Takes the stages from the query's profile (see ARAX_profiler.py): setup, then each span directly inside the
+    # query span (one per ARAXi action, then e.g. transform_results and store_response)
+    query_span_index = next((index for index, span in enumerate(spans) if span["name"] == "query" and span["parent"] is None), None)
+    if query_span_index is None:
+        return {}
+    stage_spans = [span for span in spans if span["parent"] == query_span_index]
+    setup_end = stage_spans[0]["start"] if stage_spans else spans[query_span_index]["start"] + spans[query_span_index]["wall_s"]
+    stages = {"setup": round(max(setup_end - spans[query_span_index]["start"], 0.0), 3)}
+    for stage_number, span in enumerate(stage_spans, start=1):
+        stages[f"{stage_number:02d}_{span['name']}"] = round(span["wall_s"], 3)
+    return stages
+
+
+def _get_peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # ru_maxrss is in KiB on Linux
+
+
+def _get_gc_collections() -> int:
+    return sum(generation_stats["collections"] for generation_stats in gc.get_stats())
+
+
+def run_workflow(workflow: dict, trace_allocations: bool) -> dict:
+    """Runs one workflow in this process and returns its metrics"""
+    if trace_allocations:
+        tracemalloc.start()
+    rss_at_start_mb = _get_peak_rss_mb()
+    gc_collections_at_start = _get_gc_collections()
+    allocated_blocks_at_start = sys.getallocatedblocks()
+    start = time.time()
+    response = ARAXQuery().query(copy.deepcopy(workflow["query"]), mode=workflow.get("mode", "ARAX"))
+    end = time.time()
+
+    metrics = {"status": response.status,
+               "wall_time_s": round(end - start, 3),
+               "stages": get_stage_times(response.profiler.get_spans()),
+               "peak_rss_mb": round(_get_peak_rss_mb(), 1),
+               "rss_at_start_mb": round(rss_at_start_mb, 1),
+               "allocated_blocks": sys.getallocatedblocks() - allocated_blocks_at_start,
+               "gc_collections": _get_gc_collections() - gc_collections_at_start}
+    if trace_allocations:
+        metrics["peak_traced_mb"] = round(tracemalloc.get_traced_memory()[1] / 1e6, 1)
+        tracemalloc.stop()
+    message = response.envelope.message if response.envelope is not None else None
+    knowledge_graph = message.knowledge_graph if message is not None else None
+    metrics["n_results"] = len(message.results) if message is not None and message.results else 0
+    metrics["n_nodes"] = len(knowledge_graph.nodes) if knowledge_graph is not None and knowledge_graph.nodes else 0
+    metrics["n_edges"] = len(knowledge_graph.edges) if knowledge_graph is not None and knowledge_graph.edges else 0
+    if response.status != 'OK':
+        metrics["error"] = f"{response.error_code}: {response.message}"
+    return metrics
+
+
+def _run_workflow_in_child(workflow: dict, trace_allocations: bool, result_queue: multiprocessing.Queue):
+    try:
+        result_queue.put(run_workflow(workflow, trace_allocations))
+    except Exception as error:
+        result_queue.put({"status": "ERROR", "error": f"{type(error).__name__}: {error}"})
+
+
+def run_workflow_in_fork(workflow: dict, trace_allocations: bool, timeout: int) -> dict:
+    """Runs one workflow in a forked process, so its peak RSS and allocations are its own"""
+    context = multiprocessing.get_context("fork")
+    result_queue = context.Queue()
+    process = context.Process(target=_run_workflow_in_child, args=(workflow, trace_allocations, result_queue))
+    process.start()
+    try:
+        metrics = result_queue.get(timeout=timeout)
+    except Exception:
+        process.kill()
+        metrics = {"status": "ERROR", "error": f"Timed out after {timeout} seconds"}
+    process.join()
+    return metrics
+
+
+def summarize_runs(runs: List[dict]) -> dict:
+    """Combines repeated runs of a workflow: median times, allocations and collections, maximum peak RSS"""
+    failed_runs = [run for run in runs if run.get("error")]
+    if failed_runs:
+        return {**failed_runs[0], "runs": len(runs)}
+    summary = dict(runs[0])
+    for metric_name in ["wall_time_s", "allocated_blocks", "gc_collections"]:
+        summary[metric_name] = statistics.median(run[metric_name] for run in runs)
+    summary["peak_rss_mb"] = max(run["peak_rss_mb"] for run in runs)
+    summary["stages"] = {stage_name: round(statistics.median(run["stages"].get(stage_name, 0.0) for run in runs), 3)
+                         for stage_name in runs[0]["stages"]}
+    summary["runs"] = len(runs)
+    return summary
+
+
+def compare_to_baseline(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Returns a description of each regression of the results against the baseline"""
+    regressions = []
+    for workflow_name, metrics in results["workflows"].items():
+        baseline_metrics = baseline["workflows"].get(workflow_name)
+        if baseline_metrics is None or baseline_metrics.get("error"):
+            continue
+        if metrics.get("error"):
+            regressions.append(f"{workflow_name}: failed ({metrics['error']})")
+            continue
+        if metrics["wall_time_s"] > baseline_metrics["wall_time_s"] * (1 + tolerance) + MIN_TIME_SLACK_S:
+            regressions.append(f"{workflow_name}: wall time {metrics['wall_time_s']}s vs. {baseline_metrics['wall_time_s']}s")
+        for stage_name, stage_time in metrics["stages"].items():
+            baseline_stage_time = baseline_metrics["stages"].get(stage_name)
+            if baseline_stage_time is not None and stage_time > baseline_stage_time * (1 + tolerance) + MIN_TIME_SLACK_S:
+                regressions.append(f"{workflow_name}: stage {stage_name} took {stage_time}s vs. {baseline_stage_time}s")
+        if metrics["peak_rss_mb"] > baseline_metrics["peak_rss_mb"] * (1 + tolerance) + MIN_RSS_SLACK_MB:
+            regressions.append(f"{workflow_name}: peak RSS {metrics['peak_rss_mb']} MB vs. {baseline_metrics['peak_rss_mb']} MB")
+        if metrics["n_results"] != baseline_metrics["n_results"]:
+            regressions.append(f"{workflow_name}: {metrics['n_results']} results vs. {baseline_metrics['n_results']}")
+    return regressions
+
+
+def print_results(results: dict):
+    print(f"{'workflow':<28} {'status':<7} {'wall s':>8} {'peak MB':>8} {'blocks':>10} {'gcs':>6} {'results':>8} {'misses':>6}")
+    for workflow_name, metrics in results["workflows"].items():
+        if metrics.get("error"):
+            print(f"{workflow_name:<28} {'ERROR':<7} {metrics['error']}")
+            continue
+        print(f"{workflow_name:<28} {metrics['status']:<7} {metrics['wall_time_s']:>8} {metrics['peak_rss_mb']:>8} "
+              f"{metrics['allocated_blocks']:>10} {metrics['gc_collections']:>6} {metrics['n_results']:>8} "
+              f"{metrics['mock_kp']['fixture_misses']:>6}")
+        for stage_name, stage_time in metrics["stages"].items():
+            print(f"    {stage_name:<24} {stage_time:>8}")
+
+
+def _get_git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       text=True).strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs the offline ARAX benchmark workflows")
+    parser.add_argument("--catalog", type=str, default=DEFAULT_CATALOG_PATH, help="Workflow catalog (JSON)")
+    parser.add_argument("--fixtures", type=str, default=DEFAULT_FIXTURES_DIR, help="Recorded KP/Plover responses")
+    parser.add_argument("--profile", type=str, default="recorded", help="Latency/size profile from the catalog")
+    parser.add_argument("--workflows", type=str, default=None, help="Comma-separated workflow names (default: all)")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per workflow (medians are reported)")
+    parser.add_argument("--timeout", type=int, default=1200, help="Seconds to allow each workflow run")
+    parser.add_argument("--tracemalloc", action="store_true", help="Also report peak traced Python memory (slower)")
+    parser.add_argument("--output", type=str, default="benchmark_results.json", help="Where to write the results")
+    parser.add_argument("--baseline", type=str, default=None, help="Baseline results to compare against")
+    parser.add_argument("--save-baseline", type=str, default=None, help="Also write the results as a baseline here")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed fractional slowdown/growth vs. baseline")
+    parser.add_argument("--record", action="store_true", help="Record fixtures from the real KPs and Plover")
+    arguments = parser.parse_args()
+
+    with open(arguments.catalog) as catalog_file:
+        catalog = json.load(catalog_file)
+    workflows = catalog["workflows"]
+    if arguments.workflows:
+        workflow_names = arguments.workflows.split(",")
+        workflows = [workflow for workflow in workflows if workflow["name"] in workflow_names]
+    profile = dict() if arguments.record else catalog["profiles"][arguments.profile]
+
+    upstream_urls = get_upstream_urls() if arguments.record else None
+    server = start_mock_kp_server(0, arguments.fixtures, profile, upstream_urls)
+    if arguments.record:
+        eprint(f"Recording meta knowledge graphs of {len(upstream_urls) - 1} KPs..")
+        for kp in upstream_urls:
+            if kp != PLOVER_SERVICE:
+                requests.get(f"{server.get_kp_url(kp)}/meta_knowledge_graph", timeout=660)
+
+    # Point this process (and so the forked workflow runs) at the mock server, and keep responses on local disk
+    temp_dir = tempfile.mkdtemp(prefix="arax_benchmark_")
+    rtx_config = RTXConfiguration()
+    rtx_config.kp_info_cache_override = f"{temp_dir}/kp_info_cache.pkl"
+    rtx_config.plover_url = f"{server.url}/{PLOVER_SERVICE}"
+    rtx_config.response_storage_override = f"{temp_dir}/responses"
+    kps = write_kp_info_cache(server, rtx_config.kp_info_cache_override)
+    eprint(f"Mock server at {server.url} is serving {len(kps)} KPs and Plover (profile: {arguments.profile})")
+
+    results = {"date": datetime.now().isoformat(), "git_commit": _get_git_commit(), "profile": arguments.profile,
+               "python_version": platform.python_version(), "host": platform.node(), "workflows": dict()}
+    for workflow in workflows:
+        eprint(f"Running {workflow['name']}..")
+        runs = []
+        for _ in range(1 if arguments.record else arguments.repeat):
+            server.pop_stats()
+            metrics = run_workflow_in_fork(workflow, arguments.tracemalloc, arguments.timeout)
+            metrics["mock_kp"] = server.pop_stats()
+            runs.append(metrics)
+        results["workflows"][workflow["name"]] = summarize_runs(runs)
+    server.shutdown()
+
+    print_results(results)
+    for output_path in [arguments.output, arguments.save_baseline]:
+        if output_path:
+            with open(output_path, "w") as output_file:
+                json.dump(results, output_file, indent=2)
+
+    if arguments.baseline:
+        with open(arguments.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline.get("profile") != results["profile"]:
+            eprint(f"WARNING: The baseline was run with profile {baseline.get('profile')}, not {results['profile']}")
+        regressions = compare_to_baseline(results, baseline, arguments.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {arguments.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import pytest
+
+import json
+import sqlite3
+import threading
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../ARAXQuery")
+import ARAX_admission_controller
+from ARAX_admission_controller import ARAXAdmissionController
+
+
+def _get_controller(tmp_path, memory_budget_gb=10.0, max_concurrent_queries=2, max_queued_queries=10):
+    sqlite_path = str(tmp_path / "kg2c.sqlite")
+    connection = sqlite3.connect(sqlite_path)
+    connection.execute("CREATE TABLE neighbors (id TEXT, neighbor_counts TEXT)")
+    connection.executemany("INSERT INTO neighbors VALUES (?, ?)", [
+        ('MONDO:0005148', json.dumps({ 'biolink:NamedThing': 50000, 'biolink:ChemicalEntity': 20000, 'biolink:Gene': 1000 })),
+        ('CHEBI:6801', json.dumps({ 'biolink:NamedThing': 3000, 'biolink:Disease': 500 })) ])
+    connection.commit()
+    connection.close()
+    return ARAXAdmissionController(memory_budget_gb=memory_budget_gb, max_concurrent_queries=max_concurrent_queries,
+                                   max_queued_queries=max_queued_queries, kg2c_sqlite_path=sqlite_path)
+
+
+def _get_cost(memory_gb, priority_class='standard'):
+    return { 'memory_gb': memory_gb, 'priority_class': priority_class }
+
+
+def _get_query(qnodes, qedges, **kwargs):
+    return dict({ 'message': { 'query_graph': { 'nodes': qnodes, 'edges': qedges } } }, **kwargs)
+
+
+def test_estimate_cost(tmp_path):
+    admission_controller = _get_controller(tmp_path)
+
+    #### Pinned at one end: the edges are the pinned node's neighbors of the other end's categories
+    query = _get_query({ 'n0': { 'ids': [ 'MONDO:0005148' ] }, 'n1': { 'categories': [ 'biolink:Gene' ] } },
+                       { 'e0': { 'subject': 'n1', 'object': 'n0' } })
+    cost = admission_controller.estimate_cost(query)
+    assert cost['n_kg_edges'] == 1000
+    assert cost['priority_class'] == 'standard'
+
+    #### Pinned at both ends: the smaller end counts; and operations add to the cost
+    query = _get_query({ 'n0': { 'ids': [ 'MONDO:0005148' ] }, 'n1': { 'ids': [ 'CHEBI:6801' ] } },
+                       { 'e0': { 'subject': 'n1', 'object': 'n0' } }, workflow=[ { 'id': 'fill' }, { 'id': 'score' } ])
+    cost = admission_controller.estimate_cost(query)
+    assert cost['n_kg_edges'] == 3000
+    assert cost['n_operations'] == 2
+    assert cost['memory_gb'] == pytest.approx(ARAX_admission_controller.BASE_QUERY_GB + 3000 * ARAX_admission_controller.GB_PER_KG_EDGE +
+                                              2 * ARAX_admission_controller.GB_PER_OPERATION, abs=0.001)
+
+    #### Curies not in KG2c and unpinned qedges get the defaults; streamed queries are interactive unless large
+    query = _get_query({ 'n0': { 'ids': [ 'FAKE:1' ] }, 'n1': {}, 'n2': {} },
+                       { 'e0': { 'subject': 'n0', 'object': 'n1' }, 'e1': { 'subject': 'n1', 'object': 'n2' } }, stream_progress=True)
+    cost = admission_controller.estimate_cost(query)
+    assert cost['n_kg_edges'] == ARAX_admission_controller.DEFAULT_NODE_DEGREE + ARAX_admission_controller.UNPINNED_QEDGE_KG_EDGES
+    assert cost['priority_class'] == 'interactive'
+    query = _get_query({ 'n0': {}, 'n1': {} }, { f"e{i}": { 'subject': 'n0', 'object': 'n1' } for i in range(4) }, stream_progress=True)
+    cost = admission_controller.estimate_cost(query)
+    assert cost['priority_class'] == 'large'
+
+
+def test_estimate_cost_never_fails(tmp_path):
+    admission_controller = ARAXAdmissionController(memory_budget_gb=10.0, kg2c_sqlite_path=str(tmp_path / "missing.sqlite"))
+    cost = admission_controller.estimate_cost(_get_query({ 'n0': { 'ids': [ 'MONDO:0005148' ] }, 'n1': {} },
+                                                         { 'e0': { 'subject': 'n0', 'object': 'n1' } }))
+    assert cost['n_kg_edges'] == ARAX_admission_controller.UNPINNED_QEDGE_KG_EDGES
+    assert admission_controller.estimate_cost({})['n_qedges'] == 0
+
+
+def test_memory_budget_and_concurrency_limit(tmp_path):
+    admission_controller = _get_controller(tmp_path, memory_budget_gb=10.0, max_concurrent_queries=2)
+    first_ticket = admission_controller.submit(_get_cost(6.0))
+    second_ticket = admission_controller.submit(_get_cost(6.0))
+    assert first_ticket.status == 'admitted'
+    assert second_ticket.status == 'waiting'
+
+    #### The second one fits once the first is done; a third waits for a slot even though it would fit in memory
+    admission_controller.release(first_ticket)
+    assert second_ticket.status == 'admitted'
+    third_ticket = admission_controller.submit(_get_cost(1.0))
+    fourth_ticket = admission_controller.submit(_get_cost(1.0))
+    assert third_ticket.status == 'admitted'
+    assert fourth_ticket.status == 'waiting'
+    assert admission_controller.get_status()['reserved_memory_gb'] == pytest.approx(7.0)
+
+    #### A query bigger than the whole budget still runs, on its own
+    admission_controller.release(second_ticket)
+    admission_controller.release(third_ticket)
+    admission_controller.release(fourth_ticket)
+    huge_ticket = admission_controller.submit(_get_cost(20.0))
+    assert huge_ticket.status == 'admitted'
+    assert admission_controller.submit(_get_cost(1.0)).status == 'waiting'
+
+
+def test_priority_classes_and_queue_full(tmp_path):
+    admission_controller = _get_controller(tmp_path, max_concurrent_queries=1, max_queued_queries=3)
+    running_ticket = admission_controller.submit(_get_cost(1.0))
+    large_ticket = admission_controller.submit(_get_cost(9.0, 'large'))
+    standard_ticket = admission_controller.submit(_get_cost(1.0, 'standard'))
+    interactive_ticket = admission_controller.submit(_get_cost(1.0, 'interactive'))
+    assert admission_controller.submit(_get_cost(1.0)) is None
+
+    assert next(admission_controller.wait_for_admission(interactive_ticket)) == 1
+    assert next(admission_controller.wait_for_admission(standard_ticket)) == 2
+    assert next(admission_controller.wait_for_admission(large_ticket)) == 3
+
+    admission_controller.release(running_ticket)
+    assert interactive_ticket.status == 'admitted'
+    assert standard_ticket.status == 'waiting'
+
+    #### Queries that waited long enough move up a class
+    large_ticket.enqueued_at -= 2 * ARAX_admission_controller.PRIORITY_AGING_INTERVAL
+    assert next(admission_controller.wait_for_admission(large_ticket)) == 1
+
+
+def test_wait_for_admission(tmp_path):
+    admission_controller = _get_controller(tmp_path, max_concurrent_queries=1)
+    running_ticket = admission_controller.submit(_get_cost(1.0))
+    waiting_ticket = admission_controller.submit(_get_cost(1.0))
+
+    #### Reports the position, then returns once the running query is released
+    queue_positions = []
+    def wait():
+        for queue_position in admission_controller.wait_for_admission(waiting_ticket, timeout=30):
+            queue_positions.append(queue_position)
+            admission_controller.release(running_ticket)
+    thread = threading.Thread(target=wait)
+    thread.start()
+    thread.join(timeout=30)
+    assert queue_positions == [ 1 ]
+    assert waiting_ticket.status == 'admitted'
+
+    #### Times out while the running query holds the only slot
+    timed_out_ticket = admission_controller.submit(_get_cost(1.0))
+    assert list(admission_controller.wait_for_admission(timed_out_ticket, timeout=0.2)) == [ 1 ]
+    assert timed_out_ticket.status == 'timed_out'
+    assert admission_controller.get_status()['waiting'] == 0
+    admission_controller.release(timed_out_ticket)
+    assert admission_controller.get_status()['running'] == 1
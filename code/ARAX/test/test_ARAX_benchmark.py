@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+
+# Tests the offline benchmark's mock KP server and baseline comparison (ARAX/Testing/benchmark)
+
+import sys
+import os
+import tempfile
+
+import requests
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../Testing/benchmark")
+from mock_kp_server import FixtureStore, get_fixture_key, scale_response, start_mock_kp_server
+from run_benchmark import compare_to_baseline, get_stage_times
+
+
+def _get_trapi_response() -> dict:
+    edge = {"subject": "CHEMBL.COMPOUND:CHEMBL112", "object": "UniProtKB:P23219", "predicate": "biolink:interacts_with",
+            "sources": [{"resource_id": "infores:drugcentral", "resource_role": "primary_knowledge_source"},
+                        {"resource_id": "infores:rtx-kg2", "resource_role": "aggregator_knowledge_source",
+                         "upstream_resource_ids": ["infores:drugcentral"]}]}
+    return {"message": {"knowledge_graph": {"nodes": {}, "edges": {"e1": edge}},
+                        "results": [{"analyses": [{"edge_bindings": {"e0": [{"id": "e1"}]}}]}]}}
+
+
+def test_mock_kp_server_replays_fixtures():
+    with tempfile.TemporaryDirectory() as fixtures_dir:
+        request = {"message": {"query_graph": {"nodes": {"n0": {"ids": ["CHEBI:1", "CHEBI:2"]}}, "edges": {}}}}
+        FixtureStore(fixtures_dir).save("infores:rtx-kg2", "POST", "query", request, 200, _get_trapi_response())
+        server = start_mock_kp_server(fixtures_dir=fixtures_dir, profile={"size_factor": 2, "latency_s": 0.05})
+        try:
+            # The same query with its curies in a different order finds the same fixture
+            reordered_request = {"message": {"query_graph": {"edges": {}, "nodes": {"n0": {"ids": ["CHEBI:2", "CHEBI:1"]}}}}}
+            response = requests.post(f"{server.get_kp_url('infores:rtx-kg2')}/query", json=reordered_request)
+            assert response.status_code == 200
+            assert len(response.json()["message"]["knowledge_graph"]["edges"]) == 2
+            missing_response = requests.post(f"{server.url}/plover/query", json={"nodes": {}, "edges": {}})
+            assert missing_response.status_code == 404
+            stats = server.pop_stats()
+            assert stats["requests"] == 2
+            assert stats["fixture_misses"] == 1
+            assert stats["delay_s"] >= 0.1
+        finally:
+            server.shutdown()
+
+
+def test_scale_response():
+    assert get_fixture_key("POST", "query", {"ids": ["a", "b"]}) == get_fixture_key("POST", "query", {"ids": ["b", "a"]})
+    scaled_response = scale_response(_get_trapi_response(), 3)
+    edges = scaled_response["message"]["knowledge_graph"]["edges"]
+    assert set(edges) == {"e1", "e1_copy1", "e1_copy2"}
+    assert edges["e1_copy1"]["sources"][0]["resource_id"] == "infores:drugcentral-copy1"
+    assert edges["e1_copy1"]["sources"][1]["upstream_resource_ids"] == ["infores:drugcentral-copy1"]
+    assert len(scaled_response["message"]["results"][0]["analyses"][0]["edge_bindings"]["e0"]) == 3
+    plover_response = {"nodes": {"n0": {}}, "edges": {"e0": {"123": ["A:1", "B:2", "biolink:treats", "infores:x"]}}}
+    assert scale_response(plover_response, 2)["edges"]["e0"]["123_copy1"][3] == "infores:x-copy1"
+
+
+def test_stage_times_and_baseline_comparison():
+    spans = [{"name": "query", "parent": None, "start": 100.0, "wall_s": 5.0},
+             {"name": "expand", "parent": 0, "start": 101.0, "wall_s": 3.0},
+             {"name": "kp_query", "parent": 1, "start": 101.5, "wall_s": 2.0},
+             {"name": "resultify", "parent": 0, "start": 104.0, "wall_s": 1.0}]
+    stages = get_stage_times(spans)
+    assert stages == {"setup": 1.0, "01_expand": 3.0, "02_resultify": 1.0}
+
+    baseline = {"workflows": {"w": {"wall_time_s": 5.0, "stages": stages, "peak_rss_mb": 1000.0, "n_results": 10}}}
+    results = {"workflows": {"w": {"wall_time_s": 5.5, "stages": stages, "peak_rss_mb": 1100.0, "n_results": 10}}}
+    assert compare_to_baseline(results, baseline, 0.25) == []
+    results["workflows"]["w"].update({"wall_time_s": 8.0, "stages": {**stages, "01_expand": 6.0}, "n_results": 9})
+    regressions = compare_to_baseline(results, baseline, 0.25)
+    assert len(regressions) == 3
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+# Tests the batched lookups of the ExplainableDTD database (Infer/scripts/ExplianableDTD_db.py) on a small in-memory table
+
+import sys
+import os
+import pytest
+
+import sqlite3
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../ARAXQuery")
+sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../ARAXQuery/Infer/scripts")
+import ExplianableDTD_db
+from ExplianableDTD_db import ExplainableDTD
+
+DRUGS = [f"CHEBI:{i}" for i in range(30)]
+DISEASES = [f"MONDO:{i}" for i in range(20)]
+
+
+class CountingConnection:
+    # Records the number of parameters bound by each query
+    def __init__(self, connection):
+        self.connection = connection
+        self.param_counts = []
+
+    def execute(self, sql, params=()):
+        self.param_counts.append(len(params))
+        return self.connection.execute(sql, params)
+
+
+@pytest.fixture
+def explainable_dtd():
+    connection = sqlite3.connect(":memory:")
+    connection.execute("create table PREDICTION_SCORE_TABLE (drug_id text, disease_id text, tp_score real)")
+    connection.executemany("insert into PREDICTION_SCORE_TABLE values (?,?,?)",
+                           [(drug, disease, (i * 7 + j * 3) % 11 / 10) for i, drug in enumerate(DRUGS) for j, disease in enumerate(DISEASES)])
+    #### (the constructor connects to the real database)
+    explainable_dtd = ExplainableDTD.__new__(ExplainableDTD)
+    explainable_dtd.connection = CountingConnection(connection)
+    return explainable_dtd
+
+
+def _fetch(explainable_dtd, drug_curie_ids, disease_curie_ids):
+    return sorted(explainable_dtd._fetch_batched("select drug_id,disease_id,tp_score from PREDICTION_SCORE_TABLE",
+                                                 "order by tp_score desc", drug_curie_ids, disease_curie_ids))
+
+
+@pytest.mark.parametrize("drug_curie_ids,disease_curie_ids", [
+    (DRUGS, None),
+    (None, DISEASES[:3]),
+    (DRUGS, DISEASES[:2]),
+    (DRUGS[:4], DISEASES),
+    (DRUGS, DISEASES),
+])
+def test_fetch_batched(explainable_dtd, monkeypatch, drug_curie_ids, disease_curie_ids):
+    expected = _fetch(explainable_dtd, drug_curie_ids, disease_curie_ids)
+    assert len(expected) == len(drug_curie_ids or DRUGS) * len(disease_curie_ids or DISEASES)
+
+    #### With a small parameter limit, the batched lookups find the same rows, and no query binds too many parameters
+    monkeypatch.setattr(ExplianableDTD_db, "MAX_SQL_PARAMETERS", 10)
+    explainable_dtd.connection.param_counts = []
+    assert _fetch(explainable_dtd, drug_curie_ids, disease_curie_ids) == expected
+    assert max(explainable_dtd.connection.param_counts) <= 10
@@ -31,6 +31,7 @@ from openapi_server.models.node_binding import NodeBinding
 from openapi_server.models.edge_binding import EdgeBinding
 from openapi_server.models.result import Result
 from openapi_server.models.message import Message
+from openapi_server.models.attribute import Attribute
 
 
 def _do_arax_query(query: dict, print_response: bool=True) -> List[Union[ARAXResponse, Message]]:
@@ -333,5 +334,37 @@ def test_tuple_bug():
     [response, message] = _do_arax_query(query)
     assert response.status == 'OK'
 
+def test_filter_chain_reuses_edge_attribute_table():
+    from Filter_KG.remove_edges import RemoveEdges
+    nodes = {f"N{i}": Node(categories=["biolink:Protein"]) for i in range(6)}
+    for node in nodes.values():
+        node.qnode_keys = ["n0"]
+    edges = {}
+    for i in range(5):
+        edges[f"e{i}"] = Edge(subject=f"N{i}", object=f"N{i+1}", predicate="biolink:related_to",
+                              attributes=[Attribute(attribute_type_id="EDAM-DATA:2526", original_attribute_name="ngd", value=i / 10),
+                                          Attribute(attribute_type_id="biolink:primary_knowledge_source", value="infores:rtx-kg2")])
+        edges[f"e{i}"].qedge_keys = ["e00"]
+    message = Message(query_graph=QueryGraph(nodes={"n0": QNode()}, edges={"e00": QEdge(subject="n0", object="n0")}),
+                      knowledge_graph=KnowledgeGraph(nodes=nodes, edges=edges))
+    response = ARAXResponse()
+    RemoveEdges(response, message, {"edge_attribute": "ngd", "direction": "above", "threshold": 0.35,
+                                    "remove_connected_nodes": False}).remove_edges_by_attribute()
+    assert set(message.knowledge_graph.edges) == {"e0", "e1", "e2", "e3"}
+    table = response.data['edge_attribute_table']
+    # An attribute added between filter steps (e.g. by an overlay) is picked up by the cached table
+    message.knowledge_graph.edges["e0"].attributes.append(Attribute(attribute_type_id="jaccard_index", value=0.9))
+    message.knowledge_graph.edges["e1"].attributes.append(Attribute(attribute_type_id="jaccard_index", value=0.1))
+    RemoveEdges(response, message, {"edge_attribute": "jaccard_index", "stat": "n", "threshold": 1, "top": True,
+                                    "direction": "below", "remove_connected_nodes": True}).remove_edges_by_stats()
+    assert response.data['edge_attribute_table'] is table
+    # e1 is removed, and with it N1 and N2 and their other edges
+    assert set(message.knowledge_graph.edges) == {"e3"}
+    assert set(message.knowledge_graph.nodes) == {"N0", "N3", "N4", "N5"}
+    RemoveEdges(response, message, {"edge_attribute": "biolink:primary_knowledge_source", "value": "infores:rtx-kg2",
+                                    "remove_connected_nodes": False}).remove_edges_by_property()
+    assert response.status == 'OK'
+    assert message.knowledge_graph.edges == {}
+
 if __name__ == "__main__":
     pytest.main(['-v'])
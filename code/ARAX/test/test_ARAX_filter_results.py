@@ -31,6 +31,8 @@ from openapi_server.models.node_binding import NodeBinding
 from openapi_server.models.edge_binding import EdgeBinding
 from openapi_server.models.result import Result
 from openapi_server.models.message import Message
+from openapi_server.models.analysis import Analysis
+from openapi_server.models.attribute import Attribute
 
 
 def _do_arax_query(query: dict) -> List[Union[ARAXResponse, Message]]:
@@ -210,5 +212,26 @@ def test_issue1506():
     assert len(message.results) == 30
 
 
+def test_sort_with_max_results_and_prune_kg():
+    from Filter_Results.sort_results import SortResults
+    nodes = {f"N{i}": Node(categories=["biolink:Protein"]) for i in range(6)}
+    edges = {f"e{i}": Edge(subject="N0", object=f"N{i}", predicate="biolink:related_to",
+                           attributes=[Attribute(attribute_type_id="EDAM-DATA:2526", original_attribute_name="ngd", value=value)])
+             for i, value in zip(range(1, 6), [0.3, 0.1, 0.5, 0.1, 0.2])}
+    results = [Result(node_bindings={"n0": [NodeBinding(id="N0")], "n1": [NodeBinding(id=f"N{i}")]},
+                      analyses=[Analysis(resource_id="infores:arax", edge_bindings={"e0": [EdgeBinding(id=f"e{i}")]})])
+               for i in range(1, 6)]
+    message = Message(results=results, knowledge_graph=KnowledgeGraph(nodes=nodes, edges=edges))
+    response = ARAXResponse()
+    SortResults(response, message, {"edge_attribute": "ngd", "descending": False, "max_results": 3,
+                                    "prune_kg": True}).sort_by_edge_attribute()
+    assert response.status == 'OK'
+    # The smallest three, with ties in their original order
+    assert [result.node_bindings["n1"][0].id for result in message.results] == ["N2", "N4", "N5"]
+    assert message.n_results == 3
+    assert set(message.knowledge_graph.nodes) == {"N0", "N2", "N4", "N5"}
+    assert set(message.knowledge_graph.edges) == {"e2", "e4", "e5"}
+
+
 if __name__ == "__main__":
     pytest.main(['-v'])
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+
+# Tests the GraphSage training data pipeline (Overlay/GraphSage_train/py_scripts/graphsage_pipeline.py) on a small
+# synthetic graph
+
+import sys
+import os
+import pytest
+
+import json
+import random
+import sqlite3
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../ARAXQuery/Overlay/GraphSage_train/py_scripts")
+import graphsage_pipeline
+
+
+def _write_synthetic_graph(tmp_path, n_nodes=60, n_edges=200):
+    rng = random.Random(1)
+    curies = [f"CURIE:{i:03d}" for i in range(n_nodes)]
+    edges = {(rng.choice(curies), rng.choice(curies)) for _ in range(n_edges)}
+    graph_file = tmp_path / "graph_edges.txt"
+    graph_file.write_text("source\ttarget\n" + "".join(f"{source}\t{target}\n" for source, target in sorted(edges)))
+    node_class_file = tmp_path / "graph_nodes_label_remove_name.txt"
+    node_class_file.write_text("id\tcategory\n" + "".join(f"{curie}\tbiolink:{rng.choice(['Gene', 'Disease', 'Drug'])}\n" for curie in curies))
+    return str(graph_file), str(node_class_file), sorted(edges)
+
+
+def _run(tmp_path, graph_file, node_class_file, stages, **kwargs):
+    return graphsage_pipeline.run_pipeline(str(tmp_path / "out"), stages=stages, graph_file=graph_file, node_class_file=node_class_file,
+                                           number_of_walks=3, chunk_size=7, processes=2, **kwargs)
+
+
+def test_prepare_and_walks(tmp_path):
+    graph_file, node_class_file, edges = _write_synthetic_graph(tmp_path)
+    outpath = tmp_path / "out"
+    _run(tmp_path, graph_file, node_class_file, ['prepare', 'walks'], walk_length=2)
+
+    #### GraphSage's input files
+    curies = [line.split('\t')[0] for line in (outpath / "id_map.txt").read_text().splitlines()[1:]]
+    curie_to_id = {curie: node_id for node_id, curie in enumerate(curies)}
+    assert curies == sorted({curie for edge in edges for curie in edge})
+    graph = json.loads((outpath / "data-G.json").read_text())
+    assert [node['id'] for node in graph['nodes']] == list(range(len(curies)))
+    assert [(link['source'], link['target']) for link in graph['links']] == sorted((curie_to_id[source], curie_to_id[target]) for source, target in edges)
+    is_validation = np.load(outpath / "validation_mask.npy")
+    assert [node['val'] for node in graph['nodes']] == is_validation.tolist()
+    assert is_validation.sum() == int(len(curies) * 0.3)
+    assert len(json.loads((outpath / "data-class_map.json").read_text())) == len(curies)
+
+    #### With walks of length 2, each pair is a training node and one of its neighbors in the training subgraph
+    training_neighbors = {(curie_to_id[source], curie_to_id[target]) for source, target in edges
+                          if not is_validation[curie_to_id[source]] and not is_validation[curie_to_id[target]]}
+    training_neighbors |= {(target, source) for source, target in training_neighbors}
+    pairs = [tuple(int(node) for node in line.split('\t')) for line in (outpath / "data-walks.txt").read_text().splitlines()]
+    assert len(pairs) > 0
+    assert all(pair in training_neighbors and pair[0] != pair[1] for pair in pairs)
+    #### every training node with a neighbor other than itself starts number_of_walks walks
+    assert {start for start, _ in pairs} == {source for source, target in training_neighbors if source != target}
+
+
+def test_resume(tmp_path):
+    graph_file, node_class_file, _ = _write_synthetic_graph(tmp_path)
+    outpath = tmp_path / "out"
+    _run(tmp_path, graph_file, node_class_file, ['prepare', 'walks'])
+    walks = (outpath / "data-walks.txt").read_text()
+
+    #### Completed stages are skipped
+    state = json.loads((outpath / "pipeline_state.json").read_text())
+    _run(tmp_path, graph_file, node_class_file, ['prepare', 'walks'])
+    assert json.loads((outpath / "pipeline_state.json").read_text()) == state
+
+    #### An interrupted walks stage only runs its missing chunks, with the same walks as before
+    part_files = sorted((outpath / "walks").glob("part-*.txt"))
+    assert len(part_files) > 2
+    kept_part_mtime = part_files[0].stat().st_mtime_ns
+    part_files[-1].unlink()
+    (outpath / "data-walks.txt").unlink()
+    _run(tmp_path, graph_file, node_class_file, ['walks'])
+    assert part_files[0].stat().st_mtime_ns == kept_part_mtime
+    assert (outpath / "data-walks.txt").read_text() == walks
+
+    #### Other parameters run the stage (and all its chunks) again
+    _run(tmp_path, graph_file, node_class_file, ['walks'], walk_length=5)
+    assert part_files[0].stat().st_mtime_ns != kept_part_mtime
+
+
+def test_embeddings_and_sqlite(tmp_path):
+    graph_file, node_class_file, _ = _write_synthetic_graph(tmp_path)
+    outpath = tmp_path / "out"
+    _run(tmp_path, graph_file, node_class_file, ['prepare'])
+    curies = [line.split('\t')[0] for line in (outpath / "id_map.txt").read_text().splitlines()[1:]]
+
+    #### GraphSage's output: embeddings of all nodes but one, in shuffled order
+    graphsage_output = tmp_path / "graphsage_output"
+    graphsage_output.mkdir()
+    node_ids = np.random.default_rng(1).permutation(len(curies))[:-1]
+    embeddings = np.random.default_rng(2).random((len(node_ids), 4)).astype(np.float32)
+    np.save(graphsage_output / "val.npy", embeddings)
+    (graphsage_output / "val.txt").write_text("".join(f"{node_id}\n" for node_id in node_ids))
+    _run(tmp_path, graph_file, node_class_file, ['embeddings', 'sqlite'], graphsage_output=str(graphsage_output))
+
+    embedding_curies, matrix = graphsage_pipeline.load_embeddings(str(outpath))
+    assert isinstance(matrix, np.memmap)
+    assert embedding_curies == curies
+    assert np.array_equal(matrix[node_ids], embeddings)
+    missing_node_id = (set(range(len(curies))) - set(node_ids.tolist())).pop()
+    assert np.isnan(matrix[missing_node_id]).all()
+
+    #### The GRAPH table has the same rows, as the predictor reads them
+    connection = sqlite3.connect(str(outpath / "GRAPH_v1.0.sqlite"))
+    rows = {row[0]: row[1:] for row in connection.execute("select * from GRAPH")}
+    connection.close()
+    assert len(rows) == len(curies) - 1
+    assert curies[missing_node_id] not in rows
+    node_id = int(node_ids[0])
+    assert list(rows[curies[node_id]]) == pytest.approx(matrix[node_id].tolist())
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+
+# Tests that the ARAX entry points start quickly: importing them must not pull in heavy optional subsystems (which are
+# imported where they are used), and must take less than a threshold
+
+import sys
+import os
+import json
+import subprocess
+
+import pytest
+
+ARAX_QUERY_DIR = os.path.dirname(os.path.abspath(__file__)) + "/../ARAXQuery"
+
+#### Imported only by the ARAXi commands, rankers etc. that need them, never at startup
+HEAVY_MODULES = ['torch', 'sklearn', 'pandas', 'networkx', 'scipy', 'graph_tool', 'boto3', 'neo4j',
+                 'reasoner_validator', 'opentelemetry', 'connexion']
+
+#### Seconds; generous, so that only a real regression (e.g. a heavy module imported at the top again) fails
+MAX_IMPORT_TIME_S = float(os.environ.get('ARAX_MAX_IMPORT_TIME_S', 5.0))
+
+
+def _import_in_new_process(module_name: str):
+    """Imports the module in a fresh interpreter, and returns the modules that got imported and the time it took"""
+    code = f"import sys, json; import {module_name}; print(json.dumps(sorted(sys.modules)))"
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=ARAX_QUERY_DIR,
+                             capture_output=True, text=True, timeout=300)
+    assert process.returncode == 0, process.stderr[-2000:]
+    #### Lines of -X importtime look like: "import time:  self [us] | cumulative | imported package"
+    import_time_us = 0
+    for line in process.stderr.splitlines():
+        if line.startswith('import time:') and line.split('|')[-1].strip() == module_name:
+            import_time_us = int(line.split('|')[1])
+    return set(json.loads(process.stdout.splitlines()[-1])), import_time_us / 1e6
+
+
+@pytest.mark.parametrize('module_name', ['ARAX_query', 'ARAX_background_tasker'])
+def test_entry_point_import(module_name):
+    imported_modules, import_time_s = _import_in_new_process(module_name)
+    assert [module for module in HEAVY_MODULES if module in imported_modules] == []
+    assert 0 < import_time_s < MAX_IMPORT_TIME_S
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import pytest
+
+import gzip
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../ARAXQuery/Overlay/ngd")
+import pubmed_ingest
+
+
+def _write_pubmed_file(file_path, articles):
+    # articles: list of (pmid, mesh descriptor names, keywords)
+    article_xmls = []
+    for pmid, descriptor_names, keywords in articles:
+        mesh_headings = "".join(f"<MeshHeading><DescriptorName>{name}</DescriptorName></MeshHeading>" for name in descriptor_names)
+        keyword_list = "".join(f"<Keyword>{keyword}</Keyword>" for keyword in keywords)
+        article_xmls.append(f"<PubmedArticle><MedlineCitation><PMID>{pmid}</PMID>"
+                            f"<MeshHeadingList>{mesh_headings}</MeshHeadingList>"
+                            f"<KeywordList>{keyword_list}</KeywordList></MedlineCitation></PubmedArticle>")
+    with gzip.open(file_path, "wt") as pubmed_file:
+        pubmed_file.write(f"<?xml version=\"1.0\"?><PubmedArticleSet>{''.join(article_xmls)}</PubmedArticleSet>")
+    return str(file_path)
+
+
+def _write_test_files(tmp_path):
+    file_a = _write_pubmed_file(tmp_path / "pubmed23n0001.xml.gz", [(1, ["Acetaminophen", "Fever"], ["pain"]),
+                                                                     (2, ["Fever"], [])])
+    file_b = _write_pubmed_file(tmp_path / "pubmed23n0002.xml.gz", [(3, ["Acetaminophen"], ["pain", "Fever"]),
+                                                                     (4, ["Zinc"], [])])
+    return [file_a, file_b]
+
+
+def test_parse_pubmed_file(tmp_path):
+    file_a, _ = _write_test_files(tmp_path)
+    assert pubmed_ingest.parse_pubmed_file(file_a) == {"Acetaminophen": {1}, "Fever": {1, 2}, "pain": {1}}
+
+
+def test_process_pubmed_files_skips_completed_files(tmp_path):
+    file_paths = _write_test_files(tmp_path)
+    partials_dir = str(tmp_path / "partials")
+    assert pubmed_ingest.process_pubmed_files(file_paths[:1], partials_dir, num_processes=1) == []
+    first_partial_path = pubmed_ingest.get_partial_file_path(partials_dir, file_paths[0])
+    first_partial_mtime = os.path.getmtime(first_partial_path)
+
+    # Resuming should only process the file that doesn't have a partial yet
+    assert pubmed_ingest.process_pubmed_files(file_paths, partials_dir, num_processes=2) == []
+    assert os.path.getmtime(first_partial_path) == first_partial_mtime
+    assert list(pubmed_ingest.read_partial_file(pubmed_ingest.get_partial_file_path(partials_dir, file_paths[1]))) == \
+        [("Acetaminophen", [3]), ("Fever", [3]), ("Zinc", [4]), ("pain", [3])]
+
+
+def test_process_pubmed_files_reports_bad_files(tmp_path):
+    bad_file_path = str(tmp_path / "pubmed23n0003.xml.gz")
+    with gzip.open(bad_file_path, "wt") as bad_file:
+        bad_file.write("<PubmedArticleSet><PubmedArticle>")
+    partials_dir = str(tmp_path / "partials")
+    assert pubmed_ingest.process_pubmed_files([bad_file_path], partials_dir, num_processes=1) == [bad_file_path]
+    assert os.listdir(partials_dir) == []
+
+
+def test_save_and_load_conceptname_to_pmids_db(tmp_path):
+    file_paths = _write_test_files(tmp_path)
+    partials_dir = str(tmp_path / "partials")
+    pubmed_ingest.process_pubmed_files(file_paths, partials_dir, num_processes=2)
+    partial_paths = [pubmed_ingest.get_partial_file_path(partials_dir, file_path) for file_path in file_paths]
+    db_path = str(tmp_path / "conceptname_to_pmids.sqlite")
+
+    assert pubmed_ingest.save_conceptname_to_pmids_db(partial_paths, db_path, batch_size=2) == 4
+    batches = list(pubmed_ingest.load_conceptname_to_pmids(db_path, batch_size=3))
+    assert [len(batch) for batch in batches] == [3, 1]
+    assert dict(row for batch in batches for row in batch) == {"Acetaminophen": [1, 3], "Fever": [1, 2, 3],
+                                                               "Zinc": [4], "pain": [1, 3]}
+
+
+def test_process_pubmed_files_redoes_updated_files(tmp_path):
+    file_paths = _write_test_files(tmp_path)
+    partials_dir = str(tmp_path / "partials")
+    assert pubmed_ingest.process_pubmed_files(file_paths, partials_dir, num_processes=1) == []
+    partial_paths = [pubmed_ingest.get_partial_file_path(partials_dir, file_path) for file_path in file_paths]
+    assert all(pubmed_ingest.is_partial_file_current(partial_path, file_path)
+               for partial_path, file_path in zip(partial_paths, file_paths))
+
+    # The second file is downloaded again (as wget -N does when the file was updated), with its server's timestamp
+    _write_pubmed_file(file_paths[1], [(5, ["Zinc"], [])])
+    os.utime(file_paths[1], (0, 0))
+    first_partial_mtime = os.path.getmtime(partial_paths[0])
+    assert not pubmed_ingest.is_partial_file_current(partial_paths[1], file_paths[1])
+    assert pubmed_ingest.process_pubmed_files(file_paths, partials_dir, num_processes=1) == []
+    assert os.path.getmtime(partial_paths[0]) == first_partial_mtime
+    assert list(pubmed_ingest.read_partial_file(partial_paths[1])) == [("Zinc", [5])]
+
+
+def test_merge_partial_files_in_groups(tmp_path):
+    partials_dir = tmp_path / "partials"
+    partials_dir.mkdir()
+    partial_paths = []
+    for file_num in range(7):
+        partial_path = str(partials_dir / f"pubmed23n{file_num:04}.xml.gz.tsv.gz")
+        pubmed_ingest.write_partial_file({f"concept {concept_num}": {file_num * 10 + concept_num}
+                                          for concept_num in range(file_num % 3, 5)}, partial_path)
+        partial_paths.append(partial_path)
+
+    merged = list(pubmed_ingest.merge_partial_files(partial_paths))
+    assert merged[0] == ("concept 0", [0, 30, 60])
+    assert len(merged) == 5
+    # Merging at most two files at a time gives the same result, and cleans up after itself
+    assert list(pubmed_ingest.merge_partial_files(partial_paths, max_fan_in=2)) == merged
+    assert sorted(os.listdir(partials_dir)) == sorted(os.path.basename(partial_path) for partial_path in partial_paths)
+
+
+if __name__ == "__main__":
+    pytest.main(['-v', 'test_ARAX_ngd_pubmed_ingest.py'])
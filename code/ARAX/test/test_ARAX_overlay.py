@@ -799,5 +799,56 @@ def test_ngd_sqlite_syntax_error():
     assert response.status == 'OK'
 
 
+def test_predictor_batched_treat_probs(tmp_path):
+    import sqlite3
+    from Overlay.predictor import predictor as predictor_module
+    DTD_prob_file = str(tmp_path / "DTD_probability_database.db")
+    connection = sqlite3.connect(DTD_prob_file)
+    connection.execute("CREATE TABLE DTD_PROBABILITY( disease VARCHAR(255), drug VARCHAR(255), probability FLOAT )")
+    connection.executemany("INSERT INTO DTD_PROBABILITY VALUES (?, ?, ?)", [('MONDO:1', 'CHEBI:1', 0.9), ('MONDO:2', 'CHEBI:1', 0.5),
+                                                                          ('MONDO:1', 'CHEBI:2', 0.85)])
+    connection.execute("CREATE INDEX idx_DTD_PROBABILITY_disease ON DTD_PROBABILITY(disease)")
+    connection.commit()
+    connection.close()
+
+    pred = predictor_module.predictor(DTD_prob_file=DTD_prob_file, use_prob_db=True)
+    pairs = [('CHEBI:1', 'MONDO:1'), ('CHEBI:1', 'MONDO:2'), ('CHEBI:2', 'MONDO:2'), ('CHEBI:2', 'MONDO:1')]
+    count, probabilities = pred.get_treat_probs(pairs)
+    assert count == 0
+    assert probabilities == {('CHEBI:1', 'MONDO:1'): 0.9, ('CHEBI:1', 'MONDO:2'): 0.5, ('CHEBI:2', 'MONDO:2'): None, ('CHEBI:2', 'MONDO:1'): 0.85}
+    assert all(probabilities[pair] == pred.get_prob_from_DTD_db(*pair) for pair in pairs)
+
+    # the pairs now come from the cache, without querying the database
+    pred.connection.close()
+    assert pred.get_treat_probs(pairs[:2]) == [0, {pair: probabilities[pair] for pair in pairs[:2]}]
+
+@pytest.mark.slow
+def test_concurrent_overlays_match_sequential():
+    actions = [
+        "add_qnode(ids=DOID:12889, key=n00, categories=biolink:Disease)",
+        "add_qnode(categories=biolink:Protein, is_set=true, key=n01)",
+        "add_qedge(subject=n00, object=n01, key=e00)",
+        "expand(edge_key=e00, kp=infores:rtx-kg2)",
+        "overlay(action=compute_ngd, virtual_relation_label=N1, subject_qnode_key=n00, object_qnode_key=n01)",
+        "overlay(action=overlay_clinical_info, paired_concept_frequency=true, subject_qnode_key=n00, object_qnode_key=n01, virtual_relation_label=C1)",
+        "overlay(action=fisher_exact_test, subject_qnode_key=n00, object_qnode_key=n01, virtual_relation_label=FET1, rel_edge_key=e00)",
+        "return(message=true, store=false)"
+    ]
+    araxq = ARAXQuery()
+    overlay_responses = []
+    for concurrent_overlays in [False, True]:
+        araxq.concurrent_overlays = concurrent_overlays
+        response = araxq.query({"operations": {"actions": ["create_message"] + actions}})
+        assert response.status == 'OK'
+        overlay_responses.append(response)
+    sequential_message, concurrent_message = [response.envelope.message for response in overlay_responses]
+    assert list(concurrent_message.query_graph.edges) == list(sequential_message.query_graph.edges) == ['e00', 'N1', 'C1', 'FET1']
+    assert list(concurrent_message.knowledge_graph.edges) == list(sequential_message.knowledge_graph.edges)
+    for edge_key, edge in sequential_message.knowledge_graph.edges.items():
+        assert [(attribute.attribute_type_id, attribute.value) for attribute in concurrent_message.knowledge_graph.edges[edge_key].attributes or []] == \
+               [(attribute.attribute_type_id, attribute.value) for attribute in edge.attributes or []]
+    assert "Applying 3 independent overlays concurrently" in overlay_responses[1].show(level=ARAXResponse.DEBUG)
+
+
 if __name__ == "__main__":
     pytest.main(['-v'])
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+
+# Tests applying independent overlays concurrently (ARAXOverlay.apply_concurrently()) against applying them in order,
+# offline: on a small fixture KG, with stand-ins for the overlay actions (which otherwise need their databases and KPs)
+
+import sys
+import os
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../ARAXQuery")
+from ARAX_overlay import ARAXOverlay
+from ARAX_response import ARAXResponse
+
+PACKAGE_PARENT = '../../UI/OpenAPI/python-flask-server'
+sys.path.append(os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), PACKAGE_PARENT)))
+from openapi_server.models.attribute import Attribute
+from openapi_server.models.edge import Edge
+from openapi_server.models.knowledge_graph import KnowledgeGraph
+from openapi_server.models.message import Message
+from openapi_server.models.node import Node
+from openapi_server.models.q_edge import QEdge
+from openapi_server.models.q_node import QNode
+from openapi_server.models.query_graph import QueryGraph
+from openapi_server.models.response import Response
+
+
+def _get_fixture_response(log_level=ARAXResponse.DEBUG):
+    nodes = {'MONDO:1': Node(name='disease', categories=['biolink:Disease'])}
+    nodes['MONDO:1'].qnode_keys = ['n00']
+    edges = {}
+    for protein_num in range(4):
+        protein_key = f"UniProtKB:{protein_num}"
+        nodes[protein_key] = Node(name=f"protein {protein_num}", categories=['biolink:Protein'])
+        nodes[protein_key].qnode_keys = ['n01']
+        edges[f"e{protein_num}"] = Edge(predicate='biolink:related_to', subject='MONDO:1', object=protein_key,
+                                        attributes=[Attribute(attribute_type_id='biolink:original_predicate', value='related_to')])
+        edges[f"e{protein_num}"].qedge_keys = ['e00']
+    query_graph = QueryGraph(nodes={'n00': QNode(ids=['MONDO:1']), 'n01': QNode(categories=['biolink:Protein'])},
+                             edges={'e00': QEdge(subject='n00', object='n01')})
+    response = ARAXResponse()
+    response.set_log_level(log_level)
+    response.envelope = Response(message=Message(query_graph=query_graph, knowledge_graph=KnowledgeGraph(nodes=nodes, edges=edges), results=[]))
+    return response
+
+
+def _add_virtual_edges(overlay, value):
+    # Adds an edge with the given attribute value between each pair of nodes of the given qnodes, and its qedge
+    parameters = overlay.parameters
+    message = overlay.message
+    label = parameters['virtual_relation_label']
+    nodes = message.knowledge_graph.nodes
+    for subject_key in [key for key, node in nodes.items() if parameters['subject_qnode_key'] in node.qnode_keys]:
+        for object_key in [key for key, node in nodes.items() if parameters['object_qnode_key'] in node.qnode_keys]:
+            edge = Edge(predicate='biolink:related_to', subject=subject_key, object=object_key,
+                        attributes=[Attribute(attribute_type_id=parameters['action'], value=value)])
+            edge.qedge_keys = [label]
+            message.knowledge_graph.edges[f"{label}_{subject_key}_{object_key}"] = edge
+    message.query_graph.edges[label] = QEdge(subject=parameters['subject_qnode_key'], object=parameters['object_qnode_key'])
+    overlay.response.info(f"Added {label} edges")
+
+
+def _compute_ngd(self):
+    # Also decorates the existing edges in place, as a first overlay of a group may do
+    for edge in list(self.message.knowledge_graph.edges.values()):
+        edge.attributes.append(Attribute(attribute_type_id='EDAM-DATA:2526', value='0.5'))
+    self.response.debug(f"Decorated {len(self.message.knowledge_graph.edges)} edges")
+    _add_virtual_edges(self, '0.5')
+
+
+def _overlay_clinical_info(self):
+    self.response.warning(f"Some nodes could not be mapped to OMOP", code='MissingMapping')
+    _add_virtual_edges(self, '12')
+
+
+def _fisher_exact_test(self):
+    n_rel_edges = sum(self.parameters['rel_edge_key'] in edge.qedge_keys for edge in self.message.knowledge_graph.edges.values())
+    _add_virtual_edges(self, f"{n_rel_edges}")
+
+
+@pytest.fixture
+def overlay_actions(monkeypatch):
+    for action, function in [('compute_ngd', _compute_ngd), ('overlay_clinical_info', _overlay_clinical_info),
+                             ('fisher_exact_test', _fisher_exact_test)]:
+        monkeypatch.setattr(ARAXOverlay, f"_ARAXOverlay__{action}", function)
+
+
+def _get_log(response):
+    # The log without the messages about applying concurrently, and with the KG stats after each overlay (see
+    # ARAXOverlay.report_response_stats()) only counted, since they describe each overlay's own copy of the message
+    return [(entry['level'], entry['code'], "(stats)" if entry['message'].startswith(("Query graph is ", "Number of ")) else entry['message'])
+            for entry in response.messages if not entry['message'].startswith(("Applying ", "The concurrently applied overlays"))]
+
+
+def _apply_in_order_and_concurrently(parameters_list, log_level=ARAXResponse.DEBUG):
+    sequential_response = _get_fixture_response(log_level)
+    for parameters in parameters_list:
+        ARAXOverlay().apply(sequential_response, parameters)
+    concurrent_response = _get_fixture_response(log_level)
+    ARAXOverlay().apply_concurrently(concurrent_response, parameters_list)
+    return sequential_response, concurrent_response
+
+
+def _assert_same_responses(sequential_response, concurrent_response):
+    assert sequential_response.status == concurrent_response.status == 'OK'
+    sequential_message = sequential_response.envelope.message
+    concurrent_message = concurrent_response.envelope.message
+    for graph_name in ['query_graph', 'knowledge_graph']:
+        for dict_name in ['nodes', 'edges']:
+            sequential_dict = getattr(getattr(sequential_message, graph_name), dict_name)
+            concurrent_dict = getattr(getattr(concurrent_message, graph_name), dict_name)
+            assert list(concurrent_dict) == list(sequential_dict)
+            for key, element in sequential_dict.items():
+                assert vars(concurrent_dict[key]) == vars(element)
+    assert _get_log(concurrent_response) == _get_log(sequential_response)
+    assert concurrent_response.n_warnings == sequential_response.n_warnings
+
+
+def test_concurrent_overlays_match_sequential(overlay_actions):
+    parameters_list = [
+        {'action': 'compute_ngd', 'virtual_relation_label': 'N1', 'subject_qnode_key': 'n00', 'object_qnode_key': 'n01'},
+        {'action': 'overlay_clinical_info', 'virtual_relation_label': 'C1', 'subject_qnode_key': 'n00', 'object_qnode_key': 'n01'},
+        {'action': 'fisher_exact_test', 'virtual_relation_label': 'FET1', 'subject_qnode_key': 'n00', 'object_qnode_key': 'n01', 'rel_edge_key': 'e00'},
+    ]
+    fixture_message = _get_fixture_response().envelope.message
+    sequential_response, concurrent_response = _apply_in_order_and_concurrently(parameters_list)
+    assert "Applying 3 independent overlays concurrently" in concurrent_response.show(level=ARAXResponse.DEBUG)
+    assert "conflict" not in concurrent_response.show(level=ARAXResponse.DEBUG)
+    _assert_same_responses(sequential_response, concurrent_response)
+
+    kg = concurrent_response.envelope.message.knowledge_graph
+    assert list(concurrent_response.envelope.message.query_graph.edges) == ['e00', 'N1', 'C1', 'FET1']
+    assert len(kg.edges) == len(fixture_message.knowledge_graph.edges) * 4
+    assert [len(kg.edges[edge_key].attributes) for edge_key in fixture_message.knowledge_graph.edges] == [2, 2, 2, 2]
+
+
+def test_conflicting_overlays_are_applied_in_order_once(overlay_actions):
+    #### Both clinical info overlays add the same edges, so the group is applied again in order
+    parameters_list = [
+        {'action': 'compute_ngd', 'virtual_relation_label': 'N1', 'subject_qnode_key': 'n00', 'object_qnode_key': 'n01'},
+        {'action': 'overlay_clinical_info', 'virtual_relation_label': 'C1', 'subject_qnode_key': 'n00', 'object_qnode_key': 'n01'},
+        {'action': 'overlay_clinical_info', 'virtual_relation_label': 'C1', 'subject_qnode_key': 'n00', 'object_qnode_key': 'n01'},
+    ]
+    sequential_response, concurrent_response = _apply_in_order_and_concurrently(parameters_list)
+    assert "conflict, so applying them in order instead" in concurrent_response.show(level=ARAXResponse.DEBUG)
+    _assert_same_responses(sequential_response, concurrent_response)
+
+    #### The edges the first overlay decorated while the group ran concurrently were only decorated once
+    kg = concurrent_response.envelope.message.knowledge_graph
+    assert [len(kg.edges[f"e{protein_num}"].attributes) for protein_num in range(4)] == [2, 2, 2, 2]
+
+
+def test_concurrent_overlays_keep_the_log_level(overlay_actions):
+    parameters_list = [
+        {'action': 'compute_ngd', 'virtual_relation_label': 'N1', 'subject_qnode_key': 'n00', 'object_qnode_key': 'n01'},
+        {'action': 'overlay_clinical_info', 'virtual_relation_label': 'C1', 'subject_qnode_key': 'n00', 'object_qnode_key': 'n01'},
+    ]
+    sequential_response, concurrent_response = _apply_in_order_and_concurrently(parameters_list, log_level=ARAXResponse.INFO)
+    _assert_same_responses(sequential_response, concurrent_response)
+    assert all(entry['level'] != 'DEBUG' for entry in concurrent_response.messages)
+    assert [entry['level'] for entry in concurrent_response.messages] == ['INFO', 'WARNING', 'INFO']
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+
+# Tests the cache of answers to TRAPI queries (ResponseCache/query_result_cache.py)
+
+import sys
+import os
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../ResponseCache")
+from query_result_cache import QueryResultCache
+sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../ARAXQuery/Expand")
+import kp_info_cacher
+
+
+class FakeNodeSynonymizer:
+    # (so the test doesn't need the NodeSynonymizer's sqlite database)
+    canonical_curies = {"DOID:9352": "MONDO:0005148", "MONDO:0005148": "MONDO:0005148"}
+
+    def get_canonical_curies(self, curies):
+        return {curie: {"preferred_curie": self.canonical_curies[curie]} if curie in self.canonical_curies else None
+                for curie in curies}
+
+
+class FakeBiolinkHelper:
+    descendants = {"biolink:ChemicalEntity": ["biolink:ChemicalEntity", "biolink:MolecularEntity", "biolink:Drug"],
+                   "biolink:MolecularEntity": ["biolink:MolecularEntity"], "biolink:Drug": ["biolink:Drug"],
+                   "biolink:treats": ["biolink:treats"]}
+
+    def get_descendants(self, biolink_items):
+        return [descendant for item in biolink_items for descendant in self.descendants[item]]
+
+
+def _get_query_graph(ids, categories):
+    return {"nodes": {"n0": {"ids": ids, "is_set": False}, "n1": {"categories": categories, "is_set": None}},
+            "edges": {"e0": {"subject": "n1", "object": "n0", "predicates": ["biolink:treats"]}}}
+
+
+def test_equivalent_queries_share_a_key(tmp_path):
+    cache = QueryResultCache(str(tmp_path / "query_result_cache.sqlite"))
+    cache._synonymizer = FakeNodeSynonymizer()
+    cache._biolink_helper = FakeBiolinkHelper()
+    key = cache.get_cache_key(_get_query_graph(["MONDO:0005148"], ["biolink:ChemicalEntity"]))
+    # A synonymous curie, and a category list that is the same once descendants are included
+    assert cache.get_cache_key(_get_query_graph(["DOID:9352"], ["biolink:Drug", "biolink:ChemicalEntity"])) == key
+    assert cache.get_cache_key(_get_query_graph(["MONDO:0005148"], ["biolink:Drug"])) != key
+    assert cache.get_cache_key(_get_query_graph(["MONDO:0005148"], ["biolink:ChemicalEntity"]), mode='RTXKG2') != key
+    assert cache.get_cache_key(_get_query_graph(["MONDO:0007455"], ["biolink:ChemicalEntity"])) not in [key, None]
+
+
+def test_answers_expire_and_are_invalidated(tmp_path):
+    cache = QueryResultCache(str(tmp_path / "query_result_cache.sqlite"), ttl=60)
+    answer = {"message": {"results": []}, "query_plan": {}, "total_results_count": 0}
+    cache.put("query:a", answer)
+    assert cache.get("query:a") == answer
+    assert cache.get("query:b") is None
+
+    cache.ttl = 0
+    time.sleep(0.01)
+    assert cache.get("query:a") is None
+    cache.ttl = 60
+
+    cache.invalidate()
+    assert cache.get("query:a") is None
+    cache.put("query:a", answer)
+    assert cache.get("query:a") == answer
+
+
+def test_data_version_follows_the_kp_info_cache_contents(tmp_path, monkeypatch):
+    cache = QueryResultCache(str(tmp_path / "query_result_cache.sqlite"))
+    kp_info_cache_path = tmp_path / "cache_smart_api_and_meta_map.pkl"
+    monkeypatch.setattr(cache, "_get_kp_info_cache_path", lambda: str(kp_info_cache_path))
+    kp_info_cache_path.write_bytes(b"kp info")
+    data_version = cache.get_data_version()
+
+    #### Rewriting the same contents later doesn't change the version; different contents do
+    kp_info_cache_path.write_bytes(b"kp info")
+    os.utime(kp_info_cache_path, (time.time() + 60, time.time() + 60))
+    assert cache.get_data_version() == data_version
+    kp_info_cache_path.write_bytes(b"new kp info")
+    assert cache.get_data_version() != data_version
+
+
+class FakeSmartAPI:
+    registrations = [{"infores_name": "infores:kp-a", "servers": [{"url": "https://kp-a.org/"}]}]
+    kps_excluded_by_version = set()
+    kps_excluded_by_maturity = set()
+
+    def get_all_trapi_kp_registrations(self, trapi_version, req_maturity):
+        return self.registrations
+
+
+def test_kp_info_refresh_only_invalidates_when_changed(tmp_path, monkeypatch):
+    invalidations = []
+    monkeypatch.setattr(kp_info_cacher, "SmartAPI", FakeSmartAPI)
+    monkeypatch.setattr(kp_info_cacher, "invalidate_query_result_cache", lambda: invalidations.append(time.time()))
+    monkeypatch.setattr(kp_info_cacher.KPInfoCacher, "_build_meta_map",
+                        lambda self, allowed_kps_dict: {kp: {"predicates": {}, "prefixes": {}} for kp in allowed_kps_dict})
+    cacher = kp_info_cacher.KPInfoCacher()
+    cacher.smart_api_and_meta_map_cache = str(tmp_path / "cache_smart_api_and_meta_map.pkl")
+    cacher.cache_refresh_pid_path = str(tmp_path / "cache_refresh.pid")
+
+    cacher.refresh_kp_info_caches()
+    assert len(invalidations) == 1
+    cache_contents = open(cacher.smart_api_and_meta_map_cache, "rb").read()
+    cacher.refresh_kp_info_caches()
+    assert len(invalidations) == 1
+    assert open(cacher.smart_api_and_meta_map_cache, "rb").read() == cache_contents
+
+    monkeypatch.setattr(FakeSmartAPI, "registrations", FakeSmartAPI.registrations +
+                        [{"infores_name": "infores:kp-b", "servers": [{"url": "https://kp-b.org"}]}])
+    cacher.refresh_kp_info_caches()
+    assert len(invalidations) == 2
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import pytest
+
+import pickle
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../ARAXQuery")
+import ARAX_query_tracker
+from ARAX_query_tracker import ARAXQueryTracker, ARAXQuery, ARAXOngoingQuery, ARAXQueryHeartbeat, decode_input_query, encode_input_query
+
+
+def _get_tracker(tmp_path):
+    return ARAXQueryTracker(engine_type='sqlite', database_path=str(tmp_path / "QueryTracker.sqlite"))
+
+
+def _create_entry(query_tracker, remote_address='test_address'):
+    input_query = { 'message': { 'query_graph': { 'nodes': { 'n0': { 'ids': [ 'MONDO:0005148' ] }, 'n1': {} },
+                                                  'edges': { 'e0': { 'subject': 'n0', 'object': 'n1' } } } } }
+    attributes = { 'submitter': 'infores:arax', 'input_query': input_query, 'remote_address': remote_address }
+    return query_tracker.create_tracker_entry(attributes), input_query
+
+
+def test_input_query_round_trip(tmp_path):
+    query_tracker = _get_tracker(tmp_path)
+    tracker_id, input_query = _create_entry(query_tracker)
+    assert query_tracker.get_query_by_id(tracker_id) == input_query
+    entry = query_tracker.session.query(ARAXQuery).filter(ARAXQuery.query_id == tracker_id).one()
+    assert entry.input_query_hash == encode_input_query(input_query)[1]
+
+
+def test_engine_type(tmp_path, monkeypatch):
+    monkeypatch.setattr(ARAXQueryTracker, "connect", lambda self: None)
+    monkeypatch.setattr(ARAXQueryTracker, "disconnect", lambda self: None)
+    for engine_type in [None, 'mysql']:
+        query_tracker = ARAXQueryTracker(engine_type=engine_type)
+        assert (query_tracker.engine_type, query_tracker.databaseName) == ('mysql', "ResponseCache")
+    query_tracker = ARAXQueryTracker(engine_type='sqlite')
+    assert (query_tracker.engine_type, query_tracker.databaseName) == ('sqlite', "QueryTracker")
+
+
+def test_legacy_pickled_input_query():
+    input_query = { 'message': { 'query_graph': { 'nodes': {}, 'edges': {} } } }
+    assert decode_input_query(pickle.dumps(input_query, protocol=pickle.HIGHEST_PROTOCOL)) == input_query
+
+
+def test_completed_query_leaves_ongoing_queries(tmp_path):
+    query_tracker = _get_tracker(tmp_path)
+    tracker_id, input_query = _create_entry(query_tracker)
+    assert query_tracker.session.query(ARAXQueryHeartbeat).filter(ARAXQueryHeartbeat.query_id == tracker_id).count() == 1
+    attributes = { 'status': 'Completed', 'message_id': 1, 'message_code': 'OK', 'code_description': '1 result' }
+    query_tracker.update_tracker_entry(tracker_id, attributes, wait=True)
+    query_tracker.session.commit()
+    assert query_tracker.session.query(ARAXOngoingQuery).filter(ARAXOngoingQuery.query_id == tracker_id).count() == 0
+    assert query_tracker.session.query(ARAXQueryHeartbeat).filter(ARAXQueryHeartbeat.query_id == tracker_id).count() == 0
+    assert query_tracker.get_job_status(tracker_id).status == 'Completed'
+
+
+def test_query_without_heartbeat_is_found_dead(tmp_path):
+    query_tracker = _get_tracker(tmp_path)
+    live_tracker_id, input_query = _create_entry(query_tracker, remote_address='live_address')
+    dead_tracker_id, input_query = _create_entry(query_tracker, remote_address='dead_address')
+    ARAX_query_tracker._tracker_writer.unregister_heartbeat(dead_tracker_id)
+    query_tracker.session.query(ARAXQueryHeartbeat).filter(ARAXQueryHeartbeat.query_id == dead_tracker_id).update(
+        { 'last_heartbeat': time.time() - ARAX_query_tracker.HEARTBEAT_TIMEOUT - 1 })
+    query_tracker.session.commit()
+
+    ongoing_queries_by_remote_address = query_tracker.check_ongoing_queries()
+    assert ongoing_queries_by_remote_address == { 'live_address': 1 }
+    ARAX_query_tracker.flush_tracker_updates()
+    query_tracker.session.commit()
+    assert query_tracker.get_job_status(dead_tracker_id).status == 'Died'
+    assert query_tracker.get_job_status(live_tracker_id).status == 'started'
+
+
+def test_result_cache_stats(tmp_path):
+    query_tracker = _get_tracker(tmp_path)
+    for result_cache_status in [ 'hit', 'miss', 'hit', None ]:
+        tracker_id, input_query = _create_entry(query_tracker)
+        attributes = { 'status': 'Completed', 'message_id': 1, 'message_code': 'OK', 'code_description': '1 result',
+                       'result_cache_status': result_cache_status }
+        query_tracker.update_tracker_entry(tracker_id, attributes, wait=True)
+    query_tracker.session.commit()
+    status = query_tracker.get_status()
+    assert [ query['result_cache'] for query in status['recent_queries'] ] == [ None, 'hit', 'miss', 'hit' ]
+    assert status['result_cache_stats'] == { 'hits': 2, 'misses': 1, 'bypasses': 0, 'hit_rate': 0.667 }
+
+
+def test_forked_child_gets_new_locks_and_engine(tmp_path):
+    # (the child of a fork made while another thread holds a lock must not wait on it forever)
+    query_tracker = _get_tracker(tmp_path)
+    with ARAX_query_tracker._engines_lock, ARAX_query_tracker._tracker_writer._lock:
+        pid = os.fork()
+        if pid == 0:
+            is_reset = ARAX_query_tracker._engines_lock.acquire(timeout=10) and \
+                ARAX_query_tracker._tracker_writer._lock.acquire(timeout=10)
+            if is_reset:
+                ARAX_query_tracker._engines_lock.release()
+                ARAX_query_tracker._tracker_writer._lock.release()
+                is_reset = _get_tracker(tmp_path).engine is not query_tracker.engine
+            os._exit(0 if is_reset else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+
+# Tests response storage with a local directory standing in for S3
+
+import sys
+import os
+import pytest
+
+import json
+import types
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../ResponseCache")
+import response_storage
+from response_storage import LocalDirectoryResponseStore, BackgroundResponseWriter
+
+
+def _get_envelope(response_id):
+    return { 'id': f"https://localhost/api/arax/v1.4/response/{response_id}", 'status': 'Success', 'description': 'Found 1 result',
+             'message': { 'query_graph': { 'nodes': { 'n0': { 'ids': [ 'MONDO:0005148' ] }, 'n1': {} }, 'edges': {} },
+                          'knowledge_graph': { 'nodes': {}, 'edges': {} }, 'results': [] },
+             'logs': [ { 'level': 'INFO', 'message': 'café' } ] }
+
+
+def test_round_trip_through_background_writer(tmp_path):
+    store = LocalDirectoryResponseStore(str(tmp_path))
+    writer = BackgroundResponseWriter()
+    envelope = _get_envelope(1)
+    writer.submit(store, "/responses/1.json", envelope)
+    assert writer.wait(timeout=30)
+
+    #### Stored compressed, and read back as it was
+    with open(tmp_path / "responses" / "1.json", 'rb') as infile:
+        body = infile.read()
+    assert body.startswith(response_storage.GZIP_MAGIC) or body.startswith(response_storage.ZSTD_MAGIC)
+    assert len(body) < len(json.dumps(envelope, indent=2))
+    assert store.get("/responses/1.json") == envelope
+    assert not list((tmp_path / "responses").glob("*.tmp"))
+
+
+def test_failed_writes_are_retried_then_handed_over():
+    class FailingStore:
+        def __init__(self):
+            self.n_attempts = 0
+        def put(self, key, body):
+            self.n_attempts += 1
+            raise IOError("unavailable")
+
+    store = FailingStore()
+    failed_writes = []
+    writer = BackgroundResponseWriter(max_attempts=3, initial_retry_delay=0.01)
+    writer.submit(store, "/responses/2.json", _get_envelope(2), compression='none',
+                  on_failure=lambda key, body: failed_writes.append((key, json.loads(body))))
+    assert writer.wait(timeout=30)
+    assert store.n_attempts == 3
+    assert failed_writes == [ ("/responses/2.json", _get_envelope(2)) ]
+
+
+def test_get_response_reads_legacy_uncompressed_response(tmp_path):
+    sqlalchemy = pytest.importorskip("sqlalchemy")
+    import response_cache
+    from response_cache import ResponseCache, Response, ResponseCacheConfigSetting
+
+    #### A response cache whose records are in a scratch sqlite database and whose responses are in tmp_path
+    engine = sqlalchemy.create_engine(f"sqlite:///{tmp_path / 'ResponseCache.sqlite'}")
+    response_cache.Base.metadata.create_all(engine)
+    cache = ResponseCache.__new__(ResponseCache)
+    cache._session = sqlalchemy.orm.sessionmaker(bind=engine)()
+    cache._engine = engine
+    cache.rtxConfig = types.SimpleNamespace(response_storage_override=str(tmp_path / "storage"))
+    cache.session.add(ResponseCacheConfigSetting(key='S3BucketMigrationDatetime', value='2020-01-01 00:00:00', comment=''))
+    for response_id in [ 1000001, 1000002 ]:
+        cache.session.add(Response(response_id=response_id, response_datetime=datetime.now(), tool_version='test',
+                                   response_code='OK', message='', n_results=0))
+    cache.session.commit()
+
+    #### One stored before responses were compressed (indented JSON), one stored now
+    store = cache.get_response_store('new')
+    os.makedirs(tmp_path / "storage" / "responses")
+    with open(tmp_path / "storage" / "responses" / "1000001.json", 'w') as outfile:
+        json.dump(_get_envelope(1000001), outfile, indent=2)
+    store.put("/responses/1000002.json", response_storage.serialize_envelope(_get_envelope(1000002)))
+
+    for response_id in [ 1000001, 1000002 ]:
+        envelope = cache.get_response(response_id)
+        assert isinstance(envelope, dict)
+        assert 'validation_result' in envelope
+        #### (the validator may add to the logs)
+        expected_envelope = _get_envelope(response_id)
+        assert envelope['logs'][0] == expected_envelope['logs'][0]
+        assert { key: value for key, value in envelope.items() if key not in [ 'validation_result', 'logs' ] } == \
+               { key: value for key, value in expected_envelope.items() if key != 'logs' }
+    assert cache.get_response(1000003)[1] == 404
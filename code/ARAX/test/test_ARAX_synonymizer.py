@@ -417,5 +417,32 @@ def test_cluster_graphs():
         assert node["attributes"]
 
 
+def test_batched_and_cached_normalizer_results():
+    input_entities = [PTGS1_NAME, PARKINSONS_CURIE, ACETAMINOPHEN_CURIE, FAKE_NAME]
+    # Each entity looked up on its own (by a fresh instance, sharing the process's connection pool and cache)
+    single_results = {entity: NodeSynonymizer().get_normalizer_results(entity)[entity] for entity in input_entities}
+    batched_results = NodeSynonymizer().get_normalizer_results(input_entities)
+    assert batched_results == single_results
+
+    # Cached results are copies, so changing what one caller got doesn't change what the next one gets
+    batched_results[PTGS1_NAME]["id"]["name"] = "changed"
+    assert NodeSynonymizer().get_normalizer_results(PTGS1_NAME)[PTGS1_NAME] == single_results[PTGS1_NAME]
+
+
+def test_forked_child_gets_a_new_lock_and_empty_caches():
+    # (the child of a fork made while another thread holds the lock must not wait on it forever)
+    import node_synonymizer
+    node_synonymizer._normalizer_results_cache[("synonymizer.sqlite", 0, FAKE_CURIE, None)] = {}
+    with node_synonymizer._connection_pools_lock:
+        pid = os.fork()
+        if pid == 0:
+            is_reset = node_synonymizer._connection_pools_lock.acquire(timeout=10) and \
+                not node_synonymizer._connection_pools and not node_synonymizer._normalizer_results_cache
+            os._exit(0 if is_reset else 1)
+    node_synonymizer._normalizer_results_cache.clear()
+    _, status = os.waitpid(pid, 0)
+    assert os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0
+
+
 if __name__ == "__main__":
     pytest.main(['-v', 'test_ARAX_synonymizer.py'])
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+# Tests the xCRG model store (Infer/scripts/creativeCRG.py) on small synthetic embeddings and models
+
+import sys
+import os
+import pytest
+
+import types
+import joblib
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../ARAXQuery")
+sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../ARAXQuery/Expand")
+sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../ARAXQuery/Infer/scripts")
+import creativeCRG
+
+
+class LinearModel:
+    # Stands in for the trained classifiers: the probability is a logistic function of the features
+    def __init__(self, weights):
+        self.weights = weights
+        self.n_calls = 0
+
+    def predict_proba(self, X):
+        self.n_calls += 1
+        tp_probs = 1 / (1 + np.exp(-(X @ self.weights)))
+        return np.column_stack([1 - tp_probs, tp_probs])
+
+
+class FakeBiolinkHelper:
+    def get_predicate_depth_map(self):
+        return {'biolink:related_to': 0}
+
+    def get_descendants(self, categories):
+        return categories
+
+
+@pytest.fixture
+def data_path(tmp_path, monkeypatch):
+    rng = np.random.default_rng(1)
+    np.savez(tmp_path / "embeddings.npz",
+             chemical_curies=np.array([f"CHEBI:{i}" for i in range(40)]), chemical_curie_types=np.array(['biolink:SmallMolecule'] * 40),
+             chemical_embs=rng.random((40, 3)), gene_curies=np.array([f"NCBIGene:{i}" for i in range(30)]),
+             gene_curie_types=np.array(['biolink:Gene'] * 30), gene_embs=rng.random((30, 2)))
+    joblib.dump(LinearModel(rng.normal(size=5)), tmp_path / "increase_model.pkl")
+    joblib.dump(LinearModel(rng.normal(size=5)), tmp_path / "decrease_model.pkl")
+    monkeypatch.setattr(creativeCRG, "RTXConfig", types.SimpleNamespace(xcrg_embeddings_path="/xcrg/embeddings.npz",
+                                                                         xcrg_increase_model_path="/xcrg/increase_model.pkl",
+                                                                         xcrg_decrease_model_path="/xcrg/decrease_model.pkl"))
+    monkeypatch.setattr(creativeCRG, "BiolinkHelper", FakeBiolinkHelper)
+    monkeypatch.setattr(creativeCRG, "_xcrg_model_stores", dict())
+    return tmp_path
+
+
+def _get_expected_top_N(store, chemical_rows, gene_rows, N, model_type):
+    # Scores every pair the way the models were trained (chemical embedding, then gene embedding)
+    X = np.hstack([store.chemical_embs[chemical_rows], store.gene_embs[gene_rows]])
+    probas = store.models[model_type].predict_proba(X)
+    res = pd.DataFrame({'chemical_id': [store.chemical_curies[row] for row in chemical_rows],
+                        'gene_id': [store.gene_curies[row] for row in gene_rows],
+                        'tn_prob': probas[:, 0], 'tp_prob': probas[:, 1]})
+    return res.sort_values(by='tp_prob', ascending=False, kind='stable').iloc[:N, :].reset_index(drop=True)
+
+
+def test_top_N_predictions(data_path):
+    store = creativeCRG.get_xcrg_model_store(str(data_path))
+    gene_row = store.gene_curie_to_row["NCBIGene:7"]
+    expected = _get_expected_top_N(store, np.arange(store.num_chemicals), np.full(store.num_chemicals, gene_row), 5, 'increase')
+    pd.testing.assert_frame_equal(store.top_N_chemicals_for_gene("NCBIGene:7", 5, 'increase'), expected)
+
+    chemical_row = store.chemical_curie_to_row["CHEBI:3"]
+    expected = _get_expected_top_N(store, np.full(store.num_genes, chemical_row), np.arange(store.num_genes), 50, 'decrease')
+    assert len(expected) == store.num_genes
+    pd.testing.assert_frame_equal(store.top_N_genes_for_chemical("CHEBI:3", 50, 'decrease'), expected)
+
+    assert store.top_N_chemicals_for_gene("NCBIGene:999", 5, 'increase') is None
+    assert store.top_N_genes_for_chemical("CHEBI:999", 5, 'increase') is None
+
+
+def test_predictions_are_cached_and_copied(data_path):
+    store = creativeCRG.get_xcrg_model_store(str(data_path))
+    model = store.models['increase']
+    res = store.top_N_chemicals_for_gene("NCBIGene:2", 5, 'increase')
+    n_calls = model.n_calls
+    res['tp_prob'] = 0.0
+    cached_res = store.top_N_chemicals_for_gene("NCBIGene:2", 5, 'increase')
+    assert model.n_calls == n_calls
+    assert (cached_res['tp_prob'] > 0).all()
+    pd.testing.assert_frame_equal(cached_res, store.top_N_chemicals_for_gene("NCBIGene:2", 5, 'increase'))
+
+    #### Another N (or direction) is predicted again
+    assert len(store.top_N_chemicals_for_gene("NCBIGene:2", 6, 'increase')) == 6
+    assert model.n_calls == n_calls + 1
+
+    #### Only the most recently used predictions are kept
+    store.max_cached_predictions = 2
+    store.top_N_chemicals_for_gene("NCBIGene:3", 5, 'increase')
+    assert len(store._prediction_cache) == 2
+    assert ('chemicals', "NCBIGene:2", 'increase', 5) not in store._prediction_cache
+
+
+def test_store_is_loaded_once_per_process(data_path):
+    store = creativeCRG.get_xcrg_model_store(str(data_path))
+    assert creativeCRG.get_xcrg_model_store(str(data_path / ".")) is store
+    assert len(creativeCRG._xcrg_model_stores) == 1
+
+
+def test_load_errors_are_raised(data_path):
+    (data_path / "decrease_model.pkl").unlink()
+    with pytest.raises(FileNotFoundError):
+        creativeCRG.get_xcrg_model_store(str(data_path))
+    assert creativeCRG._xcrg_model_stores == {}
@@ -229,6 +229,17 @@ class RTXConfiguration:
         else:
             self.rtx_kg2_url = None
 
+        # Set a stand-in for the S3 response storage if an override was provided: either the endpoint URL of an
+        # S3-compatible server (e.g., MinIO) or a local directory to store responses in
+        self.response_storage_override = self._read_override_file(f"{file_dir}/response_storage_override.txt")
+
+        # Use a different KP info cache (SmartAPI and meta map info) if an override was provided, e.g., one that
+        # points Expand at the mock KPs of the offline benchmark (see ARAX/Testing/benchmark)
+        self.kp_info_cache_override = self._read_override_file(f"{file_dir}/kp_info_cache_override.txt")
+
+        # Write a profile (the time and resources each stage took) of every query to this directory, if provided
+        self.profile_output_dir = self._read_override_file(f"{file_dir}/profile_output_dir_override.txt")
+
         # Default to KG2c neo4j
         self.neo4j_kg2 = "KG2c"
         if DEBUG:
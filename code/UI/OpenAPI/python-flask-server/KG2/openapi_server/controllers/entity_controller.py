@@ -9,6 +9,17 @@ import sys
 sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../../../../../../ARAX/NodeSynonymizer")
 from node_synonymizer import NodeSynonymizer
 
+# One synonymizer per process, shared by all requests (its sqlite connections are pooled and it caches popular
+# entities' results, so this endpoint doesn't open a database per request)
+_synonymizer = None
+
+
+def _get_synonymizer():
+    global _synonymizer
+    if _synonymizer is None:
+        _synonymizer = NodeSynonymizer()
+    return _synonymizer
+
 
 def get_entity(q):  # noqa: E501
     """Obtain CURIE and synonym information about a search term
@@ -20,7 +31,7 @@ def get_entity(q):  # noqa: E501
 
     :rtype: object
     """
-    synonymizer = NodeSynonymizer()
+    synonymizer = _get_synonymizer()
     response = synonymizer.get_normalizer_results(q)
 
     return response
@@ -37,7 +48,7 @@ def post_entity(body):  # noqa: E501
     :rtype: EntityQuery
     """
 
-    synonymizer = NodeSynonymizer()
+    synonymizer = _get_synonymizer()
     response = synonymizer.get_normalizer_results(body)
 
     return response
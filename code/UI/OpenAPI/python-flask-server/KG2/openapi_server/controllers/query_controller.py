@@ -6,6 +6,7 @@ import sys
 import signal
 import resource
 import traceback
+from datetime import datetime
 from typing import Iterable, Callable
 import setproctitle
 
@@ -14,18 +15,35 @@ def eprint(*args, **kwargs): print(*args, file=sys.stderr, **kwargs)
 
 
 rlimit_child_process_bytes = 34359738368  # 32 GiB
+child_pending_writes_timeout = 120  # seconds
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/../../../../../../ARAX/ARAXQuery")
 import ARAX_query
+import response_storage
+import ARAX_query_tracker
+import ARAX_admission_controller
+from ARAX_response import ARAXResponse
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)) + "/../models")
 import response
 
 
+def child_finish_pending_writes():
+    # os._exit() skips atexit handlers, so the child lets any response storage
+    # and tracker updates still pending finish (for a while) before it exits
+    if not response_storage.wait_for_pending_writes(timeout=child_pending_writes_timeout):
+        eprint("[query_controller]: child process gave up waiting for "
+               "the response to be stored")
+    if not ARAX_query_tracker.flush_tracker_updates(timeout=child_pending_writes_timeout):
+        eprint("[query_controller]: child process gave up waiting for "
+               "the query tracker to be updated")
+
+
 def child_receive_sigpipe(signal_number, frame):
     if signal_number == signal.SIGPIPE:
         eprint("[query_controller]: child process detected a "
                "SIGPIPE; exiting python")
+        child_finish_pending_writes()
         os._exit(0)
 
 
@@ -59,7 +77,10 @@ def run_query_dict_in_child_process(query_dict: dict,
                     write_fo.flush()
         except BaseException as e:
             print(f"Exception in query_controller.run_query_dict_in_child_process: {type(e)}\n{traceback.print_exc()}", file=sys.stderr)
+            child_finish_pending_writes()
             os._exit(1)
+        # the client has its response now
+        child_finish_pending_writes()
         os._exit(0)
     elif pid > 0: # I am the parent process
         os.close(write_fd)  # the parent does not write to the pipe, it reads from it
@@ -71,6 +92,45 @@ def run_query_dict_in_child_process(query_dict: dict,
     return read_fo
 
 
+def run_query_dict_when_admitted(query_dict: dict,
+                                 query_runner: Callable,
+                                 stream_queue_position: bool = False) -> Iterable[str]:
+    # Queries only start (in a child process) when the admission controller
+    # finds room for their estimated memory use; until then they wait in its
+    # queue, and streaming clients are told their position in it
+    admission_controller = ARAX_admission_controller.get_admission_controller()
+    cost = admission_controller.estimate_cost(query_dict)
+    ticket = admission_controller.submit(cost)
+    if ticket is None:
+        eprint(f"[query_controller]: query queue is full; rejecting query with estimated cost {cost}")
+        yield _get_over_limit_json("The query server is at capacity and its queue is full; please try again later", 429)
+        return
+    try:
+        for queue_position in admission_controller.wait_for_admission(ticket):
+            if stream_queue_position:
+                yield json.dumps({ 'timestamp': str(datetime.now().isoformat()), 'level': 'INFO', 'code': 'Queued',
+                                   'message': f"Query is waiting to run (estimated memory {cost['memory_gb']} GB): "
+                                              f"position {queue_position} in the queue" }) + "\n"
+        if ticket.status != 'admitted':
+            eprint(f"[query_controller]: query timed out in the queue; estimated cost {cost}")
+            yield _get_over_limit_json("The query waited too long in the query server's queue; please try again later", 503)
+            return
+        eprint(f"[query_controller]: query admitted with estimated cost {cost}; {admission_controller.get_status()}")
+        yield from run_query_dict_in_child_process(query_dict, query_runner)
+    finally:
+        admission_controller.release(ticket)
+
+
+def _get_over_limit_json(description: str, http_status: int) -> str:
+    # (a bare envelope, without the biolink metadata ARAXMessenger fills in, so that turning queries away stays cheap)
+    response = ARAXResponse()
+    response.error(description, error_code="OverLimit", http_status=http_status)
+    envelope_dict = { 'status': response.error_code, 'description': response.message,
+                      'message': { 'query_graph': None, 'knowledge_graph': None, 'results': None },
+                      'logs': response.messages.to_dict(), 'http_status': http_status }
+    return json.dumps(envelope_dict, allow_nan=False) + "\n"
+
+
 def _run_query_and_return_json_generator_nonstream(query_dict: dict) -> Iterable[str]:
     envelope = ARAX_query.ARAXQuery().query_return_message(query_dict, mode='RTXKG2')
     envelope_dict = envelope.to_dict()
@@ -117,17 +177,19 @@ def query(request_body):  # noqa: E501
         if not fork_mode:
             json_generator = _run_query_and_return_json_generator_stream(query)
         else:
-            json_generator = run_query_dict_in_child_process(query,
-                                                             _run_query_and_return_json_generator_stream)
+            json_generator = run_query_dict_when_admitted(query,
+                                                          _run_query_and_return_json_generator_stream,
+                                                          stream_queue_position=True)
 
         resp_obj = flask.Response(json_generator, mimetype=mime_type)
     # Else perform the query and return the result
         http_status = None
 
     else:
-        json_generator = run_query_dict_in_child_process(query,
-                                                         _run_query_and_return_json_generator_nonstream)
-        the_dict = json.loads(next(json_generator))
+        json_generator = run_query_dict_when_admitted(query,
+                                                      _run_query_and_return_json_generator_nonstream)
+        # (read to the end, so that the query's admission is released as soon as it is done)
+        the_dict = json.loads(''.join(json_generator))
         http_status = the_dict.get('http_status', 200)
         resp_obj = response.Response.from_dict(the_dict)
         resp_obj.http_status = http_status
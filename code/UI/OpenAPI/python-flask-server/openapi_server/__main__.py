@@ -6,18 +6,6 @@ import traceback
 import json
 import setproctitle
 
-from opentelemetry.instrumentation.flask import FlaskInstrumentor
-from opentelemetry.instrumentation.requests import RequestsInstrumentor
-from opentelemetry.instrumentation.aiohttp_client import (
-    AioHttpClientInstrumentor
-)
-from opentelemetry import trace
-from opentelemetry.trace.span import Span
-from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.trace.export import SimpleSpanProcessor
-from opentelemetry.exporter.jaeger.thrift import JaegerExporter
-from opentelemetry.semconv.resource import ResourceAttributes
-from opentelemetry.sdk.resources import SERVICE_NAME as telemetery_service_name_key, Resource
 sys.path.append(os.path.dirname(os.path.abspath(__file__)) +
                 "/../../../../ARAX/ARAXQuery")
 sys.path.append(os.path.dirname(os.path.abspath(__file__)) +
@@ -39,7 +27,20 @@ parent_pid = None
 CONFIG_FILE = 'openapi_server/flask_config.json'
 
 def instrument(app, host, port):
-    
+    # (OpenTelemetry is only imported when telemetry is enabled, to keep the
+    # startup of the server and the background tasker fast)
+    from opentelemetry.instrumentation.flask import FlaskInstrumentor
+    from opentelemetry.instrumentation.requests import RequestsInstrumentor
+    from opentelemetry.instrumentation.aiohttp_client import (
+        AioHttpClientInstrumentor
+    )
+    from opentelemetry import trace
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+    from opentelemetry.exporter.jaeger.thrift import JaegerExporter
+    from opentelemetry.semconv.resource import ResourceAttributes
+    from opentelemetry.sdk.resources import Resource
+
     service_name = "ARAX"
 
     trace.set_tracer_provider(TracerProvider(
@@ -65,6 +66,21 @@ def instrument(app, host, port):
 
 
 
+def preload_xcrg_model_store():
+    xcrg_data_path = os.path.dirname(os.path.abspath(__file__)) + \
+        "/../../../../ARAX/ARAXQuery/Infer/data/xCRG_data"
+    try:
+        sys.path.append(os.path.dirname(os.path.abspath(__file__)) +
+                        "/../../../../ARAX/ARAXQuery/Infer/scripts")
+        from creativeCRG import get_xcrg_model_store
+        eprint("Loading the xCRG embeddings and models")
+        get_xcrg_model_store(xcrg_data_path)
+    except Exception:
+        eprint("Unable to load the xCRG embeddings and models; each query "
+               "that needs them will try to load them itself")
+        eprint(traceback.format_exc())
+
+
 def main():
 
     rtx_config = RTXConfiguration()
@@ -163,6 +179,10 @@ def main():
         signal.signal(signal.SIGPIPE, receive_sigpipe)
         signal.signal(signal.SIGTERM, receive_sigterm)
 
+        # Load the xCRG embeddings and models once, so that the query child
+        # processes forked for each request inherit them instead of reloading
+        preload_xcrg_model_store()
+
         eprint("Starting flask application in the parent process")
         setproctitle.setproctitle(setproctitle.getproctitle() +
                                   f" [port={tcp_port}]")
@@ -0,0 +1,57 @@
+#!/bin/env python3
+"""
+Measures keystroke latency of rtxcomplete.get_nodes_like() against an autocomplete database: fragments are taken from
+randomly sampled terms and typed one character at a time (as the UI sends them), and latency percentiles are printed.
+Usage: python benchmark_autocomplete.py [--database autocomplete.sqlite] [--termindex autocomplete_terms.idx] [--terms 500] [--limit 15]
+"""
+
+import sqlite3
+import random
+import timeit
+import argparse
+
+import rtxcomplete
+
+
+def get_typed_fragments(database_name, num_terms, seed):
+    """Returns the fragments a user would send typing the start, or a middle part, of each of num_terms random terms"""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(database_name)
+    max_rowid = conn.execute("SELECT MAX(rowid) FROM terms").fetchone()[0]
+    fragments = []
+    for _ in range(num_terms):
+        row = conn.execute("SELECT term FROM terms WHERE rowid >= ? LIMIT 1", (rng.randint(1, max_rowid),)).fetchone()
+        term = row[0]
+        start = 0 if rng.random() < 0.5 else rng.randrange(len(term))
+        fragments += [ term[start:end] for end in range(start + 2, min(len(term), start + 12) + 1) ]
+    conn.close()
+    return fragments
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--database", type=str, help="Autocomplete database path (default: the configured database)", default=None, required=False)
+    parser.add_argument("--termindex", type=str, help="Term index path, to benchmark in-memory mode", default=None, required=False)
+    parser.add_argument("--terms", type=int, help="Number of terms to type", default=500, required=False)
+    parser.add_argument("--limit", type=int, help="Number of suggestions requested per keystroke", default=15, required=False)
+    parser.add_argument("--seed", type=int, help="Random seed for choosing terms", default=42, required=False)
+    arguments = parser.parse_args()
+
+    rtxcomplete.load(arguments.database, arguments.termindex)
+    fragments = get_typed_fragments(rtxcomplete.database_name, arguments.terms, arguments.seed)
+
+    latencies = []
+    for fragment in fragments:
+        t0 = timeit.default_timer()
+        rtxcomplete.get_nodes_like(fragment, arguments.limit)
+        latencies.append(timeit.default_timer() - t0)
+
+    latencies.sort()
+    print(f"{len(latencies)} keystrokes")
+    for percentile in [ 50, 90, 99, 100 ]:
+        index = min(len(latencies) - 1, int(len(latencies) * percentile / 100))
+        print(f"  p{percentile}: {round(latencies[index] * 1000, 2)} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,58 +1,133 @@
 #!/bin/env python3
+"""
+Builds the autocomplete database from a TSV of node info (curie, name, full_name, category[, degree]).
+Terms (node names and curies) are stored in rank order, so that rowid doubles as the rank: names rank above curies,
+then terms of better-connected nodes (higher degree) rank above others, then shorter terms above longer ones. A sqlite
+FTS5 index over the terms (trigram tokenizer, or word tokens with a prefix index on older sqlite versions) then returns
+the best matches for a fragment first. Prefixes shared by so many terms that ranking them all per keystroke would be
+slow get their top completions precomputed.
+"""
 
 import os
 import re
+import json
 import sqlite3
 import argparse
 
-parser = argparse.ArgumentParser()
-parser.add_argument("-o", "--output", type=str, help="Output database path", default="autocomplete.sqlite", required=False)
-parser.add_argument("-i", "--input", type=str, help="Input file path", default="../../data/KGmetadata/NodeNamesDescriptions_KG2.tsv", required=False)
-arguments = parser.parse_args()
-
-database_name = arguments.output
-try:
-    os.remove(database_name)
-except:
-    pass
-
-#create a data structure
-conn = sqlite3.connect(database_name)
-conn.text_factory = str
-c = conn.cursor()
-
-print(f"Creating tables")
-#c.execute(f"CREATE TABLE {tablename}(curie TEXT, name TEXT, type TEXT, rank INTEGER)")
-c.execute(f"CREATE TABLE terms(term VARCHAR(255) COLLATE NOCASE)")
-c.execute(f"CREATE TABLE cached_fragments(fragment VARCHAR(255) COLLATE NOCASE)")
-c.execute(f"CREATE TABLE cached_fragment_terms(fragment_id INT, term VARCHAR(255) COLLATE NOCASE)")
-
-rank = 1
-row_count = 0
-uc_terms = {}
-
-with open(arguments.input, 'r', encoding="latin-1", errors="replace") as nodeData:
-    print("Loading node names")
-    for line in nodeData:
-        curie, name, full_name, type = line[:-1].split("\t")
-        #c.execute("INSERT INTO term(curie,name,type,rank) VALUES(?,?,?,?)" % (tablename), (curie,name,type,rank,))
-
-        for term in [ name, curie ]:
-
-            uc_term = term.upper()
-            if uc_term not in uc_terms:
-                c.execute("INSERT INTO terms(term) VALUES(?)", (term,))
-                uc_terms[uc_term] = 1
-
-        row_count += 1
-        if row_count == int(row_count/1000000) * 1000000:
-            print(f"{row_count}...", end='', flush=True)
-            #break
-
-print()
-print(f"Creating indexes")
-c.execute(f"CREATE INDEX idx_terms_term ON terms(term)")
-c.execute(f"CREATE INDEX idx_cached_fragments_fragment ON cached_fragments(fragment)")
-
-conn.commit()
-conn.close()
+MAX_PREFIX_COMPLETIONS = 100
+MIN_PREFIX_LENGTH = 2
+MAX_PREFIX_LENGTH = 64
+#### Prefixes matching more terms than this get their top completions precomputed
+HEAVY_PREFIX_MIN_TERMS = 1000
+
+
+def get_fts_tokenizer(conn):
+    """Returns 'trigram' if this sqlite supports the FTS5 trigram tokenizer (3.34+), otherwise 'unicode61'"""
+    try:
+        conn.execute("CREATE VIRTUAL TABLE temp.trigram_check USING fts5(term, tokenize='trigram')")
+        conn.execute("DROP TABLE temp.trigram_check")
+        return 'trigram'
+    except sqlite3.OperationalError:
+        return 'unicode61'
+
+
+def load_ranked_terms(input_path):
+    """Returns a list of (term, degree) for all distinct (case-insensitive) terms, in rank order"""
+    terms = {}
+    row_count = 0
+    with open(input_path, 'r', encoding="latin-1", errors="replace") as nodeData:
+        print("Loading node names")
+        for line in nodeData:
+            columns = line[:-1].split("\t")
+            curie, name = columns[0], columns[1]
+            degree = int(columns[4]) if len(columns) > 4 and columns[4] else 0
+
+            for term, is_name in [ (name, True), (curie, False) ]:
+                if not term:
+                    continue
+                uc_term = term.upper()
+                #### Keep the first spelling seen, but the best rank of any node the term belongs to
+                if uc_term not in terms:
+                    terms[uc_term] = (term, is_name, degree)
+                else:
+                    first_term, first_is_name, first_degree = terms[uc_term]
+                    terms[uc_term] = (first_term, first_is_name or is_name, max(first_degree, degree))
+
+            row_count += 1
+            if row_count == int(row_count/1000000) * 1000000:
+                print(f"{row_count}...", end='', flush=True)
+    print()
+
+    print(f"Ranking {len(terms)} terms")
+    ranked_terms = sorted(terms.values(), key=lambda term_info: (not term_info[1], -term_info[2], len(term_info[0]), term_info[0]))
+    return [ (term, degree) for term, is_name, degree in ranked_terms ]
+
+
+def create_prefix_completions(c):
+    """Stores the top-ranked completions of every (lowercase) prefix that more than HEAVY_PREFIX_MIN_TERMS terms begin with"""
+    for prefix_length in range(MIN_PREFIX_LENGTH, MAX_PREFIX_LENGTH + 1):
+        #### A prefix can only be heavy if the prefix one character shorter is, so stop at the first length with none
+        c.execute(f"SELECT lower(substr(term, 1, {prefix_length})) AS prefix FROM terms WHERE length(term) >= {prefix_length} "
+                  f"GROUP BY prefix HAVING COUNT(*) > {HEAVY_PREFIX_MIN_TERMS}")
+        heavy_prefixes = [ row[0] for row in c.fetchall() ]
+        if len(heavy_prefixes) == 0:
+            break
+        print(f"  {len(heavy_prefixes)} prefixes of length {prefix_length}")
+        for prefix in heavy_prefixes:
+            c.execute("SELECT term FROM terms WHERE term >= ? AND term < ? ORDER BY rowid LIMIT ?",
+                      (prefix, prefix + chr(0x10ffff), MAX_PREFIX_COMPLETIONS))
+            completions = [ row[0] for row in c.fetchall() ]
+            c.execute("INSERT INTO prefix_completions(prefix, terms) VALUES(?,?)", (prefix, json.dumps(completions)))
+
+
+def create_database(input_path, database_name):
+    try:
+        os.remove(database_name)
+    except:
+        pass
+
+    #create a data structure
+    conn = sqlite3.connect(database_name)
+    conn.text_factory = str
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    c = conn.cursor()
+
+    print(f"Creating tables")
+    c.execute(f"CREATE TABLE terms(term VARCHAR(255) COLLATE NOCASE, degree INTEGER)")
+    c.execute(f"CREATE TABLE prefix_completions(prefix VARCHAR(255) PRIMARY KEY, terms TEXT)")
+    c.execute(f"CREATE TABLE autocomplete_metadata(key VARCHAR(255) PRIMARY KEY, value TEXT)")
+
+    #### Insert in rank order, so that rowid is the rank
+    c.executemany("INSERT INTO terms(term, degree) VALUES(?,?)", load_ranked_terms(input_path))
+
+    print(f"Creating indexes")
+    c.execute(f"CREATE INDEX idx_terms_term ON terms(term)")
+
+    print(f"Precomputing completions of common prefixes")
+    create_prefix_completions(c)
+
+    tokenizer = get_fts_tokenizer(conn)
+    print(f"Creating full-text index (tokenizer: {tokenizer})")
+    if tokenizer == 'trigram':
+        c.execute(f"CREATE VIRTUAL TABLE terms_fts USING fts5(term, content='terms', content_rowid='rowid', tokenize='trigram')")
+    else:
+        c.execute(f"CREATE VIRTUAL TABLE terms_fts USING fts5(term, content='terms', content_rowid='rowid', prefix='3')")
+    c.execute(f"INSERT INTO terms_fts(terms_fts) VALUES('rebuild')")
+    c.execute(f"INSERT INTO terms_fts(terms_fts) VALUES('optimize')")
+    c.execute("INSERT INTO autocomplete_metadata(key, value) VALUES(?,?)", ('fts_tokenizer', tokenizer))
+
+    conn.commit()
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-o", "--output", type=str, help="Output database path", default="autocomplete.sqlite", required=False)
+    parser.add_argument("-i", "--input", type=str, help="Input file path", default="../../data/KGmetadata/NodeNamesDescriptions_KG2.tsv", required=False)
+    arguments = parser.parse_args()
+    create_database(arguments.input, arguments.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
 import sqlite3
 import re
+import json
 import timeit
+import threading
 import sys
 import os
 def eprint(*args, **kwargs): print(*args, file=sys.stderr, **kwargs)
@@ -10,22 +12,42 @@ RTXindex = pathlist.index("RTX")
 sys.path.append(os.path.sep.join([*pathlist[:(RTXindex + 1)], 'code']))
 from RTXConfiguration import RTXConfiguration
 
+from term_index import TermIndex
+
 RTXConfig = RTXConfiguration()
 autocomplete_filepath = os.path.sep.join([*pathlist[:(RTXindex + 1)], 'code', 'autocomplete'])
 
-
 conn = None
 cursor = None
 cache_conn = None
 cache_cursor = None
 
+#### Set by load(): the database, and how its full-text index was built (None for databases without one)
+database_name = None
+fts_tokenizer = None
+
+#### Set by load() in in-memory mode: a memory-mapped TermIndex, which answers prefix and fuzzy lookups without sqlite
+term_index = None
+
+#### Lookups may run in several threads (see server.py), and sqlite connections cannot be shared across threads
+thread_local = threading.local()
+legacy_lock = threading.Lock()
+
 
-def load():
+def load(database_path=None, term_index_path=None):
     global conn
     global cursor
     global cache_conn
     global cache_cursor
-    database_name = f"{autocomplete_filepath}{os.path.sep}{RTXConfig.autocomplete_path.split('/')[-1]}"
+    global database_name
+    global fts_tokenizer
+    global term_index
+    if term_index_path is not None:
+        term_index = TermIndex(term_index_path)
+        print(f"INFO: Loaded term index {term_index_path} ({term_index.num_terms} terms)",file=sys.stderr)
+    if database_path is None:
+        database_path = f"{autocomplete_filepath}{os.path.sep}{RTXConfig.autocomplete_path.split('/')[-1]}"
+    database_name = database_path
     conn = sqlite3.connect(database_name)
     cursor = conn.cursor()
     try:
@@ -34,8 +56,16 @@ def load():
     except:
         print(f"WARN: Could NOT connect to {database_name}. Please check that file and database exist!",file=sys.stderr)
 
+    try:
+        fts_tokenizer = conn.execute("SELECT value FROM autocomplete_metadata WHERE key = 'fts_tokenizer'").fetchone()[0]
+        print(f"INFO: Using full-text index of {database_name} (tokenizer: {fts_tokenizer})",file=sys.stderr)
+        return True
+    except:
+        fts_tokenizer = None
+        print(f"WARN: {database_name} has no full-text index; falling back to LIKE queries. Please rebuild it with create_load_db.py",file=sys.stderr)
+
     cache_database_name = os.path.dirname(os.path.abspath(__file__)) + '/rtxcomplete_cache.sqlite'
-    cache_conn = sqlite3.connect(cache_database_name)
+    cache_conn = sqlite3.connect(cache_database_name, check_same_thread=False)
     cache_cursor = cache_conn.cursor()
     print(f"INFO: Connected to {cache_database_name}",file=sys.stderr)
     cache_cursor.execute("CREATE TABLE IF NOT EXISTS cached_fragments(fragment VARCHAR(1024))")
@@ -44,9 +74,113 @@ def load():
     return True
 
 
+def reload_term_index_if_changed():
+    """Switches to a rebuilt term index once it has been moved into place; lookups in progress finish on the old one"""
+    global term_index
+    if term_index is None or not term_index.has_changed():
+        return False
+    try:
+        term_index = TermIndex(term_index.index_path)
+    except Exception as error:
+        eprint(f"ERROR: Unable to reload term index {term_index.index_path}: {error}")
+        return False
+    eprint(f"INFO: Reloaded term index {term_index.index_path} ({term_index.num_terms} terms)")
+    return True
+
+
+def get_thread_cursor():
+    """Returns a read-only cursor on the autocomplete database for the calling thread"""
+    if getattr(thread_local, 'database_name', None) != database_name:
+        thread_local.conn = sqlite3.connect(f"file:{database_name}?mode=ro", uri=True)
+        thread_local.database_name = database_name
+    return thread_local.conn.cursor()
+
+
+def get_fts_query(word):
+    """Converts a typed fragment into an FTS5 MATCH expression, or None if it cannot match anything"""
+    if fts_tokenizer == 'trigram':
+        #### The trigram tokenizer matches any substring of three or more characters
+        if len(word) < 3:
+            return None
+        return '"' + word.replace('"', '""') + '"'
+    #### Word tokens: every token must appear in the term, and the last one may still be partially typed
+    tokens = re.findall(r'\w+', word)
+    if len(tokens) == 0:
+        return None
+    return ' '.join([ f'"{token}"' for token in tokens[:-1] ] + [ f'"{tokens[-1]}"*' ])
+
+
 def get_nodes_like(word,requested_limit):
 
+    if fts_tokenizer is None and term_index is None:
+        #### The legacy lookup shares the fragment cache connection, so only one thread may run it at a time
+        with legacy_lock:
+            return get_nodes_like_legacy(word,requested_limit)
+
+    debug = False
+
+    t0 = timeit.default_timer()
+    requested_limit = int(requested_limit)
+
+    values = []
+    values_dict = {}
+
+    if len(word) < 2:
+        return values
+
+    def add_terms(terms):
+        for term in terms:
+            if len(values) >= requested_limit:
+                break
+            if term.upper() not in values_dict:
+                values.append({ "curie": '??', "name": term, "type": '??' })
+                values_dict[term.upper()] = 1
+
+    fts_query = get_fts_query(word) if fts_tokenizer is not None else None
+
+    #### In in-memory mode, the best-ranked terms that begin with these letters, and then (to catch typos) those that
+    #### begin with letters one edit away, come from the term index. Taking a reference keeps a reload from
+    #### swapping the index out in the middle of a lookup
+    current_term_index = term_index
+    if current_term_index is not None:
+        add_terms(current_term_index.get_prefix_matches(word, requested_limit))
+        if len(values) < requested_limit:
+            add_terms(current_term_index.get_fuzzy_prefix_matches(word, requested_limit))
+        t1 = timeit.default_timer()
+
+    #### Otherwise the best-ranked terms that begin with these letters: precomputed for prefixes shared by many terms,
+    #### otherwise few enough terms match that ranking them all is quick
+    else:
+        cursor = get_thread_cursor()
+        row = cursor.execute("SELECT terms FROM prefix_completions WHERE prefix = ?", (word.lower(),)).fetchone()
+        prefix_completions = json.loads(row[0]) if row is not None else []
+        if len(prefix_completions) >= requested_limit:
+            add_terms(prefix_completions)
+        else:
+            cursor.execute("SELECT term FROM terms WHERE term >= ? AND term < ? ORDER BY rowid LIMIT ?",
+                           (word, word + chr(0x10ffff), requested_limit))
+            add_terms([ row[0] for row in cursor.fetchall() ])
+        t1 = timeit.default_timer()
+
+    #### If we haven't reached the limit yet, add the best-ranked terms that contain this string. Terms are stored in
+    #### rank order and FTS5 returns matches in rowid order, so the query stops as soon as it has enough rows
+    if len(values) < requested_limit and fts_query is not None:
+        cursor = get_thread_cursor()
+        cursor.execute("SELECT term FROM terms_fts WHERE terms_fts MATCH ? ORDER BY rowid LIMIT ?",
+                       (fts_query, 2 * requested_limit))
+        add_terms([ row[0] for row in cursor.fetchall() ])
+    t2 = timeit.default_timer()
+
+    if debug:
+        eprint(f"INFO: get_nodes_like('{word}'): prefix lookup in {t1-t0} sec, infix query in {t2-t1} sec")
+
+    return(values)
+
+
+def get_nodes_like_legacy(word,requested_limit):
+
     debug = True
+    cursor = get_thread_cursor()
 
     t0 = timeit.default_timer()
     requested_limit = int(requested_limit)
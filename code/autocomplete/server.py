@@ -7,11 +7,17 @@ import rtxcomplete
 import traceback
 import re
 import setproctitle
+import argparse
+import concurrent.futures
 
 root = os.path.dirname(os.path.abspath(__file__))
-rtxcomplete.load()
 
 SERVER_TCP_PORT = 4999
+LOOKUP_THREADS = 8
+TERM_INDEX_RELOAD_CHECK_INTERVAL = 30    # seconds
+
+#### Lookups run in these threads so that a slow query does not hold up the IOLoop (sqlite releases the GIL while querying)
+lookup_executor = concurrent.futures.ThreadPoolExecutor(max_workers=LOOKUP_THREADS)
 
 #### Sanitize the client-provided callback function name
 def sanitize_callback(callback):
@@ -99,12 +105,12 @@ class autofuzzySearch(tornado.web.RequestHandler):
 
 
 class nodesLikeSearch(tornado.web.RequestHandler):
-    def get(self, arg,word=None):
+    async def get(self, arg,word=None):
         try:
             limit = self.get_argument("limit")
             word = self.get_argument("word")
             callback = sanitize_callback(self.get_argument("callback"))
-            result = rtxcomplete.get_nodes_like(word,limit);
+            result = await tornado.ioloop.IOLoop.current().run_in_executor(lookup_executor, rtxcomplete.get_nodes_like, word, limit)
             result = callback+"("+json.dumps(result)+");"
             self.write(result)
         except:
@@ -147,6 +153,11 @@ def make_redirect_app():
     ])
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--termindex", type=str, help="Serve prefix and fuzzy lookups from this in-memory term index (see term_index.py), reloading it when it is rebuilt", default=None, required=False)
+    parser.add_argument("--processes", type=int, help="Number of server processes to fork (0 for one per cpu)", default=1, required=False)
+    arguments = parser.parse_args()
+
     print("root: " + root)
 
     proc_title = setproctitle.getproctitle()
@@ -156,12 +167,22 @@ if __name__ == "__main__":
     if True: #FW/EWD: clean this up later
         http_app = make_https_app()
         http_server = tornado.httpserver.HTTPServer(http_app)
-        http_server.listen(SERVER_TCP_PORT)
+        if arguments.processes == 1:
+            http_server.listen(SERVER_TCP_PORT)
+        else:
+            #### Each forked process opens its own sqlite connections and maps the term index itself; the mapped
+            #### index file is shared between all of them through the page cache
+            http_server.bind(SERVER_TCP_PORT)
+            http_server.start(arguments.processes)
+        rtxcomplete.load(term_index_path=arguments.termindex)
+        if arguments.termindex is not None:
+            tornado.ioloop.PeriodicCallback(rtxcomplete.reload_term_index_if_changed, TERM_INDEX_RELOAD_CHECK_INTERVAL * 1000).start()
 
     else:
         redirect_app = make_redirect_app()
         redirect_app.listen(80)
 
+        rtxcomplete.load(term_index_path=arguments.termindex)
         https_app = make_https_app()
         https_server = tornado.httpserver.HTTPServer(https_app, ssl_options={
             "certfile": "/etc/letsencrypt/live/rtxcomplete.ixlab.org/fullchain.pem",
@@ -0,0 +1,280 @@
+#!/bin/env python3
+"""
+In-memory (memory-mapped) index of autocomplete terms, built from an autocomplete database made by create_load_db.py.
+The index file holds the terms in rank order plus their normalized (lowercase) forms in sorted order, so the terms
+starting with a prefix are one binary search away; the top-ranked completions of prefixes shared by many terms are
+precomputed. The file is mapped read-only, so every server process using it shares one copy through the page cache.
+A rebuilt index should be moved into place with a rename (as build_term_index() does), which lets running servers
+switch to it (see TermIndex.has_changed()) while the old file stays valid for lookups still using it.
+Usage: python term_index.py --database autocomplete.sqlite --output autocomplete_terms.idx
+"""
+
+import os
+import mmap
+import json
+import sqlite3
+import argparse
+import itertools
+
+import numpy as np
+
+MAGIC = b'RTXTIDX1'
+TOP_K = 100
+MIN_PREFIX_LENGTH = 2
+MAX_PREFIX_LENGTH = 64
+#### Prefixes matching more terms than this get their top completions precomputed
+HEAVY_PREFIX_MIN_TERMS = 1000
+#### Shorter fragments are one edit away from almost everything
+MIN_FUZZY_LENGTH = 4
+NO_RANK = np.iinfo(np.uint32).max
+
+
+def normalize(term):
+    return term.lower()
+
+
+def _concatenate(strings):
+    """Returns the UTF-8 encoded strings as one byte string plus an array of len(strings) + 1 offsets into it"""
+    encoded = [ string.encode('utf-8') for string in strings ]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+    np.cumsum([ len(string) for string in encoded ], out=offsets[1:])
+    return b''.join(encoded), offsets
+
+
+def _get_heavy_prefixes(keys, key_ranks):
+    """Returns (prefix, top ranks) for all prefixes of keys (sorted) that more than HEAVY_PREFIX_MIN_TERMS keys start with"""
+    heavy_prefixes = []
+    parent_ranges = [ (0, len(keys)) ]
+    for prefix_length in range(MIN_PREFIX_LENGTH, MAX_PREFIX_LENGTH + 1):
+        #### Keys are sorted, so keys sharing a prefix are contiguous, and a prefix can only be heavy if its parent is
+        ranges = []
+        for parent_lo, parent_hi in parent_ranges:
+            lo = parent_lo
+            for prefix, group in itertools.groupby(keys[parent_lo:parent_hi], key=lambda key: key[:prefix_length]):
+                hi = lo + sum(1 for _ in group)
+                if hi - lo > HEAVY_PREFIX_MIN_TERMS and len(prefix) == prefix_length:
+                    top_ranks = np.sort(np.partition(key_ranks[lo:hi], TOP_K - 1)[:TOP_K])
+                    heavy_prefixes.append((prefix, top_ranks))
+                    ranges.append((lo, hi))
+                lo = hi
+        if len(ranges) == 0:
+            break
+        parent_ranges = ranges
+    heavy_prefixes.sort(key=lambda prefix_and_ranks: prefix_and_ranks[0].encode('utf-8'))
+    return heavy_prefixes
+
+
+def build_term_index(database_name, index_path):
+    """Writes a term index of the terms table of an autocomplete database (whose rowids are the terms' ranks)"""
+    conn = sqlite3.connect(database_name)
+    terms = [ row[0] for row in conn.execute("SELECT term FROM terms ORDER BY rowid") ]
+    conn.close()
+
+    #### Sort normalized keys by their UTF-8 bytes (the order lookups compare them in)
+    keys = [ normalize(term) for term in terms ]
+    key_order = sorted(range(len(keys)), key=lambda rank: keys[rank].encode('utf-8'))
+    key_ranks = np.array(key_order, dtype=np.uint32)
+    sorted_keys = [ keys[rank] for rank in key_order ]
+    del keys, key_order
+
+    heavy_prefixes = _get_heavy_prefixes(sorted_keys, key_ranks)
+    prefix_completions = np.full((len(heavy_prefixes), TOP_K), NO_RANK, dtype=np.uint32)
+    for prefix_num, (prefix, top_ranks) in enumerate(heavy_prefixes):
+        prefix_completions[prefix_num, :len(top_ranks)] = top_ranks
+
+    term_bytes, term_offsets = _concatenate(terms)
+    key_bytes, key_offsets = _concatenate(sorted_keys)
+    prefix_bytes, prefix_offsets = _concatenate([ prefix for prefix, top_ranks in heavy_prefixes ])
+    sections = [ ('term_offsets', term_offsets), ('term_bytes', np.frombuffer(term_bytes, dtype=np.uint8)),
+                 ('key_offsets', key_offsets), ('key_bytes', np.frombuffer(key_bytes, dtype=np.uint8)),
+                 ('key_ranks', key_ranks),
+                 ('prefix_offsets', prefix_offsets), ('prefix_bytes', np.frombuffer(prefix_bytes, dtype=np.uint8)),
+                 ('prefix_completions', prefix_completions) ]
+
+    #### Layout: magic, header length, JSON header, then each section (8-byte aligned so arrays can be mapped in place)
+    header = { 'num_terms': len(terms), 'num_prefixes': len(heavy_prefixes), 'top_k': TOP_K, 'sections': {} }
+    offset = 0
+    for name, array in sections:
+        header['sections'][name] = { 'offset': offset, 'dtype': array.dtype.str, 'shape': list(array.shape) }
+        offset += (array.nbytes + 7) // 8 * 8
+    header_bytes = json.dumps(header).encode('utf-8')
+    data_start = (len(MAGIC) + 8 + len(header_bytes) + 7) // 8 * 8
+
+    temp_index_path = f"{index_path}.{os.getpid()}.tmp"
+    with open(temp_index_path, 'wb') as index_file:
+        index_file.write(MAGIC)
+        index_file.write(len(header_bytes).to_bytes(8, 'little'))
+        index_file.write(header_bytes)
+        for name, array in sections:
+            index_file.seek(data_start + header['sections'][name]['offset'])
+            index_file.write(array.tobytes())
+        index_file.truncate(data_start + offset)
+    os.replace(temp_index_path, index_path)
+
+
+class TermIndex:
+
+    def __init__(self, index_path):
+        self.index_path = index_path
+        with open(index_path, 'rb') as index_file:
+            self.file_id = self._get_file_id(index_file.fileno())
+            self.mm = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{index_path} is not an autocomplete term index")
+        header_length = int.from_bytes(self.mm[len(MAGIC):len(MAGIC) + 8], 'little')
+        header = json.loads(self.mm[len(MAGIC) + 8:len(MAGIC) + 8 + header_length])
+        data_start = (len(MAGIC) + 8 + header_length + 7) // 8 * 8
+        self.num_terms = header['num_terms']
+
+        arrays = {}
+        for name, section in header['sections'].items():
+            count = int(np.prod(section['shape']))
+            arrays[name] = np.frombuffer(self.mm, dtype=section['dtype'], count=count,
+                                         offset=data_start + section['offset']).reshape(section['shape'])
+        self.term_bytes_start = data_start + header['sections']['term_bytes']['offset']
+        self.key_bytes_start = data_start + header['sections']['key_bytes']['offset']
+        self.prefix_bytes_start = data_start + header['sections']['prefix_bytes']['offset']
+        #### Plain memoryviews for offsets, since indexing them is much faster than indexing numpy arrays one by one
+        self.term_offsets = memoryview(arrays['term_offsets']).cast('B').cast('Q')
+        self.key_offsets = memoryview(arrays['key_offsets']).cast('B').cast('Q')
+        self.prefix_offsets = memoryview(arrays['prefix_offsets']).cast('B').cast('Q')
+        self.key_ranks = arrays['key_ranks']
+        self.prefix_completions = arrays['prefix_completions']
+        self.num_prefixes = header['num_prefixes']
+
+
+    @staticmethod
+    def _get_file_id(file_descriptor_or_path):
+        stat = os.stat(file_descriptor_or_path)
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+    def has_changed(self):
+        """True if a different (e.g. rebuilt) index file has been moved into place at this index's path"""
+        try:
+            return self._get_file_id(self.index_path) != self.file_id
+        except OSError:
+            return False
+
+
+    def get_term(self, rank):
+        return self.mm[self.term_bytes_start + self.term_offsets[rank]:self.term_bytes_start + self.term_offsets[rank + 1]].decode('utf-8')
+
+
+    def _get_key(self, key_num):
+        return self.mm[self.key_bytes_start + self.key_offsets[key_num]:self.key_bytes_start + self.key_offsets[key_num + 1]]
+
+
+    def _bisect_left(self, key, lo, hi):
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._get_key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+
+    def _get_prefix_range(self, prefix, lo=0, hi=None):
+        """Returns the range of sorted keys starting with prefix (UTF-8 bytes), optionally within a known range"""
+        if hi is None:
+            hi = self.num_terms
+        start = self._bisect_left(prefix, lo, hi)
+        #### No UTF-8 byte is 0xff, so every key starting with prefix sorts before prefix + 0xff
+        end = self._bisect_left(prefix + b'\xff', start, hi)
+        return start, end
+
+
+    def _get_precomputed_ranks(self, prefix):
+        lo, hi = 0, self.num_prefixes
+        while lo < hi:
+            mid = (lo + hi) // 2
+            mid_prefix = self.mm[self.prefix_bytes_start + self.prefix_offsets[mid]:self.prefix_bytes_start + self.prefix_offsets[mid + 1]]
+            if mid_prefix < prefix:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.num_prefixes and self.mm[self.prefix_bytes_start + self.prefix_offsets[lo]:self.prefix_bytes_start + self.prefix_offsets[lo + 1]] == prefix:
+            ranks = self.prefix_completions[lo]
+            return ranks[ranks != NO_RANK]
+        return None
+
+
+    def _get_top_ranks(self, prefix, limit, lo=0, hi=None):
+        """Returns the ranks of the best (up to limit) terms starting with prefix, best first"""
+        if limit <= self.prefix_completions.shape[1]:
+            ranks = self._get_precomputed_ranks(prefix)
+            if ranks is not None:
+                return ranks[:limit]
+        start, end = self._get_prefix_range(prefix, lo, hi)
+        ranks = self.key_ranks[start:end]
+        if len(ranks) > limit:
+            ranks = np.partition(ranks, limit - 1)[:limit]
+        return np.sort(ranks)
+
+
+    def get_prefix_matches(self, word, limit):
+        """Returns the best-ranked terms (up to limit) starting with word, case-insensitively"""
+        return [ self.get_term(int(rank)) for rank in self._get_top_ranks(normalize(word).encode('utf-8'), limit) ]
+
+
+    def _get_next_characters(self, head, lo, hi):
+        """Yields each character that follows head (UTF-8 bytes) in the keys in range lo:hi, with the range of its keys"""
+        head_length = len(head.decode('utf-8'))
+        start = lo
+        while start < hi:
+            key = self._get_key(start).decode('utf-8')
+            if len(key) == head_length:
+                start += 1
+                continue
+            character = key[head_length]
+            end = self._bisect_left(head + character.encode('utf-8') + b'\xff', start, hi)
+            yield character, start, end
+            start = end
+
+
+    def get_fuzzy_prefix_matches(self, word, limit):
+        """
+        Returns the best-ranked terms (up to limit) starting with a string one edit (deletion, insertion, substitution
+        or transposition of adjacent characters) away from word, other than those starting with word itself
+        """
+        key = normalize(word)
+        if len(key) < MIN_FUZZY_LENGTH:
+            return []
+        ranks = set()
+
+        def add_variant(variant, lo, hi):
+            if len(variant) >= MIN_PREFIX_LENGTH and variant != key:
+                ranks.update(int(rank) for rank in self._get_top_ranks(variant.encode('utf-8'), 2 * limit, lo, hi))
+
+        #### Walk the sorted keys like a trie: edits after a head that no key starts with cannot match anything, and
+        #### only characters that actually follow a head are tried for insertions and substitutions
+        lo, hi = 0, self.num_terms
+        for position in range(len(key) + 1):
+            head, tail = key[:position], key[position:]
+            lo, hi = self._get_prefix_range(head.encode('utf-8'), lo, hi)
+            if lo >= hi:
+                break
+            if tail:
+                add_variant(head + tail[1:], lo, hi)
+            if len(tail) > 1:
+                add_variant(head + tail[1] + tail[0] + tail[2:], lo, hi)
+            for character, character_lo, character_hi in self._get_next_characters(head.encode('utf-8'), lo, hi):
+                add_variant(head + character + tail, character_lo, character_hi)
+                if tail and character != tail[0]:
+                    add_variant(head + character + tail[1:], character_lo, character_hi)
+
+        terms = [ self.get_term(rank) for rank in sorted(ranks) ]
+        return [ term for term in terms if not normalize(term).startswith(key) ][:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-d", "--database", type=str, help="Autocomplete database path", default="autocomplete.sqlite", required=False)
+    parser.add_argument("-o", "--output", type=str, help="Output term index path", default="autocomplete_terms.idx", required=False)
+    arguments = parser.parse_args()
+    build_term_index(arguments.database, arguments.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+This script times the KG2pre loading and edge canonicalization steps of the KG2c build on a synthetic KG2pre, so that
+changes to those steps can be compared without a full KG2pre or synonymizer. Results are appended to a TSV so build
+time can be tracked over time.
+Usage: python benchmark_kg2c_build.py [--nodes 1000000] [--edges 5000000] [--edgeworkers 4] [--maxedgesinmemory N]
+"""
+import argparse
+import csv
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import create_kg2c_files
+from create_kg2c_files import KG2C_DIR, add_edge_processing_arguments
+
+PREDICATES = ["biolink:related_to", "biolink:interacts_with", "biolink:treats", "biolink:causes",
+              "biolink:regulates", "biolink:subclass_of", "biolink:has_part", "biolink:affects"]
+KNOWLEDGE_SOURCES = ["infores:semmeddb", "infores:chembl", "infores:drugbank", "infores:mondo", "infores:umls"]
+
+
+def _write_tsv(tsv_path: str, header_path: str, headers: list, rows):
+    # KG2pre header files carry neo4j type suffixes (e.g. "publications:string[]"), which the build strips
+    with open(header_path, "w") as header_file:
+        csv.writer(header_file, delimiter="\t").writerow([f"{header}:string[]" if header == "publications" else header
+                                                          for header in headers])
+    with open(tsv_path, "w") as tsv_file:
+        csv.writer(tsv_file, delimiter="\t").writerows(rows)
+
+
+def create_synthetic_kg2pre(tsv_dir_path: str, num_nodes: int, num_edges: int, cluster_size: int,
+                            seed: int) -> Dict[str, str]:
+    """
+    Writes synthetic KG2pre nodes/edges TSVs (with their columns in a shuffled order and an extra unused column)
+    and returns a curie map that merges every cluster_size consecutive nodes into one canonical node.
+    """
+    rng = random.Random(seed)
+    node_headers = sorted(create_kg2c_files._get_kg2pre_properties("nodes")) + ["deprecated"]
+    edge_headers = sorted(create_kg2c_files._get_kg2pre_properties("edges")) + ["negated"]
+    rng.shuffle(node_headers)
+    rng.shuffle(edge_headers)
+
+    def node_row(node_num: int) -> list:
+        node = {"id": f"SYN:{node_num}", "name": f"synthetic node {node_num}", "category": "biolink:NamedThing",
+                "iri": f"http://example.org/SYN_{node_num}", "description": f"Synthetic node number {node_num}",
+                "publications": ";".join(f"PMID:{rng.randrange(10000000)}" for _ in range(rng.randrange(3))),
+                "deprecated": "False"}
+        return [node[header] for header in node_headers]
+
+    def edge_row(edge_num: int) -> list:
+        publications = [f"PMID:{rng.randrange(10000000)}" for _ in range(rng.randrange(4))]
+        edge = {"id": f"SYN:edge{edge_num}", "subject": f"SYN:{rng.randrange(num_nodes)}",
+                "object": f"SYN:{rng.randrange(num_nodes)}", "predicate": rng.choice(PREDICATES),
+                "primary_knowledge_source": rng.choice(KNOWLEDGE_SOURCES), "publications": ";".join(publications),
+                "publications_info": str({publication: {"sentence": "A synthetic sentence."}
+                                          for publication in publications}),
+                "qualified_predicate": "None", "qualified_object_aspect": "None",
+                "qualified_object_direction": rng.choice(["None", "increased"]),
+                "domain_range_exclusion": "False", "knowledge_level": "knowledge_assertion",
+                "agent_type": "manual_agent", "negated": "False"}
+        return [edge[header] for header in edge_headers]
+
+    _write_tsv(f"{tsv_dir_path}/nodes.tsv", f"{tsv_dir_path}/nodes_header.tsv", node_headers,
+               (node_row(node_num) for node_num in range(num_nodes)))
+    _write_tsv(f"{tsv_dir_path}/edges.tsv", f"{tsv_dir_path}/edges_header.tsv", edge_headers,
+               (edge_row(edge_num) for edge_num in range(num_edges)))
+    return {f"SYN:{node_num}": f"SYN:{node_num - node_num % cluster_size}" for node_num in range(num_nodes)}
+
+
+def main():
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s %(levelname)s: %(message)s',
+                        handlers=[logging.StreamHandler()])
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--nodes', dest='num_nodes', type=int, default=1000000,
+                            help="Number of nodes in the synthetic KG2pre (default: 1000000).")
+    arg_parser.add_argument('--edges', dest='num_edges', type=int, default=5000000,
+                            help="Number of edges in the synthetic KG2pre (default: 5000000).")
+    arg_parser.add_argument('--clustersize', dest='cluster_size', type=int, default=3,
+                            help="Number of synthetic nodes merged into each canonical node (default: 3).")
+    arg_parser.add_argument('--seed', dest='seed', type=int, default=42,
+                            help="Random seed for generating the synthetic KG2pre (default: 42).")
+    arg_parser.add_argument('--resultsfile', dest='results_file', default=f"{KG2C_DIR}/kg2c_build_benchmarks.tsv",
+                            help="TSV file to append timings to (default: kg2c_build_benchmarks.tsv in this "
+                                 "directory).")
+    add_edge_processing_arguments(arg_parser)
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tsv_dir_path:
+        logging.info(f"Creating synthetic KG2pre with {args.num_nodes} nodes and {args.num_edges} edges..")
+        start = time.time()
+        curie_map = create_synthetic_kg2pre(tsv_dir_path, args.num_nodes, args.num_edges, args.cluster_size,
+                                            args.seed)
+        logging.info(f"Creating synthetic KG2pre took {round(time.time() - start, 1)} seconds")
+
+        start = time.time()
+        num_nodes_loaded = sum(1 for _ in create_kg2c_files._iter_kg2pre_tsv(tsv_dir_path, "nodes", False))
+        node_load_seconds = time.time() - start
+        logging.info(f"Loading {num_nodes_loaded} KG2pre nodes took {round(node_load_seconds, 1)} seconds")
+
+        start = time.time()
+        canonicalized_edges = create_kg2c_files._canonicalize_edges(tsv_dir_path, curie_map, False,
+                                                                    num_workers=args.edge_workers,
+                                                                    chunk_size=args.edge_chunk_size,
+                                                                    max_edges_in_memory=args.max_edges_in_memory)
+        edge_canonicalization_seconds = time.time() - start
+        logging.info(f"Canonicalizing {args.num_edges} KG2pre edges into {len(canonicalized_edges)} KG2c edges took "
+                     f"{round(edge_canonicalization_seconds, 1)} seconds "
+                     f"({round(args.num_edges / edge_canonicalization_seconds)} edges per second)")
+        num_kg2c_edges = len(canonicalized_edges)
+        canonicalized_edges.close()
+
+    write_header = not os.path.exists(args.results_file)
+    with open(args.results_file, "a") as results_file:
+        writer = csv.writer(results_file, delimiter="\t")
+        if write_header:
+            writer.writerow(["date", "num_nodes", "num_edges", "edge_workers", "edge_chunk_size",
+                             "max_edges_in_memory", "num_kg2c_edges", "node_load_seconds",
+                             "edge_canonicalization_seconds"])
+        writer.writerow([datetime.now().strftime('%Y-%m-%d %H:%M'), args.num_nodes, args.num_edges,
+                         args.edge_workers if args.edge_workers else os.cpu_count(), args.edge_chunk_size,
+                         args.max_edges_in_memory, num_kg2c_edges, round(node_load_seconds, 2),
+                         round(edge_canonicalization_seconds, 2)])
+    logging.info(f"Appended timings to {args.results_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -18,7 +18,7 @@ import time
 import pandas as pd
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-from create_kg2c_files import create_kg2c_files
+from create_kg2c_files import create_kg2c_files, add_edge_processing_arguments
 from record_kg2c_meta_info import record_meta_kg_info
 import file_manager
 
@@ -75,6 +75,10 @@ def main():
                                  "KG2pre TSVs and do a KG2c build off of those. They ensure that the test graph "
                                  "does not include any orphan edges. All output files from test builds are named with "
                                  "a '_TEST' suffix.")
+    arg_parser.add_argument('--optimizesqlite', dest='optimize_sqlite', action='store_true',
+                            help="Specifies that the finished KG2c sqlite database should be VACUUMed and ANALYZEd, "
+                                 "producing a compact, read-optimized file (adds some minutes to the build).")
+    add_edge_processing_arguments(arg_parser)
     args = arg_parser.parse_args()
     logging.info(f"STARTING KG2c BUILD")
 
@@ -117,9 +121,12 @@ def main():
 
     # Actually build KG2c
     logging.info("Calling create_kg2c_files.py..")
-    create_kg2c_files(args.kg2pre_version, args.sub_version, args.biolink_version, synonymizer_name, args.test)
+    create_kg2c_files(args.kg2pre_version, args.sub_version, args.biolink_version, synonymizer_name, args.test,
+                      num_edge_workers=args.edge_workers,
+                      edge_chunk_size=args.edge_chunk_size,
+                      max_edges_in_memory=args.max_edges_in_memory)
     logging.info("Calling record_kg2c_meta_info.py..")
-    record_meta_kg_info(args.biolink_version, args.test)
+    record_meta_kg_info(args.biolink_version, args.test, args.optimize_sqlite)
 
     # Upload artifacts to the relevant places
     file_manager.make_kg2c_tarball(args.test)
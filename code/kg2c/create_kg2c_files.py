@@ -7,6 +7,7 @@ import argparse
 import ast
 import csv
 import gc
+import itertools
 import json
 import logging
 import os
@@ -16,14 +17,15 @@ import sqlite3
 import subprocess
 import sys
 import time
-from collections import defaultdict
+from collections import defaultdict, deque
 
 from datetime import datetime
 from multiprocessing import Pool
-from typing import List, Dict, Tuple, Union, Optional, Set
+from typing import Iterable, Iterator, List, Dict, TextIO, Tuple, Union, Optional, Set
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from utils import select_best_description
+import sqlite_bulk_loader
 sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../ARAX/NodeSynonymizer/")
 from node_synonymizer import NodeSynonymizer
 sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../ARAX/BiolinkHelper/")
@@ -32,6 +34,8 @@ from biolink_helper import BiolinkHelper
 KG2C_ARRAY_DELIMITER = "ǂ"  # Need to use a delimiter that does not appear in any list items (strings)
 KG2PRE_ARRAY_DELIMITER = ";"
 KG2C_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_EDGE_CHUNK_SIZE = 50000
+DEFAULT_MAX_EDGES_IN_MEMORY = 20000000
 csv.field_size_limit(sys.maxsize)  # Required because some KG2pre fields are massive
 
 
@@ -212,25 +216,52 @@ def _load_publications_info(raw_publications_info: Union[str, dict], kg2_edge_id
     return publications_info
 
 
-def _load_kg2pre_tsv(local_tsv_dir_path: str, nodes_or_edges: str, is_test: bool) -> List[Dict[str, any]]:
+def _get_kg2pre_tsv_paths(local_tsv_dir_path: str, nodes_or_edges: str, is_test: bool) -> Tuple[str, str]:
     tsv_path = f"{local_tsv_dir_path}/{nodes_or_edges}.tsv{'_TEST' if is_test else ''}"
     tsv_header_path = f"{local_tsv_dir_path}/{nodes_or_edges}_header.tsv{'_TEST' if is_test else ''}"
-    kg2pre_objects = []
-    logging.info(f"Loading {nodes_or_edges} from KG2pre TSV ({tsv_path})..")
-    headers = _get_kg2pre_headers(tsv_header_path)
-    kg2pre_property_names = _get_kg2pre_properties(nodes_or_edges)
-    counter = 0
+    return tsv_path, tsv_header_path
+
+
+def _get_row_loader(headers: List[str], nodes_or_edges: str,
+                    property_names: Optional[Set[str]] = None) -> List[Tuple[str, int, any]]:
+    # Resolve the column position of each property once, rather than searching the headers for every row
+    property_names = property_names if property_names else _get_kg2pre_properties(nodes_or_edges)
+    missing_property_names = property_names.difference(headers)
+    if missing_property_names:
+        raise ValueError(f"KG2pre {nodes_or_edges} header is missing these columns: {missing_property_names}")
+    return [(property_name, headers.index(property_name), PROPERTIES_LOOKUP[nodes_or_edges][property_name]["type"])
+            for property_name in sorted(property_names)]
+
+
+def _load_row(row: List[str], row_loader: List[Tuple[str, int, any]]) -> Dict[str, any]:
+    return {property_name: _load_property(row[column_index], property_type)
+            for property_name, column_index, property_type in row_loader}
+
+
+def _iter_kg2pre_tsv(local_tsv_dir_path: str, nodes_or_edges: str, is_test: bool,
+                     property_names: Optional[Set[str]] = None) -> Iterator[Dict[str, any]]:
+    tsv_path, tsv_header_path = _get_kg2pre_tsv_paths(local_tsv_dir_path, nodes_or_edges, is_test)
+    row_loader = _get_row_loader(_get_kg2pre_headers(tsv_header_path), nodes_or_edges, property_names)
     with open(tsv_path) as kg2pre_file:
         reader = csv.reader(kg2pre_file, delimiter="\t")
         for row in reader:
-            counter += 1
-            new_object = dict()
-            for property_name in kg2pre_property_names:
-                property_info = PROPERTIES_LOOKUP[nodes_or_edges][property_name]
-                raw_property_value = row[headers.index(property_name)]
-                new_object[property_name] = _load_property(raw_property_value, property_info["type"])
-            kg2pre_objects.append(new_object)
-    return kg2pre_objects
+            yield _load_row(row, row_loader)
+
+
+def _iter_tsv_row_chunks(tsv_path: str, chunk_size: int) -> Iterator[List[List[str]]]:
+    with open(tsv_path) as tsv_file:
+        reader = csv.reader(tsv_file, delimiter="\t")
+        while True:
+            chunk = list(itertools.islice(reader, chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+
+def _load_kg2pre_tsv(local_tsv_dir_path: str, nodes_or_edges: str, is_test: bool) -> List[Dict[str, any]]:
+    logging.info(f"Loading {nodes_or_edges} from KG2pre TSV "
+                 f"({_get_kg2pre_tsv_paths(local_tsv_dir_path, nodes_or_edges, is_test)[0]})..")
+    return list(_iter_kg2pre_tsv(local_tsv_dir_path, nodes_or_edges, is_test))
 
 
 def _modify_column_headers_for_neo4j(plain_column_headers: List[str], file_name_root: str) -> List[str]:
@@ -317,10 +348,16 @@ def _create_edge(subject: str, object: str, predicate: str, primary_knowledge_so
     }
 
 
-def _write_list_to_neo4j_ready_tsv(input_list: List[Dict[str, any]], file_name_root: str, is_test: bool):
-    # Converts a list into the specific format Neo4j wants (string with delimiter)
+def _write_list_to_neo4j_ready_tsv(input_items: Iterable[Dict[str, any]], file_name_root: str, is_test: bool):
+    # Converts a list (or any iterable, written one item at a time) into the specific format Neo4j wants (string with
+    # delimiter); the column headers are taken from the first item
     logging.info(f"  Creating {file_name_root} header file..")
-    column_headers = list(input_list[0].keys())
+    input_items = iter(input_items)
+    first_item = next(input_items, None)
+    if first_item is None:
+        logging.warning(f"  There are no {file_name_root} items to write")
+        return
+    column_headers = list(first_item.keys())
     modified_headers = _modify_column_headers_for_neo4j(column_headers, file_name_root)
     with open(f"{KG2C_DIR}/{file_name_root}_header.tsv{'_TEST' if is_test else ''}", "w+") as header_file:
         dict_writer = csv.DictWriter(header_file, modified_headers, delimiter='\t')
@@ -328,48 +365,71 @@ def _write_list_to_neo4j_ready_tsv(input_list: List[Dict[str, any]], file_name_r
     logging.info(f"  Creating {file_name_root} file..")
     with open(f"{KG2C_DIR}/{file_name_root}.tsv{'_TEST' if is_test else ''}", "w+") as data_file:
         dict_writer = csv.DictWriter(data_file, column_headers, delimiter='\t')
-        dict_writer.writerows(input_list)
+        dict_writer.writerow(first_item)
+        dict_writer.writerows(input_items)
+
+
+def _write_streamed_json(output_file: TextIO, json_dict: Dict[str, any], indent: Optional[int] = None):
+    # Writes the same JSON as json.dump(json_dict, output_file, indent=indent), except that values which are iterators
+    # (e.g., of edges) are written as lists one item at a time, so they never need to be held in memory all at once
+    def _get_json(value: any, level: int) -> str:
+        # Nested values are indented to their level, as json.dump() would
+        json_string = json.dumps(value, indent=indent)
+        return json_string.replace("\n", "\n" + " " * (indent * level)) if indent is not None else json_string
+
+    def _get_line_start(level: int) -> str:
+        return "\n" + " " * (indent * level) if indent is not None else ""
+
+    item_separator = "," if indent is not None else ", "
+    output_file.write("{")
+    for key_num, (key, value) in enumerate(json_dict.items()):
+        output_file.write((item_separator if key_num else "") + _get_line_start(1) + f"{json.dumps(key)}: ")
+        if isinstance(value, Iterator):
+            first_item = next(value, None)
+            if first_item is None:
+                output_file.write("[]")
+                continue
+            output_file.write("[" + _get_line_start(2) + _get_json(first_item, 2))
+            for item in value:
+                output_file.write(item_separator + _get_line_start(2) + _get_json(item, 2))
+            output_file.write(_get_line_start(1) + "]")
+        else:
+            output_file.write(_get_json(value, 1))
+    output_file.write((_get_line_start(0) if json_dict else "") + "}")
 
 
 def create_kg2c_json_file(canonicalized_nodes_dict: Dict[str, Dict[str, any]],
-                          canonicalized_edges_dict: Dict[str, Dict[str, any]],
+                          kg2c_edges: Iterable[Dict[str, any]],
                           meta_info_dict: Dict[str, str], is_test: bool):
     logging.info(f" Creating KG2c JSON file..")
-    kgx_format_json = {"nodes": list(canonicalized_nodes_dict.values()),
-                       "edges": list(canonicalized_edges_dict.values())}
+    kgx_format_json = {"nodes": iter(canonicalized_nodes_dict.values()),
+                       "edges": iter(kg2c_edges)}
     kgx_format_json.update(meta_info_dict)
     with open(f"{KG2C_DIR}/kg2c.json{'_TEST' if is_test else ''}", "w+") as output_file:
-        json.dump(kgx_format_json, output_file)
+        _write_streamed_json(output_file, kgx_format_json)
 
 
 def create_kg2c_lite_json_file(canonicalized_nodes_dict: Dict[str, Dict[str, any]],
-                               canonicalized_edges_dict: Dict[str, Dict[str, any]],
+                               kg2c_edges: Iterable[Dict[str, any]],
                                meta_info_dict: Dict[str, str], is_test: bool):
     logging.info(f" Creating KG2c lite JSON file..")
     # Filter out all except these properties so we create a lightweight KG
     node_lite_properties = _get_lite_properties("node")
     edge_lite_properties = _get_lite_properties("edge")
-    lite_kg = {"nodes": [], "edges": []}
-    for node in canonicalized_nodes_dict.values():
-        lite_node = dict()
-        for lite_property in node_lite_properties:
-            lite_node[lite_property] = node[lite_property]
-        lite_kg["nodes"].append(lite_node)
-    for edge in canonicalized_edges_dict.values():
-        lite_edge = dict()
-        for lite_property in edge_lite_properties:
-            lite_edge[lite_property] = edge[lite_property]
-        lite_kg["edges"].append(lite_edge)
+    lite_kg = {"nodes": ({lite_property: node[lite_property] for lite_property in node_lite_properties}
+                         for node in canonicalized_nodes_dict.values()),
+               "edges": ({lite_property: edge[lite_property] for lite_property in edge_lite_properties}
+                         for edge in kg2c_edges)}
     lite_kg.update(meta_info_dict)
 
-    # Save this lite KG to a JSON file
+    # Save this lite KG to a JSON file (edges are converted and written one at a time)
     logging.info(f"  Saving lite json...")
     with open(f"{KG2C_DIR}/kg2c_lite.json{'_TEST' if is_test else ''}", "w+") as output_file:
-        json.dump(lite_kg, output_file, indent=2)
+        _write_streamed_json(output_file, lite_kg, indent=2)
 
 
 def create_kg2c_tsv_files(canonicalized_nodes_dict: Dict[str, Dict[str, any]],
-                          canonicalized_edges_dict: Dict[str, Dict[str, any]],
+                          kg2c_edges: Iterable[Dict[str, any]],
                           biolink_version: str, is_test: bool):
     bh = BiolinkHelper(biolink_version)
     # Convert array fields into the format neo4j wants and do some final processing
@@ -381,57 +441,55 @@ def create_kg2c_tsv_files(canonicalized_nodes_dict: Dict[str, Dict[str, any]],
 
         for list_node_property in array_node_columns:
             canonicalized_node[list_node_property] = _convert_list_to_string_encoded_format(canonicalized_node[list_node_property])
-    for canonicalized_edge in canonicalized_edges_dict.values():
+
+    def _get_neo4j_ready_edge(kg2c_edge: Dict[str, any]) -> Dict[str, any]:
+        # (a converted copy, so the same edges can still be written to the other KG2c files)
         if not is_test:  # Make sure we don't have any orphan edges
-            assert canonicalized_edge['subject'] in canonicalized_nodes_dict
-            assert canonicalized_edge['object'] in canonicalized_nodes_dict
+            assert kg2c_edge['subject'] in canonicalized_nodes_dict
+            assert kg2c_edge['object'] in canonicalized_nodes_dict
+        neo4j_ready_edge = dict(kg2c_edge)
         for list_edge_property in array_edge_columns:
-            canonicalized_edge[list_edge_property] = _convert_list_to_string_encoded_format(canonicalized_edge[list_edge_property])
-        canonicalized_edge['predicate_for_conversion'] = canonicalized_edge['predicate']
-        canonicalized_edge['subject_for_conversion'] = canonicalized_edge['subject']
-        canonicalized_edge['object_for_conversion'] = canonicalized_edge['object']
+            neo4j_ready_edge[list_edge_property] = _convert_list_to_string_encoded_format(neo4j_ready_edge[list_edge_property])
+        neo4j_ready_edge['predicate_for_conversion'] = neo4j_ready_edge['predicate']
+        neo4j_ready_edge['subject_for_conversion'] = neo4j_ready_edge['subject']
+        neo4j_ready_edge['object_for_conversion'] = neo4j_ready_edge['object']
+        return neo4j_ready_edge
 
-    # Finally dump all our nodes/edges into TSVs (formatted for neo4j)
+    # Finally dump all our nodes/edges into TSVs (formatted for neo4j); edges are converted as they are written
     logging.info(f" Creating TSVs for Neo4j..")
     _write_list_to_neo4j_ready_tsv(list(canonicalized_nodes_dict.values()), "nodes_c", is_test)
-    _write_list_to_neo4j_ready_tsv(list(canonicalized_edges_dict.values()), "edges_c", is_test)
+    _write_list_to_neo4j_ready_tsv((_get_neo4j_ready_edge(kg2c_edge) for kg2c_edge in kg2c_edges), "edges_c", is_test)
 
 
 def create_kg2c_sqlite_db(canonicalized_nodes_dict: Dict[str, Dict[str, any]],
-                          canonicalized_edges_dict: Dict[str, Dict[str, any]], is_test: bool):
+                          kg2c_edges: Iterable[Dict[str, any]], is_test: bool):
     logging.info(" Creating KG2c sqlite database..")
     db_name = f"kg2c.sqlite{'_TEST' if is_test else ''}"
     # Remove any preexisting version of this database
     if os.path.exists(db_name):
         os.remove(db_name)
-    connection = sqlite3.connect(db_name)
+    connection = sqlite_bulk_loader.open_for_bulk_load(db_name)
 
     # Add all nodes (node object is dumped into a JSON string)
     logging.info(f"  Creating nodes table..")
+    start = time.time()
     sqlite_node_properties = list(set(PROPERTIES_LOOKUP["nodes"]).difference(_get_lite_properties("nodes")).union({"id", _get_node_labels_property()}))
     logging.info(f"   Node properties to store in sqlite db are: {sqlite_node_properties}")
     cols_with_types_string = ", ".join([f"{property_name} TEXT" for property_name in sqlite_node_properties])
-    question_marks_string = ", ".join(["?" for _ in range(len(sqlite_node_properties))])
-    cols_string = ", ".join(sqlite_node_properties)
     connection.execute(f"CREATE TABLE nodes ({cols_with_types_string})")
-    node_rows = [[_prep_for_sqlite(node[property_name]) for property_name in sqlite_node_properties]
-                 for node in canonicalized_nodes_dict.values()]
-    connection.executemany(f"INSERT INTO nodes ({cols_string}) VALUES ({question_marks_string})", node_rows)
-    connection.execute("CREATE UNIQUE INDEX node_id_index ON nodes (id)")
-    connection.commit()
-    cursor = connection.execute(f"SELECT COUNT(*) FROM nodes")
-    logging.info(f"  Done creating nodes table; contains {cursor.fetchone()[0]} rows.")
-    cursor.close()
+    node_rows = ([_prep_for_sqlite(node[property_name]) for property_name in sqlite_node_properties]
+                 for node in canonicalized_nodes_dict.values())
+    num_nodes = sqlite_bulk_loader.bulk_insert(connection, "nodes", sqlite_node_properties, node_rows)
+    logging.info(f"  Done loading nodes table; inserted {num_nodes} rows in {round(time.time() - start)} seconds.")
 
     # Add all edges (edge object is dumped into a JSON string)
     logging.info(f"  Creating edges table..")
+    start = time.time()
     sqlite_edge_properties = list(set(PROPERTIES_LOOKUP["edges"]).difference(_get_lite_properties("edges")).union({"primary_knowledge_source"}))
     logging.info(f"   Edge properties to store in sqlite db are: {sqlite_edge_properties}")
     cols_with_types_string = ", ".join([f"{property_name} TEXT" for property_name in sqlite_edge_properties])
-    question_marks_string = ", ".join(["?" for _ in range(len(sqlite_edge_properties))])
-    cols_string = ", ".join(sqlite_edge_properties)
     connection.execute(f"CREATE TABLE edges (triple TEXT, node_pair TEXT, {cols_with_types_string})")
-    edge_rows = [[_get_edge_key(subject=edge['subject'],
+    edge_rows = ([_get_edge_key(subject=edge['subject'],
                                 object=edge['object'],
                                 predicate=edge['predicate'],
                                 qualified_predicate=edge['qualified_predicate'],
@@ -439,16 +497,15 @@ def create_kg2c_sqlite_db(canonicalized_nodes_dict: Dict[str, Dict[str, any]],
                                 qualified_object_direction=edge['qualified_object_direction'],
                                 primary_knowledge_source=edge['primary_knowledge_source']),
                   f"{edge['subject']}--{edge['object']}"] + [_prep_for_sqlite(edge[property_name]) for property_name in sqlite_edge_properties]
-
-                 for edge in canonicalized_edges_dict.values()]
-    connection.executemany(f"INSERT INTO edges (triple, node_pair, {cols_string}) VALUES (?, ?, {question_marks_string})", edge_rows)
-    connection.execute("CREATE UNIQUE INDEX triple_index ON edges (triple)")
-    connection.execute("CREATE INDEX node_pair_index ON edges (node_pair)")
-    connection.commit()
-    cursor = connection.execute(f"SELECT COUNT(*) FROM edges")
-    logging.info(f"  Done creating edges table; contains {cursor.fetchone()[0]} rows.")
-    cursor.close()
-
+                 for edge in kg2c_edges)
+    num_edges = sqlite_bulk_loader.bulk_insert(connection, "edges", ["triple", "node_pair"] + sqlite_edge_properties, edge_rows)
+    logging.info(f"  Done loading edges table; inserted {num_edges} rows in {round(time.time() - start)} seconds.")
+
+    # Indexes are built once all rows are in, which is much faster than maintaining them during the inserts
+    logging.info(f"  Creating indexes..")
+    sqlite_bulk_loader.create_indexes(connection, ["CREATE UNIQUE INDEX node_id_index ON nodes (id)",
+                                                   "CREATE UNIQUE INDEX triple_index ON edges (triple)",
+                                                   "CREATE INDEX node_pair_index ON edges (node_pair)"])
     connection.close()
 
 
@@ -472,11 +529,12 @@ def _create_build_node(kg2_version: str, sub_version: str, biolink_version: str)
     return kg2c_build_node
 
 
-def _canonicalize_nodes(kg2pre_nodes: List[Dict[str, any]],
-                        synonymizer_name: str) -> Tuple[Dict[str, Dict[str, any]], Dict[str, str]]:
+def _canonicalize_nodes(local_tsv_dir_path: str, synonymizer_name: str,
+                        is_test: bool) -> Tuple[Dict[str, Dict[str, any]], Dict[str, str]]:
     logging.info(f"Canonicalizing nodes using {synonymizer_name}..")
     synonymizer = NodeSynonymizer(sqlite_file_name=synonymizer_name)
-    node_ids = [node.get('id') for node in kg2pre_nodes if node.get('id')]
+    # Only the node IDs are held in memory up front; full KG2pre nodes are streamed from the TSV one at a time below
+    node_ids = [node['id'] for node in _iter_kg2pre_tsv(local_tsv_dir_path, "nodes", is_test, {"id"}) if node['id']]
     logging.info(f"  Sending NodeSynonymizer.get_canonical_curies() {len(node_ids)} curies..")
     canonicalized_info = synonymizer.get_canonical_curies(curies=node_ids, return_all_categories=True)
     all_canonical_curies = {canonical_info['preferred_curie'] for canonical_info in canonicalized_info.values() if canonical_info}
@@ -489,7 +547,9 @@ def _canonicalize_nodes(kg2pre_nodes: List[Dict[str, any]],
     logging.info(f"  Creating canonicalized nodes..")
     curie_map = dict()
     canonicalized_nodes = dict()
-    for kg2pre_node in kg2pre_nodes:
+    num_kg2pre_nodes = 0
+    for kg2pre_node in _iter_kg2pre_tsv(local_tsv_dir_path, "nodes", is_test):
+        num_kg2pre_nodes += 1
         # Grab relevant info for this node and its canonical version
         canonical_info = canonicalized_info.get(kg2pre_node['id'])
         canonicalized_curie = canonical_info.get('preferred_curie', kg2pre_node['id']) if canonical_info else kg2pre_node['id']
@@ -526,91 +586,234 @@ def _canonicalize_nodes(kg2pre_nodes: List[Dict[str, any]],
             canonicalized_nodes[canonicalized_node['id']] = canonicalized_node
         curie_map[kg2pre_node['id']] = canonicalized_curie  # Record this mapping for easy lookup later
     logging.info(f"Number of KG2pre nodes was reduced to {len(canonicalized_nodes)} "
-                 f"({round((len(canonicalized_nodes) / len(kg2pre_nodes)) * 100)}%)")
+                 f"({round((len(canonicalized_nodes) / num_kg2pre_nodes) * 100)}%)")
     return canonicalized_nodes, curie_map
 
 
-def _canonicalize_edges(local_tsv_dir_path: str, curie_map: Dict[str, str], is_test: bool) -> Dict[str, Dict[str, any]]:
+def _canonicalize_edge(kg2pre_edge: Dict[str, any], curie_map: Dict[str, str]) -> Optional[Tuple[str, Dict[str, any]]]:
+    # Creates a canonicalized version of a KG2pre edge; returns None for edges that should be left out of KG2c
+    kg2_edge_id = kg2pre_edge['id']
+    original_subject = kg2pre_edge['subject']
+    original_object = kg2pre_edge['object']
+    assert original_subject in curie_map
+    assert original_object in curie_map
+    canonicalized_subject = curie_map.get(original_subject, original_subject)
+    canonicalized_object = curie_map.get(original_object, original_object)
+    edge_publications = kg2pre_edge['publications'] if kg2pre_edge.get('publications') else []
+    edge_primary_knowledge_source = kg2pre_edge['primary_knowledge_source'] if kg2pre_edge.get('primary_knowledge_source') else ""
+    edge_qualified_predicate = kg2pre_edge['qualified_predicate'] if kg2pre_edge.get('qualified_predicate') else ""
+    edge_qualified_object_aspect = kg2pre_edge['qualified_object_aspect'] if kg2pre_edge.get('qualified_object_aspect') else ""
+    edge_qualified_object_direction = kg2pre_edge['qualified_object_direction'] if kg2pre_edge.get('qualified_object_direction') else ""
+    edge_domain_range_exclusion = kg2pre_edge['domain_range_exclusion']
+    edge_knowledge_level = kg2pre_edge['knowledge_level']
+    edge_agent_type = kg2pre_edge['agent_type']
+
+    # Patch for lack of qualified_predicate when qualified_object_direction is present
+    predicate = kg2pre_edge['predicate']
+    if predicate == "biolink:regulates" and edge_qualified_object_direction and not edge_qualified_predicate:
+        edge_qualified_predicate = "biolink:causes"
+        edge_qualified_object_aspect = "activity_or_abundance"
+    # Patch to filter out Chembl applied_to_treat edges (will eventually be removed from KG2pre itself)
+    elif predicate == "biolink:applied_to_treat" and edge_primary_knowledge_source == "infores:chembl":
+        return None
+
+    if canonicalized_subject == canonicalized_object:  # Don't allow self-edges
+        return None
+    edge_publications_info = _load_publications_info(kg2pre_edge['publications_info'], kg2_edge_id) if kg2pre_edge.get('publications_info') else dict()
+    canonicalized_edge_key = _get_edge_key(subject=canonicalized_subject,
+                                           object=canonicalized_object,
+                                           predicate=predicate,
+                                           qualified_predicate=edge_qualified_predicate,
+                                           qualified_object_aspect=edge_qualified_object_aspect,
+                                           qualified_object_direction=edge_qualified_object_direction,
+                                           primary_knowledge_source=edge_primary_knowledge_source)
+    canonicalized_edge = _create_edge(subject=canonicalized_subject,
+                                      object=canonicalized_object,
+                                      predicate=predicate,
+                                      primary_knowledge_source=edge_primary_knowledge_source,
+                                      publications=edge_publications,
+                                      publications_info=edge_publications_info,
+                                      kg2_ids=[kg2_edge_id],
+                                      qualified_predicate=edge_qualified_predicate,
+                                      qualified_object_aspect=edge_qualified_object_aspect,
+                                      qualified_object_direction=edge_qualified_object_direction,
+                                      domain_range_exclusion=edge_domain_range_exclusion,
+                                      knowledge_level=edge_knowledge_level,
+                                      agent_type=edge_agent_type)
+    return canonicalized_edge_key, canonicalized_edge
+
+
+def _merge_canonicalized_edge(canonicalized_edge: Dict[str, any], other_canonicalized_edge: Dict[str, any]):
+    # Merges the second edge (which has the same edge key) into the first; KG2pre IDs keep their input order
+    canonicalized_edge['publications'] = _merge_two_lists(canonicalized_edge['publications'], other_canonicalized_edge['publications'])
+    canonicalized_edge['publications_info'].update(other_canonicalized_edge['publications_info'])
+    canonicalized_edge['kg2_ids'] += other_canonicalized_edge['kg2_ids']
+
+
+# Set in each edge worker process by _init_edge_worker() (inherited rather than pickled when workers are forked)
+_edge_worker_curie_map = None
+_edge_worker_row_loader = None
+
+
+def _init_edge_worker(curie_map: Dict[str, str], row_loader: List[Tuple[str, int, any]]):
+    global _edge_worker_curie_map, _edge_worker_row_loader
+    _edge_worker_curie_map = curie_map
+    _edge_worker_row_loader = row_loader
+
+
+def _canonicalize_edge_chunk(rows: List[List[str]]) -> Tuple[int, Dict[str, Dict[str, any]]]:
+    canonicalized_edges = dict()
+    for row in rows:
+        canonicalized = _canonicalize_edge(_load_row(row, _edge_worker_row_loader), _edge_worker_curie_map)
+        if canonicalized:
+            canonicalized_edge_key, canonicalized_edge = canonicalized
+            if canonicalized_edge_key in canonicalized_edges:
+                _merge_canonicalized_edge(canonicalized_edges[canonicalized_edge_key], canonicalized_edge)
+            else:
+                canonicalized_edges[canonicalized_edge_key] = canonicalized_edge
+    return len(rows), canonicalized_edges
+
+
+def _iter_canonicalized_edge_chunks(edges_tsv_path: str, curie_map: Dict[str, str],
+                                    row_loader: List[Tuple[str, int, any]], num_workers: int,
+                                    chunk_size: int) -> Iterator[Tuple[int, Dict[str, Dict[str, any]]]]:
+    # Yields chunk results in input order; only a few chunks per worker are in flight at once, so reading the TSV
+    # never runs far ahead of the merge
+    row_chunks = _iter_tsv_row_chunks(edges_tsv_path, chunk_size)
+    if num_workers <= 1:
+        _init_edge_worker(curie_map, row_loader)
+        for rows in row_chunks:
+            yield _canonicalize_edge_chunk(rows)
+        return
+    with Pool(num_workers, initializer=_init_edge_worker, initargs=(curie_map, row_loader)) as pool:
+        pending_results = deque()
+        for rows in row_chunks:
+            pending_results.append(pool.apply_async(_canonicalize_edge_chunk, (rows,)))
+            if len(pending_results) >= 2 * num_workers:
+                yield pending_results.popleft().get()
+        while pending_results:
+            yield pending_results.popleft().get()
+
+
+class CanonicalizedEdges:
+    """
+    The merged KG2c edges: held in a dict or, when there were more of them than fit in memory, in a temporary sqlite
+    file. Each iteration yields the edges one at a time, in the order they were first seen in KG2pre either way, so
+    that the KG2c files can be written (one pass per file) without holding all edges in memory.
+    """
+
+    def __init__(self, edges_dict: Optional[Dict[str, Dict[str, any]]] = None,
+                 spill_connection: Optional[sqlite3.Connection] = None, spill_path: Optional[str] = None):
+        self.edges_dict = edges_dict
+        self.spill_connection = spill_connection
+        self.spill_path = spill_path
+        if spill_connection is not None:
+            self.num_edges = spill_connection.execute("SELECT COUNT(*) FROM merged_edges").fetchone()[0]
+        else:
+            self.num_edges = len(edges_dict)
+
+    def __len__(self) -> int:
+        return self.num_edges
+
+    def __iter__(self) -> Iterator[Dict[str, any]]:
+        if self.spill_connection is None:
+            yield from self.edges_dict.values()
+        else:
+            for edge_json, in self.spill_connection.execute("SELECT edge FROM merged_edges ORDER BY first_seen"):
+                yield json.loads(edge_json)
+
+    def close(self):
+        # Deletes the temporary sqlite file, if any
+        if self.spill_connection is not None:
+            self.spill_connection.close()
+            self.spill_connection = None
+            os.remove(self.spill_path)
+
+
+def _spill_canonicalized_edges(spill_connection: sqlite3.Connection, canonicalized_edges: Dict[str, Dict[str, any]]):
+    spill_connection.executemany("INSERT INTO edge_spill (edge_key, edge) VALUES (?, ?)",
+                                 ((edge_key, json.dumps(edge)) for edge_key, edge in canonicalized_edges.items()))
+    spill_connection.commit()
+
+
+def _iter_merged_spilled_edges(spill_connection: sqlite3.Connection) -> Iterator[Tuple[int, Dict[str, any]]]:
+    # sqlite sorts the spilled edges by key on disk; rowid order keeps the pieces of each edge in input order. Each
+    # spill holds its edges in the order they were first seen, so an edge's first rowid gives its overall input order.
+    current_edge_key, current_edge, current_first_seen = None, None, None
+    for edge_key, edge_json, rowid in spill_connection.execute("SELECT edge_key, edge, rowid FROM edge_spill "
+                                                               "ORDER BY edge_key, rowid"):
+        edge = json.loads(edge_json)
+        if edge_key == current_edge_key:
+            _merge_canonicalized_edge(current_edge, edge)
+        else:
+            if current_edge_key is not None:
+                yield current_first_seen, current_edge
+            current_edge_key, current_edge, current_first_seen = edge_key, edge, rowid
+    if current_edge_key is not None:
+        yield current_first_seen, current_edge
+
+
+def _merge_spilled_edges(spill_connection: sqlite3.Connection):
+    # Merges the spilled pieces of each edge into the merged_edges table (keyed by input order), one edge at a time
+    spill_connection.execute("CREATE TABLE merged_edges (first_seen INTEGER PRIMARY KEY, edge TEXT)")
+    spill_connection.executemany("INSERT INTO merged_edges (first_seen, edge) VALUES (?, ?)",
+                                 ((first_seen, json.dumps(edge))
+                                  for first_seen, edge in _iter_merged_spilled_edges(spill_connection)))
+    spill_connection.execute("DROP TABLE edge_spill")
+    spill_connection.commit()
+
+
+def _canonicalize_edges(local_tsv_dir_path: str, curie_map: Dict[str, str], is_test: bool,
+                        num_workers: Optional[int] = None, chunk_size: int = DEFAULT_EDGE_CHUNK_SIZE,
+                        max_edges_in_memory: int = DEFAULT_MAX_EDGES_IN_MEMORY) -> CanonicalizedEdges:
     logging.info(f"Canonicalizing edges..")
+    edges_tsv_path, edges_tsv_header_path = _get_kg2pre_tsv_paths(local_tsv_dir_path, "edges", is_test)
+    row_loader = _get_row_loader(_get_kg2pre_headers(edges_tsv_header_path), "edges")
+    num_workers = num_workers if num_workers else os.cpu_count()
+    logging.info(f"Looping through edges in KG2pre TSV ({edges_tsv_path}) and converting them to canonicalized edges "
+                 f"using {num_workers} processes, {chunk_size} edges at a time..")
     canonicalized_edges = dict()
-    edges_tsv_path = f"{local_tsv_dir_path}/edges.tsv{'_TEST' if is_test else ''}"
-    edges_tsv_header_path = f"{local_tsv_dir_path}/edges_header.tsv{'_TEST' if is_test else ''}"
-    logging.info(f"Looping through edges in KG2pre TSV ({edges_tsv_path}) and converting them to canonicalized edges..")
-    headers = _get_kg2pre_headers(edges_tsv_header_path)
-    kg2pre_property_names = _get_kg2pre_properties("edges")
+    spill_path = f"{KG2C_DIR}/edge_merge_spill.sqlite{'_TEST' if is_test else ''}"
+    spill_connection = None
     num_kg2pre_edges_processed = 0
-    with open(edges_tsv_path) as kg2pre_edges_file:
-        reader = csv.reader(kg2pre_edges_file, delimiter="\t")
-        for row in reader:  # We only load one KG2pre edge into memory at a time to reduce memory consumption
-            num_kg2pre_edges_processed += 1
-            if num_kg2pre_edges_processed % 1000000 == 0:
-                logging.info(f"Have processed {num_kg2pre_edges_processed} KG2pre edges")
-
-            # First load this KG2pre edge into a dictionary
-            kg2pre_edge = dict()
-            for property_name in kg2pre_property_names:
-                property_info = PROPERTIES_LOOKUP["edges"][property_name]
-                raw_property_value = row[headers.index(property_name)]
-                kg2pre_edge[property_name] = _load_property(raw_property_value, property_info["type"])
-
-            # Then create a canonicalized version of this KG2pre edge
-            kg2_edge_id = kg2pre_edge['id']
-            original_subject = kg2pre_edge['subject']
-            original_object = kg2pre_edge['object']
-            assert original_subject in curie_map
-            assert original_object in curie_map
-            canonicalized_subject = curie_map.get(original_subject, original_subject)
-            canonicalized_object = curie_map.get(original_object, original_object)
-            edge_publications = kg2pre_edge['publications'] if kg2pre_edge.get('publications') else []
-            edge_primary_knowledge_source = kg2pre_edge['primary_knowledge_source'] if kg2pre_edge.get('primary_knowledge_source') else ""
-            edge_qualified_predicate = kg2pre_edge['qualified_predicate'] if kg2pre_edge.get('qualified_predicate') else ""
-            edge_qualified_object_aspect = kg2pre_edge['qualified_object_aspect'] if kg2pre_edge.get('qualified_object_aspect') else ""
-            edge_qualified_object_direction = kg2pre_edge['qualified_object_direction'] if kg2pre_edge.get('qualified_object_direction') else ""
-            edge_domain_range_exclusion = kg2pre_edge['domain_range_exclusion']
-            edge_knowledge_level = kg2pre_edge['knowledge_level']
-            edge_agent_type = kg2pre_edge['agent_type']
-
-            # Patch for lack of qualified_predicate when qualified_object_direction is present
-            predicate = kg2pre_edge['predicate']
-            if predicate == "biolink:regulates" and edge_qualified_object_direction and not edge_qualified_predicate:
-                edge_qualified_predicate = "biolink:causes"
-                edge_qualified_object_aspect = "activity_or_abundance"
-            # Patch to filter out Chembl applied_to_treat edges (will eventually be removed from KG2pre itself)
-            elif predicate == "biolink:applied_to_treat" and edge_primary_knowledge_source == "infores:chembl":
-                continue
-
-            edge_publications_info = _load_publications_info(kg2pre_edge['publications_info'], kg2_edge_id) if kg2pre_edge.get('publications_info') else dict()
-            if canonicalized_subject != canonicalized_object:  # Don't allow self-edges
-                canonicalized_edge_key = _get_edge_key(subject=canonicalized_subject,
-                                                       object=canonicalized_object,
-                                                       predicate=kg2pre_edge['predicate'],
-                                                       qualified_predicate=edge_qualified_predicate,
-                                                       qualified_object_aspect=edge_qualified_object_aspect,
-                                                       qualified_object_direction=edge_qualified_object_direction,
-                                                       primary_knowledge_source=edge_primary_knowledge_source)
-                if canonicalized_edge_key in canonicalized_edges:
-                    canonicalized_edge = canonicalized_edges[canonicalized_edge_key]
-                    canonicalized_edge['publications'] = _merge_two_lists(canonicalized_edge['publications'], edge_publications)
-                    canonicalized_edge['publications_info'].update(edge_publications_info)
-                    canonicalized_edge['kg2_ids'].append(kg2_edge_id)
-                else:
-                    new_canonicalized_edge = _create_edge(subject=canonicalized_subject,
-                                                          object=canonicalized_object,
-                                                          predicate=kg2pre_edge['predicate'],
-                                                          primary_knowledge_source=edge_primary_knowledge_source,
-                                                          publications=edge_publications,
-                                                          publications_info=edge_publications_info,
-                                                          kg2_ids=[kg2_edge_id],
-                                                          qualified_predicate=edge_qualified_predicate,
-                                                          qualified_object_aspect=edge_qualified_object_aspect,
-                                                          qualified_object_direction=edge_qualified_object_direction,
-                                                          domain_range_exclusion=edge_domain_range_exclusion,
-                                                          knowledge_level=edge_knowledge_level,
-                                                          agent_type=edge_agent_type)
-                    canonicalized_edges[canonicalized_edge_key] = new_canonicalized_edge
-        logging.info(f"Number of KG2pre edges was reduced to {len(canonicalized_edges)} "
-                     f"({round((len(canonicalized_edges) / num_kg2pre_edges_processed) * 100)}%)")
-    return canonicalized_edges
+    next_progress_report = 1000000
+    for num_rows, chunk_canonicalized_edges in _iter_canonicalized_edge_chunks(edges_tsv_path, curie_map, row_loader,
+                                                                               num_workers, chunk_size):
+        num_kg2pre_edges_processed += num_rows
+        if num_kg2pre_edges_processed >= next_progress_report:
+            logging.info(f"Have processed {num_kg2pre_edges_processed} KG2pre edges")
+            next_progress_report += 1000000
+        for canonicalized_edge_key, canonicalized_edge in chunk_canonicalized_edges.items():
+            if canonicalized_edge_key in canonicalized_edges:
+                _merge_canonicalized_edge(canonicalized_edges[canonicalized_edge_key], canonicalized_edge)
+            else:
+                canonicalized_edges[canonicalized_edge_key] = canonicalized_edge
+        if len(canonicalized_edges) >= max_edges_in_memory:
+            # Too many edges to hold in memory; spill them to disk and merge them with an external sort at the end
+            if spill_connection is None:
+                if os.path.exists(spill_path):
+                    os.remove(spill_path)
+                spill_connection = sqlite3.connect(spill_path)
+                spill_connection.execute("PRAGMA journal_mode=OFF")
+                spill_connection.execute("PRAGMA synchronous=OFF")
+                spill_connection.execute("CREATE TABLE edge_spill (edge_key TEXT, edge TEXT)")
+            logging.info(f"  Spilling {len(canonicalized_edges)} partially merged edges to {spill_path}..")
+            _spill_canonicalized_edges(spill_connection, canonicalized_edges)
+            canonicalized_edges = dict()
+            gc.collect()
+
+    if spill_connection is not None:
+        _spill_canonicalized_edges(spill_connection, canonicalized_edges)
+        canonicalized_edges = None
+        gc.collect()
+        logging.info(f"  Merging spilled edges in {spill_path}..")
+        _merge_spilled_edges(spill_connection)
+        kg2c_edges = CanonicalizedEdges(spill_connection=spill_connection, spill_path=spill_path)
+    else:
+        kg2c_edges = CanonicalizedEdges(edges_dict=canonicalized_edges)
+    logging.info(f"Number of KG2pre edges was reduced to {len(kg2c_edges)} "
+                 f"({round((len(kg2c_edges) / num_kg2pre_edges_processed) * 100)}%)")
+    return kg2c_edges
 
 
 def _post_process_nodes(canonicalized_nodes_dict: Dict[str, Dict[str, any]]) -> Dict[str, Dict[str, any]]:
@@ -643,24 +846,33 @@ def _post_process_nodes(canonicalized_nodes_dict: Dict[str, Dict[str, any]]) ->
     return canonicalized_nodes_dict
 
 
-def _post_process_edges(canonicalized_edges_dict: Dict[str, Dict[str, any]]) -> Dict[str, Dict[str, any]]:
-    logging.info(f"Doing final clean-up/formatting of edges")
+def _post_process_edges(canonicalized_edges: CanonicalizedEdges,
+                        canonicalized_nodes_dict: Dict[str, Dict[str, any]]) -> Iterator[Dict[str, any]]:
+    # Does the final clean-up/formatting of edges one at a time, as they are written out; this runs once per KG2c file,
+    # and gives the same result each time
+    num_orphaned_edges = 0
     # Convert our edge IDs to integers (to save space downstream) and add them as actual properties on the edges
     edge_num = 1
-    for edge_id, edge in canonicalized_edges_dict.items():
+    for edge in canonicalized_edges:
         edge["id"] = edge_num
         edge_num += 1
+        # Leave out any edges orphaned by removing overly general nodes (see remove_overly_general_nodes())
+        if edge["subject"] not in canonicalized_nodes_dict or edge["object"] not in canonicalized_nodes_dict:
+            num_orphaned_edges += 1
+            continue
         edge["publications"] = edge["publications"][:20]  # We don't need a ton of publications, so truncate them
         if len(edge["publications_info"]) > 20:
             pubs_info_to_remove = list(edge["publications_info"])[20:]
             for pmid in pubs_info_to_remove:
                 del edge["publications_info"][pmid]
-    return canonicalized_edges_dict
+        yield edge
+    logging.info(f"  Left out {num_orphaned_edges} edges that were orphaned by removing overly general nodes; "
+                 f"{edge_num - 1 - num_orphaned_edges} edges remain")
 
 
 def remove_overly_general_nodes(canonicalized_nodes_dict: Dict[str, Dict[str, any]],
-                                canonicalized_edges_dict: Dict[str, Dict[str, any]],
-                                biolink_version: str) -> Tuple[Dict[str, Dict[str, any]], Dict[str, Dict[str, any]]]:
+                                biolink_version: str) -> Dict[str, Dict[str, any]]:
+    # (The edges this orphans are left out as they are written; see _post_process_edges())
     logging.info(f"Removing overly general nodes from the graph..")
     bh = BiolinkHelper(biolink_version)
     # Remove all nodes that have a biolink category as an equivalent identifier, as well as a few others
@@ -677,54 +889,68 @@ def remove_overly_general_nodes(canonicalized_nodes_dict: Dict[str, Dict[str, an
     for node_id in node_ids_to_remove:
         canonicalized_nodes_dict.pop(node_id, None)
 
-    # Delete any now orphaned edges
-    orphaned_edge_ids = {edge_id for edge_id, edge in canonicalized_edges_dict.items()
-                         if edge["subject"] not in canonicalized_nodes_dict or
-                         edge["object"] not in canonicalized_nodes_dict}
-    logging.info(f"  Deleting {len(orphaned_edge_ids)} edges that were orphaned by the above steps..")
-    for edge_id in orphaned_edge_ids:
-        canonicalized_edges_dict.pop(edge_id, None)
-
-    logging.info(f"Done removing overly general nodes: resulting KG2c now has {len(canonicalized_nodes_dict)} nodes "
-                 f"and {len(canonicalized_edges_dict)} edges")
-    return canonicalized_nodes_dict, canonicalized_edges_dict
+    logging.info(f"Done removing overly general nodes: resulting KG2c now has {len(canonicalized_nodes_dict)} nodes")
+    return canonicalized_nodes_dict
 
 
-def create_kg2c_files(kg2pre_version: str, sub_version: str, biolink_version: str,  synonymizer_name: str, is_test: bool):
+def create_kg2c_files(kg2pre_version: str, sub_version: str, biolink_version: str,  synonymizer_name: str, is_test: bool,
+                      num_edge_workers: Optional[int] = None, edge_chunk_size: int = DEFAULT_EDGE_CHUNK_SIZE,
+                      max_edges_in_memory: int = DEFAULT_MAX_EDGES_IN_MEMORY):
     """
     This function extracts all nodes/edges from the KG2pre TSVs, canonicalizes the nodes, merges edges
     (based on subject, object, predicate), and saves the resulting canonicalized graph in multiple file formats: JSON,
-    sqlite, and TSV (ready for import into Neo4j).
+    sqlite, and TSV (ready for import into Neo4j). KG2pre edges are canonicalized in chunks of edge_chunk_size rows
+    by num_edge_workers processes (default: one per cpu); once more than max_edges_in_memory merged edges accumulate,
+    they are spilled to a temporary sqlite file and merged there. Edges are then written to each output file one at a
+    time, so with spilling, memory use is bounded by max_edges_in_memory rather than by the number of KG2c edges.
     """
     local_tsv_dir_path = f"{KG2C_DIR}/kg2pre_tsvs/{kg2pre_version}"
 
-    # Load and canonicalize the KG2pre nodes
-    kg2pre_nodes = _load_kg2pre_tsv(local_tsv_dir_path, "nodes", is_test)
-    canonicalized_nodes_dict, curie_map = _canonicalize_nodes(kg2pre_nodes, synonymizer_name)
+    # Canonicalize the KG2pre nodes (streamed from the KG2pre nodes TSV)
+    canonicalized_nodes_dict, curie_map = _canonicalize_nodes(local_tsv_dir_path, synonymizer_name, is_test)
 
     # Add a node containing information about this KG2C build
     build_node = _create_build_node(kg2pre_version, sub_version, biolink_version)
     canonicalized_nodes_dict[build_node['id']] = build_node
     canonicalized_nodes_dict = _post_process_nodes(canonicalized_nodes_dict)
-    del kg2pre_nodes  # Try to free up as much memory as possible for edge processing
-    gc.collect()
+    gc.collect()  # Try to free up as much memory as possible for edge processing
 
     # Canonicalize edges
-    canonicalized_edges_dict = _canonicalize_edges(local_tsv_dir_path, curie_map, is_test)
-    canonicalized_edges_dict = _post_process_edges(canonicalized_edges_dict)
+    canonicalized_edges = _canonicalize_edges(local_tsv_dir_path, curie_map, is_test,
+                                              num_workers=num_edge_workers,
+                                              chunk_size=edge_chunk_size,
+                                              max_edges_in_memory=max_edges_in_memory)
 
     # Remove some overly general nodes (e.g., 'Genes', 'Disease or disorder'..)
-    canonicalized_nodes_dict, canonicalized_edges_dict = remove_overly_general_nodes(canonicalized_nodes_dict,
-                                                                                     canonicalized_edges_dict,
-                                                                                     biolink_version)
+    canonicalized_nodes_dict = remove_overly_general_nodes(canonicalized_nodes_dict, biolink_version)
 
-    # Actually create all of our output files (different formats for storing KG2c)
+    # Actually create all of our output files (different formats for storing KG2c); each one streams the edges
+    # through the final edge clean-up (which also leaves out edges orphaned by the node removal above)
     meta_info_dict = {"kg2_version": kg2pre_version, "sub_version": sub_version, "biolink_version": biolink_version}
     logging.info(f"Saving KG2c in various file formats..")
-    create_kg2c_lite_json_file(canonicalized_nodes_dict, canonicalized_edges_dict, meta_info_dict, is_test)
-    create_kg2c_json_file(canonicalized_nodes_dict, canonicalized_edges_dict, meta_info_dict, is_test)
-    create_kg2c_tsv_files(canonicalized_nodes_dict, canonicalized_edges_dict, biolink_version, is_test)
-    create_kg2c_sqlite_db(canonicalized_nodes_dict, canonicalized_edges_dict, is_test)
+    create_kg2c_lite_json_file(canonicalized_nodes_dict, _post_process_edges(canonicalized_edges, canonicalized_nodes_dict),
+                               meta_info_dict, is_test)
+    create_kg2c_json_file(canonicalized_nodes_dict, _post_process_edges(canonicalized_edges, canonicalized_nodes_dict),
+                          meta_info_dict, is_test)
+    create_kg2c_tsv_files(canonicalized_nodes_dict, _post_process_edges(canonicalized_edges, canonicalized_nodes_dict),
+                          biolink_version, is_test)
+    create_kg2c_sqlite_db(canonicalized_nodes_dict, _post_process_edges(canonicalized_edges, canonicalized_nodes_dict),
+                          is_test)
+    canonicalized_edges.close()
+
+
+def add_edge_processing_arguments(arg_parser: argparse.ArgumentParser):
+    arg_parser.add_argument('--edgeworkers', dest='edge_workers', type=int, default=None,
+                            help="Number of processes to canonicalize KG2pre edges with (default: one per cpu). Each "
+                                 "process shares the node curie map with the parent, so lower this if memory is tight.")
+    arg_parser.add_argument('--edgechunksize', dest='edge_chunk_size', type=int, default=DEFAULT_EDGE_CHUNK_SIZE,
+                            help=f"Number of KG2pre edge rows sent to a worker at a time (default: "
+                                 f"{DEFAULT_EDGE_CHUNK_SIZE}).")
+    arg_parser.add_argument('--maxedgesinmemory', dest='max_edges_in_memory', type=int,
+                            default=DEFAULT_MAX_EDGES_IN_MEMORY,
+                            help=f"Number of merged edges to hold in memory before spilling them to a temporary "
+                                 f"sqlite file for merging; the KG2c files are then written from that file, one edge "
+                                 f"at a time (default: {DEFAULT_MAX_EDGES_IN_MEMORY}).")
 
 
 def main():
@@ -746,6 +972,7 @@ def main():
     arg_parser.add_argument('-t', '--test', dest='test', action='store_true',
                             help="Specifies whether this is test build; if this flag is used, the script will use "
                                  "'_TEST' KG2pre and KG2c files.")
+    add_edge_processing_arguments(arg_parser)
     args = arg_parser.parse_args()
 
     logging.info(f"Starting to create KG2canonicalized..")
@@ -754,7 +981,10 @@ def main():
                       sub_version=args.sub_version,
                       biolink_version=args.biolink_version,
                       synonymizer_name=args.synonymizer_name,
-                      is_test=args.test)
+                      is_test=args.test,
+                      num_edge_workers=args.edge_workers,
+                      edge_chunk_size=args.edge_chunk_size,
+                      max_edges_in_memory=args.max_edges_in_memory)
     logging.info(f"Done! Took {round(((time.time() - start) / 60) / 60, 2)} hours.")
 
 
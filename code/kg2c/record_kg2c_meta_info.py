@@ -9,12 +9,13 @@ import json
 import logging
 import os
 import pickle
-import sqlite3
 import sys
 import time
 from collections import defaultdict
 from typing import Dict, Set
 
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import sqlite_bulk_loader
 sys.path.append(os.path.dirname(os.path.abspath(__file__))+"/../ARAX/BiolinkHelper/")
 from biolink_helper import BiolinkHelper
 
@@ -129,13 +130,12 @@ def add_neighbor_counts_to_sqlite(nodes_by_id: Dict[str, Dict[str, any]], edges_
 
     # Then write these counts to the sqlite file
     logging.info(f" Saving neighbor counts (for {len(neighbor_counts)} nodes) to sqlite..")
-    connection = sqlite3.connect(sqlite_file_name)
+    connection = sqlite_bulk_loader.open_for_bulk_load(sqlite_file_name)
     connection.execute("DROP TABLE IF EXISTS neighbors")
     connection.execute("CREATE TABLE neighbors (id TEXT, neighbor_counts TEXT)")
-    rows = [(node_id, json.dumps(neighbor_counts)) for node_id, neighbor_counts in neighbor_counts.items()]
-    connection.executemany(f"INSERT INTO neighbors (id, neighbor_counts) VALUES (?, ?)", rows)
-    connection.execute("CREATE UNIQUE INDEX node_neighbor_index ON neighbors (id)")
-    connection.commit()
+    rows = ((node_id, json.dumps(neighbor_counts)) for node_id, neighbor_counts in neighbor_counts.items())
+    sqlite_bulk_loader.bulk_insert(connection, "neighbors", ["id", "neighbor_counts"], rows)
+    sqlite_bulk_loader.create_indexes(connection, ["CREATE UNIQUE INDEX node_neighbor_index ON neighbors (id)"])
     cursor = connection.execute(f"SELECT COUNT(*) FROM neighbors")
     logging.info(f" Done adding neighbor counts to sqlite; neighbors table contains {cursor.fetchone()[0]} rows")
     cursor.close()
@@ -163,13 +163,12 @@ def add_category_counts_to_sqlite(nodes_by_id: Dict[str, Dict[str, any]], sqlite
 
     # Then write these counts to the sqlite file
     logging.info(f" Saving category counts (for {len(nodes_by_label)} categories) to sqlite..")
-    connection = sqlite3.connect(sqlite_file_name)
+    connection = sqlite_bulk_loader.open_for_bulk_load(sqlite_file_name)
     connection.execute("DROP TABLE IF EXISTS category_counts")
     connection.execute("CREATE TABLE category_counts (category TEXT, count INTEGER)")
-    rows = [(category, len(node_ids)) for category, node_ids in nodes_by_label.items()]
-    connection.executemany(f"INSERT INTO category_counts (category, count) VALUES (?, ?)", rows)
-    connection.execute("CREATE UNIQUE INDEX category_index ON category_counts (category)")
-    connection.commit()
+    rows = ((category, len(node_ids)) for category, node_ids in nodes_by_label.items())
+    sqlite_bulk_loader.bulk_insert(connection, "category_counts", ["category", "count"], rows)
+    sqlite_bulk_loader.create_indexes(connection, ["CREATE UNIQUE INDEX category_index ON category_counts (category)"])
     cursor = connection.execute(f"SELECT COUNT(*) FROM category_counts")
     logging.info(f" Done adding category counts to sqlite; category_counts table contains "
                  f"{cursor.fetchone()[0]} rows")
@@ -191,7 +190,7 @@ def generate_fda_approved_drugs_pickle(edges_by_id: Dict[str, Dict[str, any]], f
         pickle.dump(fda_approved_drugs, pickle_file)
 
 
-def record_meta_kg_info(biolink_version: str, is_test: bool):
+def record_meta_kg_info(biolink_version: str, is_test: bool, optimize_sqlite: bool = False):
     logging.info("Starting to record KG2c meta info..")
     bh = BiolinkHelper(biolink_version)
     start = time.time()
@@ -216,7 +215,9 @@ def record_meta_kg_info(biolink_version: str, is_test: bool):
     add_neighbor_counts_to_sqlite(nodes_by_id, edges_by_id, sqlite_file_name, expanded_labels_property_name)
     add_category_counts_to_sqlite(nodes_by_id, sqlite_file_name, expanded_labels_property_name)
     generate_fda_approved_drugs_pickle(edges_by_id, fda_approved_file_name)
-    
+    if optimize_sqlite:  # This is the last step that writes to the sqlite database
+        sqlite_bulk_loader.optimize_for_reads(sqlite_file_name)
+
     logging.info(f"Recording meta KG info took {round((time.time() - start) / 60, 1)} minutes.")
 
 
@@ -229,8 +230,10 @@ def main():
     arg_parser.add_argument('biolink_version',
                             help="The Biolink version that the given KG2pre version uses (e.g., 4.0.1).")
     arg_parser.add_argument("--test", dest="test", action='store_true', default=False)
+    arg_parser.add_argument("--optimizesqlite", dest="optimize_sqlite", action='store_true', default=False,
+                            help="VACUUM and ANALYZE the KG2c sqlite database once all tables are added.")
     args = arg_parser.parse_args()
-    record_meta_kg_info(args.biolink_version, args.test)
+    record_meta_kg_info(args.biolink_version, args.test, args.optimize_sqlite)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,71 @@
+"""
+Helpers for building the KG2c sqlite database quickly: tables are filled through large executemany() batches
+inside a single transaction with journaling and syncing turned off, and indexes are created only after loading.
+These settings are only safe for a database that is being built from scratch (a crash means rebuilding it).
+"""
+import itertools
+import logging
+import sqlite3
+import time
+from typing import Iterable, List, Sequence
+
+BULK_LOAD_PAGE_SIZE = 16384
+BULK_LOAD_CACHE_SIZE_MB = 1024
+BULK_LOAD_BATCH_SIZE = 100000
+
+
+def open_for_bulk_load(sqlite_file_name: str, cache_size_mb: int = BULK_LOAD_CACHE_SIZE_MB) -> sqlite3.Connection:
+    connection = sqlite3.connect(sqlite_file_name, isolation_level=None)
+    # page_size only takes effect on a new (empty) database or after a VACUUM
+    connection.execute(f"PRAGMA page_size = {BULK_LOAD_PAGE_SIZE}")
+    connection.execute("PRAGMA journal_mode = OFF")
+    connection.execute("PRAGMA synchronous = OFF")
+    connection.execute("PRAGMA locking_mode = EXCLUSIVE")
+    connection.execute(f"PRAGMA cache_size = {-1024 * cache_size_mb}")  # Negative values are in KiB
+    return connection
+
+
+def bulk_insert(connection: sqlite3.Connection, table_name: str, column_names: Sequence[str],
+                rows: Iterable[Sequence[any]], batch_size: int = BULK_LOAD_BATCH_SIZE) -> int:
+    """
+    Inserts rows (in the order of column_names) in batches of batch_size within one transaction; rows may be
+    a generator, so the full table never needs to be held in memory. Returns the number of rows inserted.
+    """
+    insert_statement = (f"INSERT INTO {table_name} ({', '.join(column_names)}) "
+                        f"VALUES ({', '.join('?' for _ in column_names)})")
+    num_rows = 0
+    rows = iter(rows)
+    connection.execute("BEGIN")
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            break
+        connection.executemany(insert_statement, batch)
+        num_rows += len(batch)
+    connection.execute("COMMIT")
+    return num_rows
+
+
+def create_indexes(connection: sqlite3.Connection, index_statements: List[str]):
+    connection.execute("BEGIN")
+    for index_statement in index_statements:
+        start = time.time()
+        connection.execute(index_statement)
+        logging.info(f"   {index_statement} took {round(time.time() - start, 1)} seconds")
+    connection.execute("COMMIT")
+
+
+def optimize_for_reads(sqlite_file_name: str):
+    """
+    Rewrites the finished database compactly (VACUUM, which also applies the bulk-load page size) and records
+    table/index statistics for the query planner (ANALYZE).
+    """
+    logging.info(f" Optimizing {sqlite_file_name} for reads (VACUUM and ANALYZE)..")
+    start = time.time()
+    connection = sqlite3.connect(sqlite_file_name, isolation_level=None)
+    connection.execute("PRAGMA journal_mode = DELETE")
+    connection.execute(f"PRAGMA page_size = {BULK_LOAD_PAGE_SIZE}")
+    connection.execute("VACUUM")
+    connection.execute("ANALYZE")
+    connection.close()
+    logging.info(f" Optimizing {sqlite_file_name} took {round((time.time() - start) / 60, 1)} minutes")
@@ -1,3 +1,4 @@
+import argparse
 import itertools
 import logging
 import os
@@ -5,11 +6,14 @@ import random
 import string
 import time
 from collections import defaultdict
-from typing import Dict, List, Optional
+from multiprocessing import Pool
+from typing import Dict, List, Optional, Tuple
 
 import numpy as np
 import pandas as pd
 import requests
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 KG2C_DIR = f"{SCRIPT_DIR}/../"
@@ -22,6 +26,7 @@ PREDICATE_WEIGHTS = {
 BIO_RELATED_MAJOR_BRANCHES = {"BiologicalEntity", "GeneticOrMolecularBiologicalEntity", "DiseaseOrPhenotypicFeature",
                               "BiologicalProcessOrActivity", "OrganismalEntity"}
 UNNECESSARY_CHARS_MAP = {ord(char): None for char in string.punctuation + string.whitespace}
+LABEL_PROPAGATION_SEED = 42
 
 
 def assign_edge_weights(edges_df: pd.DataFrame):
@@ -161,9 +166,140 @@ def remove_conflicting_category_edges(nodes_df: pd.DataFrame, edges_df: pd.DataF
     return edges_df
 
 
-def do_label_propagation(label_map: Dict[str, str], adj_list_weighted: Dict[str, Dict[str, float]],
-                         nodes_to_label: Optional[List[str]] = None) -> Dict[str, str]:
-    # Run label propagation, starting with whatever labels were provided
+def get_weighted_adjacency_matrix(edges_df: pd.DataFrame, node_ids: pd.Index) -> sparse.csr_matrix:
+    """
+    Builds a symmetric CSR adjacency matrix over the integer positions of node_ids, with the weights of all edges
+    between a pair of nodes summed (like get_weighted_adjacency_dict()).
+    """
+    logging.info(f"Creating weighted adjacency matrix (CSR) from edges data frame...")
+    start = time.time()
+    subject_indexes = node_ids.get_indexer(edges_df.subject)
+    object_indexes = node_ids.get_indexer(edges_df.object)
+    if (subject_indexes < 0).any() or (object_indexes < 0).any():
+        raise ValueError(f"Some edges reference nodes that aren't in the nodes DataFrame")
+    weights = edges_df.weight.to_numpy(dtype=np.float64)
+    num_nodes = len(node_ids)
+    # Converting from COO sums the weights of duplicate node pairs
+    adjacency_matrix = sparse.coo_matrix((np.concatenate([weights, weights]),
+                                          (np.concatenate([subject_indexes, object_indexes]),
+                                           np.concatenate([object_indexes, subject_indexes]))),
+                                         shape=(num_nodes, num_nodes)).tocsr()
+    adjacency_matrix.sort_indices()
+    logging.info(f"Creating weighted adjacency matrix ({adjacency_matrix.nnz:,} nonzero entries) took "
+                 f"{round(time.time() - start, 2)} seconds")
+    return adjacency_matrix
+
+
+def do_label_propagation(labels: pd.Series, adjacency_matrix: sparse.csr_matrix,
+                         nodes_to_label: Optional[np.ndarray] = None, num_processes: int = 1,
+                         seed: int = LABEL_PROPAGATION_SEED) -> pd.Series:
+    """
+    Runs weighted label propagation on the CSR adjacency matrix, starting with the given labels (a Series in the
+    same node order as the matrix; NaN means unlabeled). Only nodes in the nodes_to_label boolean mask (default:
+    all nodes) may change labels. Each iteration computes every node's majority neighbor label with sparse matrix
+    operations; ties keep the node's current label if it is among the best, and otherwise go to the
+    lexicographically smallest label, so results are deterministic. Nodes that changed label in the previous
+    iteration only change again with probability 1/2 (seeded), which breaks the oscillations that fully synchronous
+    updates can get stuck in. Stops once no node's label differs from its majority neighbor label.
+    If num_processes > 1, connected components are split into that many groups that are labeled in parallel.
+    """
+    label_codes, unique_labels = pd.factorize(labels, sort=True)  # NaN labels get code -1
+    if len(unique_labels) == 0:
+        logging.info(f"No nodes are labeled, so there are no labels to propagate")
+        return pd.Series(np.nan, index=labels.index, dtype=object)
+    label_codes = label_codes.astype(np.int64)
+    to_label_mask = np.ones(len(labels), dtype=bool) if nodes_to_label is None else np.asarray(nodes_to_label, dtype=bool)
+    logging.info(f"Starting label propagation; {to_label_mask.sum():,} nodes need labeling")
+    start = time.time()
+
+    if num_processes > 1:
+        num_components, component_ids = connected_components(adjacency_matrix, directed=False)
+        logging.info(f"Splitting {num_components:,} connected components into {num_processes} groups to label "
+                     f"in parallel..")
+        # Deal components out to groups from largest to smallest so the groups have similar numbers of nodes
+        component_sizes = np.bincount(component_ids)
+        group_ids_by_component = np.empty(num_components, dtype=np.int64)
+        group_ids_by_component[np.argsort(-component_sizes, kind="stable")] = np.arange(num_components) % num_processes
+        node_group_ids = group_ids_by_component[component_ids]
+        group_node_indexes = [np.flatnonzero(node_group_ids == group_id) for group_id in range(num_processes)]
+        group_args = [(adjacency_matrix[node_indexes][:, node_indexes], label_codes[node_indexes],
+                       to_label_mask[node_indexes], seed + group_id)
+                      for group_id, node_indexes in enumerate(group_node_indexes)]
+        with Pool(num_processes) as pool:
+            group_results = pool.starmap(propagate_label_codes, group_args)
+        for node_indexes, (group_label_codes, _) in zip(group_node_indexes, group_results):
+            label_codes[node_indexes] = group_label_codes
+        done = all(group_done for _, group_done in group_results)
+    else:
+        label_codes, done = propagate_label_codes(adjacency_matrix, label_codes, to_label_mask, seed)
+
+    if not done:
+        logging.info(f"Label propagation reached iteration limit; unable to converge")
+    logging.info(f"Label propagation took {round(time.time() - start, 2)} seconds")
+    final_labels = np.where(label_codes >= 0, np.asarray(unique_labels, dtype=object)[label_codes], np.nan)
+    return pd.Series(final_labels, index=labels.index)
+
+
+def propagate_label_codes(adjacency_matrix: sparse.csr_matrix, label_codes: np.ndarray, to_label_mask: np.ndarray,
+                          seed: int, max_iterations: int = 100) -> Tuple[np.ndarray, bool]:
+    # Label propagation over integer label codes (-1 means unlabeled); returns the final codes and whether it converged
+    label_codes = label_codes.copy()
+    rows_to_label = np.flatnonzero(to_label_mask)
+    rows_adjacency_matrix = adjacency_matrix[rows_to_label]
+    num_labels = int(label_codes.max()) + 1 if len(label_codes) else 0
+    random_generator = np.random.default_rng(seed)
+    changed_last_iteration = np.zeros(len(rows_to_label), dtype=bool)
+    for iteration in range(1, max_iterations + 1):
+        current_codes = label_codes[rows_to_label]
+        majority_codes = get_majority_label_codes(rows_adjacency_matrix, label_codes, current_codes, num_labels)
+        wants_change = majority_codes != current_codes
+        num_wanting_change = int(wants_change.sum())
+        logging.info(f"Label propagation iteration {iteration}: {num_wanting_change:,} nodes don't have their "
+                     f"majority neighbor label")
+        if not num_wanting_change:
+            logging.info(f"Label propagation reached convergence (in {iteration} iterations)")
+            return label_codes, True
+        may_change = ~changed_last_iteration | (random_generator.random(len(rows_to_label)) < 0.5)
+        changes = wants_change & may_change
+        label_codes[rows_to_label[changes]] = majority_codes[changes]
+        changed_last_iteration = changes
+    return label_codes, False
+
+
+def get_majority_label_codes(rows_adjacency_matrix: sparse.csr_matrix, label_codes: np.ndarray,
+                             current_codes: np.ndarray, num_labels: int) -> np.ndarray:
+    # For each row, sum edge weights by neighbor label and pick the heaviest label (see do_label_propagation() on ties)
+    num_rows = rows_adjacency_matrix.shape[0]
+    entry_rows = np.repeat(np.arange(num_rows), np.diff(rows_adjacency_matrix.indptr))
+    neighbor_codes = label_codes[rows_adjacency_matrix.indices]
+    is_labeled = neighbor_codes >= 0
+    label_weights = sparse.csr_matrix((rows_adjacency_matrix.data[is_labeled],
+                                       (entry_rows[is_labeled], neighbor_codes[is_labeled])),
+                                      shape=(num_rows, max(num_labels, 1)))
+    label_weights.sum_duplicates()
+    label_weights.sort_indices()
+
+    weight_rows = np.repeat(np.arange(num_rows), np.diff(label_weights.indptr))
+    max_weights = label_weights.max(axis=1).toarray().ravel()
+    # Summed floats can differ in their last bits depending on the order they were added in
+    is_max = label_weights.data >= max_weights[weight_rows] - 1e-9
+    max_rows = weight_rows[is_max]
+    max_codes = label_weights.indices[is_max]
+
+    # Nodes that have neighbors, but no labeled ones, become unlabeled; nodes without neighbors keep their label
+    has_neighbors = np.diff(rows_adjacency_matrix.indptr) > 0
+    majority_codes = np.where(has_neighbors, -1, current_codes)
+    rows_with_max, first_max_positions = np.unique(max_rows, return_index=True)
+    majority_codes[rows_with_max] = max_codes[first_max_positions]  # Smallest label code among the heaviest
+    keeps_current = np.zeros(num_rows, dtype=bool)
+    keeps_current[max_rows[max_codes == current_codes[max_rows]]] = True
+    majority_codes[keeps_current] = current_codes[keeps_current]
+    return majority_codes
+
+
+def do_label_propagation_dict(label_map: Dict[str, str], adj_list_weighted: Dict[str, Dict[str, float]],
+                              nodes_to_label: Optional[List[str]] = None) -> Dict[str, str]:
+    # Original (pure Python, asynchronous) label propagation; kept as a reference for check_label_propagation()
     node_ids = nodes_to_label if nodes_to_label else list(label_map.keys())
     logging.info(f"Starting label propagation; {len(node_ids)} nodes need labeling")
     iteration = 1
@@ -208,7 +344,7 @@ def get_most_common_neighbor_label(node_id: str, adj_list_weighted: dict, label_
             if neighbor_label == neighbor_label:  # Means it's not NaN
                 summed_label_weights[neighbor_label] += weight
             # TODO: How does this handle ties? Supposed to break ties in random fashion...
-        most_common_label = max(summed_label_weights, key=summed_label_weights.get) if summed_label_weights else np.NaN
+        most_common_label = max(summed_label_weights, key=summed_label_weights.get) if summed_label_weights else np.nan
         if update_label_map:
             label_map[node_id] = most_common_label  # Important to update label_map itself...
         return most_common_label
@@ -259,29 +395,26 @@ def create_name_sim_edges(nodes_df: pd.DataFrame, edges_df: pd.DataFrame):
     return edges_df
 
 
-def cluster_match_graph(nodes_df: pd.DataFrame, edges_df: pd.DataFrame):
+def cluster_match_graph(nodes_df: pd.DataFrame, edges_df: pd.DataFrame, num_processes: int = 1):
     # Do label propagation, where each node starts with its own ID as its label
     # TODO: Switch to modularity-based clustering, rather than label propagation..
     logging.info(f"Starting to cluster the match graph into groups of equivalent nodes...")
 
     logging.info(f"Determining which nodes need labeling..")
     # Note: A NaN value is not equal to itself
-    non_sri_nodes_df = nodes_df[nodes_df.cluster_id != nodes_df.cluster_id]
-    non_sri_node_ids = list(non_sri_nodes_df.index.values)
-    logging.info(f"Nodes missing cluster ID (non-SRI nodes) are: \n{non_sri_nodes_df}")
+    non_sri_nodes_mask = (nodes_df.cluster_id != nodes_df.cluster_id).to_numpy()
+    logging.info(f"Nodes missing cluster ID (non-SRI nodes) are: \n{nodes_df[non_sri_nodes_mask]}")
 
-    adj_list_weighted = get_weighted_adjacency_dict(edges_df)
+    adjacency_matrix = get_weighted_adjacency_matrix(edges_df, nodes_df.index)
 
     # First do label propagation without assigning node IDs as initial labels (this allows SRI cluster IDs
     # to be propagated as far as possible, rather than a KG2 node ID becoming a cluster ID and dominating, thus
     # preventing a small SRI cluster from being merged with the larger KG2 cluster
     logging.info(f"Starting run 1 of label propagation (using NaN as default starting labels)..")
-    logging.info(f"Zipping node IDs with cluster IDs and converting to dictionary format..")
-    label_map_initial_1 = dict(zip(nodes_df.index, nodes_df.cluster_id))
-    label_map_1 = do_label_propagation(label_map_initial_1, adj_list_weighted,
-                                       nodes_to_label=non_sri_node_ids)
+    labels_1 = do_label_propagation(nodes_df.cluster_id, adjacency_matrix,
+                                    nodes_to_label=non_sri_nodes_mask, num_processes=num_processes)
     logging.info(f"Updating the nodes DataFrame with the cluster IDs determined by first label propagation run..")
-    nodes_df.cluster_id = nodes_df.index.map(label_map_1)
+    nodes_df.cluster_id = labels_1
 
     # Then do another run of label propagation where we use node IDs as initial labels (this allows nodes that are only
     # weakly clustered in an SRI cluster to be won over by a dominating KG2 cluster), and also to allow clustering of
@@ -290,12 +423,10 @@ def cluster_match_graph(nodes_df: pd.DataFrame, edges_df: pd.DataFrame):
     logging.info(f"Assigning node IDs as cluster labels for nodes that don't yet have one..")
     nodes_df.fillna(value={"cluster_id": nodes_df.index.to_series()}, inplace=True)
     logging.info(f"Nodes DataFrame after assigning initial cluster IDs is: \n{nodes_df}")
-    logging.info(f"Zipping node IDs with cluster IDs and converting to dictionary format..")
-    label_map_initial_2 = dict(zip(nodes_df.index, nodes_df.cluster_id))
-    label_map_2 = do_label_propagation(label_map_initial_2, adj_list_weighted,
-                                       nodes_to_label=non_sri_node_ids)
+    labels_2 = do_label_propagation(nodes_df.cluster_id, adjacency_matrix,
+                                    nodes_to_label=non_sri_nodes_mask, num_processes=num_processes)
     logging.info(f"Updating the nodes DataFrame with the cluster IDs determined by second label propagation run..")
-    nodes_df.cluster_id = nodes_df.index.map(label_map_2)
+    nodes_df.cluster_id = labels_2
 
     logging.info(f"The final nodes DataFrame is: \n{nodes_df}")
 
@@ -304,6 +435,65 @@ def cluster_match_graph(nodes_df: pd.DataFrame, edges_df: pd.DataFrame):
                  f"(for a total of {len(nodes_df):,} nodes)")
 
 
+def check_label_propagation(num_clusters: int = 2000, seed: int = LABEL_PROPAGATION_SEED, num_processes: int = 2):
+    """
+    Verifies that the sparse matrix label propagation produces the same clusters as the original dictionary-based
+    version on a random test graph, run the way cluster_match_graph() runs it: cliques of strong (same_as) edges,
+    some nodes that start with SRI cluster IDs (which can't change), and singleton nodes weakly (has_similar_name)
+    attached to cliques. Cliques are used because, unlike e.g. paths, each has only one stable labeling.
+    """
+    random_generator = random.Random(seed)
+    node_ids, edge_rows, sri_cluster_ids = [], [], dict()
+    singleton_node_ids, clique_node_ids = [], []
+    for cluster_num in range(num_clusters):
+        cluster_node_ids = [f"TEST:{cluster_num}.{node_num}" for node_num in range(random_generator.randint(1, 6))]
+        node_ids += cluster_node_ids
+        edge_rows += [(subject, "same_as", object) for subject, object in itertools.combinations(cluster_node_ids, 2)]
+        if random_generator.random() < 0.3:  # Give a member of some clusters a (fixed) SRI cluster ID
+            sri_cluster_ids[random_generator.choice(cluster_node_ids)] = f"SRI:{cluster_num}"
+        if len(cluster_node_ids) == 1:
+            singleton_node_ids += cluster_node_ids
+        else:
+            clique_node_ids += cluster_node_ids
+    # Weak edges only join singletons to clique members (at most one per singleton), so which cluster each node
+    # ends up in doesn't depend on the order nodes are updated in
+    edge_rows += [(singleton_node_id, "has_similar_name", random_generator.choice(clique_node_ids))
+                  for singleton_node_id in singleton_node_ids
+                  if singleton_node_id not in sri_cluster_ids and random_generator.random() < 0.5]
+    nodes_df = pd.DataFrame({"cluster_id": [sri_cluster_ids.get(node_id, np.nan) for node_id in node_ids]},
+                            index=pd.Index(node_ids, name="id"))
+    edges_df = pd.DataFrame(edge_rows, columns=["subject", "predicate", "object"])
+    assign_edge_weights(edges_df)
+
+    adjacency_matrix = get_weighted_adjacency_matrix(edges_df, nodes_df.index)
+    adj_list_weighted = get_weighted_adjacency_dict(edges_df)
+    non_sri_nodes_mask = (nodes_df.cluster_id != nodes_df.cluster_id).to_numpy()
+    non_sri_node_ids = list(nodes_df.index[non_sri_nodes_mask])
+    for processes in sorted({1, num_processes}):
+        reference_labels = nodes_df.cluster_id.copy()
+        labels = nodes_df.cluster_id.copy()
+        for run_num in (1, 2):
+            if run_num == 2:  # Unlabeled nodes start out labeled with their own IDs in the second run
+                reference_labels = reference_labels.fillna(reference_labels.index.to_series())
+                labels = labels.fillna(labels.index.to_series())
+            reference_label_map = do_label_propagation_dict(dict(zip(reference_labels.index, reference_labels)),
+                                                            adj_list_weighted, nodes_to_label=list(non_sri_node_ids))
+            reference_labels = reference_labels.index.to_series().map(reference_label_map)
+            labels = do_label_propagation(labels, adjacency_matrix, nodes_to_label=non_sri_nodes_mask,
+                                          num_processes=processes)
+        # Labels of clusters without SRI IDs depend on tie-breaking, so compare the partitions (and the SRI labels)
+        reference_clusters = {frozenset(group.index) for _, group in reference_labels.groupby(reference_labels.values)}
+        clusters = {frozenset(group.index) for _, group in labels.groupby(labels.values)}
+        if reference_clusters != clusters:
+            raise ValueError(f"Sparse label propagation ({processes} processes) found {len(clusters)} clusters, but "
+                             f"the reference found {len(reference_clusters)} (they don't match)")
+        sri_labeled = reference_labels.str.startswith("SRI:")
+        if not reference_labels[sri_labeled].equals(labels[sri_labeled]):
+            raise ValueError(f"Sparse label propagation ({processes} processes) assigned SRI cluster IDs differently")
+        logging.info(f"Verified sparse label propagation ({processes} processes) matches the reference on "
+                     f"{len(nodes_df)} test nodes ({len(clusters)} clusters)")
+
+
 def verify_clustering_output(nodes_df: pd.DataFrame, edges_df: pd.DataFrame):
     # Make sure every node has a cluster ID filled out
     logging.info(f"Verifying every node has a cluster ID...")
@@ -376,7 +566,7 @@ def load_merged_edges() -> pd.DataFrame:
     return edges_df
 
 
-def run():
+def run(num_processes: int = 1):
     logging.info(f"\n\n  ------------------- STARTING TO RUN SCRIPT {os.path.basename(__file__)} ------------------- \n")
 
     # Load match graph data
@@ -394,7 +584,7 @@ def run():
     edges_df = remove_conflicting_category_edges(nodes_df, edges_df)
 
     # Cluster the graph into sets of equivalent nodes
-    cluster_match_graph(nodes_df, edges_df)
+    cluster_match_graph(nodes_df, edges_df, num_processes=num_processes)
 
     # Run some checks to make sure the output looks reasonable
     verify_clustering_output(nodes_df, edges_df)
@@ -409,7 +599,17 @@ def main():
     logging.basicConfig(level=logging.INFO,
                         format="%(asctime)s %(levelname)s: %(message)s",
                         handlers=[logging.StreamHandler()])
-    run()
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--processes', dest='num_processes', type=int, default=1,
+                            help="Number of processes to label groups of connected components with (default: 1).")
+    arg_parser.add_argument('--checklabelpropagation', dest='check_label_propagation', action='store_true',
+                            help="Only verify that label propagation matches the reference implementation on a "
+                                 "random test graph (doesn't cluster the match graph).")
+    args = arg_parser.parse_args()
+    if args.check_label_propagation:
+        check_label_propagation(num_processes=max(args.num_processes, 2))
+    else:
+        run(num_processes=args.num_processes)
 
 
 if __name__ == "__main__":
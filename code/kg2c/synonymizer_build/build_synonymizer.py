@@ -65,6 +65,9 @@ def main():
     arg_parser.add_argument('-u', '--uploadartifacts', dest='upload_artifacts', action='store_true',
                             help="Specifies that artifacts of the build should be uploaded to the ARAX "
                                  "databases server.")
+    arg_parser.add_argument('--clusterprocesses', dest='cluster_processes', type=int, default=1,
+                            help="Number of processes to use for label propagation when clustering the match graph "
+                                 "(connected components are split into this many groups; default is 1).")
     args = arg_parser.parse_args()
     logging.info(f"Starting synonymizer build. kg2pre_version={args.kg2pre_version}, sub_version={args.sub_version}, "
                  f"--downloadkg2pre={args.download_kg2pre}, --uploadartifacts={args.upload_artifacts}")
@@ -79,7 +82,7 @@ def main():
     if step_num_to_start_at <= 3:
         merge_match_graphs.run()
     if step_num_to_start_at <= 4:
-        cluster_match_graph.run()
+        cluster_match_graph.run(num_processes=args.cluster_processes)
     if step_num_to_start_at <= 5:
         create_synonymizer_sqlite.run()
     logging.info(f"Done building node_synonymizer.sqlite. Took "
@@ -20,6 +20,25 @@ def strip_tabs_and_newlines(some_string: Optional[str]) -> Optional[str]:
         return some_string
 
 
+def get_kg2pre_node_degrees(kg2pre_version: str) -> pd.Series:
+    # Counts the edges each node is involved in (used to rank autocomplete suggestions), reading edges in chunks
+    edges_tsv_path = f"{KG2PRE_TSVS_DIR}/{kg2pre_version}/edges.tsv"
+    edges_tsv_header_path = f"{KG2PRE_TSVS_DIR}/{kg2pre_version}/edges_header.tsv"
+    edges_header_df = pd.read_table(edges_tsv_header_path)
+    edge_column_names = [column_name.split(":")[0] if not column_name.startswith(":") else column_name
+                         for column_name in edges_header_df.columns]
+    node_degrees = pd.Series(dtype=np.int64)
+    edge_chunks = pd.read_table(edges_tsv_path,
+                                names=edge_column_names,
+                                usecols=["subject", "object"],
+                                dtype=str,
+                                chunksize=5000000)
+    for edges_chunk in edge_chunks:
+        chunk_degrees = pd.concat([edges_chunk.subject, edges_chunk.object]).value_counts()
+        node_degrees = node_degrees.add(chunk_degrees, fill_value=0)
+    return node_degrees.astype(np.int64)
+
+
 def dump_kg2pre_node_info(kg2pre_version: str):
     # Load KG2pre node data into a dataframe, including only the columns relevant to us
     nodes_tsv_path = f"{KG2PRE_TSVS_DIR}/{kg2pre_version}/nodes.tsv"
@@ -56,9 +75,12 @@ def dump_kg2pre_node_info(kg2pre_version: str):
     else:
         raise ValueError(f"No build node exists in the KG2pre TSVs! Cannot verify we have the correct KG2pre TSVs.")
 
+    logging.info(f"Counting node degrees..")
+    nodes_df["degree"] = get_kg2pre_node_degrees(kg2pre_version).reindex(nodes_df.index, fill_value=0)
+
     logging.info(f"Node info for autocomplete dataframe is:\n {nodes_df}")
     nodes_df.to_csv(f"{SYNONYMIZER_BUILD_DIR}/autocomplete_node_info.tsv", sep="\t", header=False,
-                    columns=["name", "full_name", "category"])  # Makes sure they're in the right order
+                    columns=["name", "full_name", "category", "degree"])  # Makes sure they're in the right order
 
 
 def main():
@@ -0,0 +1,141 @@
+"""
+Tests that the sparse matrix label propagation in synonymizer_build/4_cluster_match_graph.py clusters the same way
+as the original dictionary-based version, on seeded random match graphs.
+Usage: pytest -v test_cluster_match_graph.py
+"""
+import itertools
+import os
+import random
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/synonymizer_build")
+cluster_match_graph = __import__("4_cluster_match_graph")
+
+
+def _get_random_match_graph(seed: int, num_clusters: int = 80):
+    """
+    Builds a random match graph whose clustering doesn't depend on the order nodes are updated in (so the two
+    implementations can be compared), except at its tie nodes, which are equally weighted between two SRI clusters.
+    It has SRI clusters (one member has a fixed SRI cluster ID) with mixed and parallel edges and chains of unlabeled
+    nodes hanging off them, unlabeled cliques, unlabeled singletons (some weakly attached to a clique, some isolated)
+    and tie nodes. Returns the nodes and edges DataFrames and the tie nodes' possible labels.
+    """
+    random_generator = random.Random(seed)
+    node_ids, edge_rows, sri_cluster_ids = [], [], dict()
+    sri_cluster_node_ids, clique_node_ids, singleton_node_ids = [], [], []
+    for cluster_num in range(num_clusters):
+        cluster_node_ids = [f"TEST:{cluster_num}.{node_num}" for node_num in range(random_generator.randint(1, 5))]
+        node_ids += cluster_node_ids
+        if random_generator.random() < 0.5:
+            sri_cluster_ids[random_generator.choice(cluster_node_ids)] = f"SRI:{cluster_num}"
+            sri_cluster_node_ids.append(cluster_node_ids)
+            # Any edges will do within an SRI cluster, since its label spreads from the fixed node
+            for subject, object in itertools.combinations(cluster_node_ids, 2):
+                edge_rows.append((subject, random_generator.choice(["same_as", "close_match"]), object))
+                if random_generator.random() < 0.2:
+                    edge_rows.append((object, "same_as", subject))
+            previous_node_id = random_generator.choice(cluster_node_ids)
+            for tail_num in range(random_generator.randint(0, 3)):
+                tail_node_id = f"TEST:{cluster_num}.tail{tail_num}"
+                node_ids.append(tail_node_id)
+                edge_rows.append((previous_node_id, "close_match", tail_node_id))
+                previous_node_id = tail_node_id
+        elif len(cluster_node_ids) > 1:
+            # Equal weights, so that an unlabeled clique can only end up as one cluster
+            edge_rows += [(subject, "same_as", object) for subject, object in itertools.combinations(cluster_node_ids, 2)]
+            clique_node_ids += cluster_node_ids
+        else:
+            singleton_node_ids += cluster_node_ids
+    edge_rows += [(singleton_node_id, "has_similar_name", random_generator.choice(clique_node_ids))
+                  for singleton_node_id in singleton_node_ids if random_generator.random() < 0.5]
+    tie_labels = dict()
+    for tie_num in range(num_clusters // 10):
+        tie_node_id = f"TEST:tie{tie_num}"
+        node_ids.append(tie_node_id)
+        predicate = random_generator.choice(["same_as", "close_match", "has_similar_name"])
+        tied_clusters = random_generator.sample(sri_cluster_node_ids, 2)
+        edge_rows += [(random_generator.choice(cluster_node_ids), predicate, tie_node_id) for cluster_node_ids in tied_clusters]
+        tie_labels[tie_node_id] = {sri_cluster_ids[node_id] for cluster_node_ids in tied_clusters
+                                   for node_id in cluster_node_ids if node_id in sri_cluster_ids}
+    nodes_df = pd.DataFrame({"cluster_id": [sri_cluster_ids.get(node_id, np.nan) for node_id in node_ids]},
+                            index=pd.Index(node_ids, name="id"))
+    edges_df = pd.DataFrame(edge_rows, columns=["subject", "predicate", "object"])
+    cluster_match_graph.assign_edge_weights(edges_df)
+    return nodes_df, edges_df, tie_labels
+
+
+def _get_clusters(labels: pd.Series) -> set:
+    return {frozenset(group.index) for _, group in labels.groupby(labels.values)}
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+@pytest.mark.parametrize("num_processes", [1, 3])
+def test_label_propagation_matches_reference(seed, num_processes):
+    nodes_df, edges_df, tie_labels = _get_random_match_graph(seed)
+    adjacency_matrix = cluster_match_graph.get_weighted_adjacency_matrix(edges_df, nodes_df.index)
+    adj_list_weighted = cluster_match_graph.get_weighted_adjacency_dict(edges_df)
+    non_sri_nodes_mask = (nodes_df.cluster_id != nodes_df.cluster_id).to_numpy()
+    non_sri_node_ids = list(nodes_df.index[non_sri_nodes_mask])
+    random.seed(seed)  # (the reference updates nodes in a random order)
+
+    #### Run both the way cluster_match_graph() does: first from the SRI labels only, then with node IDs filled in
+    reference_labels = nodes_df.cluster_id.copy()
+    labels = nodes_df.cluster_id.copy()
+    for run_num in (1, 2):
+        if run_num == 2:
+            reference_labels = reference_labels.fillna(reference_labels.index.to_series())
+            labels = labels.fillna(labels.index.to_series())
+        reference_label_map = cluster_match_graph.do_label_propagation_dict(dict(zip(reference_labels.index, reference_labels)),
+                                                                            adj_list_weighted, nodes_to_label=list(non_sri_node_ids))
+        reference_labels = reference_labels.index.to_series().map(reference_label_map)
+        labels = cluster_match_graph.do_label_propagation(labels, adjacency_matrix, nodes_to_label=non_sri_nodes_mask,
+                                                          num_processes=num_processes)
+        if run_num == 1:
+            #### Nodes not connected to any SRI cluster stay unlabeled
+            assert labels.isna().equals(reference_labels.isna())
+            assert labels.isna().any() and labels.notna().any()
+
+    #### Tie nodes may go either way; everything else must be clustered the same
+    for tie_node_id, possible_labels in tie_labels.items():
+        assert labels[tie_node_id] in possible_labels
+        assert reference_labels[tie_node_id] in possible_labels
+    labels = labels.drop(list(tie_labels))
+    reference_labels = reference_labels.drop(list(tie_labels))
+    assert _get_clusters(labels) == _get_clusters(reference_labels)
+    sri_labeled = reference_labels.str.startswith("SRI:")
+    assert labels[sri_labeled].equals(reference_labels[sri_labeled])
+    assert len(_get_clusters(labels)) < len(labels)
+
+
+def test_label_propagation_ties_and_unlabeled_nodes():
+    # a-b and c-d have fixed labels; x is tied between them (and labeled), y is tied (and unlabeled), z has no
+    # labeled neighbors and w has no neighbors at all
+    node_ids = ["a", "b", "c", "d", "x", "y", "z", "w", "v"]
+    edges_df = pd.DataFrame([("a", "same_as", "x"), ("c", "same_as", "x"), ("b", "close_match", "y"),
+                             ("d", "close_match", "y"), ("z", "same_as", "v")], columns=["subject", "predicate", "object"])
+    cluster_match_graph.assign_edge_weights(edges_df)
+    adjacency_matrix = cluster_match_graph.get_weighted_adjacency_matrix(edges_df, pd.Index(node_ids))
+    labels = pd.Series(["L2", "L2", "L1", "L1", "L2", np.nan, np.nan, "W", np.nan], index=node_ids)
+    for num_processes in [1, 2]:
+        propagated_labels = cluster_match_graph.do_label_propagation(labels, adjacency_matrix,
+                                                                     nodes_to_label=np.array([False] * 4 + [True] * 5),
+                                                                     num_processes=num_processes)
+        assert propagated_labels["x"] == "L2"  # Keeps its current label, since it's among the heaviest
+        assert propagated_labels["y"] == "L1"  # Gets the smallest of the heaviest labels
+        assert propagated_labels[["z", "v"]].isna().all()
+        assert propagated_labels["w"] == "W"
+
+
+def test_label_propagation_without_labels():
+    node_ids = ["a", "b", "c"]
+    edges_df = pd.DataFrame([("a", "same_as", "b")], columns=["subject", "predicate", "object"])
+    cluster_match_graph.assign_edge_weights(edges_df)
+    adjacency_matrix = cluster_match_graph.get_weighted_adjacency_matrix(edges_df, pd.Index(node_ids))
+    labels = pd.Series([np.nan] * 3, index=node_ids)
+    propagated_labels = cluster_match_graph.do_label_propagation(labels, adjacency_matrix)
+    assert propagated_labels.isna().all()
+    assert list(propagated_labels.index) == node_ids
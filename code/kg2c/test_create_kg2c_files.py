@@ -0,0 +1,95 @@
+"""
+Tests that KG2c files built with merged edges spilled to disk (--maxedgesinmemory) are the same as those built with
+all edges in memory, on a small synthetic KG2pre.
+Usage: pytest -v test_create_kg2c_files.py
+"""
+import json
+import os
+import sqlite3
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import create_kg2c_files
+from benchmark_kg2c_build import create_synthetic_kg2pre
+
+NUM_NODES = 300
+NUM_EDGES = 3000
+
+
+class FakeBiolinkHelper:
+    # (the TSV writer only needs node labels)
+    def __init__(self, biolink_version: str):
+        pass
+
+    def get_ancestors(self, categories, include_mixins: bool = False):
+        return list(categories) + ["biolink:NamedThing"]
+
+
+def _get_canonicalized_nodes(curie_map: dict) -> dict:
+    canonicalized_nodes = dict()
+    for canonical_curie in sorted(set(curie_map.values())):
+        node = create_kg2c_files._create_node(preferred_curie=canonical_curie, name=f"node {canonical_curie}",
+                                              category="biolink:NamedThing", all_categories=["biolink:NamedThing"],
+                                              equivalent_curies=[canonical_curie], publications=[],
+                                              all_names=[f"node {canonical_curie}"], iri=None,
+                                              description="A node", descriptions_list=[])
+        del node["descriptions_list"]
+        canonicalized_nodes[canonical_curie] = node
+    # One node is removed (as an overly general node would be), which orphans its edges
+    del canonicalized_nodes["SYN:0"]
+    return canonicalized_nodes
+
+
+def _build_kg2c_files(tsv_dir_path: str, output_dir, curie_map: dict, max_edges_in_memory: int, monkeypatch) -> dict:
+    output_dir.mkdir()
+    monkeypatch.setattr(create_kg2c_files, "KG2C_DIR", str(output_dir))
+    monkeypatch.setattr(create_kg2c_files, "BiolinkHelper", FakeBiolinkHelper)
+    monkeypatch.chdir(output_dir)
+    canonicalized_edges = create_kg2c_files._canonicalize_edges(tsv_dir_path, curie_map, False, num_workers=2,
+                                                                chunk_size=100, max_edges_in_memory=max_edges_in_memory)
+    is_spilled = canonicalized_edges.spill_connection is not None
+    canonicalized_nodes = _get_canonicalized_nodes(curie_map)
+    meta_info = {"kg2_version": "2.10.0", "sub_version": "v1.0", "biolink_version": "4.2.0"}
+    for create_file in [create_kg2c_files.create_kg2c_lite_json_file, create_kg2c_files.create_kg2c_json_file]:
+        create_file(canonicalized_nodes, create_kg2c_files._post_process_edges(canonicalized_edges, canonicalized_nodes),
+                    meta_info, False)
+    create_kg2c_files.create_kg2c_tsv_files(canonicalized_nodes,
+                                            create_kg2c_files._post_process_edges(canonicalized_edges, canonicalized_nodes),
+                                            "4.2.0", False)
+    create_kg2c_files.create_kg2c_sqlite_db(canonicalized_nodes,
+                                            create_kg2c_files._post_process_edges(canonicalized_edges, canonicalized_nodes),
+                                            False)
+    canonicalized_edges.close()
+    assert not (output_dir / "edge_merge_spill.sqlite").exists()
+
+    output = {"is_spilled": is_spilled}
+    for file_name in ["kg2c.json", "kg2c_lite.json", "nodes_c.tsv", "edges_c.tsv", "edges_c_header.tsv"]:
+        output[file_name] = (output_dir / file_name).read_text()
+    connection = sqlite3.connect(str(output_dir / "kg2c.sqlite"))
+    output["kg2c.sqlite"] = [connection.execute(f"SELECT * FROM {table} ORDER BY rowid").fetchall()
+                             for table in ["nodes", "edges"]]
+    connection.close()
+    return output
+
+
+def test_spilled_edges_give_same_kg2c_files(tmp_path, monkeypatch):
+    tsv_dir_path = tmp_path / "kg2pre"
+    tsv_dir_path.mkdir()
+    curie_map = create_synthetic_kg2pre(str(tsv_dir_path), NUM_NODES, NUM_EDGES, cluster_size=3, seed=42)
+
+    in_memory_output = _build_kg2c_files(str(tsv_dir_path), tmp_path / "in_memory", curie_map, NUM_EDGES, monkeypatch)
+    spilled_output = _build_kg2c_files(str(tsv_dir_path), tmp_path / "spilled", curie_map, 250, monkeypatch)
+    assert not in_memory_output.pop("is_spilled")
+    assert spilled_output.pop("is_spilled")
+    assert spilled_output == in_memory_output
+
+    # Edges were actually merged, numbered in input order, and left out when orphaned
+    kg2c = json.loads(in_memory_output["kg2c.json"])
+    assert kg2c["kg2_version"] == "2.10.0"
+    edge_ids = [edge["id"] for edge in kg2c["edges"]]
+    assert edge_ids == sorted(edge_ids)
+    assert len(edge_ids) < edge_ids[-1]
+    assert any(len(edge["kg2_ids"]) > 1 for edge in kg2c["edges"])
+    assert all(edge["subject"] != "SYN:0" and edge["object"] != "SYN:0" for edge in kg2c["edges"])
+    assert len(in_memory_output["kg2c.sqlite"][1]) == len(kg2c["edges"])
+    assert len(json.loads(in_memory_output["kg2c_lite.json"])["edges"]) == len(kg2c["edges"])